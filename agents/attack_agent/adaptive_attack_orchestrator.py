@@ -12,11 +12,15 @@ import sqlite3
 import requests
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
 import uuid
 import yaml
 
+from shared.detection_events import detection_events
+from shared.execution_state_store import get_execution_state_store
+from .phase_execution_engine import PhaseExecutionEngine, ExecutionStep, build_execution_plan
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -50,6 +54,10 @@ class AttackScenario:
     prerequisites: List[str]
     generated_at: str
     confidence_score: float
+    # phase -> phases it waits for (default: the previous phase in attack_path)
+    phase_dependencies: Optional[Dict[str, List[str]]] = None
+    # technique -> techniques that must finish first on the same agent
+    technique_dependencies: Dict[str, List[str]] = field(default_factory=dict)
 
 @dataclass
 class AttackExecution:
@@ -66,13 +74,32 @@ class AttackExecution:
     detections_triggered: List[str]
     success_rate: float
 
+def _execution_from_dict(data: Dict[str, Any]) -> AttackExecution:
+    """Rebuild an AttackExecution from its stored asdict() form"""
+    return AttackExecution(**{**data, 'scenario': AttackScenario(**data['scenario'])})
+
+def _execution_summary(execution: AttackExecution) -> Dict[str, Any]:
+    return {
+        'scenario_name': execution.scenario.name,
+        'target_count': len(execution.target_agents),
+        'started_at': execution.started_at
+    }
+
 class AdaptiveAttackOrchestrator:
     """Production-grade adaptive attack orchestrator for SOC platforms"""
     
     def __init__(self, config_path: Optional[str] = None):
         self.config = self._load_config(config_path)
         self.db_path = self._get_db_path()
-        self.active_executions: Dict[str, AttackExecution] = {}
+        # Executions live in a durable store; only running and recently used ones stay in memory
+        execution_config = self.config.get('attack', {})
+        self.active_executions = get_execution_state_store(
+            'adaptive_attack_executions',
+            encode=asdict,
+            decode=_execution_from_dict,
+            max_hot=execution_config.get('max_cached_executions', 64),
+            completed_ttl_seconds=execution_config.get('execution_retention_hours', 168) * 3600
+        )
         self.network_cache = {}
         self.cache_ttl = 300  # 5 minutes
         self.last_network_scan = None
@@ -80,8 +107,43 @@ class AdaptiveAttackOrchestrator:
         # Initialize APT patterns (will be loaded dynamically on first use)
         self.apt_patterns = None
         
+        # Techniques run as a dependency graph across target agents
+        self.execution_engine = PhaseExecutionEngine(
+            max_concurrency=self.config.get('attack', {}).get('max_concurrent_techniques', 8)
+        )
+        
+        self._recover_interrupted_executions()
+        
         logger.info("Adaptive Attack Orchestrator initialized - Production Mode")
     
+    def _save_execution(self, execution: AttackExecution) -> None:
+        try:
+            self.active_executions.save(
+                execution.execution_id, execution, execution.status, _execution_summary(execution)
+            )
+        except Exception as e:
+            logger.error(f"Failed to persist execution {execution.execution_id}: {e}")
+    
+    def _recover_interrupted_executions(self) -> None:
+        """Mark executions cut off by a restart as interrupted so they can be resumed"""
+        try:
+            for execution_id in self.active_executions.unfinished():
+                execution = self.active_executions.get(execution_id)
+                if execution is None or execution.status not in ['queued', 'executing', 'paused']:
+                    continue
+                execution.results['interrupted'] = {
+                    'status': execution.status,
+                    'current_phase': execution.current_phase,
+                    'detected_at': datetime.now().isoformat()
+                }
+                execution.status = 'interrupted'
+                self._save_execution(execution)
+                logger.warning(f"Execution {execution_id} was interrupted by a restart")
+            
+            self.active_executions.evict_expired()
+        except Exception as e:
+            logger.error(f"Execution recovery failed: {e}")
+    
     async def _load_dynamic_apt_patterns(self) -> Dict:
         """Load APT patterns dynamically from database, threat intelligence, or files"""
         if self.apt_patterns is not None:
@@ -292,41 +354,30 @@ class AdaptiveAttackOrchestrator:
     
     def _generate_attack_paths(self, agents: List[Dict]) -> List[List[str]]:
         """Generate realistic attack paths through the network"""
-        paths = []
-        
-        # Group agents by security zone
-        zones = {}
-        for agent in agents:
-            zone = agent.get('security_zone', 'unknown')
-            if zone not in zones:
-                zones[zone] = []
-            zones[zone].append(agent)
-        
-        # Generate common attack paths
-        # Path 1: External -> DMZ -> Internal -> Secure
-        if 'dmz' in zones and 'internal' in zones and 'secure' in zones:
-            dmz_agent = zones['dmz'][0]['id'] if zones['dmz'] else None
-            internal_agent = zones['internal'][0]['id'] if zones['internal'] else None
-            secure_agent = zones['secure'][0]['id'] if zones['secure'] else None
-            
-            if all([dmz_agent, internal_agent, secure_agent]):
-                paths.append([dmz_agent, internal_agent, secure_agent])
-        
-        # Path 2: Endpoint -> Domain Controller
-        endpoints = [a for a in agents if a['network_element_type'] == 'endpoint']
-        dcs = [a for a in agents if a['network_element_type'] == 'domain_controller']
-        
-        if endpoints and dcs:
-            paths.append([endpoints[0]['id'], dcs[0]['id']])
-        
-        # Path 3: DMZ -> Internal endpoints -> Privilege escalation
-        dmz_servers = [a for a in agents if a['security_zone'] == 'dmz']
-        internal_endpoints = [a for a in agents if a['security_zone'] == 'internal' and a['network_element_type'] == 'endpoint']
-        
-        if dmz_servers and internal_endpoints and dcs:
-            paths.append([dmz_servers[0]['id'], internal_endpoints[0]['id'], dcs[0]['id']])
-        
-        return paths
+        from core.topology.attack_graph import AttackGraph, get_attack_graph, graph_fingerprint
+        
+        def build_graph() -> AttackGraph:
+            graph = AttackGraph()
+            for agent in agents:
+                graph.add_node(agent['id'], zone=agent.get('security_zone'),
+                               role=agent.get('network_element_type'))
+            return graph
+        
+        version = graph_fingerprint((agent['id'], agent.get('security_zone'), agent.get('network_element_type'))
+                                    for agent in agents)
+        graph = get_attack_graph('adaptive_orchestrator', version, build_graph)
+        
+        # Attacks start at DMZ servers and endpoints outside the secure zone
+        entry_points = [a['id'] for a in agents
+                        if a.get('security_zone') == 'dmz' or
+                        (a.get('network_element_type') == 'endpoint' and a.get('security_zone') != 'secure')]
+        
+        # Domain controllers first, then secure-zone systems and admin endpoints
+        targets = [a['id'] for a in agents if a.get('network_element_type') == 'domain_controller']
+        targets += [a['id'] for a in agents if a.get('security_zone') == 'secure']
+        targets += [a['id'] for a in agents if a.get('network_role') == 'admin']
+        
+        return graph.attack_paths(entry_points, targets, k=2, max_paths=10)
     
     async def generate_dynamic_scenario(self, prompt: str, network_context: NetworkContext) -> AttackScenario:
         """Generate attack scenario dynamically based on prompt and network topology"""
@@ -475,6 +526,7 @@ Generate a JSON response with:
     "estimated_duration": 120,
     "target_elements": ["specific_agent_types"],
     "attack_path": ["phase1", "phase2", "phase3"],
+    "phase_dependencies": {{"phase2": ["phase1"], "phase3": ["phase1"]}},
     "mitre_techniques": ["T1566.001", "T1059.001"],
     "success_criteria": {{
         "credentials_obtained": true,
@@ -520,7 +572,9 @@ Make it realistic for the detected network topology and ensure techniques are ap
                         risk_level=scenario_data.get('risk_level', 'medium'),
                         prerequisites=scenario_data.get('prerequisites', []),
                         generated_at=datetime.now().isoformat(),
-                        confidence_score=0.85
+                        confidence_score=0.85,
+                        phase_dependencies=scenario_data.get('phase_dependencies'),
+                        technique_dependencies=scenario_data.get('technique_dependencies', {})
                     )
                     
                     return scenario
@@ -624,7 +678,7 @@ Make it realistic for the detected network topology and ensure techniques are ap
         )
         
         # Store execution
-        self.active_executions[execution_id] = execution
+        self._save_execution(execution)
         
         # Start execution in background
         asyncio.create_task(self._execute_scenario_phases(execution))
@@ -668,49 +722,81 @@ Make it realistic for the detected network topology and ensure techniques are ap
         return targets
     
     async def _execute_scenario_phases(self, execution: AttackExecution):
-        """Execute attack scenario phases"""
+        """Execute attack scenario phases as a dependency graph of per-agent techniques"""
         
         execution.status = 'executing'
-        execution.started_at = datetime.now().isoformat()
+        execution.started_at = execution.started_at or datetime.now().isoformat()
+        self._save_execution(execution)
+        
+        # Detections for the targeted agents arrive as events while techniques run
+        subscription = detection_events.subscribe(agent_ids=execution.target_agents)
+        detection_task = asyncio.create_task(self._collect_detections(execution, subscription))
         
         try:
-            for phase in execution.scenario.attack_path:
-                execution.current_phase = phase
-                logger.info(f"Executing phase: {phase} for {execution.execution_id}")
-                
-                # Execute phase (this would integrate with your dynamic attack generator)
-                phase_result = await self._execute_phase(execution, phase)
-                
-                execution.results[phase] = phase_result
-                execution.phases_completed.append(phase)
-                
-                # Check for detections (this would query your detection system)
-                detections = await self._check_for_detections(execution)
-                execution.detections_triggered.extend(detections)
-                
-                # Brief pause between phases
-                await asyncio.sleep(5)
+            scenario = execution.scenario
+            # A resumed execution only runs the phases it had not completed
+            attack_path = [phase for phase in scenario.attack_path if phase not in execution.phases_completed]
+            steps = build_execution_plan(
+                attack_path,
+                execution.target_agents,
+                lambda phase: self._phase_techniques(scenario, phase),
+                phase_dependencies=scenario.phase_dependencies,
+                technique_dependencies=scenario.technique_dependencies
+            )
             
-            # Calculate success rate
-            execution.success_rate = len(execution.phases_completed) / len(execution.scenario.attack_path)
-            execution.status = 'completed'
-            execution.completed_at = datetime.now().isoformat()
+            phase_steps: Dict[str, List[ExecutionStep]] = {}
+            for step in steps.values():
+                phase_steps.setdefault(step.phase, []).append(step)
+            
+            def finish_phase(phase: str) -> None:
+                execution.results[phase] = self._phase_result(phase, phase_steps[phase])
+                if all(step.status == 'completed' for step in phase_steps[phase]):
+                    execution.phases_completed.append(phase)
+                self._save_execution(execution)
+                logger.info(f"Phase {phase} finished for {execution.execution_id}")
+            
+            def on_step_done(step: ExecutionStep) -> None:
+                execution.current_phase = step.phase
+                if step.phase not in execution.results and all(
+                        other.status in ('completed', 'failed', 'skipped') for other in phase_steps[step.phase]):
+                    finish_phase(step.phase)
+            
+            run_stats = await self.execution_engine.run(
+                steps,
+                lambda step: self._execute_step(execution, step),
+                should_continue=lambda: execution.status == 'executing',
+                on_step_done=on_step_done
+            )
+            execution.results['execution_graph'] = run_stats
+            
+            # Phases cut short by failures or a stop still get a result
+            for phase in attack_path:
+                if phase in phase_steps and phase not in execution.results:
+                    finish_phase(phase)
+            
+            # Calculate success rate over every technique on every target
+            execution.success_rate = run_stats['status_counts'].get('completed', 0) / max(run_stats['steps'], 1)
+            if execution.status == 'executing':
+                execution.status = 'completed'
+                execution.completed_at = datetime.now().isoformat()
             
-            logger.info(f"Completed execution {execution.execution_id} with {execution.success_rate:.1%} success")
+            logger.info(f"Completed execution {execution.execution_id} with {execution.success_rate:.1%} success "
+                        f"({run_stats['steps']} steps, critical path {run_stats['critical_path_length']}, "
+                        f"{run_stats['wall_clock_seconds']}s)")
             
         except Exception as e:
             execution.status = 'failed'
             execution.results['error'] = str(e)
             logger.error(f"Execution {execution.execution_id} failed: {e}")
-    
-    async def _execute_phase(self, execution: AttackExecution, phase: str) -> Dict[str, Any]:
-        """Execute individual attack phase"""
-        
-        # This would integrate with your dynamic attack generator
-        # For now, simulate phase execution
         
+        finally:
+            subscription.close()
+            await detection_task
+            self._save_execution(execution)
+    
+    def _phase_techniques(self, scenario: AttackScenario, phase: str) -> List[str]:
+        """Map an attack phase to the scenario techniques it runs"""
         phase_techniques = []
-        scenario = execution.scenario
         
         # Map phase to techniques
         if phase == 'initial_access':
@@ -723,47 +809,47 @@ Make it realistic for the detected network topology and ensure techniques are ap
         if not phase_techniques:
             phase_techniques = scenario.mitre_techniques[:2]  # Use first 2 techniques
         
-        # Simulate command execution (integrate with your dynamic attack generator here)
-        commands_executed = []
-        for technique in phase_techniques:
-            # This is where you'd call your dynamic_attack_generator
-            command = f"Simulated command for {technique} in phase {phase}"
-            commands_executed.append({
-                'technique': technique,
-                'command': command,
-                'status': 'executed',
-                'timestamp': datetime.now().isoformat()
-            })
+        return phase_techniques
+    
+    async def _execute_step(self, execution: AttackExecution, step: ExecutionStep) -> Dict[str, Any]:
+        """Execute one technique on one target agent"""
+        
+        # This is where you'd call your dynamic_attack_generator
+        # For now, simulate command execution
+        command = f"Simulated command for {step.technique} in phase {step.phase}"
         
         return {
-            'phase': phase,
-            'techniques': phase_techniques,
-            'commands': commands_executed,
-            'status': 'completed',
-            'duration_seconds': 30
+            'technique': step.technique,
+            'agent_id': step.agent_id,
+            'command': command,
+            'status': 'executed',
+            'timestamp': datetime.now().isoformat()
         }
     
-    async def _check_for_detections(self, execution: AttackExecution) -> List[str]:
-        """Check if attack execution triggered any detections"""
+    def _phase_result(self, phase: str, steps: List[ExecutionStep]) -> Dict[str, Any]:
+        """Summarize a finished phase across its agents"""
+        started = [datetime.fromisoformat(step.started_at) for step in steps if step.started_at]
+        completed = [datetime.fromisoformat(step.completed_at) for step in steps if step.completed_at]
         
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.execute("""
-                SELECT id, threat_type, technique 
-                FROM detections 
-                WHERE timestamp > datetime('now', '-5 minutes')
-                AND agent_id IN ({})
-            """.format(','.join(['?' for _ in execution.target_agents])), 
-            execution.target_agents)
-            
-            detections = [f"{row[1]}:{row[2]}" for row in cursor.fetchall()]
-            conn.close()
-            
-            return detections
-            
-        except Exception as e:
-            logger.error(f"Error checking detections: {e}")
-            return []
+        return {
+            'phase': phase,
+            'techniques': sorted({step.technique for step in steps}),
+            'commands': [step.result for step in steps if step.status == 'completed'],
+            'status': 'completed' if all(step.status == 'completed' for step in steps) else 'partial',
+            'failed_steps': [step.step_id for step in steps if step.status == 'failed'],
+            'skipped_steps': [step.step_id for step in steps if step.status == 'skipped'],
+            'duration_seconds': round((max(completed) - min(started)).total_seconds(), 3) if started and completed else 0
+        }
+    
+    async def _collect_detections(self, execution: AttackExecution, subscription) -> None:
+        """Record detections on the targeted agents as they are published"""
+        while True:
+            event = await subscription.get()
+            if event is None:
+                return
+            
+            techniques = event.get('techniques') or ['']
+            execution.detections_triggered.append(f"{event.get('threat_type')}:{techniques[0]}")
     
     def get_execution_status(self, execution_id: str) -> Optional[Dict[str, Any]]:
         """Get status of attack execution"""
@@ -789,14 +875,13 @@ Make it realistic for the detected network topology and ensure techniques are ap
         
         return [
             {
-                'execution_id': exec_id,
-                'scenario_name': execution.scenario.name,
-                'status': execution.status,
-                'target_count': len(execution.target_agents),
-                'started_at': execution.started_at
+                'execution_id': record['key'],
+                'scenario_name': record['summary'].get('scenario_name'),
+                'status': record['status'],
+                'target_count': record['summary'].get('target_count', 0),
+                'started_at': record['summary'].get('started_at')
             }
-            for exec_id, execution in self.active_executions.items()
-            if execution.status in ['queued', 'executing', 'paused']
+            for record in self.active_executions.summaries(statuses=['queued', 'executing', 'paused'])
         ]
     
     async def stop_execution(self, execution_id: str) -> bool:
@@ -809,10 +894,31 @@ Make it realistic for the detected network topology and ensure techniques are ap
         if execution.status in ['queued', 'executing', 'paused']:
             execution.status = 'stopped'
             execution.completed_at = datetime.now().isoformat()
+            self._save_execution(execution)
             logger.info(f"Stopped execution {execution_id}")
             return True
         
         return False
+    
+    async def resume_execution(self, execution_id: str) -> Optional[AttackExecution]:
+        """Resume an execution interrupted by a restart from its first unfinished phase"""
+        
+        execution = self.active_executions.get(execution_id)
+        if not execution or execution.status != 'interrupted':
+            return None
+        
+        # Partial results of unfinished phases are rerun
+        for phase in execution.scenario.attack_path:
+            if phase not in execution.phases_completed:
+                execution.results.pop(phase, None)
+        execution.results.pop('execution_graph', None)
+        execution.status = 'queued'
+        self._save_execution(execution)
+        
+        asyncio.create_task(self._execute_scenario_phases(execution))
+        
+        logger.info(f"Resumed execution {execution_id} after {len(execution.phases_completed)} completed phases")
+        return execution
 
 # Global instance for production use
 adaptive_orchestrator = AdaptiveAttackOrchestrator()
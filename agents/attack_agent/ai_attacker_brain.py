@@ -10,7 +10,6 @@ from datetime import datetime
 import uuid
 import sqlite3
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.prebuilt import ToolExecutor
 import asyncio
 import aiosqlite
@@ -25,6 +24,8 @@ from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from langchain_core.messages import BaseMessage
 from langchain_core.tools import tool
 
+from shared.workflow_checkpointer import get_workflow_checkpointer
+
 logger = logging.getLogger(__name__)
 
 # Define the state for our attack workflow
@@ -66,7 +67,8 @@ class AIAttackerBrain:
     def __init__(self, db_path="soc_database.db"):
         self.db_path = db_path
         self.llm = self._initialize_llm()
-        self.checkpointer = AsyncSqliteSaver.from_conn_string("attack_workflows.db")
+        # Pruned SQLite checkpoints: only the last few per thread are kept
+        self.checkpointer = get_workflow_checkpointer("attack_workflows.db")
         self.graph = self._build_attack_graph()
         logger.info("AI Attacker Brain initialized with LangGraph workflow")
     
@@ -12,6 +12,9 @@ import time
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the generation prompt changes so cached command sets are regenerated
+COMMAND_PROMPT_VERSION = 1
+
 
 class AICommandGenerator:
     """AI-powered dynamic command generation for attack scenarios"""
@@ -409,6 +412,23 @@ Generate commands for attack type: {context['attack_type']}
         return patterns
 
 
+def create_default_llm():
+    """Default LLM for command generation, using the API key from the environment"""
+    import os
+    from langchain_openai import ChatOpenAI
+    
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        logger.error("OPENAI_API_KEY not found in environment")
+        return None
+    
+    return ChatOpenAI(
+        model='gpt-3.5-turbo',
+        temperature=0.7,
+        api_key=api_key
+    )
+
+
 # Integration function for existing attack agent
 async def generate_ai_commands(attack_type: str, platform: str, scenario: Dict, 
                             network_context: Dict = None, llm = None) -> Dict[str, Dict]:
@@ -427,19 +447,9 @@ async def generate_ai_commands(attack_type: str, platform: str, scenario: Dict,
     """
     if not llm:
         # Use default LLM with API key from environment
-        import os
-        from langchain_openai import ChatOpenAI
-        
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            logger.error("OPENAI_API_KEY not found in environment")
+        llm = create_default_llm()
+        if llm is None:
             return {}
-            
-        llm = ChatOpenAI(
-            model='gpt-3.5-turbo', 
-            temperature=0.7,
-            api_key=api_key
-        )
     
     generator = AICommandGenerator(llm)
     return await generator.generate_dynamic_attack_commands(
@@ -0,0 +1,291 @@
+"""
+Command Generation Service
+Platform-aware, cached AI command generation for scenario fleets
+
+Target agents are grouped by platform and commands are generated once per
+distinct platform, concurrently. Validated command sets are cached by
+(scenario, platform, technique set, prompt version) so re-running a scenario
+does not go back to the LLM, and execution feedback is folded into the cached
+entries: a technique that keeps failing evicts its command set so the next
+run regenerates it.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ai_command_generator import AICommandGenerator, COMMAND_PROMPT_VERSION, create_default_llm
+
+logger = logging.getLogger(__name__)
+
+
+# Checked in order: 'darwin' contains 'win', so macOS must be matched before Windows
+PLATFORM_ALIASES = {
+    'macos': ('macos', 'mac os', 'darwin', 'osx', 'os x'),
+    'linux': ('linux', 'ubuntu', 'debian', 'centos', 'rhel', 'red hat', 'fedora', 'unix'),
+    'windows': ('windows', 'win')
+}
+
+CacheKey = Tuple[str, str, str, Tuple[str, ...], int]
+
+
+def normalize_platform(platform: Optional[str], default: str = 'windows') -> str:
+    """Map an agent's reported platform string onto a command platform"""
+    platform = (platform or '').lower()
+    for name, aliases in PLATFORM_ALIASES.items():
+        if any(alias in platform for alias in aliases):
+            return name
+    return default
+
+
+@dataclass
+class CommandSetEntry:
+    """A validated command set plus the execution feedback gathered for it"""
+    key: CacheKey
+    commands: Dict[str, Dict]
+    created_at: float
+    expires_at: float
+    hits: int = 0
+    feedback: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    
+    def record_feedback(self, technique: str, execution_result: Dict) -> Dict[str, Any]:
+        technique_feedback = self.feedback.setdefault(technique, {'successes': 0, 'failures': 0, 'last_error': ''})
+        if execution_result.get('success', False):
+            technique_feedback['successes'] += 1
+        else:
+            technique_feedback['failures'] += 1
+            technique_feedback['last_error'] = str(execution_result.get('error', ''))[:500]
+        technique_feedback['updated_at'] = datetime.utcnow().isoformat()
+        
+        command = self.commands.get(technique)
+        if command is not None:
+            command['execution_feedback'] = dict(technique_feedback)
+        return technique_feedback
+
+
+class CommandGenerationService:
+    """Generates attack commands per platform, reusing validated command sets"""
+    
+    def __init__(self, llm=None, ttl_seconds: float = 3600, max_entries: int = 256,
+                 failure_limit: int = 3, max_tracked_commands: int = 50000):
+        self.llm = llm
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.failure_limit = failure_limit
+        self.max_tracked_commands = max_tracked_commands
+        
+        self._generator: Optional[AICommandGenerator] = None
+        self._entries: 'OrderedDict[CacheKey, CommandSetEntry]' = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        
+        # command_id -> (cache key, technique), for folding execution results back in
+        self._command_index: 'OrderedDict[str, Tuple[CacheKey, str]]' = OrderedDict()
+        
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'generations': 0,
+            'generation_failures': 0,
+            'coalesced': 0,
+            'invalidations': 0,
+            'feedback_received': 0,
+            'feedback_evictions': 0
+        }
+    
+    def _get_generator(self) -> AICommandGenerator:
+        if self._generator is None:
+            llm = self.llm or create_default_llm()
+            if llm is None:
+                raise ValueError("AI command generation requires OPENAI_API_KEY to be configured")
+            self._generator = AICommandGenerator(llm)
+        return self._generator
+    
+    @staticmethod
+    def cache_key(attack_type: str, platform: str, scenario: Optional[Dict],
+                  scenario_id: Optional[str] = None) -> CacheKey:
+        scenario = scenario or {}
+        if scenario_id is None:
+            scenario_id = scenario.get('scenario_id') or scenario.get('id') or scenario.get('name') or ''
+        scenario_id = str(scenario_id)
+        techniques = tuple(sorted(str(technique) for technique in scenario.get('mitre_techniques') or []))
+        return (scenario_id, normalize_platform(platform), attack_type, techniques, COMMAND_PROMPT_VERSION)
+    
+    def _lookup(self, key: CacheKey) -> Optional[CommandSetEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+    
+    async def get_commands(self, attack_type: str, platform: str, scenario: Optional[Dict],
+                           network_context: Dict = None, scenario_id: Optional[str] = None) -> Dict[str, Dict]:
+        """Validated commands for one platform, generated at most once per cache key"""
+        platform = normalize_platform(platform)
+        key = self.cache_key(attack_type, platform, scenario, scenario_id)
+        
+        entry = self._lookup(key)
+        if entry is not None:
+            entry.hits += 1
+            self.stats['hits'] += 1
+            return entry.commands
+        
+        # Concurrent requests for the same key share one generation
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(inflight)
+        
+        self.stats['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            commands = await self._get_generator().generate_dynamic_attack_commands(
+                attack_type, platform, scenario, network_context
+            )
+            self.stats['generations'] += 1
+            
+            if commands:
+                now = time.monotonic()
+                self._entries[key] = CommandSetEntry(key, commands, now, now + self.ttl_seconds)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            
+            future.set_result(commands)
+            return commands
+        
+        except Exception as e:
+            self.stats['generation_failures'] += 1
+            future.set_exception(e)
+            # Retrieve the exception so an unawaited future does not warn
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def generate_for_agents(self, attack_type: str, scenario: Optional[Dict], agents: List[Dict],
+                                  network_context: Dict = None,
+                                  scenario_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Generate commands for a mixed fleet
+        
+        Agents are grouped by platform and each distinct platform is generated
+        concurrently. Returns {platform: {'agent_ids': [...], 'commands': {...}}};
+        platforms whose generation failed map to empty commands.
+        """
+        agent_ids_by_platform: Dict[str, List[str]] = {}
+        for agent in agents:
+            agent_id = agent.get('agent_id') or agent.get('id')
+            if agent_id:
+                agent_ids_by_platform.setdefault(normalize_platform(agent.get('platform')), []).append(agent_id)
+        
+        platforms = list(agent_ids_by_platform)
+        results = await asyncio.gather(
+            *(self.get_commands(attack_type, platform, scenario, network_context, scenario_id)
+              for platform in platforms),
+            return_exceptions=True
+        )
+        
+        generated = {}
+        for platform, result in zip(platforms, results):
+            if isinstance(result, Exception):
+                logger.error(f"Command generation failed for {platform} agents: {result}")
+                result = {}
+            generated[platform] = {'agent_ids': agent_ids_by_platform[platform], 'commands': result}
+        
+        logger.info(f"Generated commands for {len(agents)} agents across {len(platforms)} platforms")
+        return generated
+    
+    def track_commands(self, attack_type: str, platform: str, scenario: Optional[Dict],
+                       command_ids: Dict[str, Dict[str, Dict[str, str]]],
+                       scenario_id: Optional[str] = None) -> None:
+        """Remember which cached command set queued commands came from (id matrix from the command manager)"""
+        key = self.cache_key(attack_type, platform, scenario, scenario_id)
+        for agent_commands in command_ids.values():
+            for technique, ids in agent_commands.items():
+                self._command_index[ids['command_id']] = (key, technique)
+        
+        while len(self._command_index) > self.max_tracked_commands:
+            self._command_index.popitem(last=False)
+    
+    async def learn_from_execution(self, command_id: str, execution_result: Dict) -> None:
+        """Fold an execution result into the cached command set it was generated from"""
+        try:
+            tracked = self._command_index.pop(command_id, None)
+            if tracked is None:
+                return
+            
+            key, technique = tracked
+            self.stats['feedback_received'] += 1
+            
+            entry = self._entries.get(key)
+            if entry is not None:
+                technique_feedback = entry.record_feedback(technique, execution_result)
+                if (technique_feedback['failures'] >= self.failure_limit
+                        and technique_feedback['failures'] > technique_feedback['successes']):
+                    # The command keeps failing: regenerate the set on the next run
+                    del self._entries[key]
+                    self.stats['feedback_evictions'] += 1
+                    logger.info(f"Evicted cached {key[1]} commands for scenario {key[0] or 'unknown'}: "
+                                f"{technique} failed {technique_feedback['failures']} times")
+            
+            if self._generator is not None:
+                await self._generator.learn_from_execution(command_id, execution_result)
+        
+        except Exception as e:
+            logger.error(f"Learning from execution failed: {e}")
+    
+    def invalidate(self, scenario_id: Optional[str] = None, platform: Optional[str] = None) -> int:
+        """Drop cached command sets, optionally only for a scenario and/or platform"""
+        if platform is not None:
+            platform = normalize_platform(platform)
+        
+        keys = [
+            key for key in self._entries
+            if (scenario_id is None or key[0] == scenario_id) and (platform is None or key[1] == platform)
+        ]
+        for key in keys:
+            del self._entries[key]
+        
+        self.stats['invalidations'] += len(keys)
+        return len(keys)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            'prompt_version': COMMAND_PROMPT_VERSION,
+            'cached_sets': len(self._entries),
+            'tracked_commands': len(self._command_index),
+            'entries': [
+                {
+                    'scenario_id': entry.key[0],
+                    'platform': entry.key[1],
+                    'attack_type': entry.key[2],
+                    'techniques': list(entry.key[3]),
+                    'commands': len(entry.commands),
+                    'hits': entry.hits,
+                    'expires_in_seconds': round(entry.expires_at - now, 1),
+                    'feedback': entry.feedback
+                }
+                for entry in self._entries.values()
+            ]
+        }
+
+
+# Global service shared by scenario execution and command result handling
+_command_generation_service: Optional[CommandGenerationService] = None
+
+
+def get_command_generation_service() -> CommandGenerationService:
+    """Get the process-wide command generation service"""
+    global _command_generation_service
+    if _command_generation_service is None:
+        _command_generation_service = CommandGenerationService()
+    return _command_generation_service
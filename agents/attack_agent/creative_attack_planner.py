@@ -142,10 +142,11 @@ class CreativeAttackPlanner:
                 'by_zone': {}
             }
             
-            # Analyze each endpoint
-            for endpoint in endpoints:
-                analysis = await self.endpoint_analyzer.analyze_endpoint_capabilities(endpoint)
-                endpoint_with_analysis = {**endpoint, 'analysis': analysis}
+            # Analyze all endpoints in one pass over the capability table
+            table = self.endpoint_analyzer.get_feature_table(endpoints)
+            analyzed = self.endpoint_analyzer.rows_with_analysis(table, range(table.size), endpoints)
+            for endpoint, endpoint_with_analysis in zip(endpoints, analyzed):
+                analysis = endpoint_with_analysis['analysis']
                 
                 # Categorize by role
                 if analysis['is_executive']:
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Endpoint Feature Table
+Columnar capability analysis for whole endpoint fleets
+
+Every endpoint is parsed once into primitive feature columns (service,
+port, hostname and role indicators); capability flags and scores are then
+derived for all endpoints at once with NumPy, so finder queries become
+boolean masks and sorts over the table instead of per-endpoint analysis.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Indicator vocabularies (kept in step with IntelligentEndpointAnalyzer's checks)
+SMTP_SERVICE_TERMS = ['smtp', 'mail']
+SMTP_PORTS = {25, 587, 465}
+FTP_SERVICE_TERMS = ['ftp']
+FTP_PORTS = {21, 22}
+WEB_SERVICE_TERMS = ['http', 'apache', 'nginx', 'iis', 'web']
+WEB_PORTS = {80, 443, 8080, 8443}
+DATABASE_SERVICE_TERMS = ['mysql', 'postgres', 'mssql', 'oracle', 'mongodb', 'database']
+DATABASE_PORTS = {3306, 5432, 1433, 1521, 27017}
+EXECUTIVE_KEYWORDS = ['ceo', 'cfo', 'cto', 'president', 'executive', 'director', 'vp', 'chief']
+ADMIN_KEYWORDS = ['admin', 'sysadmin', 'administrator', 'root']
+PRIVILEGED_PORTS = {21, 22, 23, 25, 80, 443, 445, 3389}
+
+# Fields that determine an endpoint's analysis (anything else cannot change the table)
+FEATURE_FIELDS = ('id', 'hostname', 'platform', 'network_role', 'detected_services',
+                  'open_ports', 'security_zone', 'network_element_type')
+
+# Primitive per-endpoint indicators gathered in the single parsing pass
+_PRIMITIVES = (
+    'svc_smtp', 'port_smtp', 'svc_ftp', 'port_ftp', 'svc_web', 'port_web',
+    'svc_database', 'port_database', 'linux', 'server_platform',
+    'host_executive', 'role_executive', 'host_admin', 'role_admin', 'host_dc',
+    'element_server', 'role_database', 'zone_exposed'
+)
+
+
+def _parse_ports(open_ports: Any) -> List:
+    if not open_ports:
+        return []
+    try:
+        return json.loads(open_ports) if isinstance(open_ports, str) else list(open_ports)
+    except Exception:
+        return []
+
+
+def endpoints_version(endpoints: Iterable[Dict[str, Any]]) -> str:
+    """Version token for an endpoint list, covering only the fields the analysis reads"""
+    digest = hashlib.sha1()
+    for endpoint in endpoints:
+        digest.update(repr(tuple(endpoint.get(name) for name in FEATURE_FIELDS)).encode())
+    return digest.hexdigest()
+
+
+class EndpointFeatureTable:
+    """Capability matrix for a list of endpoints (one row per endpoint)"""
+    
+    def __init__(self, endpoints: List[Dict[str, Any]], version: Optional[str] = None):
+        self.endpoints = list(endpoints)
+        self.version = version
+        self.size = len(self.endpoints)
+        
+        self.ids: List[str] = []
+        self.hostnames: List[str] = []
+        self.platforms: List[str] = []
+        
+        primitives = {name: np.zeros(self.size, dtype=bool) for name in _PRIMITIVES}
+        port_counts = np.zeros(self.size, dtype=np.int32)
+        privileged_counts = np.zeros(self.size, dtype=np.int32)
+        
+        # Single parsing pass: every string and port list is touched once
+        for row, endpoint in enumerate(self.endpoints):
+            hostname = (endpoint.get('hostname') or '').lower()
+            platform_info = (endpoint.get('platform') or '').lower()
+            network_role = (endpoint.get('network_role') or '').lower()
+            services = (endpoint.get('detected_services') or '').lower()
+            security_zone = (endpoint.get('security_zone') or '').lower()
+            ports = _parse_ports(endpoint.get('open_ports', ''))
+            port_set = {port for port in ports if isinstance(port, (int, str))}
+            
+            self.ids.append(endpoint.get('id', 'unknown'))
+            self.hostnames.append(hostname)
+            self.platforms.append(platform_info)
+            
+            primitives['svc_smtp'][row] = any(term in services for term in SMTP_SERVICE_TERMS)
+            primitives['port_smtp'][row] = not SMTP_PORTS.isdisjoint(port_set)
+            primitives['svc_ftp'][row] = any(term in services for term in FTP_SERVICE_TERMS)
+            primitives['port_ftp'][row] = not FTP_PORTS.isdisjoint(port_set)
+            primitives['svc_web'][row] = any(term in services for term in WEB_SERVICE_TERMS)
+            primitives['port_web'][row] = not WEB_PORTS.isdisjoint(port_set)
+            primitives['svc_database'][row] = any(term in services for term in DATABASE_SERVICE_TERMS)
+            primitives['port_database'][row] = not DATABASE_PORTS.isdisjoint(port_set)
+            primitives['linux'][row] = 'linux' in platform_info
+            primitives['server_platform'][row] = 'server' in platform_info
+            primitives['host_executive'][row] = any(keyword in hostname for keyword in EXECUTIVE_KEYWORDS)
+            primitives['role_executive'][row] = 'executive' in network_role or 'c-level' in network_role
+            primitives['host_admin'][row] = any(keyword in hostname for keyword in ADMIN_KEYWORDS)
+            primitives['role_admin'][row] = 'admin' in network_role
+            primitives['host_dc'][row] = 'domain' in hostname or 'dc' in hostname
+            primitives['element_server'][row] = 'server' in (endpoint.get('network_element_type') or '').lower()
+            primitives['role_database'][row] = 'database' in network_role
+            primitives['zone_exposed'][row] = 'dmz' in security_zone or 'external' in security_zone
+            
+            port_counts[row] = len(ports)
+            privileged_counts[row] = sum(1 for port in ports if isinstance(port, int) and port in PRIVILEGED_PORTS)
+        
+        p = primitives
+        self.role_database = p['role_database']
+        self.linux = p['linux']
+        self.server_platform = p['server_platform']
+        
+        # Capability flags, derived for the whole fleet at once
+        self.columns: Dict[str, np.ndarray] = {
+            'can_be_smtp': p['svc_smtp'] | p['port_smtp'] | p['linux'],
+            'can_be_ftp': p['svc_ftp'] | p['port_ftp'] | p['linux'] | p['server_platform'],
+            'can_be_web_server': p['svc_web'] | p['port_web'],
+            'can_be_database': p['svc_database'] | p['port_database'],
+            'is_executive': p['host_executive'] | p['role_executive'],
+            'is_admin': p['host_admin'] | p['role_admin'],
+            'is_domain_controller': p['host_dc']
+        }
+        
+        c = self.columns
+        self.attack_surface_score = np.minimum(
+            np.minimum(port_counts * 5, 30) + privileged_counts * 10 + p['zone_exposed'] * 20, 100
+        )
+        self.value_score = np.minimum(
+            c['is_executive'] * 50 + c['is_admin'] * 40 + p['host_dc'] * 60
+            + p['element_server'] * 30 + p['role_database'] * 40, 100
+        )
+        
+        # Infrastructure suitability (same for every resource type)
+        self.suitability_score = np.maximum(
+            p['server_platform'] * 30 + p['linux'] * 20 + (100 - self.attack_surface_score) * 0.3
+            - (c['is_executive'] | c['is_admin']) * 50, 0
+        )
+        
+        self._analyses: Dict[int, Dict[str, Any]] = {}
+    
+    def column(self, name: str) -> np.ndarray:
+        """Boolean capability column; unknown capabilities match nothing"""
+        return self.columns.get(name, np.zeros(self.size, dtype=bool))
+    
+    def analysis(self, row: int, roles: Callable[[Dict], List[str]],
+                 vectors: Callable[[Dict, Dict], List[str]]) -> Dict[str, Any]:
+        """Per-endpoint analysis dict for one row (built on first use)"""
+        analysis = self._analyses.get(row)
+        if analysis is None:
+            analysis = {
+                'endpoint_id': self.ids[row],
+                'hostname': self.hostnames[row],
+                'platform': self.platforms[row],
+                **{name: bool(values[row]) for name, values in self.columns.items()},
+                'attack_surface_score': int(self.attack_surface_score[row]),
+                'value_score': int(self.value_score[row]),
+                'recommended_roles': [],
+                'attack_vectors': []
+            }
+            analysis['recommended_roles'] = roles(analysis)
+            analysis['attack_vectors'] = vectors(analysis, self.endpoints[row])
+            self._analyses[row] = analysis
+        return analysis
+    
+    def rows(self, mask: np.ndarray, order_by: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row indexes matching a mask, optionally sorted descending by a score column"""
+        rows = np.flatnonzero(mask)
+        if order_by is not None and rows.size:
+            rows = rows[np.argsort(-order_by[rows], kind='stable')]
+        return rows
+
+
+class FeatureTableCache:
+    """Small LRU of feature tables keyed by endpoint-set version"""
+    
+    def __init__(self, max_tables: int = 8):
+        self.max_tables = max_tables
+        self._tables: 'OrderedDict[str, EndpointFeatureTable]' = OrderedDict()
+        self.stats = {'hits': 0, 'builds': 0}
+    
+    def get(self, endpoints: List[Dict[str, Any]], version: Optional[str] = None) -> EndpointFeatureTable:
+        if version is None:
+            version = endpoints_version(endpoints)
+        
+        table = self._tables.get(version)
+        if table is not None:
+            self._tables.move_to_end(version)
+            self.stats['hits'] += 1
+            return table
+        
+        table = EndpointFeatureTable(endpoints, version)
+        self._tables[version] = table
+        if len(self._tables) > self.max_tables:
+            self._tables.popitem(last=False)
+        self.stats['builds'] += 1
+        return table
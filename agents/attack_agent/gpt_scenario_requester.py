@@ -10,6 +10,8 @@ from datetime import datetime
 import asyncio
 import time
 
+from shared.mitre_index import get_mitre_index
+
 logger = logging.getLogger(__name__)
 
 
@@ -312,13 +314,19 @@ Focus on creating a scenario that:
     
     def _validate_mitre_techniques(self, techniques: List[str]) -> List[str]:
         """Validate MITRE ATT&CK techniques"""
+        mitre_index = get_mitre_index()
         valid_techniques = []
         
         for technique in techniques:
-            if technique.startswith('T') and '.' in technique:
-                valid_techniques.append(technique)
-            elif technique.startswith('T') and len(technique) == 5:
-                valid_techniques.append(technique)
+            technique_id = mitre_index.normalize_id(technique)
+            if not mitre_index.is_valid_id(technique_id):
+                # Techniques given by name ("Process Injection") map to their id
+                matches = mitre_index.find_by_name(technique)
+                if not matches:
+                    continue
+                technique_id = matches[0].id
+            if technique_id not in valid_techniques:
+                valid_techniques.append(technique_id)
         
         return valid_techniques
     
@@ -10,6 +10,8 @@ import json
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
+from .endpoint_feature_table import EndpointFeatureTable, FeatureTableCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,6 +29,9 @@ class IntelligentEndpointAnalyzer:
         self.llm_client = llm_client
         self.analysis_cache = {}
         
+        # Fleet-wide capability tables, keyed by endpoint-set version
+        self.feature_tables = FeatureTableCache()
+        
     async def analyze_endpoint_capabilities(self, endpoint: Dict[str, Any]) -> Dict[str, Any]:
         """
         AI determines what this endpoint can do
@@ -307,109 +312,97 @@ class IntelligentEndpointAnalyzer:
         
         return vectors
     
-    async def identify_executive_endpoints(self, endpoints: List[Dict]) -> List[Dict]:
+    def get_feature_table(self, endpoints: List[Dict], version: Optional[str] = None) -> EndpointFeatureTable:
+        """
+        Capability table for a whole endpoint list, built once per version
+        
+        Args:
+            endpoints: Endpoints to analyze
+            version: Topology version of the endpoint list; derived from the
+                     endpoints' analyzed fields when not given
+        """
+        return self.feature_tables.get(endpoints, version)
+    
+    def rows_with_analysis(self, table: EndpointFeatureTable, rows, endpoints: List[Dict]) -> List[Dict]:
+        """
+        Caller's endpoints at the given table rows, each with its analysis attached
+        
+        The table may be a cached one built from an earlier endpoint list with
+        the same analyzed fields, so the endpoint dicts come from ``endpoints``
+        (same row order) rather than from the table.
+        """
+        return [
+            {
+                **endpoints[row],
+                'analysis': table.analysis(row, self._determine_recommended_roles, self._identify_attack_vectors)
+            }
+            for row in rows
+        ]
+    
+    async def identify_executive_endpoints(self, endpoints: List[Dict], version: Optional[str] = None) -> List[Dict]:
         """Find endpoints with executive/high-value users"""
-        executive_endpoints = []
-        
-        for endpoint in endpoints:
-            analysis = await self.analyze_endpoint_capabilities(endpoint)
-            if analysis['is_executive'] or analysis['value_score'] > 60:
-                executive_endpoints.append({
-                    **endpoint,
-                    'analysis': analysis
-                })
+        table = self.get_feature_table(endpoints, version)
+        rows = table.rows(table.column('is_executive') | (table.value_score > 60))
+        executive_endpoints = self.rows_with_analysis(table, rows, endpoints)
         
         logger.info(f"Identified {len(executive_endpoints)} executive endpoints")
         return executive_endpoints
     
-    async def find_smtp_capable_endpoints(self, endpoints: List[Dict]) -> List[Dict]:
+    async def find_smtp_capable_endpoints(self, endpoints: List[Dict], version: Optional[str] = None) -> List[Dict]:
         """Find endpoints that can be SMTP servers"""
-        smtp_capable = []
-        
-        for endpoint in endpoints:
-            analysis = await self.analyze_endpoint_capabilities(endpoint)
-            if analysis['can_be_smtp']:
-                smtp_capable.append({
-                    **endpoint,
-                    'analysis': analysis
-                })
+        table = self.get_feature_table(endpoints, version)
+        smtp_capable = self.rows_with_analysis(table, table.rows(table.column('can_be_smtp')), endpoints)
         
         logger.info(f"Found {len(smtp_capable)} SMTP-capable endpoints")
         return smtp_capable
     
-    async def find_ftp_capable_endpoints(self, endpoints: List[Dict]) -> List[Dict]:
+    async def find_ftp_capable_endpoints(self, endpoints: List[Dict], version: Optional[str] = None) -> List[Dict]:
         """Find endpoints that can be FTP servers"""
-        ftp_capable = []
-        
-        for endpoint in endpoints:
-            analysis = await self.analyze_endpoint_capabilities(endpoint)
-            if analysis['can_be_ftp']:
-                ftp_capable.append({
-                    **endpoint,
-                    'analysis': analysis
-                })
+        table = self.get_feature_table(endpoints, version)
+        ftp_capable = self.rows_with_analysis(table, table.rows(table.column('can_be_ftp')), endpoints)
         
         logger.info(f"Found {len(ftp_capable)} FTP-capable endpoints")
         return ftp_capable
     
-    async def find_web_server_endpoints(self, endpoints: List[Dict]) -> List[Dict]:
+    async def find_web_server_endpoints(self, endpoints: List[Dict], version: Optional[str] = None) -> List[Dict]:
         """Find endpoints that can be web servers"""
-        web_capable = []
-        
-        for endpoint in endpoints:
-            analysis = await self.analyze_endpoint_capabilities(endpoint)
-            if analysis['can_be_web_server']:
-                web_capable.append({
-                    **endpoint,
-                    'analysis': analysis
-                })
+        table = self.get_feature_table(endpoints, version)
+        web_capable = self.rows_with_analysis(table, table.rows(table.column('can_be_web_server')), endpoints)
         
         logger.info(f"Found {len(web_capable)} web server capable endpoints")
         return web_capable
     
-    async def find_database_endpoints(self, endpoints: List[Dict]) -> List[Dict]:
+    async def find_database_endpoints(self, endpoints: List[Dict], version: Optional[str] = None) -> List[Dict]:
         """Find database server endpoints"""
-        database_endpoints = []
-        
-        for endpoint in endpoints:
-            analysis = await self.analyze_endpoint_capabilities(endpoint)
-            if analysis['can_be_database'] or 'database' in endpoint.get('network_role', '').lower():
-                database_endpoints.append({
-                    **endpoint,
-                    'analysis': analysis
-                })
+        table = self.get_feature_table(endpoints, version)
+        rows = table.rows(table.column('can_be_database') | table.role_database)
+        database_endpoints = self.rows_with_analysis(table, rows, endpoints)
         
         logger.info(f"Found {len(database_endpoints)} database endpoints")
         return database_endpoints
     
     async def find_attack_infrastructure_candidates(self, endpoints: List[Dict], 
-                                                   resource_type: str) -> List[Dict]:
+                                                   resource_type: str,
+                                                   version: Optional[str] = None) -> List[Dict]:
         """
         Find endpoints that can host attack infrastructure
         
         Args:
             endpoints: List of all endpoints
-            resource_type: Type of infrastructure needed (smtp, ftp, web, database)
+            resource_type: Type of infrastructure needed (smtp, ftp, web_server, database)
+            version: Optional topology version of the endpoint list
         
         Returns:
             List of suitable endpoints, sorted by suitability
         """
-        candidates = []
-        
-        for endpoint in endpoints:
-            analysis = await self.analyze_endpoint_capabilities(endpoint)
-            
-            # Check if endpoint can host this resource type
-            capability_key = f'can_be_{resource_type}'
-            if analysis.get(capability_key, False):
-                candidates.append({
-                    **endpoint,
-                    'analysis': analysis,
-                    'suitability_score': self._calculate_suitability_score(analysis, resource_type)
-                })
+        table = self.get_feature_table(endpoints, version)
         
-        # Sort by suitability score
-        candidates.sort(key=lambda x: x['suitability_score'], reverse=True)
+        # Capable endpoints, best suited first
+        rows = table.rows(table.column(f'can_be_{resource_type}'), order_by=table.suitability_score)
+        candidates = [
+            {**candidate, 'suitability_score': float(table.suitability_score[row])}
+            for row, candidate in zip(rows, self.rows_with_analysis(table, rows, endpoints))
+        ]
         
         logger.info(f"Found {len(candidates)} candidates for {resource_type}")
         return candidates
@@ -442,69 +435,72 @@ class IntelligentEndpointAnalyzer:
         Returns:
             {
                 'nodes': List of endpoints with analysis,
-                'edges': Possible attack paths between endpoints,
+                'edges': Attack steps along the computed attack paths,
+                'attack_paths': Cheapest paths from entry points to high-value targets,
                 'entry_points': Best entry points for attacks,
                 'high_value_targets': Most valuable targets
             }
         """
-        nodes = []
         edges = []
-        entry_points = []
-        high_value_targets = []
-        
-        # Analyze all endpoints
-        for endpoint in endpoints:
-            analysis = await self.analyze_endpoint_capabilities(endpoint)
-            node = {
-                **endpoint,
-                'analysis': analysis
-            }
-            nodes.append(node)
-            
-            # Identify entry points
-            if analysis['attack_surface_score'] > 50:
-                entry_points.append(node)
-            
-            # Identify high-value targets
-            if analysis['value_score'] > 60:
-                high_value_targets.append(node)
-        
-        # Generate attack edges (possible paths)
-        for source in nodes:
-            for target in nodes:
-                if source['id'] != target['id']:
-                    # Check if attack path is possible
-                    if self._is_attack_path_possible(source, target):
-                        edges.append({
-                            'source': source['id'],
-                            'target': target['id'],
-                            'techniques': self._get_path_techniques(source, target)
-                        })
+        
+        # Analyze all endpoints in one pass over the capability table
+        table = self.get_feature_table(endpoints)
+        nodes = self.rows_with_analysis(table, range(table.size), endpoints)
+        entry_points = [nodes[row] for row in table.rows(table.attack_surface_score > 50)]
+        high_value_targets = [nodes[row] for row in table.rows(table.value_score > 60)]
+        
+        # Attack paths from entry points to high-value targets over the shared sparse graph
+        from core.topology.attack_graph import AttackGraph, get_attack_graph, graph_fingerprint
+        
+        def build_graph() -> AttackGraph:
+            graph = AttackGraph()
+            for node in nodes:
+                # Larger attack surface = cheaper to compromise
+                graph.add_node(node['id'], zone=node.get('security_zone'),
+                               cost=1.0 - node['analysis'].get('attack_surface_score', 50) / 100)
+            return graph
+        
+        version = graph_fingerprint((node['id'], node.get('security_zone'),
+                                     node['analysis'].get('attack_surface_score')) for node in nodes)
+        graph = get_attack_graph('endpoint_analyzer', version, build_graph)
+        
+        ranked_targets = sorted(high_value_targets, key=lambda node: node['analysis']['value_score'], reverse=True)
+        attack_paths = graph.attack_paths([node['id'] for node in entry_points],
+                                          [node['id'] for node in ranked_targets])
+        
+        # Edges along the computed paths (the full zone-permitted edge set is only counted)
+        nodes_by_id = {node['id']: node for node in nodes}
+        seen_edges = set()
+        for path in attack_paths:
+            for source_id, target_id in zip(path, path[1:]):
+                if (source_id, target_id) in seen_edges:
+                    continue
+                seen_edges.add((source_id, target_id))
+                edges.append({
+                    'source': source_id,
+                    'target': target_id,
+                    'techniques': self._get_path_techniques(nodes_by_id[source_id], nodes_by_id[target_id])
+                })
         
         return {
             'nodes': nodes,
             'edges': edges,
+            'attack_paths': attack_paths,
             'entry_points': entry_points,
             'high_value_targets': high_value_targets,
             'graph_metrics': {
                 'total_endpoints': len(nodes),
                 'entry_points': len(entry_points),
                 'high_value_targets': len(high_value_targets),
-                'possible_paths': len(edges)
+                'possible_paths': graph.count_possible_edges(),
+                'attack_paths': len(attack_paths)
             }
         }
     
     def _is_attack_path_possible(self, source: Dict, target: Dict) -> bool:
         """Check if attack path from source to target is possible"""
-        # Same security zone = easier path
-        if source.get('security_zone') == target.get('security_zone'):
-            return True
-        
-        # DMZ to internal is possible
-        if source.get('security_zone') == 'dmz' and target.get('security_zone') == 'internal':
-            return True
-        
-        return False
+        from core.topology.attack_graph import zone_transition_cost
+        return zone_transition_cost(source.get('security_zone'), target.get('security_zone')) is not None
     
     def _get_path_techniques(self, source: Dict, target: Dict) -> List[str]:
         """Get MITRE techniques for attack path"""
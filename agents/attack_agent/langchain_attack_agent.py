@@ -23,6 +23,8 @@ try:
 except ImportError:
     from langchain_community.chat_models import ChatOllama
 
+from shared.execution_state_store import get_execution_state_store
+
 from .adaptive_attack_orchestrator import adaptive_orchestrator
 from .dynamic_attack_generator import DynamicAttackGenerator
 
@@ -51,6 +53,39 @@ class AttackScenario(BaseModel):
     requires_approval: bool = Field(default=True, description="Whether human approval is required")
 
 
+def _encode_scenario_state(state: Dict) -> Dict:
+    """JSON form of an approval/execution record (scenario model and datetimes flattened)"""
+    return {
+        key: value.dict() if isinstance(value, AttackScenario)
+        else value.isoformat() if isinstance(value, datetime) else value
+        for key, value in state.items()
+    }
+
+
+def _decode_scenario_state(data: Dict) -> Dict:
+    state = dict(data)
+    state['scenario'] = AttackScenario(**state['scenario'])
+    for key in ('created_at', 'approved_at', 'started_at'):
+        if state.get(key):
+            state[key] = datetime.fromisoformat(state[key])
+    return state
+
+
+def _scenario_summary(state: Dict) -> Dict:
+    """Listing fields kept uncompressed next to the stored record"""
+    scenario = state['scenario']
+    return {
+        'scenario_name': scenario.name,
+        'attack_type': scenario.attack_type,
+        'target_count': len(scenario.target_agents),
+        'risk_level': scenario.risk_level,
+        'estimated_duration': scenario.estimated_duration,
+        'techniques': scenario.mitre_techniques,
+        'created_at': state['created_at'].isoformat() if state.get('created_at') else None,
+        'started_at': state['started_at'].isoformat() if state.get('started_at') else None
+    }
+
+
 class AttackCallbackHandler(AsyncCallbackHandler):
     """Callback handler for attack agent events"""
     
@@ -340,10 +375,9 @@ async def native_attack_deployment_tool(scenario: Dict[str, Any], target_agents:
                 # Use REAL attack commands based on scenario type
                 attack_type = scenario.get('attack_type', 'network_intrusion')
                 
-                # Generate AI-powered attack commands for this agent's platform
-                from agents.attack_agent.ai_command_generator import generate_ai_commands
-                import asyncio
-                real_commands = asyncio.run(generate_ai_commands(attack_type, platform, scenario, network_context=None))
+                # AI-powered attack commands for this agent's platform (generated once per platform)
+                from agents.attack_agent.command_generation_service import get_command_generation_service
+                real_commands = await get_command_generation_service().get_commands(attack_type, platform, scenario)
                 
                 if real_commands:
                     # Queue REAL attack commands
@@ -1446,9 +1480,20 @@ IMPORTANT: Always prefer native_attack_deployment_tool over container_deployment
             early_stopping_method="generate"
         )
         
-        # State tracking
-        self.pending_approvals = {}
-        self.active_executions = {}
+        # State tracking, persisted so approvals and executions survive restarts
+        self.pending_approvals = get_execution_state_store(
+            'phantomstrike_approvals',
+            encode=_encode_scenario_state,
+            decode=_decode_scenario_state,
+            terminal_statuses={'approved', 'rejected'},
+            pin_unfinished=False
+        )
+        self.active_executions = get_execution_state_store(
+            'phantomstrike_executions',
+            encode=_encode_scenario_state,
+            decode=_decode_scenario_state,
+            pin_unfinished=False
+        )
         
         logger.info("LangChain PhantomStrike AI Attack Agent initialized")
     
@@ -1619,11 +1664,14 @@ SCENARIO QUALITY:
             )
             
             # Store for approval tracking
-            self.pending_approvals[scenario.scenario_id] = {
+            approval_info = {
                 'scenario': scenario,
                 'created_at': datetime.utcnow(),
                 'status': 'pending_approval'
             }
+            self.pending_approvals.save(
+                scenario.scenario_id, approval_info, approval_info['status'], _scenario_summary(approval_info)
+            )
             
             return scenario
             
@@ -1635,15 +1683,16 @@ SCENARIO QUALITY:
                                       user_approval: bool) -> Dict[str, Any]:
         """Execute attack scenario after user approval"""
         try:
-            if scenario_id not in self.pending_approvals:
+            approval_info = self.pending_approvals.get(scenario_id)
+            if approval_info is None:
                 return {'success': False, 'error': 'Scenario not found'}
             
-            approval_info = self.pending_approvals[scenario_id]
             scenario = approval_info['scenario']
             
             if not user_approval:
                 # User rejected scenario
                 approval_info['status'] = 'rejected'
+                self.pending_approvals.save(scenario_id, approval_info, 'rejected', _scenario_summary(approval_info))
                 return {
                     'success': False,
                     'status': 'rejected',
@@ -1653,6 +1702,7 @@ SCENARIO QUALITY:
             # User approved - execute scenario
             approval_info['status'] = 'approved'
             approval_info['approved_at'] = datetime.utcnow()
+            self.pending_approvals.save(scenario_id, approval_info, 'approved', _scenario_summary(approval_info))
             
             execution_input = {
                 "input": f"""
@@ -1677,12 +1727,15 @@ Proceed with execution now that approval is confirmed.
             execution_result = await self.agent_executor.ainvoke(execution_input)
             
             # Track execution
-            self.active_executions[scenario_id] = {
+            execution_info = {
                 'scenario': scenario,
                 'execution_result': execution_result,
                 'started_at': datetime.utcnow(),
                 'status': 'executing'
             }
+            self.active_executions.save(
+                scenario_id, execution_info, execution_info['status'], _scenario_summary(execution_info)
+            )
             
             return {
                 'success': True,
@@ -1833,19 +1886,19 @@ After creating the scenario, you MUST:
         try:
             pending = []
             
-            for scenario_id, approval_info in self.pending_approvals.items():
-                if approval_info['status'] == 'pending_approval':
-                    scenario = approval_info['scenario']
-                    pending.append({
-                        'scenario_id': scenario_id,
-                        'scenario_name': scenario.name,
-                        'attack_type': scenario.attack_type,
-                        'target_count': len(scenario.target_agents),
-                        'risk_level': scenario.risk_level,
-                        'estimated_duration': scenario.estimated_duration,
-                        'created_at': approval_info['created_at'].isoformat(),
-                        'techniques': scenario.mitre_techniques
-                    })
+            # Listed from the stored summaries without loading the scenarios
+            for record in self.pending_approvals.summaries(statuses=['pending_approval']):
+                summary = record['summary']
+                pending.append({
+                    'scenario_id': record['key'],
+                    'scenario_name': summary.get('scenario_name'),
+                    'attack_type': summary.get('attack_type'),
+                    'target_count': summary.get('target_count', 0),
+                    'risk_level': summary.get('risk_level'),
+                    'estimated_duration': summary.get('estimated_duration'),
+                    'created_at': summary.get('created_at'),
+                    'techniques': summary.get('techniques', [])
+                })
             
             return pending
             
@@ -1858,21 +1911,21 @@ After creating the scenario, you MUST:
         try:
             active_executions = []
             
-            for scenario_id, execution_info in self.active_executions.items():
-                scenario = execution_info['scenario']
+            for record in self.active_executions.summaries(statuses=['executing']):
+                summary = record['summary']
+                execution_info = {'started_at': datetime.fromisoformat(summary['started_at'])}
                 active_executions.append({
-                    'scenario_id': scenario_id,
-                    'scenario_name': scenario.name,
-                    'attack_type': scenario.attack_type,
-                    'status': execution_info['status'],
-                    'started_at': execution_info['started_at'].isoformat(),
+                    'scenario_id': record['key'],
+                    'scenario_name': summary.get('scenario_name'),
+                    'attack_type': summary.get('attack_type'),
+                    'status': record['status'],
+                    'started_at': summary['started_at'],
                     'progress': self._calculate_execution_progress(execution_info)
                 })
             
             return {
                 'active_executions': active_executions,
-                'pending_approvals': len([a for a in self.pending_approvals.values() 
-                                        if a['status'] == 'pending_approval']),
+                'pending_approvals': len(self.pending_approvals.summaries(statuses=['pending_approval'])),
                 'agent_status': 'operational',
                 'last_update': datetime.utcnow().isoformat()
             }
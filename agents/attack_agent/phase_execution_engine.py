@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Phase Execution Engine
+Runs attack scenario techniques as a dependency graph
+
+Every (phase, technique, target agent) becomes a step. A step waits only for
+the steps it depends on - by default the previous phase's steps on the same
+agent - so independent techniques and different hosts run concurrently under
+a shared concurrency budget, and wall-clock time follows the critical path
+rather than the total technique count.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExecutionStep:
+    """One technique on one target agent within a phase"""
+    step_id: str
+    phase: str
+    technique: str
+    agent_id: str
+    depends_on: Set[str] = field(default_factory=set)
+    status: str = 'pending'  # pending, ready, running, completed, failed, skipped
+    result: Dict[str, Any] = field(default_factory=dict)
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+
+
+def default_phase_dependencies(attack_path: List[str]) -> Dict[str, List[str]]:
+    """Kill-chain order: each phase depends on the one before it"""
+    return {phase: [attack_path[index - 1]] if index else [] for index, phase in enumerate(attack_path)}
+
+
+def build_execution_plan(attack_path: List[str], target_agents: List[str],
+                         phase_techniques: Callable[[str], List[str]],
+                         phase_dependencies: Optional[Dict[str, List[str]]] = None,
+                         technique_dependencies: Optional[Dict[str, List[str]]] = None) -> Dict[str, ExecutionStep]:
+    """
+    Expand a scenario into per-agent steps with their dependencies
+
+    Phase dependencies apply per agent (a host's persistence waits for that
+    host's initial access, not for every host's). Technique dependencies
+    order techniques on the same agent regardless of phase.
+    """
+    if phase_dependencies is None:
+        phase_dependencies = default_phase_dependencies(attack_path)
+    technique_dependencies = technique_dependencies or {}
+
+    steps: Dict[str, ExecutionStep] = {}
+    by_agent_phase: Dict[tuple, List[str]] = {}
+    by_agent_technique: Dict[tuple, List[str]] = {}
+
+    for phase in attack_path:
+        for technique in phase_techniques(phase):
+            for agent_id in target_agents:
+                step_id = f"{phase}:{technique}:{agent_id}"
+                if step_id in steps:
+                    continue
+                steps[step_id] = ExecutionStep(step_id, phase, technique, agent_id)
+                by_agent_phase.setdefault((agent_id, phase), []).append(step_id)
+                by_agent_technique.setdefault((agent_id, technique), []).append(step_id)
+
+    for step in steps.values():
+        for dependency_phase in phase_dependencies.get(step.phase, []):
+            step.depends_on.update(by_agent_phase.get((step.agent_id, dependency_phase), []))
+        for dependency_technique in technique_dependencies.get(step.technique, []):
+            step.depends_on.update(by_agent_technique.get((step.agent_id, dependency_technique), []))
+        step.depends_on.discard(step.step_id)
+
+    _check_acyclic(steps)
+    return steps
+
+
+def _check_acyclic(steps: Dict[str, ExecutionStep]) -> None:
+    indegree = {step_id: len(step.depends_on) for step_id, step in steps.items()}
+    dependents = _dependents(steps)
+    ready = [step_id for step_id, degree in indegree.items() if degree == 0]
+    visited = 0
+    while ready:
+        step_id = ready.pop()
+        visited += 1
+        for dependent in dependents[step_id]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                ready.append(dependent)
+    if visited != len(steps):
+        raise ValueError("Scenario dependencies contain a cycle")
+
+
+def _dependents(steps: Dict[str, ExecutionStep]) -> Dict[str, List[str]]:
+    dependents: Dict[str, List[str]] = {step_id: [] for step_id in steps}
+    for step in steps.values():
+        for dependency in step.depends_on:
+            dependents[dependency].append(step.step_id)
+    return dependents
+
+
+def critical_path_length(steps: Dict[str, ExecutionStep]) -> int:
+    """Number of steps on the longest dependency chain"""
+    depth: Dict[str, int] = {}
+
+    def step_depth(step_id: str) -> int:
+        if step_id not in depth:
+            depth[step_id] = 1 + max((step_depth(dependency) for dependency in steps[step_id].depends_on), default=0)
+        return depth[step_id]
+
+    return max((step_depth(step_id) for step_id in steps), default=0)
+
+
+class PhaseExecutionEngine:
+    """Executes a step graph with bounded concurrency"""
+
+    def __init__(self, max_concurrency: int = 8):
+        self.max_concurrency = max_concurrency
+
+    async def run(self, steps: Dict[str, ExecutionStep],
+                  execute_step: Callable[[ExecutionStep], Awaitable[Dict[str, Any]]],
+                  should_continue: Callable[[], bool] = lambda: True,
+                  on_step_done: Optional[Callable[[ExecutionStep], None]] = None) -> Dict[str, Any]:
+        """
+        Run every step once its dependencies completed
+
+        A failed step skips everything that depends on it; when
+        should_continue() turns false no new steps are started.
+        """
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        dependents = _dependents(steps)
+        remaining = {step_id: len(step.depends_on) for step_id, step in steps.items()}
+        running: Dict[asyncio.Task, ExecutionStep] = {}
+
+        async def run_step(step: ExecutionStep) -> None:
+            async with semaphore:
+                step.status = 'running'
+                step.started_at = datetime.now().isoformat()
+                try:
+                    step.result = await execute_step(step) or {}
+                    step.status = 'failed' if step.result.get('status') == 'failed' else 'completed'
+                except Exception as e:
+                    logger.error(f"Step {step.step_id} failed: {e}")
+                    step.result = {'status': 'failed', 'error': str(e)}
+                    step.status = 'failed'
+                step.completed_at = datetime.now().isoformat()
+
+        def skip_dependents(step_id: str) -> None:
+            for dependent in dependents[step_id]:
+                if steps[dependent].status == 'pending':
+                    steps[dependent].status = 'skipped'
+                    skip_dependents(dependent)
+
+        def start_ready(step_ids) -> None:
+            for step_id in step_ids:
+                step = steps[step_id]
+                if step.status == 'pending' and remaining[step_id] == 0 and should_continue():
+                    # Ready steps wait for a concurrency slot; marking them keeps them from starting twice
+                    step.status = 'ready'
+                    running[asyncio.ensure_future(run_step(step))] = step
+
+        start_ready(list(steps))
+
+        while running:
+            done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            ready = []
+            for task in done:
+                step = running.pop(task)
+                if on_step_done is not None:
+                    on_step_done(step)
+
+                if step.status == 'completed':
+                    for dependent in dependents[step.step_id]:
+                        remaining[dependent] -= 1
+                        ready.append(dependent)
+                else:
+                    skip_dependents(step.step_id)
+            start_ready(ready)
+
+        counts: Dict[str, int] = {}
+        for step in steps.values():
+            counts[step.status] = counts.get(step.status, 0) + 1
+
+        return {
+            'steps': len(steps),
+            'status_counts': counts,
+            'critical_path_length': critical_path_length(steps),
+            'max_concurrency': self.max_concurrency,
+            'wall_clock_seconds': round(time.monotonic() - started, 3)
+        }
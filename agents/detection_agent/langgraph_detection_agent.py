@@ -12,13 +12,14 @@ from datetime import datetime, timedelta
 import uuid
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 try:
     from langchain_ollama import ChatOllama
 except ImportError:
     from langchain_community.chat_models import ChatOllama
 
+from shared.workflow_checkpointer import get_workflow_checkpointer, resume_thread
+
 from .real_threat_detector import real_threat_detector
 from .ai_threat_analyzer import ai_threat_analyzer
 
@@ -57,10 +58,9 @@ class LangGraphDetectionAgent:
             temperature=self.config['llm']['temperature']
         )
         
-        # Initialize SQLite checkpointer for persistence
+        # Initialize SQLite checkpointer for persistence (pruned to the last few checkpoints per thread)
         try:
-            import aiosqlite
-            self.checkpointer = AsyncSqliteSaver.from_conn_string("detection_workflows.db")
+            self.checkpointer = get_workflow_checkpointer("detection_workflows.db")
         except Exception as e:
             logger.warning(f"Failed to initialize checkpointer: {e}")
             self.checkpointer = None
@@ -865,23 +865,24 @@ class LangGraphDetectionAgent:
         try:
             # Get current state
             current_state = await self.workflow.aget_state(config)
+            updates = {}
             
             if human_input:
                 # Process human input
                 if "escalate" in human_input.lower():
-                    current_state.values["human_review_status"] = "escalate"
+                    updates["human_review_status"] = "escalate"
                 elif "false_positive" in human_input.lower():
-                    current_state.values["human_review_status"] = "false_positive"
+                    updates["human_review_status"] = "false_positive"
                 elif "monitor" in human_input.lower():
-                    current_state.values["human_review_status"] = "monitor"
+                    updates["human_review_status"] = "monitor"
                 
                 # Add human message
-                current_state.values["messages"].append(
+                updates["messages"] = list(current_state.values.get("messages", [])) + [
                     HumanMessage(content=human_input)
-                )
+                ]
             
-            # Resume execution
-            final_state = await self.workflow.ainvoke(current_state.values, config)
+            # Resume from the human review checkpoint instead of replaying the workflow
+            final_state = await resume_thread(self.workflow, thread_id, updates, as_node="human_review")
             
             return {
                 "success": True,
@@ -0,0 +1,8 @@
+"""
+MITRE ATT&CK Techniques Database
+Detection-side access to the shared ATT&CK index (see shared/mitre_index.py)
+"""
+
+from shared.mitre_index import MitreIndex, Technique, get_mitre_index
+
+__all__ = ['MitreIndex', 'Technique', 'get_mitre_index']
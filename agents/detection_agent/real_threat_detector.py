@@ -21,6 +21,8 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+from shared.detection_events import detection_events
+
 logger = logging.getLogger(__name__)
 
 class RealThreatDetector:
@@ -459,6 +461,14 @@ class RealThreatDetector:
             conn.commit()
             conn.close()
             
+            detection_events.publish(
+                detection_id,
+                agent_id,
+                threat_type=detection_result.get('threat_type', 'unknown'),
+                severity=detection_result.get('severity', 'low'),
+                techniques=detection_result.get('mitre_techniques', [])
+            )
+            
             logger.info(f"Detection stored: {detection_id}")
             return detection_id
             
@@ -12,6 +12,7 @@ import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any
 import uuid
+from shared.migrations import ensure_schema
 
 logger = logging.getLogger(__name__)
 
@@ -31,30 +32,9 @@ class GoldenImageTool:
         self._init_database()
     
     def _init_database(self):
-        """Initialize golden images table in database"""
+        """Ensure golden images table exists (created by the schema migrations)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS golden_images (
-                    id TEXT PRIMARY KEY,
-                    agent_id TEXT NOT NULL,
-                    image_type TEXT DEFAULT 'snapshot',
-                    created_at TIMESTAMP,
-                    created_by TEXT,
-                    checksum TEXT,
-                    size_bytes INTEGER,
-                    metadata TEXT,
-                    status TEXT DEFAULT 'ready',
-                    restore_count INTEGER DEFAULT 0,
-                    last_restored TIMESTAMP,
-                    notes TEXT
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            ensure_schema(self.db_path)
         except Exception as e:
             logger.error(f"Database initialization error: {e}")
     
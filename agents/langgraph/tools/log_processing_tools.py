@@ -11,8 +11,14 @@ from datetime import datetime, timezone, timedelta
 import hashlib
 import re
 
+from shared.database import get_db_connection
+from shared.migrations import ensure_schema
+
 logger = logging.getLogger(__name__)
 
+# SQLite host-parameter limit is 999 on older builds
+ACK_CHUNK_SIZE = 500
+
 class LogFetcherTool:
     """Tool for fetching logs from database"""
     
@@ -22,6 +28,132 @@ class LogFetcherTool:
         self.description = "Fetch logs from database for processing"
         self.last_processed_id = None
         self.batch_size = 100
+        self._schema_ready = False
+    
+    def _connect(self):
+        if not self._schema_ready:
+            ensure_schema(self.db_path)
+            self._schema_ready = True
+        return get_db_connection(self.db_path)
+    
+    def get_position(self, consumer: str = 'detection_workflow') -> int:
+        """Persisted high-water mark (last processed log_entries rowid) of a consumer"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT position FROM stream_cursors WHERE consumer = ?', (consumer,)).fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+    
+    def has_new_logs(self, consumer: str = 'detection_workflow') -> bool:
+        """Whether any log was ingested past the consumer's cursor (a single index probe)"""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute('''
+                    SELECT 1 FROM log_entries
+                    WHERE rowid > COALESCE((SELECT position FROM stream_cursors WHERE consumer = ?), 0)
+                    LIMIT 1
+                ''', (consumer,)).fetchone()
+                return row is not None
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Log cursor check error: {e}")
+            return False
+    
+    def fetch_new_logs(self, batch_size: int = 100, consumer: str = 'detection_workflow') -> Dict[str, Any]:
+        """
+        Fetch logs ingested after the consumer's cursor, oldest first
+        
+        The cursor only moves when acknowledge() is called for the batch, so a
+        failed pass re-reads the same logs and nothing is skipped.
+        """
+        try:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT position FROM stream_cursors WHERE consumer = ?', (consumer,))
+                row = cursor.fetchone()
+                position = row['position'] if row else 0
+                
+                cursor.execute('''
+                    SELECT rowid AS position, id, agent_id, timestamp, level, source, message,
+                           raw_data, parsed_data, event_type, attack_technique, threat_score
+                    FROM log_entries
+                    WHERE rowid > ?
+                    ORDER BY rowid
+                    LIMIT ?
+                ''', (position, batch_size))
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            
+            logs = []
+            for row in rows:
+                logs.append({
+                    'id': row['id'],
+                    'agent_id': row['agent_id'],
+                    'timestamp': row['timestamp'],
+                    'level': row['level'],
+                    'source': row['source'],
+                    'message': row['message'],
+                    'data': json.loads(row['parsed_data']) if row['parsed_data'] else (row['raw_data'] or {}),
+                    'event_type': row['event_type'],
+                    'technique': row['attack_technique'],
+                    'threat_score': row['threat_score']
+                })
+            
+            return {
+                'success': True,
+                'logs': logs,
+                'cursor': position,
+                'high_water_mark': rows[-1]['position'] if rows else position,
+                'has_more': len(rows) == batch_size,
+                'fetch_time': datetime.now(timezone.utc).isoformat()
+            }
+        
+        except Exception as e:
+            logger.error(f"Log fetching error: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'logs': [],
+                'high_water_mark': None
+            }
+    
+    def acknowledge(self, log_ids: List[str], high_water_mark: int,
+                    consumer: str = 'detection_workflow') -> bool:
+        """Mark a processed batch and advance the consumer's cursor in one transaction"""
+        try:
+            conn = self._connect()
+            try:
+                processed_at = datetime.now(timezone.utc).isoformat()
+                for start in range(0, len(log_ids), ACK_CHUNK_SIZE):
+                    chunk = log_ids[start:start + ACK_CHUNK_SIZE]
+                    conn.execute(
+                        f"UPDATE log_entries SET processed_at = ? WHERE id IN ({', '.join('?' for _ in chunk)})",
+                        [processed_at, *chunk]
+                    )
+                
+                # The cursor never moves backwards
+                conn.execute('''
+                    INSERT INTO stream_cursors (consumer, position, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(consumer) DO UPDATE SET
+                        position = MAX(position, excluded.position),
+                        updated_at = excluded.updated_at
+                ''', (consumer, high_water_mark, processed_at))
+                conn.commit()
+            finally:
+                conn.close()
+            
+            self.last_processed_id = log_ids[-1] if log_ids else self.last_processed_id
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error acknowledging processed logs: {e}")
+            return False
     
     def run(self, 
             batch_size: int = 100, 
@@ -145,12 +277,13 @@ class LogFetcherTool:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            for log_id in log_ids:
-                cursor.execute("""
-                    UPDATE detections 
-                    SET status = ? 
-                    WHERE id = ?
-                """, (status, log_id))
+            # One statement per chunk instead of one per row
+            for start in range(0, len(log_ids), ACK_CHUNK_SIZE):
+                chunk = log_ids[start:start + ACK_CHUNK_SIZE]
+                cursor.execute(
+                    f"UPDATE detections SET status = ? WHERE id IN ({', '.join('?' for _ in chunk)})",
+                    [status, *chunk]
+                )
             
             conn.commit()
             conn.close()
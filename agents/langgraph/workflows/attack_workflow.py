@@ -6,6 +6,7 @@ Complete MITRE evaluation-based attack agent using LangGraph
 import asyncio
 import json
 import logging
+import os
 from typing import Dict, List, Any, TypedDict, Annotated, Sequence
 from enum import Enum
 from datetime import datetime, timezone
@@ -14,7 +15,6 @@ import uuid
 # LangGraph imports
 try:
     from langgraph.graph import StateGraph, END
-    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
     from langgraph.prebuilt import ToolExecutor
     LANGGRAPH_AVAILABLE = True
 except ImportError:
@@ -26,6 +26,7 @@ from ..tools.network_tools import NetworkDiscoveryTool, VulnerabilityAnalysisToo
 from ..tools.golden_image_tools import GoldenImageTool
 from ..tools.llm_manager import llm_manager, LLMProvider
 from ..prompts.attack_prompts import attack_prompts
+from shared.workflow_checkpointer import get_workflow_checkpointer, resume_thread
 
 logger = logging.getLogger(__name__)
 
@@ -587,7 +588,8 @@ class AttackWorkflowNodes:
             if state.get('approved', False):
                 return 'golden_image_creation'
             else:
-                return 'user_review'
+                # Pause at the checkpoint; approve_plan() resumes the thread
+                return END
         elif phase == AttackPhase.GOLDEN_IMAGE_CREATION:
             return 'golden_image_creation'
         elif phase == AttackPhase.EXECUTION:
@@ -605,12 +607,15 @@ class AttackWorkflowNodes:
 class AttackWorkflow:
     """Main attack workflow using LangGraph"""
     
-    def __init__(self, checkpoint_dir: str = "checkpoints"):
+    def __init__(self, checkpoint_dir: str = "checkpoints", keep_checkpoints: int = 5):
         if not LANGGRAPH_AVAILABLE:
             raise ImportError("LangGraph not installed. Run: pip install langgraph")
         
         self.nodes = AttackWorkflowNodes()
         self.checkpoint_dir = checkpoint_dir
+        self.checkpointer = get_workflow_checkpointer(
+            os.path.join(checkpoint_dir, "attack.db"), keep_last=keep_checkpoints
+        )
         self.workflow = self._build_workflow()
     
     def _build_workflow(self) -> StateGraph:
@@ -665,7 +670,7 @@ class AttackWorkflow:
         workflow.add_edge("monitoring", END)
         workflow.add_edge("restoration", END)
         
-        return workflow.compile()
+        return workflow.compile(checkpointer=self.checkpointer)
     
     async def run(self, user_request: str, scenario_type: str = None, 
                   constraints: Dict = None, llm_provider: str = "ollama") -> Dict:
@@ -679,7 +684,7 @@ class AttackWorkflow:
             llm_provider: Which LLM to use
         
         Returns:
-            Final state with results
+            Final state with results, plus the thread_id to approve the plan with
         """
         # Initialize state
         initial_state = {
@@ -713,18 +718,14 @@ class AttackWorkflow:
         
         # Run workflow
         try:
-            # Use checkpointing for resumability
-            async with AsyncSqliteSaver.from_path(f"{self.checkpoint_dir}/attack.db") as saver:
-                config = {"configurable": {"thread_id": f"attack_{uuid.uuid4().hex[:8]}"}}
-                
-                # Run the workflow
-                final_state = await self.workflow.ainvoke(
-                    initial_state,
-                    config,
-                    {"checkpointer": saver}
-                )
-                
-                return final_state
+            # Checkpointed so the run can pause for approval and resume later
+            thread_id = f"attack_{uuid.uuid4().hex[:8]}"
+            config = {"configurable": {"thread_id": thread_id}}
+            
+            # Run the workflow (stops at user review until the plan is approved)
+            final_state = await self.workflow.ainvoke(initial_state, config)
+            
+            return {**final_state, 'thread_id': thread_id}
                 
         except Exception as e:
             logger.error(f"Workflow execution error: {e}")
@@ -734,24 +735,12 @@ class AttackWorkflow:
     async def approve_plan(self, thread_id: str) -> Dict:
         """Approve a pending attack plan"""
         try:
-            async with AsyncSqliteSaver.from_path(f"{self.checkpoint_dir}/attack.db") as saver:
-                config = {"configurable": {"thread_id": thread_id}}
-                
-                # Get current state
-                state = await saver.aget(config)
-                
-                # Update approval
-                state['approved'] = True
-                state['current_phase'] = AttackPhase.GOLDEN_IMAGE_CREATION
-                
-                # Continue workflow
-                final_state = await self.workflow.ainvoke(
-                    state,
-                    config,
-                    {"checkpointer": saver}
-                )
-                
-                return final_state
+            # Record the approval as the review step's outcome and continue from the checkpoint
+            final_state = await resume_thread(
+                self.workflow, thread_id, {'approved': True}, as_node='user_review'
+            )
+            
+            return {**final_state, 'thread_id': thread_id}
                 
         except Exception as e:
             logger.error(f"Approval error: {e}")
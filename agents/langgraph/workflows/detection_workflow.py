@@ -6,6 +6,8 @@ Continuous threat detection system with AI reasoning
 import asyncio
 import json
 import logging
+import os
+import time
 from typing import Dict, List, Any, TypedDict, Annotated, Sequence, Optional
 from enum import Enum
 from datetime import datetime, timezone
@@ -15,7 +17,6 @@ import numpy as np
 # LangGraph imports
 try:
     from langgraph.graph import StateGraph, END
-    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
     from langgraph.prebuilt import ToolExecutor
     LANGGRAPH_AVAILABLE = True
 except ImportError:
@@ -27,6 +28,8 @@ from ..tools.log_processing_tools import LogFetcherTool, LogParserTool, LogAggre
 from ..tools.ml_detection_tools import MLModelManager, LogEnrichmentTool, ThreatIntelligenceTool
 from ..tools.llm_manager import llm_manager, LLMProvider
 from ..prompts.detection_prompts import detection_prompts
+from shared.workflow_checkpointer import get_workflow_checkpointer, resume_thread
+from shared.log_events import log_events
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +59,29 @@ class ThreatVerdict(Enum):
     LIKELY_BENIGN = "likely_benign"
     CONFIRMED_BENIGN = "confirmed_benign"
 
+def _append(left: List, right: List) -> List:
+    """
+    Reducer for lists written by concurrent nodes
+    
+    A non-empty write is appended. An empty write RESETS the list: the initial
+    state uses this to clear a checkpointed thread's lists for a fresh run. A
+    node must therefore never write [] to an appended key, or it wipes what
+    parallel branches added; nodes wrapped by as_update_node only ever write
+    the items they appended, and omit the key when there are none.
+    """
+    return left + right if right else []
+
+
+def _merge(left: Dict, right: Dict) -> Dict:
+    """
+    Reducer for dicts written by concurrent nodes
+    
+    Like _append, an empty write ({}) resets the dict for a fresh run, so
+    nodes must only write the entries they add.
+    """
+    return {**left, **right} if right else {}
+
+
 class DetectionState(TypedDict):
     """State for detection workflow"""
     # Configuration
@@ -66,6 +92,7 @@ class DetectionState(TypedDict):
     
     # Raw data
     raw_logs: List[Dict]
+    high_water_mark: Optional[int]  # last log_entries rowid in raw_logs
     parsed_logs: List[Dict]
     enriched_logs: List[Dict]
     
@@ -76,7 +103,7 @@ class DetectionState(TypedDict):
     ml_confidence_scores: List[float]
     
     # LLM Analysis results
-    llm_results: List[Dict]
+    llm_results: Annotated[List[Dict], _append]
     llm_threats: List[Dict]
     llm_confidence_scores: List[float]
     
@@ -104,10 +131,52 @@ class DetectionState(TypedDict):
     threats_detected: int
     false_positives: int
     processing_time: float
+    node_timings: Annotated[Dict[str, float], _merge]  # seconds per node
     
     # Messages and errors
-    messages: Sequence[str]
-    errors: List[str]
+    messages: Annotated[List[str], _append]
+    errors: Annotated[List[str], _append]
+
+
+# Keys merged by reducers: a node's update carries only what it appended
+APPEND_KEYS = ('messages', 'errors', 'llm_results')
+
+# Analysis nodes that read only the enriched logs and run concurrently
+ANALYSIS_BRANCHES = ('ml_detection', 'llm_analysis', 'threat_intelligence', 'correlation')
+
+
+def as_update_node(name: str, node, exclude: Sequence[str] = ()):
+    """
+    Adapt a node that mutates and returns the whole state into one returning
+    only the keys it changed, timed under node_timings
+    
+    Concurrent branches must not write the same plain key in one step, so
+    `exclude` drops keys (such as current_phase) that a join node sets instead.
+    """
+    async def run(state: DetectionState) -> Dict[str, Any]:
+        started = time.perf_counter()
+        working = dict(state)
+        for key in APPEND_KEYS:
+            working[key] = list(state.get(key) or [])
+        lengths = {key: len(value) for key, value in state.items() if isinstance(value, list)}
+        
+        result = await node(working)
+        
+        update: Dict[str, Any] = {}
+        for key, value in result.items():
+            if key in exclude or key == 'node_timings':
+                continue
+            if key in APPEND_KEYS:
+                added = value[len(state.get(key) or []):]
+                if added:
+                    update[key] = added
+            elif value is not state.get(key) or (key in lengths and len(value) != lengths[key]):
+                update[key] = value
+        
+        update['node_timings'] = {name: round(time.perf_counter() - started, 4)}
+        return update
+    
+    return run
 
 # ============= DETECTION NODES =============
 
@@ -131,16 +200,13 @@ class DetectionWorkflowNodes:
         logger.info("Fetching logs from database")
         
         try:
-            # Fetch logs
-            result = self.log_fetcher.run(
-                batch_size=state.get('batch_size', 100),
-                time_window=state.get('time_window', 5)
-            )
+            # Everything ingested past the persisted cursor, oldest first
+            result = self.log_fetcher.fetch_new_logs(batch_size=state.get('batch_size', 100))
             
             if result['success']:
-                # Combine detection and agent logs
-                all_logs = result['detection_logs'] + result['agent_logs']
+                all_logs = result['logs']
                 state['raw_logs'] = all_logs
+                state['high_water_mark'] = result['high_water_mark']
                 state['messages'].append(f"Fetched {len(all_logs)} logs for analysis")
                 
                 if len(all_logs) == 0:
@@ -401,6 +467,18 @@ class DetectionWorkflowNodes:
         
         return state
     
+    async def analysis_join_node(self, state: DetectionState) -> DetectionState:
+        """Wait for every analysis branch, then hand over to AI reasoning"""
+        timings = state.get('node_timings', {})
+        branch_times = [timings[name] for name in ANALYSIS_BRANCHES if name in timings]
+        if branch_times:
+            state['messages'].append(
+                f"Parallel analysis took {max(branch_times):.2f}s "
+                f"({sum(branch_times):.2f}s of branch work)"
+            )
+        state['current_phase'] = DetectionPhase.AI_REASONING
+        return state
+    
     async def ai_reasoning_node(self, state: DetectionState) -> DetectionState:
         """AI reasoning for final verdict"""
         logger.info("AI reasoning for final verdict")
@@ -659,31 +737,47 @@ class DetectionWorkflowNodes:
 class DetectionWorkflow:
     """Main detection workflow using LangGraph"""
     
-    def __init__(self, checkpoint_dir: str = "checkpoints", db_path: str = "soc_database.db"):
+    # Thread reused by every continuous-mode pass, so its checkpoints are pruned in place
+    CONTINUOUS_THREAD_ID = "detection_continuous"
+    
+    def __init__(self, checkpoint_dir: str = "checkpoints", db_path: str = "soc_database.db",
+                 keep_checkpoints: int = 5):
         if not LANGGRAPH_AVAILABLE:
             raise ImportError("LangGraph not installed. Run: pip install langgraph")
         
         self.nodes = DetectionWorkflowNodes(db_path)
         self.checkpoint_dir = checkpoint_dir
+        self.checkpointer = get_workflow_checkpointer(
+            os.path.join(checkpoint_dir, "detection.db"), keep_last=keep_checkpoints
+        )
         self.workflow = self._build_workflow()
         self.running = False
+        self.continuous = False
+        self._subscription = None
+        self.last_thread_id = None
     
     def _build_workflow(self) -> StateGraph:
         """Build the LangGraph workflow"""
         workflow = StateGraph(DetectionState)
         
         # Add nodes
-        workflow.add_node("log_fetching", self.nodes.log_fetching_node)
-        workflow.add_node("log_parsing", self.nodes.log_parsing_node)
-        workflow.add_node("log_enrichment", self.nodes.log_enrichment_node)
-        workflow.add_node("ml_detection", self.nodes.ml_detection_node)
-        workflow.add_node("llm_analysis", self.nodes.llm_analysis_node)
-        workflow.add_node("threat_intelligence", self.nodes.threat_intelligence_node)
-        workflow.add_node("correlation", self.nodes.correlation_node)
-        workflow.add_node("ai_reasoning", self.nodes.ai_reasoning_node)
-        workflow.add_node("verdict", self.nodes.verdict_node)
-        workflow.add_node("alert_generation", self.nodes.alert_generation_node)
-        workflow.add_node("notification", self.nodes.notification_node)
+        nodes = {
+            "log_fetching": self.nodes.log_fetching_node,
+            "log_parsing": self.nodes.log_parsing_node,
+            "log_enrichment": self.nodes.log_enrichment_node,
+            "ml_detection": self.nodes.ml_detection_node,
+            "llm_analysis": self.nodes.llm_analysis_node,
+            "threat_intelligence": self.nodes.threat_intelligence_node,
+            "correlation": self.nodes.correlation_node,
+            "analysis_join": self.nodes.analysis_join_node,
+            "ai_reasoning": self.nodes.ai_reasoning_node,
+            "verdict": self.nodes.verdict_node,
+            "alert_generation": self.nodes.alert_generation_node,
+            "notification": self.nodes.notification_node
+        }
+        for name, node in nodes.items():
+            exclude = ('current_phase',) if name in ANALYSIS_BRANCHES else ()
+            workflow.add_node(name, as_update_node(name, node, exclude))
         
         # Set entry point
         workflow.set_entry_point("log_fetching")
@@ -691,11 +785,13 @@ class DetectionWorkflow:
         # Add edges
         workflow.add_edge("log_fetching", "log_parsing")
         workflow.add_edge("log_parsing", "log_enrichment")
-        workflow.add_edge("log_enrichment", "ml_detection")
-        workflow.add_edge("ml_detection", "llm_analysis")
-        workflow.add_edge("llm_analysis", "threat_intelligence")
-        workflow.add_edge("threat_intelligence", "correlation")
-        workflow.add_edge("correlation", "ai_reasoning")
+        
+        # Fan out to the independent analyses and join once all of them finished,
+        # so a pass takes as long as the slowest branch rather than their sum
+        for branch in ANALYSIS_BRANCHES:
+            workflow.add_edge("log_enrichment", branch)
+        workflow.add_edge(list(ANALYSIS_BRANCHES), "analysis_join")
+        workflow.add_edge("analysis_join", "ai_reasoning")
         workflow.add_edge("ai_reasoning", "verdict")
         
         # Conditional edges
@@ -719,13 +815,14 @@ class DetectionWorkflow:
             }
         )
         
-        return workflow.compile()
+        return workflow.compile(checkpointer=self.checkpointer)
     
     async def run(self, 
                   batch_size: int = 100,
                   time_window: int = 5,
                   continuous_mode: bool = False,
-                  llm_provider: str = "ollama") -> Dict:
+                  llm_provider: str = "ollama",
+                  thread_id: Optional[str] = None) -> Dict:
         """
         Run the detection workflow
         
@@ -734,6 +831,7 @@ class DetectionWorkflow:
             time_window: Time window in minutes for log fetching
             continuous_mode: If True, run continuously
             llm_provider: Which LLM provider to use
+            thread_id: Checkpoint thread to run on (a new one by default)
         
         Returns:
             Final state with detection results
@@ -749,7 +847,9 @@ class DetectionWorkflow:
             'threats_detected': 0,
             'false_positives': 0,
             'processing_time': 0.0,
+            'node_timings': {},
             'raw_logs': [],
+            'high_water_mark': None,
             'parsed_logs': [],
             'enriched_logs': [],
             'ml_results': {},
@@ -777,26 +877,29 @@ class DetectionWorkflow:
         try:
             start_time = datetime.now(timezone.utc)
             
-            # Use checkpointing for resumability
-            async with AsyncSqliteSaver.from_path(f"{self.checkpoint_dir}/detection.db") as saver:
-                config = {"configurable": {"thread_id": f"detection_{uuid.uuid4().hex[:8]}"}}
-                
-                self.running = True
-                
-                # Run the workflow
-                final_state = await self.workflow.ainvoke(
-                    initial_state,
-                    config,
-                    {"checkpointer": saver}
+            # Checkpointed per thread so an interrupted run can be resumed
+            thread_id = thread_id or f"detection_{uuid.uuid4().hex[:8]}"
+            config = {"configurable": {"thread_id": thread_id}}
+            self.last_thread_id = thread_id
+            
+            self.running = True
+            
+            # Run the workflow
+            final_state = await self.workflow.ainvoke(initial_state, config)
+            
+            # Advance the cursor only after the batch went through the whole graph
+            if final_state.get('raw_logs') and final_state.get('high_water_mark') is not None:
+                self.nodes.log_fetcher.acknowledge(
+                    [log['id'] for log in final_state['raw_logs']], final_state['high_water_mark']
                 )
-                
-                # Calculate processing time
-                end_time = datetime.now(timezone.utc)
-                final_state['processing_time'] = (end_time - start_time).total_seconds()
-                
-                self.running = False
-                
-                return final_state
+            
+            # Calculate processing time
+            end_time = datetime.now(timezone.utc)
+            final_state['processing_time'] = (end_time - start_time).total_seconds()
+            
+            self.running = False
+            
+            return final_state
                 
         except Exception as e:
             logger.error(f"Workflow execution error: {e}")
@@ -804,21 +907,69 @@ class DetectionWorkflow:
             initial_state['errors'].append(str(e))
             return initial_state
     
-    async def run_continuous(self, **kwargs):
-        """Run detection continuously in background"""
-        kwargs['continuous_mode'] = True
+    async def resume(self, thread_id: str) -> Dict:
+        """Continue an interrupted detection run from its last checkpoint"""
+        try:
+            return await resume_thread(self.workflow, thread_id)
+        except Exception as e:
+            logger.error(f"Workflow resume error: {e}")
+            return {'errors': [str(e)]}
+    
+    async def run_continuous(self, batch_window: float = 0.25, fallback_poll_seconds: float = 300,
+                             **kwargs):
+        """
+        Run detection continuously in background
         
-        while self.running:
-            try:
-                await self.run(**kwargs)
-                await asyncio.sleep(30)  # Wait 30 seconds between iterations
-            except Exception as e:
-                logger.error(f"Continuous detection error: {e}")
-                await asyncio.sleep(60)  # Wait longer on error
+        Driven by ingestion notifications rather than a fixed interval: a pass
+        starts once logs arrive, after gathering them for up to `batch_window`
+        seconds, and drains everything past the cursor. While idle nothing
+        touches the database except a fallback check every
+        `fallback_poll_seconds` for logs written by other processes.
+        """
+        # Each pass is one traversal starting from fresh state on a single thread,
+        # so memory and checkpoint storage stay flat however long this runs
+        kwargs['continuous_mode'] = False
+        kwargs.setdefault('thread_id', self.CONTINUOUS_THREAD_ID)
+        batch_size = kwargs.get('batch_size', 100)
+        fetcher = self.nodes.log_fetcher
+        self.continuous = True
+        self._subscription = subscription = log_events.subscribe()
+        last_compaction = time.monotonic()
+        
+        try:
+            while self.continuous:
+                try:
+                    # Drain the backlog; stop if a pass could not advance the cursor
+                    while self.continuous and fetcher.has_new_logs():
+                        position = fetcher.get_position()
+                        await self.run(**kwargs)
+                        if fetcher.get_position() == position:
+                            logger.error("Detection pass did not advance the log cursor; backing off")
+                            await asyncio.sleep(60)
+                            break
+                    
+                    if time.monotonic() - last_compaction >= 3600:  # Shrink threads from one-off runs
+                        last_compaction = time.monotonic()
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, lambda: self.checkpointer.compact(idle_seconds=3600, delete_after_seconds=30 * 86400)
+                        )
+                    
+                    await subscription.wait_batch(
+                        max_items=batch_size, max_wait=batch_window, timeout=fallback_poll_seconds
+                    )
+                except Exception as e:
+                    logger.error(f"Continuous detection error: {e}")
+                    await asyncio.sleep(60)  # Wait longer on error
+        finally:
+            subscription.close()
+            self._subscription = None
     
     def stop(self):
         """Stop continuous detection"""
+        self.continuous = False
         self.running = False
+        if self._subscription is not None:
+            self._subscription.close()
         logger.info("Stopping continuous detection")
 
 
@@ -4,12 +4,16 @@ AI Compliance Dashboard - Fully Dynamic Version
 Generates comprehensive compliance reports across multiple security frameworks
 """
 
+import asyncio
 import logging
 import json
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-import sqlite3
 import os
+import zlib
+from shared.database import get_db_connection
+from shared.migrations import ensure_schema
+from shared.report_snapshot import ReportSnapshot, load_report_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -67,59 +71,36 @@ class AIComplianceDashboardDynamic:
         self._init_tables()
     
     def _init_tables(self):
-        """Initialize tables for historical compliance tracking"""
+        """Ensure historical compliance tracking tables exist (created by the schema migrations)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Compliance history table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS compliance_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    framework_id TEXT,
-                    score REAL,
-                    recorded_at TEXT,
-                    metadata TEXT
-                )
-            ''')
-            
-            # Framework controls table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS framework_controls (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    framework_id TEXT,
-                    control_id TEXT,
-                    control_name TEXT,
-                    implemented BOOLEAN DEFAULT 0,
-                    last_checked TEXT,
-                    UNIQUE(framework_id, control_id)
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            ensure_schema(self.db_path)
         except Exception as e:
             logger.error(f"Failed to initialize tables: {e}")
     
     async def generate_compliance_dashboard(self) -> Dict[str, Any]:
         """Generate comprehensive compliance dashboard - 100% dynamic"""
         try:
+            # One consistent read of everything the dashboard reports on
+            snapshot = await load_report_snapshot(self.db_path)
+            
             # Gather real-time compliance data
-            overall_score = await self._calculate_overall_compliance_dynamic()
-            framework_scores = await self._calculate_framework_scores_dynamic()
-            compliance_gaps = await self._identify_compliance_gaps()
-            audit_trail = await self._generate_audit_trail()
-            recent_improvements = await self._track_recent_improvements()
+            overall_score = await self._calculate_overall_compliance_dynamic(snapshot)
+            framework_scores, compliance_gaps, audit_trail, recent_improvements = await asyncio.gather(
+                self._calculate_framework_scores_dynamic(snapshot, overall_score),
+                self._identify_compliance_gaps(snapshot),
+                self._generate_audit_trail(snapshot),
+                self._track_recent_improvements(snapshot)
+            )
             risk_areas = await self._identify_risk_areas_dynamic(framework_scores)
             
-            # Get AI-powered insights
-            ai_insights = await self._get_ai_compliance_insights(
-                overall_score, framework_scores, compliance_gaps
+            # Get AI-powered insights while the current scores are stored for historical tracking
+            ai_insights, _ = await asyncio.gather(
+                self._get_ai_compliance_insights(overall_score, framework_scores, compliance_gaps),
+                asyncio.get_running_loop().run_in_executor(
+                    None, self._store_compliance_history, overall_score, framework_scores
+                )
             )
             
-            # Store current scores for historical tracking
-            await self._store_compliance_history(overall_score, framework_scores)
-            
             # Build data array format
             data_array = []
             
@@ -129,7 +110,7 @@ class AIComplianceDashboardDynamic:
                 "overallScore": overall_score,
                 "grade": self._score_to_grade(overall_score),
                 "status": self._get_compliance_status(overall_score),
-                "trend": await self._calculate_compliance_trend(),
+                "trend": self._calculate_compliance_trend(snapshot, overall_score),
                 "frameworks": [
                     {
                         "name": framework_data.get("id", framework_data.get("name", "Unknown")),
@@ -189,7 +170,7 @@ class AIComplianceDashboardDynamic:
             # 8. Compliance History
             data_array.append({
                 "type": "compliance_history",
-                "history": await self._get_compliance_history_dynamic()
+                "history": self._get_compliance_history_dynamic(snapshot, overall_score)
             })
             
             return {
@@ -212,42 +193,20 @@ class AIComplianceDashboardDynamic:
                 "generatedAt": datetime.utcnow().isoformat()
             }
     
-    async def _calculate_overall_compliance_dynamic(self) -> float:
+    async def _calculate_overall_compliance_dynamic(self, snapshot: ReportSnapshot) -> float:
         """Calculate overall compliance score - 100% from database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Factor 1: Endpoint Security (40% weight)
-            cursor.execute("SELECT COUNT(*) FROM agents WHERE status='active'")
-            total_agents = cursor.fetchone()[0] or 1
+            total_agents = snapshot.agent_count(status='active') or 1
             
             # Agents with security controls
-            cursor.execute("""
-                SELECT COUNT(*) FROM agents 
-                WHERE status='active' 
-                AND json_extract(quick_summary, '$.antivirus') != 'unknown'
-                AND json_extract(quick_summary, '$.firewall') != 'unknown'
-            """)
-            secure_agents = cursor.fetchone()[0]
+            secure_agents = snapshot.agent_count(status='active', controls_known=1)
             
             endpoint_security_score = (secure_agents / total_agents) * 100
             
             # Factor 2: Threat Detection & Response (30% weight)
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 
-                AND detected_at > datetime('now', '-30 days')
-            """)
-            total_threats = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 
-                AND verified=1
-                AND detected_at > datetime('now', '-30 days')
-            """)
-            resolved_threats = cursor.fetchone()[0]
+            total_threats = snapshot.threats('last_30d')
+            resolved_threats = snapshot.threats('last_30d', verified=1)
             
             if total_threats > 0:
                 threat_response_score = (resolved_threats / total_threats) * 100
@@ -255,34 +214,20 @@ class AIComplianceDashboardDynamic:
                 threat_response_score = 100  # No threats is good
             
             # Factor 3: Update & Patch Management (20% weight)
-            cursor.execute("""
-                SELECT COUNT(*) FROM agents 
-                WHERE status='active'
-                AND (
-                    json_extract(quick_summary, '$.updates') LIKE '%up to date%'
-                    OR json_extract(quick_summary, '$.updates') LIKE '%current%'
-                )
-            """)
-            patched_agents = cursor.fetchone()[0]
+            patched_agents = snapshot.agent_count(status='active', updates_current=1)
             
             patch_score = (patched_agents / total_agents) * 100
             
             # Factor 4: Incident Response Time (10% weight)
-            cursor.execute("""
-                SELECT AVG(
-                    CAST((julianday(datetime('now')) - julianday(detected_at)) * 24 AS REAL)
-                ) FROM detection_results 
-                WHERE threat_detected=1 
-                AND verified=1
-                AND detected_at > datetime('now', '-7 days')
-            """)
-            avg_response_hours = cursor.fetchone()[0] or 24
+            resolved_recent = snapshot.threats('last_7d', verified=1)
+            # Whole hours: the age grows with the clock, so finer values would change every generation
+            avg_response_hours = (
+                round(snapshot.threats('age_hours_sum_7d', verified=1) / resolved_recent) if resolved_recent else 24
+            )
             
             # Score: 100 for < 1 hour, decreasing to 0 at 48 hours
             response_score = max(0, 100 - (avg_response_hours / 48 * 100))
             
-            conn.close()
-            
             # Calculate weighted overall score
             overall_score = (
                 endpoint_security_score * 0.40 +
@@ -296,34 +241,26 @@ class AIComplianceDashboardDynamic:
         except Exception as e:
             logger.error(f"Failed to calculate overall compliance: {e}")
             # Return based on what data we have
-            try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM agents WHERE status='active'")
-                if cursor.fetchone()[0] > 0:
-                    return 50.0  # Some agents active
-                return 0.0  # No data
-            except:
-                return 0.0
+            if snapshot.agent_count(status='active') > 0:
+                return 50.0  # Some agents active
+            return 0.0  # No data
     
-    async def _calculate_framework_scores_dynamic(self) -> List[Dict[str, Any]]:
+    async def _calculate_framework_scores_dynamic(self, snapshot: ReportSnapshot,
+                                                  overall_compliance: float) -> List[Dict[str, Any]]:
         """Calculate compliance scores for each framework - fully dynamic"""
         framework_scores = []
         
-        # Get overall security posture
-        overall_compliance = await self._calculate_overall_compliance_dynamic()
-        
         for framework_id, framework_info in self.frameworks.items():
             # Apply framework-specific multiplier to overall score
             framework_score = overall_compliance * framework_info["weight_multiplier"]
             
             # Adjust based on framework-specific factors
             framework_score = await self._adjust_framework_score(
-                framework_id, framework_score
+                snapshot, framework_id, framework_score
             )
             
             # Get dynamic control counts
-            controls_data = await self._get_dynamic_control_counts(framework_id)
+            controls_data = await self._get_dynamic_control_counts(snapshot, framework_id)
             
             framework_scores.append({
                 "id": framework_id,
@@ -333,7 +270,7 @@ class AIComplianceDashboardDynamic:
                 "grade": self._score_to_grade(framework_score),
                 "status": self._get_compliance_status(framework_score),
                 "categories": await self._get_category_scores_dynamic(
-                    framework_id, framework_info["categories"], framework_score
+                    snapshot, framework_id, framework_info["categories"], framework_score
                 ),
                 "lastAudited": datetime.utcnow().isoformat(),
                 "controlsImplemented": controls_data["implemented"],
@@ -343,63 +280,32 @@ class AIComplianceDashboardDynamic:
         
         return framework_scores
     
-    async def _adjust_framework_score(self, framework_id: str, base_score: float) -> float:
+    async def _adjust_framework_score(self, snapshot: ReportSnapshot, framework_id: str, base_score: float) -> float:
         """Adjust framework score based on specific requirements"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Check for framework-specific gaps
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 
-                AND severity='critical'
-                AND verified=0
-                AND detected_at > datetime('now', '-30 days')
-            """)
-            critical_unresolved = cursor.fetchone()[0]
+            critical_unresolved = snapshot.threats('last_30d', severity='critical', verified=0)
             
             # Penalize based on unresolved critical issues
             penalty = min(30, critical_unresolved * 5)
             
-            conn.close()
-            
             return max(0, base_score - penalty)
             
         except Exception as e:
             logger.error(f"Failed to adjust framework score: {e}")
             return base_score
     
-    async def _get_dynamic_control_counts(self, framework_id: str) -> Dict[str, Any]:
+    async def _get_dynamic_control_counts(self, snapshot: ReportSnapshot, framework_id: str) -> Dict[str, Any]:
         """Get dynamic control counts based on actual implementation"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Check if we have control data
-            cursor.execute("""
-                SELECT COUNT(*), SUM(CASE WHEN implemented=1 THEN 1 ELSE 0 END)
-                FROM framework_controls 
-                WHERE framework_id=?
-            """, (framework_id,))
-            
-            result = cursor.fetchone()
-            total_controls = result[0] or 0
-            implemented_controls = result[1] or 0
+            total_controls, implemented_controls = snapshot.framework_controls.get(framework_id, (0, 0))
             
             # If no controls tracked yet, estimate from security posture
             if total_controls == 0:
                 # Estimate based on endpoint security
-                cursor.execute("SELECT COUNT(*) FROM agents WHERE status='active'")
-                total_agents = cursor.fetchone()[0] or 1
-                
-                cursor.execute("""
-                    SELECT COUNT(*) FROM agents 
-                    WHERE status='active'
-                    AND json_extract(quick_summary, '$.antivirus') != 'unknown'
-                    AND json_extract(quick_summary, '$.firewall') != 'unknown'
-                """)
-                secure_agents = cursor.fetchone()[0]
+                total_agents = snapshot.agent_count(status='active') or 1
+                secure_agents = snapshot.agent_count(status='active', controls_known=1)
                 
                 # Estimate controls based on security coverage
                 estimated_total = 50  # Typical framework size
@@ -408,8 +314,6 @@ class AIComplianceDashboardDynamic:
                 total_controls = estimated_total
                 implemented_controls = estimated_implemented
             
-            conn.close()
-            
             rate = (implemented_controls / total_controls * 100) if total_controls > 0 else 0
             
             return {
@@ -422,16 +326,13 @@ class AIComplianceDashboardDynamic:
             logger.error(f"Failed to get control counts: {e}")
             return {"total": 50, "implemented": 25, "rate": 50.0}
     
-    async def _get_category_scores_dynamic(self, framework_id: str, 
+    async def _get_category_scores_dynamic(self, snapshot: ReportSnapshot, framework_id: str, 
                                           categories: List[str], 
                                           framework_score: float) -> List[Dict[str, Any]]:
         """Get compliance scores for each category - dynamic"""
         category_scores = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             for category in categories:
                 # Base score from framework score with small variation
                 category_base = framework_score
@@ -439,43 +340,28 @@ class AIComplianceDashboardDynamic:
                 # Adjust based on category-specific factors
                 if "protect" in category.lower() or "security" in category.lower():
                     # Check endpoint protection
-                    cursor.execute("""
-                        SELECT COUNT(*) * 100.0 / (SELECT COUNT(*) FROM agents WHERE status='active')
-                        FROM agents 
-                        WHERE status='active'
-                        AND json_extract(quick_summary, '$.antivirus') != 'unknown'
-                    """)
-                    protection_rate = cursor.fetchone()[0] or 50
+                    active_agents = snapshot.agent_count(status='active')
+                    protected_agents = snapshot.agent_count(status='active', antivirus_known=1)
+                    protection_rate = (protected_agents * 100.0 / active_agents if active_agents else None) or 50
                     category_score = (category_base + protection_rate) / 2
                     
                 elif "detect" in category.lower() or "monitor" in category.lower():
                     # Check detection capability
-                    cursor.execute("""
-                        SELECT COUNT(DISTINCT threat_type) FROM detection_results 
-                        WHERE threat_detected=1
-                    """)
-                    detection_diversity = min(cursor.fetchone()[0] or 1, 10)
+                    detection_diversity = min(len(snapshot.threats_by_type()) or 1, 10)
                     detection_score = (detection_diversity / 10) * 100
                     category_score = (category_base + detection_score) / 2
                     
                 elif "respond" in category.lower() or "incident" in category.lower():
                     # Check response effectiveness
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM detection_results WHERE threat_detected=1 AND detected_at > datetime('now', '-30 days')
-                    """)
-                    total = cursor.fetchone()[0] or 1
-                    
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM detection_results WHERE threat_detected=1 AND verified=1 AND detected_at > datetime('now', '-30 days')
-                    """)
-                    resolved = cursor.fetchone()[0] or 0
+                    total = snapshot.threats('last_30d') or 1
+                    resolved = snapshot.threats('last_30d', verified=1)
                     
                     response_rate = (resolved / total) * 100
                     category_score = (category_base + response_rate) / 2
                     
                 else:
-                    # Use framework score with slight variation
-                    category_score = category_base + (hash(category) % 10 - 5)
+                    # Use framework score with slight variation (crc32 is stable across processes, hash() is not)
+                    category_score = category_base + (zlib.crc32(category.encode('utf-8')) % 10 - 5)
                 
                 # Get control counts for this category
                 controls_total = 10  # Estimate
@@ -489,8 +375,6 @@ class AIComplianceDashboardDynamic:
                     "controlsTotal": controls_total
                 })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to get category scores: {e}")
             # Fallback to framework-based scores
@@ -505,24 +389,13 @@ class AIComplianceDashboardDynamic:
         
         return category_scores
     
-    async def _identify_compliance_gaps(self) -> List[Dict[str, Any]]:
+    async def _identify_compliance_gaps(self, snapshot: ReportSnapshot) -> List[Dict[str, Any]]:
         """Identify compliance gaps - fully dynamic from database"""
         gaps = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Gap 1: Missing security controls
-            cursor.execute("""
-                SELECT COUNT(*) FROM agents 
-                WHERE status='active'
-                AND (
-                    json_extract(quick_summary, '$.antivirus') = 'unknown'
-                    OR json_extract(quick_summary, '$.firewall') = 'unknown'
-                )
-            """)
-            missing_security_controls = cursor.fetchone()[0]
+            missing_security_controls = snapshot.agent_count(status='active', controls_unknown=1)
             
             if missing_security_controls > 0:
                 gaps.append({
@@ -539,15 +412,7 @@ class AIComplianceDashboardDynamic:
                 })
             
             # Gap 2: Unpatched systems
-            cursor.execute("""
-                SELECT COUNT(*) FROM agents 
-                WHERE status='active'
-                AND (
-                    json_extract(quick_summary, '$.updates') LIKE '%pending%'
-                    OR json_extract(quick_summary, '$.updates') = 'unknown'
-                )
-            """)
-            unpatched_systems = cursor.fetchone()[0]
+            unpatched_systems = snapshot.agent_count(status='active', updates_pending=1)
             
             if unpatched_systems > 0:
                 gaps.append({
@@ -564,14 +429,7 @@ class AIComplianceDashboardDynamic:
                 })
             
             # Gap 3: Unresolved threats
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 
-                AND severity IN ('high', 'critical')
-                AND verified=0
-                AND detected_at > datetime('now', '-7 days')
-            """)
-            unresolved_threats = cursor.fetchone()[0]
+            unresolved_threats = snapshot.threats('last_7d', severity=('high', 'critical'), verified=0)
             
             if unresolved_threats > 0:
                 gaps.append({
@@ -587,67 +445,44 @@ class AIComplianceDashboardDynamic:
                     "priority": 1
                 })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to identify compliance gaps: {e}")
         
         return gaps
     
-    async def _generate_audit_trail(self) -> List[Dict[str, Any]]:
+    async def _generate_audit_trail(self, snapshot: ReportSnapshot) -> List[Dict[str, Any]]:
         """Generate audit trail - fully from database"""
         audit_entries = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get recent security events
-            cursor.execute("""
-                SELECT detected_at, threat_type, severity, verified
-                FROM detection_results 
-                WHERE threat_detected=1
-                ORDER BY detected_at DESC
-                LIMIT 20
-            """)
-            
-            for row in cursor.fetchall():
+            # Recent security events
+            for row in snapshot.recent_threats:
                 audit_entries.append({
-                    "timestamp": row[0],
+                    "timestamp": row['detected_at'],
                     "eventType": "threat_detection",
                     "category": "Security Monitoring",
-                    "description": f"{row[1]} threat detected",
-                    "severity": row[2],
-                    "status": "verified" if row[3] else "under_investigation",
+                    "description": f"{row['threat_type']} threat detected",
+                    "severity": row['severity'],
+                    "status": "verified" if row['verified'] else "under_investigation",
                     "frameworks": ["NIST_CSF", "ISO_27001"]
                 })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to generate audit trail: {e}")
         
         return audit_entries[:10]
     
-    async def _track_recent_improvements(self) -> List[Dict[str, Any]]:
+    async def _track_recent_improvements(self, snapshot: ReportSnapshot) -> List[Dict[str, Any]]:
         """Track recent improvements - fully dynamic"""
         improvements = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Check for newly active agents
-            cursor.execute("""
-                SELECT COUNT(*) FROM agents 
-                WHERE last_heartbeat > datetime('now', '-7 days')
-                AND status='active'
-            """)
-            recent_agents = cursor.fetchone()[0]
+            recent_agents = snapshot.agent_count(status='active', heartbeat_recent=1)
             
             if recent_agents > 0:
                 improvements.append({
-                    "date": (datetime.utcnow() - timedelta(days=5)).isoformat(),
+                    "date": (datetime.utcnow().date() - timedelta(days=5)).isoformat(),
                     "category": "Asset Management",
                     "improvement": f"{recent_agents} endpoints actively monitored",
                     "impact": "Increased visibility and security coverage",
@@ -656,16 +491,11 @@ class AIComplianceDashboardDynamic:
                 })
             
             # Check for resolved threats
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 AND verified=1
-                AND detected_at > datetime('now', '-7 days')
-            """)
-            resolved_threats = cursor.fetchone()[0]
+            resolved_threats = snapshot.threats('last_7d', verified=1)
             
             if resolved_threats > 0:
                 improvements.append({
-                    "date": (datetime.utcnow() - timedelta(days=3)).isoformat(),
+                    "date": (datetime.utcnow().date() - timedelta(days=3)).isoformat(),
                     "category": "Incident Response",
                     "improvement": f"{resolved_threats} security incidents resolved",
                     "impact": "Improved threat response effectiveness",
@@ -673,8 +503,6 @@ class AIComplianceDashboardDynamic:
                     "scoreImpact": f"+{resolved_threats * 1.5}"
                 })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to track improvements: {e}")
         
@@ -728,14 +556,17 @@ As a cybersecurity compliance expert, provide:
 
 Be specific, actionable, and professional."""
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a cybersecurity compliance expert."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
+            # The client is synchronous; keep it off the event loop
+            response = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: openai.ChatCompletion.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "You are a cybersecurity compliance expert."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=500
+                )
             )
             
             ai_response = response.choices[0].message.content
@@ -811,78 +642,54 @@ Be specific, actionable, and professional."""
         
         return recommendations
     
-    async def _calculate_compliance_trend(self) -> str:
-        """Calculate trend - from history"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT score FROM compliance_history 
-                WHERE framework_id='OVERALL'
-                ORDER BY recorded_at DESC 
-                LIMIT 2
-            """)
-            scores = cursor.fetchall()
-            
-            if len(scores) >= 2:
-                current = scores[0][0]
-                previous = scores[1][0]
-                if current > previous + 5:
-                    return "improving"
-                elif current < previous - 5:
-                    return "declining"
-            
-            conn.close()
-            return "stable"
-            
-        except:
-            return "stable"
+    @staticmethod
+    def _history_before_today(snapshot: ReportSnapshot) -> List[tuple]:
+        """Stored overall scores from earlier days (today's point is the current score)"""
+        today = datetime.utcnow().date().isoformat()
+        return [(score, recorded_at) for score, recorded_at in snapshot.compliance_history
+                if not str(recorded_at).startswith(today)]
     
-    async def _get_compliance_history_dynamic(self) -> List[Dict[str, Any]]:
-        """Get historical scores - from database"""
-        history = []
-        
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT score, recorded_at FROM compliance_history 
-                WHERE framework_id='OVERALL'
-                ORDER BY recorded_at DESC 
-                LIMIT 10
-            """)
-            
-            for row in cursor.fetchall():
-                history.append({
-                    "date": row[1],
-                    "score": round(row[0], 2),
-                    "grade": self._score_to_grade(row[0])
-                })
-            
-            conn.close()
-            
-        except Exception as e:
-            logger.error(f"Failed to get history: {e}")
+    def _calculate_compliance_trend(self, snapshot: ReportSnapshot, current: float) -> str:
+        """Calculate trend - current score against the last stored one from an earlier day"""
+        history = self._history_before_today(snapshot)
+        if history:
+            previous = history[0][0]
+            if current > previous + 5:
+                return "improving"
+            elif current < previous - 5:
+                return "declining"
+        return "stable"
+    
+    def _get_compliance_history_dynamic(self, snapshot: ReportSnapshot, current_score: float) -> List[Dict[str, Any]]:
+        """Get historical scores - today's (current) score followed by the stored daily ones"""
+        history = [{
+            "date": datetime.utcnow().date().isoformat(),
+            "score": current_score,
+            "grade": self._score_to_grade(current_score)
+        }]
         
-        # If no history, create initial entry
-        if not history:
-            current_score = await self._calculate_overall_compliance_dynamic()
+        for score, recorded_at in self._history_before_today(snapshot)[:9]:
             history.append({
-                "date": datetime.utcnow().isoformat(),
-                "score": current_score,
-                "grade": self._score_to_grade(current_score)
+                "date": str(recorded_at)[:10],
+                "score": round(score, 2),
+                "grade": self._score_to_grade(score)
             })
         
         return history
     
-    async def _store_compliance_history(self, overall_score: float, framework_scores: List[Dict]):
-        """Store current scores for future historical analysis"""
+    def _store_compliance_history(self, overall_score: float, framework_scores: List[Dict]):
+        """Store current scores for future historical analysis (one point per framework per day)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
+            # Replace today's points so repeated generations do not grow the history
+            framework_ids = ['OVERALL'] + [framework['id'] for framework in framework_scores]
+            cursor.execute(f"""
+                DELETE FROM compliance_history
+                WHERE framework_id IN ({','.join('?' * len(framework_ids))}) AND substr(recorded_at, 1, 10) = ?
+            """, (*framework_ids, datetime.utcnow().date().isoformat()))
+            
             # Store overall score
             cursor.execute("""
                 INSERT INTO compliance_history (framework_id, score, recorded_at, metadata)
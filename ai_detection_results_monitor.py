@@ -4,12 +4,13 @@ AI Detection Results Monitor for CodeGrey SOC Platform
 Real-time detection statistics and accuracy tracking
 """
 
-import sqlite3
 import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
+from shared.database import get_db_connection
+from shared.migrations import ensure_schema
 
 logger = logging.getLogger(__name__)
 
@@ -37,60 +38,9 @@ class AIDetectionMonitor:
         self._ensure_ground_truth_tables()
     
     def _ensure_ground_truth_tables(self):
-        """Create tables for ground truth tracking (best approach)"""
+        """Ensure ground truth tracking tables exist (created by the schema migrations)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Red Team Attacks Table (Ground Truth)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS red_team_attacks (
-                    id TEXT PRIMARY KEY,
-                    scenario_id TEXT,
-                    attack_type TEXT,
-                    target_agent_id TEXT,
-                    attack_timestamp TEXT,
-                    expected_detection BOOLEAN DEFAULT 1,
-                    was_detected BOOLEAN DEFAULT 0,
-                    detection_id TEXT,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Analyst Review Table (High Confidence)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS analyst_reviews (
-                    id TEXT PRIMARY KEY,
-                    log_entry_id TEXT,
-                    detection_result_id TEXT,
-                    analyst_verdict TEXT,
-                    confidence INTEGER,
-                    threat_type TEXT,
-                    notes TEXT,
-                    reviewed_by TEXT,
-                    reviewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Known Attack Indicators Table (Threat Intel)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS attack_indicators (
-                    id TEXT PRIMARY KEY,
-                    indicator_type TEXT,
-                    indicator_value TEXT,
-                    threat_type TEXT,
-                    severity TEXT,
-                    source TEXT,
-                    first_seen TEXT,
-                    last_seen TEXT,
-                    active BOOLEAN DEFAULT 1
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
-            
+            ensure_schema(self.db_path)
         except Exception as e:
             logger.error(f"Failed to create ground truth tables: {e}")
     
@@ -101,7 +51,7 @@ class AIDetectionMonitor:
         start_time = end_time - timedelta(hours=time_range_hours)
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get total detections processed
@@ -286,7 +236,7 @@ class AIDetectionMonitor:
         start_time = end_time - timedelta(hours=time_range_hours)
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -324,7 +274,7 @@ class AIDetectionMonitor:
         start_time = end_time - timedelta(hours=time_range_hours)
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -362,7 +312,7 @@ class AIDetectionMonitor:
         start_time = end_time - timedelta(hours=time_range_hours)
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -390,7 +340,7 @@ class AIDetectionMonitor:
         """Get most recent detections"""
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -525,45 +475,67 @@ class AIDetectionMonitor:
         else:
             return 'unknown'
     
-    async def record_red_team_attack(self, attack_data: Dict) -> str:
-        """Record a red team attack for ground truth tracking"""
-        try:
-            import uuid
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            attack_id = str(uuid.uuid4())
-            
-            cursor.execute('''
-                INSERT INTO red_team_attacks (
-                    id, scenario_id, attack_type, target_agent_id,
-                    attack_timestamp, expected_detection, notes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
+    def insert_red_team_attacks(self, cursor, attacks: List[Dict]) -> List[str]:
+        """
+        Insert red team attack rows using the caller's cursor
+        
+        The caller owns the transaction, so ground truth can be committed
+        together with the commands that carry out the attacks.
+        """
+        import uuid
+        
+        attack_ids = [str(uuid.uuid4()) for _ in attacks]
+        now = datetime.now().isoformat()
+        
+        cursor.executemany('''
+            INSERT INTO red_team_attacks (
+                id, scenario_id, attack_type, target_agent_id,
+                attack_timestamp, expected_detection, notes
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (
                 attack_id,
                 attack_data.get('scenario_id'),
                 attack_data.get('attack_type'),
                 attack_data.get('target_agent_id'),
-                attack_data.get('timestamp', datetime.now().isoformat()),
+                attack_data.get('timestamp', now),
                 attack_data.get('expected_detection', True),
                 attack_data.get('notes', '')
-            ))
-            
-            conn.commit()
-            conn.close()
+            )
+            for attack_id, attack_data in zip(attack_ids, attacks)
+        ])
+        
+        return attack_ids
+    
+    async def record_red_team_attack(self, attack_data: Dict) -> str:
+        """Record a red team attack for ground truth tracking"""
+        attack_ids = await self.record_red_team_attacks([attack_data])
+        
+        if attack_ids:
+            logger.info(f"Recorded red team attack: {attack_ids[0]}")
+            return attack_ids[0]
+        return None
+    
+    async def record_red_team_attacks(self, attacks: List[Dict]) -> List[str]:
+        """Record a batch of red team attacks in one transaction"""
+        try:
+            conn = get_db_connection(self.db_path)
+            try:
+                with conn:
+                    attack_ids = self.insert_red_team_attacks(conn.cursor(), attacks)
+            finally:
+                conn.close()
             
-            logger.info(f"Recorded red team attack: {attack_id}")
-            return attack_id
+            return attack_ids
             
         except Exception as e:
-            logger.error(f"Failed to record red team attack: {e}")
-            return None
+            logger.error(f"Failed to record red team attacks: {e}")
+            return []
     
     async def mark_attack_detected(self, attack_id: str, detection_id: str):
         """Mark a red team attack as detected"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -585,7 +557,7 @@ class AIDetectionMonitor:
         try:
             import uuid
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             review_id = str(uuid.uuid4())
@@ -622,7 +594,7 @@ class AIDetectionMonitor:
         try:
             import uuid
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             indicator_id = str(uuid.uuid4())
@@ -3,12 +3,13 @@ AI Risk Assessment
 Generates comprehensive risk assessments based on simulation results and threat data
 """
 
+import asyncio
 import logging
 import json
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-import sqlite3
 import os
+from shared.report_snapshot import ReportSnapshot, load_report_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -29,17 +30,25 @@ class AIRiskAssessment:
     async def generate_risk_assessment(self) -> Dict[str, Any]:
         """Generate comprehensive risk assessment"""
         try:
-            # Gather risk data
-            overall_risk = await self._calculate_overall_risk()
-            risk_matrix = await self._build_risk_matrix()
-            top_risks = await self._identify_top_risks()
-            risk_trends = await self._analyze_risk_trends()
-            mitigation_status = await self._assess_mitigation_status()
-            simulation_risks = await self._analyze_simulation_results()
-            
-            # Get AI-powered insights
-            ai_insights = await self._get_ai_risk_insights(
-                overall_risk, top_risks, simulation_risks
+            # One consistent read of everything the sections need
+            snapshot = await load_report_snapshot(self.db_path)
+            
+            # Gather risk data (independent sections run concurrently)
+            (overall_risk, risk_matrix, top_risks, risk_trends,
+             mitigation_status, simulation_risks) = await asyncio.gather(
+                self._calculate_overall_risk(snapshot),
+                self._build_risk_matrix(snapshot),
+                self._identify_top_risks(snapshot),
+                self._analyze_risk_trends(snapshot),
+                self._assess_mitigation_status(snapshot),
+                self._analyze_simulation_results(snapshot)
+            )
+            
+            # Get AI-powered insights while the remaining sections are built
+            ai_insights, recommendations, risk_history = await asyncio.gather(
+                self._get_ai_risk_insights(overall_risk, top_risks, simulation_risks),
+                self._generate_risk_recommendations(top_risks),
+                self._get_risk_history(overall_risk)
             )
             
             # Build data array format
@@ -50,7 +59,7 @@ class AIRiskAssessment:
                 "type": "overall_risk",
                 "score": overall_risk,
                 "level": self._score_to_risk_level(overall_risk),
-                "trend": await self._calculate_risk_trend(),
+                "trend": risk_trends.get("trend", "stable"),
                 "description": self._get_risk_description(overall_risk)
             })
             
@@ -93,13 +102,13 @@ class AIRiskAssessment:
             # 8. Recommendations
             data_array.append({
                 "type": "recommendations",
-                "recommendations": await self._generate_risk_recommendations(top_risks)
+                "recommendations": recommendations
             })
             
             # 9. Risk History
             data_array.append({
                 "type": "risk_history",
-                "history": await self._get_risk_history()
+                "history": risk_history
             })
             
             return {
@@ -107,6 +116,7 @@ class AIRiskAssessment:
                 "data": data_array,
                 "metadata": {
                     "generatedAt": datetime.utcnow().isoformat(),
+                    "snapshotSeconds": snapshot.load_seconds,
                     "nextAssessmentDate": (datetime.utcnow() + timedelta(days=30)).isoformat()
                 }
             }
@@ -119,53 +129,25 @@ class AIRiskAssessment:
                 "generatedAt": datetime.utcnow().isoformat()
             }
     
-    async def _calculate_overall_risk(self) -> float:
+    async def _calculate_overall_risk(self, snapshot: ReportSnapshot) -> float:
         """Calculate overall risk score (0-100, higher is more risky)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Factor 1: Critical/High severity threats (40% weight)
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 
-                AND severity IN ('critical', 'high')
-                AND detected_at > datetime('now', '-30 days')
-            """)
-            critical_threats = cursor.fetchone()[0]
+            critical_threats = snapshot.threats('last_30d', severity=('critical', 'high'))
             threat_score = min(100, critical_threats * 10)  # Each critical threat adds 10 points
             
             # Factor 2: Unpatched/vulnerable systems (30% weight)
-            cursor.execute("""
-                SELECT COUNT(*) FROM agents 
-                WHERE json_extract(quick_summary, '$.antivirus') = 'unknown'
-                OR json_extract(quick_summary, '$.firewall') = 'unknown'
-            """)
-            vulnerable_systems = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM agents WHERE status='active'")
-            total_systems = cursor.fetchone()[0] or 1
+            vulnerable_systems = snapshot.agent_count(controls_unknown=1)
+            total_systems = snapshot.agent_count(status='active') or 1
             
             vulnerability_score = (vulnerable_systems / total_systems) * 100
             
             # Factor 3: Attack simulation success rate (30% weight)
-            cursor.execute("""
-                SELECT COUNT(*) FROM command_queue 
-                WHERE status='completed' 
-                AND created_at > datetime('now', '-30 days')
-            """)
-            successful_attacks = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM command_queue 
-                WHERE created_at > datetime('now', '-30 days')
-            """)
-            total_attacks = cursor.fetchone()[0] or 1
+            successful_attacks = snapshot.commands('completed_30d')
+            total_attacks = snapshot.commands('last_30d') or 1
             
             attack_success_rate = (successful_attacks / total_attacks) * 100
             
-            conn.close()
-            
             # Calculate weighted risk score
             overall_risk = (
                 threat_score * 0.4 +
@@ -179,7 +161,7 @@ class AIRiskAssessment:
             logger.error(f"Failed to calculate overall risk: {e}")
             return 50.0  # Default moderate risk
     
-    async def _build_risk_matrix(self) -> Dict[str, Any]:
+    async def _build_risk_matrix(self, snapshot: ReportSnapshot) -> Dict[str, Any]:
         """Build risk matrix (likelihood vs impact)"""
         matrix = {
             "critical": [],  # High likelihood, High impact
@@ -189,22 +171,12 @@ class AIRiskAssessment:
         }
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Get threat distribution
-            cursor.execute("""
-                SELECT threat_type, COUNT(*) as count, AVG(confidence_score) as avg_confidence
-                FROM detection_results 
-                WHERE threat_detected=1
-                AND detected_at > datetime('now', '-30 days')
-                GROUP BY threat_type
-            """)
-            
-            for row in cursor.fetchall():
-                threat_type = row[0]
-                frequency = row[1]
-                confidence = row[2]
+            frequencies = snapshot.threats_by_type('last_30d')
+            confidence_sums = snapshot.threats_by_type('confidence_sum_30d')
+            
+            for threat_type, frequency in frequencies.items():
+                confidence = confidence_sums.get(threat_type, 0) / frequency
                 
                 # Determine likelihood (based on frequency)
                 if frequency >= 10:
@@ -239,35 +211,19 @@ class AIRiskAssessment:
                     "confidence": round(confidence, 2)
                 })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to build risk matrix: {e}")
         
         return matrix
     
-    async def _identify_top_risks(self) -> List[Dict[str, Any]]:
+    async def _identify_top_risks(self, snapshot: ReportSnapshot) -> List[Dict[str, Any]]:
         """Identify top risks requiring attention"""
         risks = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Risk 1: Unresolved critical threats
-            cursor.execute("""
-                SELECT COUNT(*), threat_type
-                FROM detection_results 
-                WHERE threat_detected=1 
-                AND severity='critical'
-                AND verified=0
-                AND detected_at > datetime('now', '-7 days')
-                GROUP BY threat_type
-                ORDER BY COUNT(*) DESC
-                LIMIT 1
-            """)
-            
-            result = cursor.fetchone()
+            unresolved = snapshot.threats_by_type('last_7d', severity='critical', verified=0)
+            result = max(((count, threat_type) for threat_type, count in unresolved.items()), default=None)
             if result and result[0] > 0:
                 risks.append({
                     "id": "risk_001",
@@ -291,12 +247,7 @@ class AIRiskAssessment:
                 })
             
             # Risk 2: Vulnerable endpoints
-            cursor.execute("""
-                SELECT COUNT(*) FROM agents 
-                WHERE json_extract(quick_summary, '$.antivirus') = 'unknown'
-                OR json_extract(quick_summary, '$.firewall') = 'unknown'
-            """)
-            vulnerable_endpoints = cursor.fetchone()[0]
+            vulnerable_endpoints = snapshot.agent_count(controls_unknown=1)
             
             if vulnerable_endpoints > 0:
                 risks.append({
@@ -321,13 +272,7 @@ class AIRiskAssessment:
                 })
             
             # Risk 3: Successful attack simulations
-            cursor.execute("""
-                SELECT COUNT(*) FROM command_queue 
-                WHERE status='completed'
-                AND result LIKE '%success%'
-                AND created_at > datetime('now', '-7 days')
-            """)
-            successful_simulations = cursor.fetchone()[0]
+            successful_simulations = snapshot.commands('succeeded_7d')
             
             if successful_simulations > 5:
                 risks.append({
@@ -352,12 +297,7 @@ class AIRiskAssessment:
                 })
             
             # Risk 4: Compliance gaps
-            cursor.execute("""
-                SELECT COUNT(DISTINCT threat_type) FROM detection_results 
-                WHERE threat_detected=1
-                AND detected_at > datetime('now', '-30 days')
-            """)
-            threat_diversity = cursor.fetchone()[0]
+            threat_diversity = len(snapshot.threats_by_type('last_30d'))
             
             if threat_diversity > 5:
                 risks.append({
@@ -381,8 +321,6 @@ class AIRiskAssessment:
                     "owner": "Compliance Team"
                 })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to identify top risks: {e}")
         
@@ -391,28 +329,12 @@ class AIRiskAssessment:
         
         return risks[:5]  # Return top 5 risks
     
-    async def _analyze_risk_trends(self) -> Dict[str, Any]:
+    async def _analyze_risk_trends(self, snapshot: ReportSnapshot) -> Dict[str, Any]:
         """Analyze how risks are trending over time"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Get threat counts for different time periods
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 
-                AND detected_at > datetime('now', '-7 days')
-            """)
-            recent_threats = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 
-                AND detected_at BETWEEN datetime('now', '-14 days') AND datetime('now', '-7 days')
-            """)
-            previous_threats = cursor.fetchone()[0]
-            
-            conn.close()
+            recent_threats = snapshot.threats('last_7d')
+            previous_threats = snapshot.threats('previous_7d')
             
             # Calculate trend
             if previous_threats == 0:
@@ -448,29 +370,15 @@ class AIRiskAssessment:
                 "description": "Unable to determine trend"
             }
     
-    async def _assess_mitigation_status(self) -> Dict[str, Any]:
+    async def _assess_mitigation_status(self, snapshot: ReportSnapshot) -> Dict[str, Any]:
         """Assess current risk mitigation status"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Check verified/resolved threats
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1 AND verified=1
-            """)
-            mitigated = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM detection_results 
-                WHERE threat_detected=1
-            """)
-            total = cursor.fetchone()[0] or 1
+            mitigated = snapshot.threats(verified=1)
+            total = snapshot.threats() or 1
             
             mitigation_rate = (mitigated / total) * 100
             
-            conn.close()
-            
             return {
                 "mitigationRate": round(mitigation_rate, 1),
                 "totalRisksIdentified": total,
@@ -486,30 +394,21 @@ class AIRiskAssessment:
                 "status": "unknown"
             }
     
-    async def _analyze_simulation_results(self) -> List[Dict[str, Any]]:
+    async def _analyze_simulation_results(self, snapshot: ReportSnapshot) -> List[Dict[str, Any]]:
         """Analyze risks based on attack simulation results"""
         simulation_risks = []
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Get simulation results
-            cursor.execute("""
-                SELECT technique, COUNT(*) as attempts,
-                       SUM(CASE WHEN status='completed' THEN 1 ELSE 0 END) as successful
-                FROM command_queue
-                WHERE created_at > datetime('now', '-30 days')
-                GROUP BY technique
-                HAVING successful > 0
-                ORDER BY successful DESC
-                LIMIT 5
-            """)
-            
-            for row in cursor.fetchall():
-                technique = row[0]
-                attempts = row[1]
-                successful = row[2]
+            rows = sorted(
+                (group for group in snapshot.command_groups if (group['completed_30d'] or 0) > 0),
+                key=lambda group: group['completed_30d'], reverse=True
+            )
+            
+            for row in rows[:5]:
+                technique = row['technique']
+                attempts = row['last_30d']
+                successful = row['completed_30d']
                 success_rate = (successful / attempts) * 100
                 
                 simulation_risks.append({
@@ -523,8 +422,6 @@ class AIRiskAssessment:
                     "recommendation": f"Review and strengthen defenses against {technique} attacks"
                 })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to analyze simulation results: {e}")
         
@@ -565,7 +462,8 @@ As a cybersecurity risk management expert, provide:
 
 Be specific, actionable, and focus on business impact."""
             
-            response = openai.ChatCompletion.create(
+            # Blocking client call; run it off the event loop so it overlaps the other sections
+            response = await asyncio.get_running_loop().run_in_executor(None, lambda: openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a cybersecurity risk management expert providing executive-level insights."},
@@ -573,7 +471,7 @@ Be specific, actionable, and focus on business impact."""
                 ],
                 temperature=0.7,
                 max_tokens=500
-            )
+            ))
             
             ai_response = response.choices[0].message.content
             
@@ -655,20 +553,13 @@ Be specific, actionable, and focus on business impact."""
         
         return recommendations
     
-    async def _calculate_risk_trend(self) -> str:
-        """Calculate overall risk trend"""
-        trends = await self._analyze_risk_trends()
-        return trends.get("trend", "stable")
-    
-    async def _get_risk_history(self) -> List[Dict[str, Any]]:
+    async def _get_risk_history(self, current_risk: float) -> List[Dict[str, Any]]:
         """Get historical risk scores"""
         history = []
         
-        # Generate historical data points
-        current_risk = await self._calculate_overall_risk()
-        
+        # Generate historical data points (day resolution keeps the report content stable)
         for days_ago in [30, 60, 90]:
-            date = datetime.utcnow() - timedelta(days=days_ago)
+            date = datetime.utcnow().date() - timedelta(days=days_ago)
             # Simulate historical scores (in reality, you'd store these)
             historical_risk = current_risk + (days_ago / 30 * 5)  # Risk decreasing over time
             
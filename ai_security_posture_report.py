@@ -4,7 +4,6 @@ AI Security Posture Report Generator for CodeGrey SOC Platform
 Comprehensive security posture analysis with AI-powered recommendations
 """
 
-import sqlite3
 import json
 import logging
 import os
@@ -13,6 +12,7 @@ from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, field
 from collections import defaultdict, Counter
 import asyncio
+from shared.report_snapshot import ReportSnapshot, load_report_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -92,30 +92,37 @@ class AISecurityPostureReporter:
         
         logger.info(f"Generating AI Security Posture Report for {start_time} to {end_time}")
         
-        # Gather all security data
-        endpoints_data = await self._get_endpoints_security_data()
-        threats_data = await self._get_threats_data(start_time, end_time)
-        vulnerabilities_data = await self._analyze_vulnerabilities(endpoints_data)
-        attack_surface_data = await self._analyze_attack_surface(endpoints_data)
-        compliance_data = await self._assess_compliance(endpoints_data)
+        # One consistent read of agents and threats for every section
+        snapshot = await load_report_snapshot(self.db_path, start_time, end_time)
+        
+        # Gather all security data (independent sections run concurrently)
+        endpoints_data, threats_data, posture_trend = await asyncio.gather(
+            self._get_endpoints_security_data(snapshot),
+            self._get_threats_data(snapshot, start_time, end_time),
+            self._calculate_posture_trend(snapshot)
+        )
+        vulnerabilities_data, attack_surface_data, compliance_data = await asyncio.gather(
+            self._analyze_vulnerabilities(snapshot),
+            self._analyze_attack_surface(snapshot),
+            self._assess_compliance(endpoints_data)
+        )
         
         # Calculate security scores
         overall_risk_score = self._calculate_overall_risk_score(
             endpoints_data, threats_data, vulnerabilities_data, attack_surface_data
         )
         security_grade = self._calculate_security_grade(overall_risk_score)
-        posture_trend = await self._calculate_posture_trend(start_time, end_time)
         
-        # Get AI insights if available
-        ai_insights = []
-        risk_predictions = {}
-        if self.use_ai:
-            ai_analysis = await self._get_ai_insights(
+        # Get AI insights if available, alongside the remaining sections
+        ai_analysis, anomaly_detections = await asyncio.gather(
+            self._get_ai_insights(
                 endpoints_data, threats_data, vulnerabilities_data, 
                 attack_surface_data, compliance_data
-            )
-            ai_insights = ai_analysis.get('insights', [])
-            risk_predictions = ai_analysis.get('predictions', {})
+            ),
+            self._detect_anomalies(endpoints_data, threats_data)
+        )
+        ai_insights = ai_analysis.get('insights', [])
+        risk_predictions = ai_analysis.get('predictions', {})
         
         # Generate recommendations
         recommendations = self._generate_prioritized_recommendations(
@@ -156,7 +163,7 @@ class AISecurityPostureReporter:
             security_best_practices=compliance_data['best_practices'],
             ai_insights=ai_insights,
             risk_predictions=risk_predictions,
-            anomaly_detections=await self._detect_anomalies(endpoints_data, threats_data),
+            anomaly_detections=anomaly_detections,
             critical_actions=recommendations['critical'],
             high_priority_actions=recommendations['high'],
             medium_priority_actions=recommendations['medium'],
@@ -165,20 +172,10 @@ class AISecurityPostureReporter:
         
         return report
     
-    async def _get_endpoints_security_data(self) -> Dict[str, Any]:
+    async def _get_endpoints_security_data(self, snapshot: ReportSnapshot) -> Dict[str, Any]:
         """Get comprehensive endpoint security data"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, hostname, ip_address, platform, os_version, status,
-                       quick_summary, system_info, last_heartbeat
-                FROM agents
-            ''')
-            
-            endpoints = cursor.fetchall()
-            conn.close()
+            endpoints = snapshot.agents
             
             total = len(endpoints)
             at_risk = 0
@@ -198,10 +195,9 @@ class AISecurityPostureReporter:
             }
             
             for endpoint in endpoints:
-                platform = endpoint[3] or 'unknown'
-                status = endpoint[5] or 'offline'
-                quick_summary = json.loads(endpoint[6]) if endpoint[6] else {}
-                system_info = json.loads(endpoint[7]) if endpoint[7] else {}
+                platform = endpoint['platform'] or 'unknown'
+                status = endpoint['status'] or 'offline'
+                system_info = endpoint['system_info']
                 
                 # Platform breakdown
                 if 'windows' in platform.lower():
@@ -269,36 +265,20 @@ class AISecurityPostureReporter:
                 'patch_compliance': 0
             }
     
-    async def _get_threats_data(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+    async def _get_threats_data(self, snapshot: ReportSnapshot, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
         """Get threat landscape data"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Active threats
-            cursor.execute('''
-                SELECT COUNT(*) FROM detection_results
-                WHERE threat_detected = 1 AND detected_at >= ? AND detected_at <= ?
-            ''', (start_time.isoformat(), end_time.isoformat()))
-            active_threats = cursor.fetchone()[0]
+            active_threats = snapshot.threats('in_window')
             
             # Resolved threats (marked as false positive or verified)
-            cursor.execute('''
-                SELECT COUNT(*) FROM detection_results
-                WHERE threat_detected = 1 AND (false_positive = 1 OR verified = 1)
-                AND detected_at >= ? AND detected_at <= ?
-            ''', (start_time.isoformat(), end_time.isoformat()))
-            resolved_threats = cursor.fetchone()[0]
+            resolved_threats = sum(
+                group['in_window'] or 0 for group in snapshot.threat_groups
+                if group['false_positive'] == 1 or group['verified'] == 1
+            )
             
             # Threat types
-            cursor.execute('''
-                SELECT threat_type, COUNT(*) FROM detection_results
-                WHERE threat_detected = 1 AND detected_at >= ? AND detected_at <= ?
-                GROUP BY threat_type
-            ''', (start_time.isoformat(), end_time.isoformat()))
-            threat_types = dict(cursor.fetchall())
-            
-            conn.close()
+            threat_types = snapshot.threats_by_type('in_window')
             
             # Calculate threat velocity (threats per hour)
             hours = (end_time - start_time).total_seconds() / 3600
@@ -315,7 +295,7 @@ class AISecurityPostureReporter:
             logger.error(f"Failed to get threats data: {e}")
             return {'active': 0, 'resolved': 0, 'velocity': 0, 'types': {}}
     
-    async def _analyze_vulnerabilities(self, endpoints_data: Dict) -> Dict[str, Any]:
+    async def _analyze_vulnerabilities(self, snapshot: ReportSnapshot) -> Dict[str, Any]:
         """Analyze vulnerabilities across endpoints"""
         # This would integrate with vulnerability scanners
         # For now, we'll assess based on security controls
@@ -329,16 +309,9 @@ class AISecurityPostureReporter:
         }
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT hostname, system_info FROM agents
-            ''')
-            
-            for row in cursor.fetchall():
-                hostname = row[0]
-                system_info = json.loads(row[1]) if row[1] else {}
+            for agent in snapshot.agents:
+                hostname = agent['hostname']
+                system_info = agent['system_info']
                 security = system_info.get('security', {})
                 
                 # Check for missing security controls
@@ -369,29 +342,20 @@ class AISecurityPostureReporter:
                         'recommendation': 'Apply security updates immediately'
                     })
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Failed to analyze vulnerabilities: {e}")
         
         return vulnerabilities
     
-    async def _analyze_attack_surface(self, endpoints_data: Dict) -> Dict[str, Any]:
+    async def _analyze_attack_surface(self, snapshot: ReportSnapshot) -> Dict[str, Any]:
         """Analyze attack surface"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT system_info FROM agents
-            ''')
-            
             all_services = []
             all_ports = []
             external_ips = set()
             
-            for row in cursor.fetchall():
-                system_info = json.loads(row[0]) if row[0] else {}
+            for agent in snapshot.agents:
+                system_info = agent['system_info']
                 
                 # Extract services
                 services = system_info.get('services', [])
@@ -408,8 +372,6 @@ class AISecurityPostureReporter:
                         if remote_ip and not remote_ip.startswith(('127.', '192.168.', '10.', '172.')):
                             external_ips.add(remote_ip)
             
-            conn.close()
-            
             # Calculate attack surface score (0-100, lower is better)
             score = 0
             if len(all_services) > 10:
@@ -530,29 +492,12 @@ class AISecurityPostureReporter:
         else:
             return 'F'
     
-    async def _calculate_posture_trend(self, start_time: datetime, end_time: datetime) -> str:
+    async def _calculate_posture_trend(self, snapshot: ReportSnapshot) -> str:
         """Calculate security posture trend"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            midpoint = start_time + (end_time - start_time) / 2
-            
-            # First half threats
-            cursor.execute('''
-                SELECT COUNT(*) FROM detection_results
-                WHERE threat_detected = 1 AND detected_at >= ? AND detected_at < ?
-            ''', (start_time.isoformat(), midpoint.isoformat()))
-            first_half = cursor.fetchone()[0]
-            
-            # Second half threats
-            cursor.execute('''
-                SELECT COUNT(*) FROM detection_results
-                WHERE threat_detected = 1 AND detected_at >= ? AND detected_at <= ?
-            ''', (midpoint.isoformat(), end_time.isoformat()))
-            second_half = cursor.fetchone()[0]
-            
-            conn.close()
+            # Threats in the first and second half of the report window
+            first_half = snapshot.threats('window_first_half')
+            second_half = snapshot.threats('window_second_half')
             
             if second_half > first_half * 1.2:
                 return 'declining'
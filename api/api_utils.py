@@ -4,13 +4,14 @@ API Utilities for CodeGrey AI SOC Platform
 Centralized API response formatting and data management
 """
 
-import sqlite3
 import json
+import hashlib
 import logging
 import os
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import asyncio
+from shared.database import get_db_connection
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,8 @@ class APIUtils:
         self.db_path = db_path
         # Don't cache the API key - check it dynamically
         self._openai_api_key = None
+        # Last AI security analysis per agent, with a digest of the endpoint data it was made from
+        self._security_analysis_cache: Dict[str, Tuple[str, Dict[str, Any]]] = {}
     
     @property
     def openai_api_key(self):
@@ -106,7 +109,7 @@ class APIUtils:
     async def get_network_topology_data(self) -> Dict[str, Any]:
         """Get network topology data from database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get all registered agents with enhanced system information
@@ -120,9 +123,28 @@ class APIUtils:
             agents = cursor.fetchall()
             logger.info(f"Found {len(agents)} agents in database")
             
+            # Recent activity and services for all agents in one pass each
+            cursor.execute('''
+                SELECT agent_id, COUNT(*) FROM log_entries
+                WHERE timestamp > datetime('now', '-5 minutes')
+                GROUP BY agent_id
+            ''')
+            recent_log_counts = {row[0]: row[1] for row in cursor.fetchall()}
+            
+            cursor.execute('''
+                SELECT agent_id, source FROM log_entries
+                WHERE timestamp > datetime('now', '-1 hour')
+                GROUP BY agent_id, source
+            ''')
+            agent_services: Dict[str, List[str]] = {}
+            for row_agent_id, source in cursor.fetchall():
+                sources = agent_services.setdefault(row_agent_id, [])
+                if len(sources) < 10:
+                    sources.append(source)
+            
             data = []
             for agent in agents:
-                logger.info(f"Processing agent: {agent[0] if agent else 'None'}")
+                logger.debug(f"Processing agent: {agent[0] if agent else 'None'}")
                 agent_id, hostname, ip_address, platform, status, last_heartbeat, agent_type, os_version, capabilities, system_info, quick_summary = agent
                 
                 # Simple network location determination
@@ -133,26 +155,12 @@ class APIUtils:
                 else:
                     location = "External Network"
                 
-                # Check if agent is active by analyzing recent logs
-                cursor.execute('''
-                    SELECT COUNT(*) FROM log_entries 
-                    WHERE agent_id = ? AND timestamp > datetime('now', '-5 minutes')
-                ''', (agent_id,))
-                recent_logs_result = cursor.fetchone()
-                recent_logs = recent_logs_result[0] if recent_logs_result else 0
-                
                 # Agent is active if it sent logs in last 5 minutes
+                recent_logs = recent_log_counts.get(agent_id, 0)
                 current_status = "active" if recent_logs > 0 else "inactive"
                 
-                # Get services from recent logs
-                cursor.execute('''
-                    SELECT DISTINCT source FROM log_entries 
-                    WHERE agent_id = ? AND timestamp > datetime('now', '-1 hour')
-                    LIMIT 10
-                ''', (agent_id,))
-                
-                service_results = cursor.fetchall()
-                services = [row[0] for row in service_results] if service_results else []
+                # Services seen in recent logs
+                services = agent_services.get(agent_id, [])
                 
                 # Parse enhanced system information
                 system_info_parsed = {}
@@ -167,6 +175,7 @@ class APIUtils:
                 
                 # Build the original agent data structure (for backward compatibility)
                 agent_data = {
+                    "agentId": agent_id,
                     "hostname": hostname or "Unknown",
                     "ipAddress": ip_address or "Unknown",
                     "platform": platform or "Unknown",
@@ -269,6 +278,32 @@ class APIUtils:
                 }
             }
     
+    def _network_topology_snapshot_cache(self):
+        """Snapshot cache for get_network_topology_data"""
+        from api.topology_snapshot import get_topology_snapshot_cache, status_time_bucket
+        from shared.utils import data_change_tracker
+        
+        # Agent status and risk depend on agent/detection writes and on
+        # the last-5-minutes activity window
+        return get_topology_snapshot_cache(
+            'backend-network',
+            self.get_network_topology_data,
+            lambda: (data_change_tracker.snapshot(['agents', 'detections']), status_time_bucket()),
+            items_key='data',
+            item_id='agentId',
+            volatile_keys=('lastUpdated',)
+        )
+    
+    async def get_network_topology_response(self, request=None):
+        """Network topology as a cached, ETag'd and optionally gzipped response"""
+        return await self._network_topology_snapshot_cache().serve(request)
+    
+    async def get_network_topology_changes(self, since_version: int) -> Dict[str, Any]:
+        """Endpoints changed since a network topology snapshot version"""
+        cache = self._network_topology_snapshot_cache()
+        await cache.get()
+        return {"status": "success", **cache.changes_since(since_version)}
+    
     async def get_software_download_data(self) -> List[Dict[str, Any]]:
         """Get software download data with camelCase"""
         return [
@@ -334,7 +369,7 @@ class APIUtils:
     async def get_detection_results_data(self) -> Dict[str, Any]:
         """Get detection results with FULL AI REPORT in logInfo.message"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get detection results with ml_results (contains full AI report)
@@ -628,7 +663,7 @@ class APIUtils:
         """Learn location from actual environment data without hardcoded patterns"""
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Learn from historical data and network behavior
@@ -826,6 +861,24 @@ class APIUtils:
             logger.debug(f"Country detection failed: {e}")
             return 'Unknown'
     
+    async def _cached_security_analysis(self, agent_id: str, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        AI security analysis for an endpoint, reused while its endpoint data is unchanged
+        
+        The model's answer varies between calls, so re-asking on every topology
+        rebuild would change the endpoint's report even when nothing about the
+        endpoint changed. Only successful AI analyses are kept; errors are retried.
+        """
+        input_digest = hashlib.sha1(json.dumps(endpoint_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        cached = self._security_analysis_cache.get(agent_id)
+        if cached is not None and cached[0] == input_digest:
+            return cached[1]
+        
+        analysis = await self._analyze_security_with_ai(endpoint_data)
+        if analysis.get('analysisMethod', '').startswith('AI-powered'):
+            self._security_analysis_cache[agent_id] = (input_digest, analysis)
+        return analysis
+    
     async def _analyze_security_with_ai(self, endpoint_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Use AI to analyze endpoint security and provide rating from A to F
@@ -1124,7 +1177,7 @@ Respond ONLY with valid JSON in this exact format:
             }
             
             # Get AI security analysis - always use AI, no fallbacks
-            ai_security_analysis = await self._analyze_security_with_ai(endpoint_data)
+            ai_security_analysis = await self._cached_security_analysis(agent_id, endpoint_data)
             
             report = {
                 "reportId": f"report_{agent_id}_{int(datetime.now().timestamp())}",
@@ -9,11 +9,12 @@ import json
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 
 from ..storage.database_manager import DatabaseManager
 from ..topology.network_mapper import NetworkTopologyMapper
+from .topology_snapshot import TopologySnapshotCache, get_topology_snapshot_cache, status_time_bucket
 
 
 logger = logging.getLogger(__name__)
@@ -30,6 +31,7 @@ class DynamicFrontendAPI:
         
         # Add routes matching CodeGrey API spec
         self.router.add_api_route("/network-topology", self.get_network_topology, methods=["GET"])
+        self.router.add_api_route("/network-topology/changes", self.get_network_topology_changes, methods=["GET"])
         self.router.add_api_route("/agents", self.get_agents_list, methods=["GET"])
         self.router.add_api_route("/agents/{agent_id}/details", self.get_agent_details, methods=["GET"])
         self.router.add_api_route("/software-download", self.get_software_download, methods=["GET"])
@@ -43,82 +45,122 @@ class DynamicFrontendAPI:
         self.router.add_api_route("/langgraph/detection/recent", self.get_recent_detections, methods=["GET"])
     
     async def get_network_topology(self, 
+                                  request: Request,
                                   hierarchy: str = Query("desc", description="Hierarchy order (asc/desc)"),
-                                  sort_by: str = Query("importance", description="Sort field")) -> JSONResponse:
+                                  sort_by: str = Query("importance", description="Sort field")) -> Response:
         """Get network topology in CodeGrey API format - NO AUTH REQUIRED"""
         try:
-            # Build topology from actual logs (organization's network)
-            topology = await self.topology_mapper.build_topology_from_logs(hours=24)
-            
-            network_nodes = []
-            x_pos = 10
-            y_pos = 20
+            # Build topology from actual logs (organization's network); only
+            # logs newer than the engine watermark are applied
+            await self.topology_mapper.build_topology_from_logs(hours=24)
             
-            # Use ONLY the topology discovered from logs (organization endpoints)
-            # Group nodes by security zones discovered from logs
-            zone_groups = {}
-            
-            for agent_id, node in topology.nodes.items():
-                zone = node.security_zone
-                if zone not in zone_groups:
-                    zone_groups[zone] = []
-                
-                # Convert NetworkNode to agent format for frontend
-                agent_data = {
-                    'id': agent_id,
-                    'name': node.hostname,
-                    'type': 'endpoint',  # These are organization endpoints
-                    'platform': node.platform,
-                    'status': 'active' if (datetime.utcnow() - node.last_activity).seconds < 300 else 'inactive',
-                    'location': zone,
-                    'lastActivity': node.last_activity.isoformat(),
-                    'ip_addresses': list(node.ip_addresses),
-                    'services': list(node.running_services),
-                    'role': node.role,
-                    'importance': node.importance
-                }
-                zone_groups[zone].append(agent_data)
-            
-            # Create network nodes from discovered zones
-            for zone_name, zone_agents in zone_groups.items():
-                if zone_agents:  # Only zones with actual endpoints
-                    network_node = {
-                        'id': zone_name.lower().replace(' ', '_').replace('-', '_'),
-                        'name': zone_name,
-                        'type': self._determine_zone_type_from_topology(zone_agents),
-                        'x': x_pos,
-                        'y': y_pos,
-                        'agents': zone_agents,  # Organization endpoints only
-                        'status': self._get_zone_status_from_agents(zone_agents)
-                    }
-                    
-                    network_nodes.append(network_node)
-                    x_pos += 150
-                    if x_pos > 500:
-                        x_pos = 10
-                        y_pos += 100
+            # Zone groups are rebuilt only when the topology version changes
+            return await self._network_topology_snapshot_cache(hierarchy, sort_by).serve(request)
             
-            # Sort based on actual data
-            network_nodes = self._sort_nodes_dynamically(network_nodes, sort_by, hierarchy)
+        except Exception as e:
+            logger.error(f"Dynamic network nodes error: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    async def get_network_topology_changes(self,
+                                          since_version: int = Query(0, description="Snapshot version the client already has"),
+                                          hierarchy: str = Query("desc", description="Hierarchy order (asc/desc)"),
+                                          sort_by: str = Query("importance", description="Sort field")) -> JSONResponse:
+        """Get network zones changed since a topology snapshot version"""
+        try:
+            await self.topology_mapper.build_topology_from_logs(hours=24)
             
+            cache = self._network_topology_snapshot_cache(hierarchy, sort_by)
+            await cache.get()
             return JSONResponse(content={
                 'status': 'success',
-                'network_nodes': network_nodes,
-                'metadata': {
-                    'data_source': 'real_topology',
-                    'total_nodes': len(network_nodes),
-                    'total_agents': sum(len(node['agents']) for node in network_nodes),
-                    'generated_from_logs': True,
-                    'hierarchy': hierarchy,
-                    'sort_by': sort_by,
-                    'generated_at': datetime.utcnow().isoformat()
-                }
+                **cache.changes_since(since_version)
             })
-            
+        
         except Exception as e:
-            logger.error(f"Dynamic network nodes error: {e}")
+            logger.error(f"Dynamic network changes error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
+    def _network_topology_snapshot_cache(self, hierarchy: str, sort_by: str) -> TopologySnapshotCache:
+        """Snapshot cache for one hierarchy/sort combination"""
+        # Zone status depends on the topology and on the 5-minute activity window
+        return get_topology_snapshot_cache(
+            f"frontend-{hierarchy}-{sort_by}",
+            lambda: self._build_network_topology(hierarchy, sort_by),
+            lambda: (self.topology_mapper.engine.version, status_time_bucket()),
+            items_key='network_nodes',
+            item_id='id',
+            volatile_keys=('generated_at',)
+        )
+    
+    async def _build_network_topology(self, hierarchy: str, sort_by: str) -> Dict[str, Any]:
+        """Group the current topology into network zones for the frontend"""
+        topology = self.topology_mapper.topology
+        
+        network_nodes = []
+        x_pos = 10
+        y_pos = 20
+        
+        # Use ONLY the topology discovered from logs (organization endpoints)
+        # Group nodes by security zones discovered from logs
+        zone_groups = {}
+        
+        for agent_id, node in topology.nodes.items():
+            zone = node.security_zone
+            if zone not in zone_groups:
+                zone_groups[zone] = []
+            
+            # Convert NetworkNode to agent format for frontend
+            agent_data = {
+                'id': agent_id,
+                'name': node.hostname,
+                'type': 'endpoint',  # These are organization endpoints
+                'platform': node.platform,
+                'status': 'active' if (datetime.utcnow() - node.last_activity).seconds < 300 else 'inactive',
+                'location': zone,
+                'lastActivity': node.last_activity.isoformat(),
+                'ip_addresses': list(node.ip_addresses),
+                'services': list(node.running_services),
+                'role': node.role,
+                'importance': node.importance
+            }
+            zone_groups[zone].append(agent_data)
+        
+        # Create network nodes from discovered zones
+        for zone_name, zone_agents in zone_groups.items():
+            if zone_agents:  # Only zones with actual endpoints
+                network_node = {
+                    'id': zone_name.lower().replace(' ', '_').replace('-', '_'),
+                    'name': zone_name,
+                    'type': self._determine_zone_type_from_topology(zone_agents),
+                    'x': x_pos,
+                    'y': y_pos,
+                    'agents': zone_agents,  # Organization endpoints only
+                    'status': self._get_zone_status_from_agents(zone_agents)
+                }
+                
+                network_nodes.append(network_node)
+                x_pos += 150
+                if x_pos > 500:
+                    x_pos = 10
+                    y_pos += 100
+        
+        # Sort based on actual data
+        network_nodes = self._sort_nodes_dynamically(network_nodes, sort_by, hierarchy)
+        
+        return {
+            'status': 'success',
+            'network_nodes': network_nodes,
+            'metadata': {
+                'data_source': 'real_topology',
+                'total_nodes': len(network_nodes),
+                'total_agents': sum(len(node['agents']) for node in network_nodes),
+                'generated_from_logs': True,
+                'hierarchy': hierarchy,
+                'sort_by': sort_by,
+                'generated_at': datetime.utcnow().isoformat()
+            }
+        }
+    
     async def get_agents_list(self,
                              location: Optional[str] = Query(None),
                              agent_type: Optional[str] = Query(None), 
@@ -32,6 +32,7 @@ class TopologyAPI:
         self.router.add_api_route("/attack-plan", self.generate_attack_plan, methods=["POST"])
         self.router.add_api_route("/refresh", self.refresh_topology, methods=["POST"])
         self.router.add_api_route("/status", self.get_topology_status, methods=["GET"])
+        self.router.add_api_route("/changes", self.get_topology_changes, methods=["GET"])
     
     async def get_network_topology(self, hours: int = Query(24, description="Hours of logs to analyze")) -> JSONResponse:
         """Get complete network topology"""
@@ -43,7 +44,8 @@ class TopologyAPI:
                 'topology': topology.to_dict(),
                 'metadata': {
                     'analysis_period_hours': hours,
-                    'generated_at': topology.last_updated.isoformat()
+                    'generated_at': topology.last_updated.isoformat(),
+                    'topology_version': self.topology_mapper.engine.version
                 }
             })
             
@@ -116,6 +118,21 @@ class TopologyAPI:
             logger.error(f"Generate attack plan error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     
+    async def get_topology_changes(self, since_version: int = Query(0, description="Topology version the client already has")) -> JSONResponse:
+        """Get nodes changed since a topology version"""
+        try:
+            await self.topology_mapper.build_topology_from_logs()
+            changes = self.topology_mapper.engine.get_changes_since(since_version)
+            
+            return JSONResponse(content={
+                'status': 'success',
+                **changes
+            })
+        
+        except Exception as e:
+            logger.error(f"Get topology changes error: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
     async def refresh_topology(self) -> JSONResponse:
         """Force refresh of network topology"""
         try:
@@ -142,7 +159,8 @@ class TopologyAPI:
             status = {
                 'monitoring_enabled': True,
                 'last_update': datetime.utcnow().isoformat(),
-                'topology_version': 1,
+                'topology_version': self.topology_mapper.engine.version,
+                'engine': self.topology_mapper.engine.get_statistics(),
                 'continuous_updates': True,
                 'update_frequency': '30 seconds',
                 'full_refresh_frequency': '5 minutes'
@@ -0,0 +1,268 @@
+"""
+Topology Snapshot Cache
+Materialized network topology responses served with ETags, gzip and deltas
+
+Topology views are rebuilt only when the data they are derived from changes
+(topology engine version, agent/detection change counters, or the time bucket
+their activity status depends on). Each snapshot is kept serialized and
+compressed, so repeated polls cost a header comparison instead of a rebuild,
+and clients can fetch only the items changed since the version they hold.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+logger = logging.getLogger(__name__)
+
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+# Status fields derived from "last activity within N minutes" are recomputed
+# at most this often when nothing else has changed
+STATUS_BUCKET_SECONDS = 30
+
+SnapshotBuilder = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def status_time_bucket(seconds: int = STATUS_BUCKET_SECONDS) -> int:
+    """Current time bucket, for views whose content depends on the clock"""
+    return int(time.time() // seconds)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+@dataclass
+class TopologySnapshot:
+    """One materialized topology response"""
+    version: int
+    etag: str
+    body: bytes
+    gzip_body: bytes
+    source_version: Any
+    generated_at: float
+    items: Dict[str, Dict[str, Any]] = field(repr=False)
+    item_digests: Dict[str, str] = field(repr=False)
+    metadata_digest: str = ''
+
+
+class TopologySnapshotCache:
+    """Single-flight cache of one topology view with a per-version change feed"""
+    
+    def __init__(self, name: str, builder: SnapshotBuilder, source_version: Callable[[], Any],
+                 items_key: str = 'data', item_id: str = 'id',
+                 volatile_keys: Tuple[str, ...] = (),
+                 min_refresh_interval: float = 5.0, history_size: int = 100):
+        self.name = name
+        self.builder = builder
+        self.source_version = source_version
+        self.items_key = items_key
+        self.item_id = item_id
+        # Payload/metadata keys (e.g. generation timestamps) ignored when
+        # deciding whether a rebuild changed anything
+        self.volatile_keys = frozenset(volatile_keys)
+        self.min_refresh_interval = min_refresh_interval
+        
+        self._snapshot: Optional[TopologySnapshot] = None
+        self._checked_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        
+        # (from_version, to_version, changed ids, removed ids)
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'rebuilds': 0,
+                      'unchanged_rebuilds': 0, 'not_modified': 0}
+    
+    def _is_fresh(self, source_version: Any) -> bool:
+        if self._snapshot is None:
+            return False
+        if self._snapshot.source_version == source_version:
+            return True
+        return time.monotonic() - self._checked_at < self.min_refresh_interval
+    
+    async def get(self) -> Optional[TopologySnapshot]:
+        """Current snapshot; a stale one is served while a single rebuild runs"""
+        source_version = self.source_version()
+        
+        if self._is_fresh(source_version):
+            self.stats['hits'] += 1
+            return self._snapshot
+        
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._rebuild(source_version))
+        
+        if self._snapshot is not None:
+            self.stats['stale_hits'] += 1
+            return self._snapshot
+        
+        self.stats['misses'] += 1
+        return await asyncio.shield(self._inflight)
+    
+    async def _rebuild(self, source_version: Any) -> Optional[TopologySnapshot]:
+        self._checked_at = time.monotonic()
+        try:
+            payload = await self.builder()
+        except Exception as e:
+            logger.error(f"Failed to build {self.name} topology snapshot: {e}")
+            return self._snapshot
+        
+        if not isinstance(payload, dict) or payload.get('status') != 'success':
+            # Errors are never cached; the next request retries
+            logger.error(f"{self.name} topology snapshot builder returned no data")
+            self._checked_at = 0.0
+            return self._snapshot
+        
+        self.stats['rebuilds'] += 1
+        items = {}
+        for item in payload.get(self.items_key) or []:
+            if isinstance(item, dict) and item.get(self.item_id) is not None:
+                items[str(item[self.item_id])] = item
+        item_digests = {item_id: _digest(item) for item_id, item in items.items()}
+        metadata_digest = _digest(self._metadata(payload))
+        
+        previous = self._snapshot
+        if (previous is not None and previous.item_digests == item_digests
+                and previous.metadata_digest == metadata_digest):
+            # Same content: keep the existing body and ETag so clients get 304s
+            self.stats['unchanged_rebuilds'] += 1
+            previous.source_version = source_version
+            return previous
+        
+        version = previous.version + 1 if previous else 1
+        payload = dict(payload)
+        payload['snapshotVersion'] = version
+        body = json.dumps(payload, default=str).encode('utf-8')
+        
+        if previous is not None:
+            changed = {item_id for item_id, digest in item_digests.items()
+                       if previous.item_digests.get(item_id) != digest}
+            removed = set(previous.item_digests) - set(item_digests)
+            self._history.append({'from_version': previous.version, 'to_version': version,
+                                  'changed': changed, 'removed': removed})
+        
+        self._snapshot = TopologySnapshot(
+            version=version,
+            etag=f'"{self.name}-{version}-{_digest(item_digests)[:16]}"',
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_SIZE else b'',
+            source_version=source_version,
+            generated_at=time.time(),
+            items=items,
+            item_digests=item_digests,
+            metadata_digest=metadata_digest
+        )
+        return self._snapshot
+    
+    def _metadata(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Everything in a payload besides its items, without the volatile keys"""
+        metadata = {key: value for key, value in payload.items()
+                    if key != self.items_key and key not in self.volatile_keys}
+        if isinstance(metadata.get('metadata'), dict):
+            metadata['metadata'] = {key: value for key, value in metadata['metadata'].items()
+                                    if key not in self.volatile_keys}
+        return metadata
+    
+    def changes_since(self, since_version: int) -> Dict[str, Any]:
+        """Items changed or removed after a snapshot version the client holds"""
+        snapshot = self._snapshot
+        current = snapshot.version if snapshot else 0
+        
+        if since_version == current:
+            return {'version': current, 'full_resync_required': False, 'changed': [], 'removed': []}
+        
+        oldest = self._history[0]['from_version'] if self._history else current
+        if snapshot is None or since_version < oldest or since_version > current:
+            return {'version': current, 'full_resync_required': True, 'changed': [], 'removed': []}
+        
+        changed: Set[str] = set()
+        removed: Set[str] = set()
+        for entry in self._history:
+            if entry['to_version'] > since_version:
+                changed |= entry['changed']
+                removed |= entry['removed']
+        
+        return {
+            'version': current,
+            'full_resync_required': False,
+            'changed': [snapshot.items[item_id] for item_id in sorted(changed) if item_id in snapshot.items],
+            'removed': sorted(removed - set(snapshot.items))
+        }
+    
+    def respond(self, snapshot: TopologySnapshot, request: Optional[Request]) -> Response:
+        """Conditional, optionally compressed response for a snapshot"""
+        headers = {
+            'ETag': snapshot.etag,
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+            'X-Topology-Version': str(snapshot.version)
+        }
+        
+        if request is not None and _etag_matches(request.headers.get('if-none-match'), snapshot.etag):
+            self.stats['not_modified'] += 1
+            return Response(status_code=304, headers=headers)
+        
+        accept_encoding = request.headers.get('accept-encoding', '') if request is not None else ''
+        if snapshot.gzip_body and 'gzip' in accept_encoding.lower():
+            headers['Content-Encoding'] = 'gzip'
+            return Response(content=snapshot.gzip_body, media_type='application/json', headers=headers)
+        
+        return Response(content=snapshot.body, media_type='application/json', headers=headers)
+    
+    async def serve(self, request: Optional[Request]) -> Response:
+        """Serve the current snapshot, rebuilding it first if needed"""
+        snapshot = await self.get()
+        if snapshot is None:
+            return JSONResponse(status_code=503, content={
+                'status': 'error', 'message': f'{self.name} topology is not available', self.items_key: []
+            })
+        return self.respond(snapshot, request)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'name': self.name,
+            'version': snapshot.version if snapshot else 0,
+            'items': len(snapshot.items) if snapshot else 0,
+            'body_bytes': len(snapshot.body) if snapshot else 0,
+            'gzip_bytes': len(snapshot.gzip_body) if snapshot else 0,
+            'history': len(self._history),
+            **self.stats
+        }
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+# Named snapshot caches shared across routes
+_snapshot_caches: Dict[str, TopologySnapshotCache] = {}
+
+
+def get_topology_snapshot_cache(name: str, builder: SnapshotBuilder, source_version: Callable[[], Any],
+                                **options) -> TopologySnapshotCache:
+    """Get or create the snapshot cache for a topology view"""
+    cache = _snapshot_caches.get(name)
+    if cache is None:
+        cache = TopologySnapshotCache(name, builder, source_version, **options)
+        _snapshot_caches[name] = cache
+    return cache
+
+
+def get_topology_snapshot_statistics() -> List[Dict[str, Any]]:
+    """Statistics for every registered topology snapshot cache"""
+    return [cache.get_statistics() for cache in _snapshot_caches.values()]
@@ -8,6 +8,7 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime
 
 from shared.models import LogEntry, DetectionResult
+from shared.mitre_index import get_mitre_index
 
 
 logger = logging.getLogger(__name__)
@@ -203,6 +204,10 @@ class DetectionIntegration:
         if 'tactics' in result:
             detection_result.tactics = result['tactics']
         
+        # Derive tactics from the techniques when the detector did not report them
+        if detection_result.mitre_techniques and not detection_result.tactics:
+            detection_result.tactics = get_mitre_index().tactics_for(detection_result.mitre_techniques)
+        
         # Add metadata
         detection_result.metadata = {
             'detector_type': detector_type,
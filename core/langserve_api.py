@@ -11,8 +11,6 @@ import uuid
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from langserve import add_routes
-from langchain.schema.runnable import Runnable
-from langchain.schema import BaseMessage
 from fastapi import FastAPI, Request
 # CORSMiddleware not imported - CORS is handled by Nginx
 import sys
@@ -22,46 +20,65 @@ from pathlib import Path
 # Add project root to Python path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
+from shared.database import get_db_connection
+from shared.migrations import ensure_schema
+from shared.detection_events import detection_events
+from shared.component_registry import get_component_registry
 
 logger = logging.getLogger(__name__)
 
+# Agent components served through LangServe routes
+AGENT_COMPONENTS = ('soc_orchestrator', 'detection_agent', 'attack_agent')
 
-class SOCPlatformAPI:
-    """LangServe-based API for AI SOC Platform"""
 
-    def __init__(self):
-        # Import agents with error handling
-        self.agents_available = False
-        self.soc_orchestrator = None
-        self.langchain_detection_agent = None
-        self.phantomstrike_ai = None
-        self.gpt_scenario_requester = None
+def _load_soc_orchestrator():
+    from agents.langchain_orchestrator import soc_orchestrator
+    return soc_orchestrator
 
-        try:
-            from agents.langchain_orchestrator import soc_orchestrator
-            from agents.detection_agent.langchain_detection_agent import langchain_detection_agent  
-            from agents.attack_agent.langchain_attack_agent import phantomstrike_ai
-            from agents.attack_agent.gpt_scenario_requester import GPTScenarioRequester
-            from langchain_openai import ChatOpenAI
-            
-            self.soc_orchestrator = soc_orchestrator
-            self.langchain_detection_agent = langchain_detection_agent
-            self.phantomstrike_ai = phantomstrike_ai
-            
-            # Set detection_agent alias for _analyze_threat_dynamically
-            self.detection_agent = langchain_detection_agent
 
-            # Initialize GPT scenario requester
-            llm = ChatOpenAI(model='gpt-3.5-turbo', temperature=0.7)
-            self.gpt_scenario_requester = GPTScenarioRequester(llm)
+def _load_detection_agent():
+    from agents.detection_agent.langchain_detection_agent import langchain_detection_agent
+    return langchain_detection_agent
 
-            self.agents_available = True
-            logger.info(
-                "All AI agents loaded: SOC Orchestrator, Detection Agent, Attack Agent, GPT Scenario Requester")
 
-        except ImportError as e:
-            logger.warning(
-                f"LangChain agents not available for LangServe: {e}")
+def _load_attack_agent():
+    from agents.attack_agent.langchain_attack_agent import phantomstrike_ai
+    return phantomstrike_ai
+
+
+def _load_mitre_index():
+    from shared.mitre_index import get_mitre_index
+    return get_mitre_index()
+
+
+def _load_gpt_scenario_requester():
+    from agents.attack_agent.gpt_scenario_requester import GPTScenarioRequester
+    from langchain_openai import ChatOpenAI
+    llm = ChatOpenAI(model='gpt-3.5-turbo', temperature=0.7)
+    return GPTScenarioRequester(llm)
+
+
+class SOCPlatformAPI:
+    """LangServe-based API for AI SOC Platform"""
+
+    def __init__(self):
+        # Agents (and the models they load) are built on first use or by the
+        # background warmup, so importing this module stays cheap
+        self.components = get_component_registry()
+        self.components.register('soc_orchestrator', _load_soc_orchestrator)
+        self.components.register('detection_agent', _load_detection_agent)
+        self.components.register('attack_agent', _load_attack_agent)
+        self.components.register('gpt_scenario_requester', _load_gpt_scenario_requester)
+        self.components.register('mitre_index', _load_mitre_index)
+        self._agents_disabled = False
+        self._langserve_routes_added = False
+        self._warmup_task = None
+        
+        # Apply pending schema migrations once, before any request touches the database
+        try:
+            ensure_schema('soc_database.db')
+        except Exception as e:
+            logger.error(f"Schema migration failed: {e}")
         
         self.app = FastAPI(
                 title="AI SOC Platform - LangChain API",
@@ -70,8 +87,12 @@ class SOCPlatformAPI:
         )
                 # CORS is now handled by Nginx - no need for FastAPI CORS middleware
                 # This prevents duplicate CORS headers
-                # Add LangServe routes
-        self._add_langserve_routes()
+
+        # LangServe routes are added once the agents finished warming up
+        @self.app.on_event("startup")
+        async def start_component_warmup():
+            self._warmup_task = asyncio.create_task(self._warmup_components())
+
                 # Add custom endpoints
         self._add_custom_endpoints()
         self._add_pdf_download_endpoints()
@@ -272,11 +293,12 @@ class SOCPlatformAPI:
             ]
 
             ai_scenarios = []
+            gpt_scenario_requester = await self.components.aget('gpt_scenario_requester')
 
             for i, request in enumerate(scenario_requests):
                 try:
                     # Generate AI scenario with real network context
-                    scenario = await self.gpt_scenario_requester.request_custom_scenario(
+                    scenario = await gpt_scenario_requester.request_custom_scenario(
                         user_request=request,
                         network_context=network_context,
                         constraints={
@@ -397,8 +419,47 @@ class SOCPlatformAPI:
             "real_attack": True
         }
 
+    def _loaded(self, name: str):
+        """The component if already built, else None; never blocks (handlers use components.aget)"""
+        return self.components.get(name) if self.components.is_ready(name) else None
+    
+    @property
+    def soc_orchestrator(self):
+        return self._loaded('soc_orchestrator')
+    
+    @property
+    def langchain_detection_agent(self):
+        return self._loaded('detection_agent')
+    
+    @property
+    def detection_agent(self):
+        return self._loaded('detection_agent')
+    
+    @property
+    def phantomstrike_ai(self):
+        return self._loaded('attack_agent')
+    
+    @property
+    def gpt_scenario_requester(self):
+        return self._loaded('gpt_scenario_requester')
+    
+    @property
+    def agents_available(self) -> bool:
+        """False once an agent failed to load; agents not loaded yet load on first use"""
+        return not self._agents_disabled and not any(self.components.is_failed(name) for name in AGENT_COMPONENTS)
+    
+    async def _warmup_components(self):
+        """Load agents in the background after the listener is up, then expose them via LangServe"""
+        try:
+            await self.components.warmup()
+            self._add_langserve_routes()
+        except Exception as e:
+            logger.error(f"Component warmup failed: {e}")
+    
     def _add_langserve_routes(self):
         """Add LangServe routes for agents"""
+        if self._langserve_routes_added:
+            return
         if not self.agents_available:
             logger.warning(
                 "LangChain agents not available, skipping LangServe routes")
@@ -432,10 +493,13 @@ class SOCPlatformAPI:
                     playground_type="default"
                 )
 
+            self._langserve_routes_added = True
+            # Routes were added after startup; rebuild the OpenAPI schema on next request
+            self.app.openapi_schema = None
             logger.info("LangServe routes added successfully")
         except Exception as e:
             logger.error(f"Failed to add LangServe routes: {e}")
-            self.agents_available = False
+            self._agents_disabled = True
 
     def _add_custom_endpoints(self):
         """Add custom API endpoints"""
@@ -455,29 +519,35 @@ class SOCPlatformAPI:
 
         @self.app.get("/health")
         async def health_check():
+            # Reports readiness without triggering any component load
             try:
+                components = self.components.status()
                 if not self.agents_available:
                     return {
                         "status": "healthy",
                         "version": "2.0.0",
+                        "ready": self.components.ready,
                         "agents": "unavailable",
-                        "ai_services": "disabled"
+                        "ai_services": "disabled",
+                        "components": components
                     }
 
-                # Check agent status
-                orchestrator_status = "available" if self.soc_orchestrator else "unavailable"
-                detection_status = "available" if self.langchain_detection_agent else "unavailable"
-                attack_status = "available" if self.phantomstrike_ai else "unavailable"
+                def agent_status(name):
+                    state = components[name]['state']
+                    return "available" if state == 'ready' else "unavailable" if state == 'failed' else state
 
                 return {
                     "status": "healthy",
                     "version": "2.0.0",
+                    "ready": self.components.ready,
                     "agents": {
-                        "orchestrator": orchestrator_status,
-                        "detection": detection_status,
-                        "attack": attack_status
+                        "orchestrator": agent_status('soc_orchestrator'),
+                        "detection": agent_status('detection_agent'),
+                        "attack": agent_status('attack_agent')
                     },
-                    "ai_services": "active" if self.agents_available else "disabled"
+                    "ai_services": "active" if self.components.ready else "warming_up",
+                    "components": components,
+                    "warmup_seconds": self.components.warmup_seconds
                 }
             except Exception as e:
                 return {
@@ -489,7 +559,8 @@ class SOCPlatformAPI:
         async def analyze_threat(request_data: Dict[str, Any]):
             """Analyze threat using SOC orchestrator"""
             try:
-                if not self.agents_available or not self.soc_orchestrator:
+                soc_orchestrator = await self.components.aget('soc_orchestrator')
+                if not self.agents_available or not soc_orchestrator:
                     return {
                         "success": False,
                         "error": "SOC orchestrator not available"
@@ -497,7 +568,7 @@ class SOCPlatformAPI:
                 
                 detection_data = request_data.get('detection_data', {})
                 context = request_data.get('context', {})
-                result = await self.soc_orchestrator.process_soc_request(
+                result = await soc_orchestrator.process_soc_request(
                     f"Analyze this threat: {detection_data}",
                     context
                 )
@@ -513,7 +584,8 @@ class SOCPlatformAPI:
                 attack_request = request_data.get('attack_request', '')
                 network_context = request_data.get('network_context', {})
                 constraints = request_data.get('constraints', {})
-                result = await self.soc_orchestrator.process_soc_request(
+                soc_orchestrator = await self.components.aget('soc_orchestrator')
+                result = await soc_orchestrator.process_soc_request(
                     f"Plan attack scenario: {attack_request}",
                 {
                         "network_context": network_context,
@@ -530,7 +602,8 @@ class SOCPlatformAPI:
         async def get_pending_approvals():
             """Get scenarios pending approval"""
             try:
-                approvals = await self.phantomstrike_ai.get_pending_approvals()
+                phantomstrike_ai = await self.components.aget('attack_agent')
+                approvals = await phantomstrike_ai.get_pending_approvals()
                 return {
                     "success": True,
                     "approvals": approvals
@@ -544,7 +617,8 @@ class SOCPlatformAPI:
         async def request_gpt_scenario(request_data: Dict[str, Any]):
             """Request a custom attack scenario from GPT"""
             try:
-                if not self.gpt_scenario_requester:
+                gpt_scenario_requester = await self.components.aget('gpt_scenario_requester')
+                if not gpt_scenario_requester:
                     return {"success": False,
      "error": "GPT Scenario Requester not available"}
 
@@ -552,7 +626,7 @@ class SOCPlatformAPI:
                 network_context = request_data.get('network_context', {})
                 constraints = request_data.get('constraints', {})
 
-                scenario = await self.gpt_scenario_requester.request_custom_scenario(
+                scenario = await gpt_scenario_requester.request_custom_scenario(
                     user_request=user_request,
                     network_context=network_context,
                     constraints=constraints
@@ -575,10 +649,11 @@ class SOCPlatformAPI:
             network_context: Dict[str, Any] = None):
             """Get GPT-generated scenario suggestions"""
             try:
-                if not self.gpt_scenario_requester:
+                gpt_scenario_requester = await self.components.aget('gpt_scenario_requester')
+                if not gpt_scenario_requester:
                     return {"success": False,"error": "GPT Scenario Requester not available"}
 
-                suggestions = await self.gpt_scenario_requester.get_scenario_suggestions(network_context or {})
+                suggestions = await gpt_scenario_requester.get_scenario_suggestions(network_context or {})
 
                 return {
                     "success": True,
@@ -633,7 +708,8 @@ class SOCPlatformAPI:
                         "timestamp": datetime.utcnow().isoformat()
                     }
 
-                if not self.phantomstrike_ai:
+                phantomstrike_ai = await self.components.aget('attack_agent')
+                if not phantomstrike_ai:
                     return {
                         "success": False, "error": "Attack agent not available"}
 
@@ -690,7 +766,7 @@ class SOCPlatformAPI:
                 # This will generate AI commands for each platform
                 attack_request = customized_scenario.get('description', f"Execute {customized_scenario.get('name')} attack scenario")
 
-                scenario_result = await self.phantomstrike_ai.plan_attack_scenario(
+                scenario_result = await phantomstrike_ai.plan_attack_scenario(
                     attack_request=attack_request,
                     network_context=network_context,
                         constraints={
@@ -703,7 +779,7 @@ class SOCPlatformAPI:
                 # AUTOMATICALLY EXECUTE THE SCENARIO (no approval needed for AI SOC)
                 # Call attack command generation directly instead of through LangChain tool
                 try:
-                    from agents.attack_agent.ai_command_generator import generate_ai_commands
+                    from agents.attack_agent.command_generation_service import get_command_generation_service
                     
                     target_agent_ids = [agent.get('agent_id') for agent in agents]
                     
@@ -718,13 +794,18 @@ class SOCPlatformAPI:
                         # Fallback to __dict__
                         scenario_dict = scenario_result.__dict__
                     
-                    # Generate AI commands using real AI generator
-                    ai_commands = await generate_ai_commands(
-                        attack_type=scenario_dict.get('attack_type', 'network_intrusion'),
-                        platform='windows',  # Default to windows for now
+                    # Generate AI commands once per distinct agent platform (cached per scenario/platform)
+                    generation_service = get_command_generation_service()
+                    attack_type = scenario_dict.get('attack_type', 'network_intrusion')
+                    commands_by_platform = await generation_service.generate_for_agents(
+                        attack_type=attack_type,
                         scenario=scenario_dict,
-                        network_context=network_context
+                        agents=agents,
+                        network_context=network_context,
+                        scenario_id=scenario_id
                     )
+                    if not any(platform_commands['commands'] for platform_commands in commands_by_platform.values()):
+                        raise ValueError("AI command generation returned no commands for any target platform")
                     
                     # Queue the AI commands to the database
                     from core.server.command_queue.command_manager import CommandManager
@@ -733,52 +814,44 @@ class SOCPlatformAPI:
                     db_manager = DatabaseManager()
                     command_manager = CommandManager(db_manager)
                     
-                    queued_commands = 0
-                    
                     # Import red team tracking
                     from ai_detection_results_monitor import detection_monitor
                     
-                    for agent_id in target_agent_ids:
-                        for technique, cmd_info in ai_commands.items():
-                            try:
-                                # RECORD RED TEAM ATTACK (Ground Truth Tracking)
-                                attack_id = await detection_monitor.record_red_team_attack({
-                                    'scenario_id': scenario_id,
-                                    'attack_type': technique,
-                                    'target_agent_id': agent_id,
-                                    'timestamp': datetime.now().isoformat(),
-                                    'expected_detection': True,  # We expect this to be detected
-                                    'notes': f"GPT Scenario: {scenario_name or scenario_id} - {cmd_info.get('description', '')}"
-                                })
-                                
-                                command_id = await command_manager.queue_command(
-                                    agent_id=agent_id,
-                                    technique=technique,
-                                    command_data={
-                                        'script': cmd_info.get('script', ''),
-                                        'description': cmd_info.get('description', ''),
-                                        'mitre_technique': cmd_info.get('mitre_technique', ''),
-                                        'destructive': cmd_info.get('destructive', False),
-                                        'real_attack': cmd_info.get('real_attack', True),
-                                        'ai_generated': True,
-                                        'attack_id': attack_id  # Link to red team tracking
-                                    },
-                                    scenario_id=scenario_id
-                                )
-                                queued_commands += 1
-                                logger.info(f"Queued AI command {technique} for agent {agent_id} (attack_id: {attack_id})")
-                            except Exception as e:
-                                logger.error(f"Failed to queue command {technique} for agent {agent_id}: {e}")
+                    # Queue each platform's agents x techniques matrix, with its ground truth, in one transaction
+                    queued_commands = 0
+                    agent_platforms = {}
+                    for platform, platform_commands in commands_by_platform.items():
+                        for agent_id in platform_commands['agent_ids']:
+                            agent_platforms[agent_id] = platform
+                        if not platform_commands['commands']:
+                            continue
+                        try:
+                            command_ids = await command_manager.queue_scenario_commands(
+                                agent_ids=platform_commands['agent_ids'],
+                                commands=platform_commands['commands'],
+                                scenario_id=scenario_id,
+                                scenario_name=scenario_name,
+                                attack_tracker=detection_monitor
+                            )
+                            generation_service.track_commands(attack_type, platform, scenario_dict, command_ids,
+                                                              scenario_id=scenario_id)
+                            queued_commands += sum(len(agent_commands) for agent_commands in command_ids.values())
+                        except Exception as e:
+                            logger.error(f"Failed to queue scenario commands for {len(platform_commands['agent_ids'])} "
+                                         f"{platform} agents: {e}")
                     
-                    commands_generated = len(ai_commands)
-                    logger.info(f"GPT scenario executed: {commands_generated} AI commands generated, {queued_commands} queued")
+                    commands_generated = sum(len(platform_commands['commands'])
+                                             for platform_commands in commands_by_platform.values())
+                    logger.info(f"GPT scenario executed: {commands_generated} AI commands generated for "
+                                f"{len(commands_by_platform)} platforms, {queued_commands} queued")
                     
                     # Create execution result
                     execution_result = {
                         'deployment_results': [
                             {
                                 'agent_id': agent_id,
-                                'commands': ai_commands,
+                                'platform': agent_platforms.get(agent_id),
+                                'commands': commands_by_platform.get(agent_platforms.get(agent_id), {}).get('commands', {}),
                                 'status': 'queued'
                             }
                             for agent_id in target_agent_ids
@@ -860,7 +933,7 @@ class SOCPlatformAPI:
                 db_manager = DatabaseManager()
                 agents = await db_manager.get_all_agents()
                 
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get scenario data dynamically
@@ -997,13 +1070,12 @@ class SOCPlatformAPI:
             """Get comprehensive system status with all active scenarios"""
             try:
                 from core.server.storage.database_manager import DatabaseManager
-                import sqlite3
                 
                 db_manager = DatabaseManager()
                 agents = await db_manager.get_all_agents()
                 
                 # Get all active scenarios
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get scenario execution stats
@@ -1086,8 +1158,8 @@ class SOCPlatformAPI:
                 return {
                     "success": True,
                     "systemStatus": {
-                        "gptRequesterAvailable": self.gpt_scenario_requester is not None,
-                        "attackAgentAvailable": self.phantomstrike_ai is not None,
+                        "gptRequesterAvailable": self.components.is_ready('gpt_scenario_requester'),
+                        "attackAgentAvailable": self.components.is_ready('attack_agent'),
                         "activeAgents": active_agents,
                         "totalAgents": len(agents),
                         "recentDetections": recent_detections
@@ -1114,10 +1186,9 @@ class SOCPlatformAPI:
         async def get_scenario_detailed_execution_status(scenario_id: str):
             """Get comprehensive status of specific scenario with stage breakdown"""
             try:
-                import sqlite3
                 from datetime import datetime, timedelta
                 
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get detailed command information
@@ -1257,12 +1328,11 @@ class SOCPlatformAPI:
             """Debug command execution issues"""
             try:
                 from core.server.storage.database_manager import DatabaseManager
-                import sqlite3
                 
                 db_manager = DatabaseManager()
                 
                 # Get command execution statistics
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get command status breakdown
@@ -1349,9 +1419,7 @@ class SOCPlatformAPI:
         async def debug_command_execution(command_id: str):
             """Debug specific command execution"""
             try:
-                import sqlite3
-                
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get command details
@@ -1418,9 +1486,7 @@ class SOCPlatformAPI:
         async def debug_recent_commands():
             """Debug recent command executions"""
             try:
-                import sqlite3
-                
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get recent commands with results
@@ -1469,14 +1535,53 @@ class SOCPlatformAPI:
             except Exception as e:
                 logger.error(f"Recent commands debug failed: {e}")
                 return {"success": False, "error": str(e)}
+        
+        @self.app.get("/api/backend/debug/command-generation-cache")
+        async def debug_command_generation_cache():
+            """Cached AI command sets per scenario/platform, with their execution feedback"""
+            try:
+                from agents.attack_agent.command_generation_service import get_command_generation_service
+                
+                return {"success": True, **get_command_generation_service().get_statistics()}
+            
+            except Exception as e:
+                logger.error(f"Command generation cache debug failed: {e}")
+                return {"success": False, "error": str(e)}
+        
+        @self.app.delete("/api/backend/debug/command-generation-cache")
+        async def invalidate_command_generation_cache(scenario_id: Optional[str] = None, platform: Optional[str] = None):
+            """Invalidate cached AI command sets (all, or for a scenario and/or platform)"""
+            try:
+                from agents.attack_agent.command_generation_service import get_command_generation_service
+                
+                invalidated = get_command_generation_service().invalidate(scenario_id=scenario_id, platform=platform)
+                return {"success": True, "invalidated": invalidated}
+            
+            except Exception as e:
+                logger.error(f"Command generation cache invalidation failed: {e}")
+                return {"success": False, "error": str(e)}
+        
+        @self.app.get("/api/backend/debug/query-stats")
+        async def debug_query_stats(sort_by: str = "total_ms", limit: int = 50, reset: bool = False):
+            """Per-statement SQLite timings, row counts and query plans for slow queries"""
+            try:
+                from shared.database import query_stats
+                
+                stats = query_stats.get_statistics(sort_by=sort_by, limit=limit)
+                if reset:
+                    query_stats.reset()
+                
+                return {"success": True, **stats}
+            
+            except Exception as e:
+                logger.error(f"Query stats debug failed: {e}")
+                return {"success": False, "error": str(e)}
     
         @self.app.get("/api/backend/gpt-scenarios/live-status")
         async def get_live_scenario_status():
             """Get real-time status updates for active scenarios (for live monitoring)"""
             try:
-                import sqlite3
-                
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get live metrics
@@ -1573,7 +1678,7 @@ class SOCPlatformAPI:
                 db_manager = DatabaseManager()
                 agents = await db_manager.get_all_agents()
                 
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get scenario data dynamically
@@ -1710,13 +1815,12 @@ class SOCPlatformAPI:
             """Get comprehensive system status with all active scenarios"""
             try:
                 from core.server.storage.database_manager import DatabaseManager
-                import sqlite3
                 
                 db_manager = DatabaseManager()
                 agents = await db_manager.get_all_agents()
                 
                 # Get all active scenarios
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get scenario execution stats
@@ -1799,8 +1903,8 @@ class SOCPlatformAPI:
                 return {
                     "success": True,
                     "systemStatus": {
-                        "gptRequesterAvailable": self.gpt_scenario_requester is not None,
-                        "attackAgentAvailable": self.phantomstrike_ai is not None,
+                        "gptRequesterAvailable": self.components.is_ready('gpt_scenario_requester'),
+                        "attackAgentAvailable": self.components.is_ready('attack_agent'),
                         "activeAgents": active_agents,
                         "totalAgents": len(agents),
                         "recentDetections": recent_detections
@@ -1827,10 +1931,9 @@ class SOCPlatformAPI:
         async def get_scenario_detailed_execution_status(scenario_id: str):
             """Get comprehensive status of specific scenario with stage breakdown"""
             try:
-                import sqlite3
                 from datetime import datetime, timedelta
                 
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get detailed command information
@@ -1970,12 +2073,11 @@ class SOCPlatformAPI:
             """Debug command execution issues"""
             try:
                 from core.server.storage.database_manager import DatabaseManager
-                import sqlite3
                 
                 db_manager = DatabaseManager()
                 
                 # Get command execution statistics
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get command status breakdown
@@ -2062,9 +2164,7 @@ class SOCPlatformAPI:
         async def debug_command_execution(command_id: str):
             """Debug specific command execution"""
             try:
-                import sqlite3
-                
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get command details
@@ -2131,9 +2231,7 @@ class SOCPlatformAPI:
         async def debug_recent_commands():
             """Debug recent command executions"""
             try:
-                import sqlite3
-                
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get recent commands with results
@@ -2187,9 +2285,7 @@ class SOCPlatformAPI:
         async def get_live_scenario_status():
             """Get real-time status updates for active scenarios (for live monitoring)"""
             try:
-                import sqlite3
-                
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 # Get live metrics
@@ -2267,8 +2363,8 @@ class SOCPlatformAPI:
 
                 return {
                     "success": True,
-                    "gpt_requester_available": self.gpt_scenario_requester is not None,
-                    "attack_agent_available": self.phantomstrike_ai is not None,
+                    "gpt_requester_available": self.components.is_ready('gpt_scenario_requester'),
+                    "attack_agent_available": self.components.is_ready('attack_agent'),
                     "client_agents_connected": len(agents),
                     "agents": [{"id": agent.get('agent_id'), "ip": agent.get('ip_address')} for agent in agents[:5]],
                     "timestamp": datetime.utcnow().isoformat()
@@ -2293,11 +2389,10 @@ class SOCPlatformAPI:
 
                 # Clear pending commands for this scenario
                 from core.server.storage.database_manager import DatabaseManager
-                import sqlite3
                 db_manager = DatabaseManager()
 
                 # Delete pending commands for this scenario
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 cursor.execute('''
                     DELETE FROM commands
@@ -2338,9 +2433,8 @@ class SOCPlatformAPI:
                     }
 
                 # Mark commands as paused
-                import sqlite3
 
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE commands
@@ -2382,9 +2476,8 @@ class SOCPlatformAPI:
                     }
 
                 # Mark commands as pending again
-                import sqlite3
 
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE commands
@@ -2416,9 +2509,7 @@ class SOCPlatformAPI:
         async def get_scenario_execution_status(scenario_id: str):
             """Get detailed status of a specific scenario execution"""
             try:
-                import sqlite3
-
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
 
                 # Get command stats for this scenario
@@ -2483,7 +2574,8 @@ class SOCPlatformAPI:
         async def create_custom_apt_scenario(request_data: dict):
             """Create a custom AI-generated APT scenario based on user requirements"""
             try:
-                if not self.gpt_scenario_requester:
+                gpt_scenario_requester = await self.components.aget('gpt_scenario_requester')
+                if not gpt_scenario_requester:
                     return {
                         "success": False,
                         "error": "GPT scenario requester not available",
@@ -2503,7 +2595,7 @@ class SOCPlatformAPI:
                     }
 
                 # Generate custom AI scenario
-                scenario = await self.gpt_scenario_requester.request_custom_scenario(
+                scenario = await gpt_scenario_requester.request_custom_scenario(
                     user_request=user_request,
                     network_context=network_context,
                     constraints=constraints
@@ -2534,7 +2626,8 @@ class SOCPlatformAPI:
             try:
                 scenario_id = request_data.get('scenario_id')
                 approved = request_data.get('approved', False)
-                result = await self.phantomstrike_ai.execute_approved_scenario(
+                phantomstrike_ai = await self.components.aget('attack_agent')
+                result = await phantomstrike_ai.execute_approved_scenario(
                     scenario_id, approved
                 )
                 return result
@@ -2546,7 +2639,8 @@ class SOCPlatformAPI:
         async def get_network_topology():
             """Get current network topology"""
             try:
-                result = await self.soc_orchestrator.process_soc_request(
+                soc_orchestrator = await self.components.aget('soc_orchestrator')
+                result = await soc_orchestrator.process_soc_request(
                 "Get current network topology analysis",
                 {'operation_type': 'topology_query'}
                 )
@@ -2585,15 +2679,49 @@ class SOCPlatformAPI:
                 return {"status": "error", "message": str(e), "data": []}
 
         @self.app.get("/api/backend/network-topology")
-        async def get_network_topology():
-            """Get network topology data"""
+        async def get_network_topology(request: Request):
+            """Get network topology data (supports If-None-Match and gzip)"""
             try:
                 from api.api_utils import api_utils
-                return await api_utils.get_network_topology_data()
+                return await api_utils.get_network_topology_response(request)
             except Exception as e:
                 logger.error(f"Network topology error: {e}")
                 return {"status": "error", "message": str(e), "data": []}
-
+        
+        @self.app.get("/api/backend/network-topology/changes")
+        async def get_network_topology_changes(since_version: int = 0):
+            """Get endpoints changed since a network topology snapshot version"""
+            try:
+                from api.api_utils import api_utils
+                return await api_utils.get_network_topology_changes(since_version)
+            except Exception as e:
+                logger.error(f"Network topology changes error: {e}")
+                return {"status": "error", "message": str(e), "changed": [], "removed": []}
+
+        @self.app.get("/api/backend/network-topology/stream")
+        async def stream_network_topology_changes(request: Request):
+            """Push topology changes to the frontend over Server-Sent Events"""
+            from fastapi.responses import StreamingResponse
+            from core.topology.change_bus import get_topology_change_bus
+            
+            # Pull-mode subscription: changes coalesce while the client is slow
+            subscription = get_topology_change_bus().subscribe(name=f"sse-{uuid.uuid4().hex[:8]}", max_pending=500)
+            
+            async def event_stream():
+                try:
+                    while not await request.is_disconnected():
+                        notification = await subscription.get(timeout=15)
+                        if notification:
+                            payload = json.dumps(notification, default=str)
+                            yield f"event: topology_changed\nid: {notification['topology_version']}\ndata: {payload}\n\n"
+                        else:
+                            yield ": keepalive\n\n"
+                finally:
+                    subscription.close()
+            
+            return StreamingResponse(event_stream(), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
         @self.app.get("/api/backend/software-download")
         async def get_software_download():
             """Get software download data"""
@@ -2612,20 +2740,12 @@ class SOCPlatformAPI:
         async def get_client_agents():
             """get list of connected client agents (monitored computers)"""
             try:
-                import sqlite3
                 from datetime import datetime
-                conn = sqlite3.connect('soc_database.db')
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT id, hostname, ip_address, platform, status,
-                            last_heartbeat, created_at
-                    FROM agents
-                    WHERE status = 'active'
-                    ORDER BY last_heartbeat DESC
-                """)
-                rows = cursor.fetchall()
-                conn.close()
+                from core.server.storage.database_manager import DatabaseManager
+                
+                # Served from the in-memory agent state table kept current by heartbeats
+                db_manager = DatabaseManager(db_path='soc_database.db')
+                rows = db_manager.agent_state.get_all(status='active')
 
                 agents = []
                 for row in rows:
@@ -2663,7 +2783,7 @@ class SOCPlatformAPI:
             try:
                 import sqlite3
                 from datetime import datetime
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
 
@@ -2960,11 +3080,11 @@ class SOCPlatformAPI:
                     enable_influxdb=False
                 )
                 
-                # Update agent status and IP address
+                # Update agent status and IP address (buffered, flushed to SQLite in batches)
                 agent_data = {
                     'agent_id': agent_id,
                     'status': 'active',
-                    'last_seen': datetime.now()
+                    'last_heartbeat': datetime.now()
                 }
                 
                 # Update IP address if provided in heartbeat data
@@ -3007,17 +3127,18 @@ class SOCPlatformAPI:
                 return {"status": "error", "message": str(e)}
 
         @self.app.get("/api/agents/{agent_id}/commands")
-        async def get_agent_commands(agent_id: str):
-            """Get pending commands for client agent"""
+        async def get_agent_commands(agent_id: str, wait: int = 0):
+            """Get pending commands for client agent (long-polls for up to `wait` seconds)"""
             try:
-                from core.server.command_queue.command_manager import CommandManager
+                from core.server.command_queue.command_manager import get_command_manager
                 from core.server.storage.database_manager import DatabaseManager
-                # Initialize CommandManager
-                db_manager = DatabaseManager(db_path='soc_database.db')
-                cmd_manager = CommandManager(db_manager)
-                # Get pending commands for this agent
-                commands = await cmd_manager.get_pending_commands(agent_id)
-                logger.info(f"Retrieved {len(commands)} pending commands for {agent_id}")
+                cmd_manager = get_command_manager(DatabaseManager(db_path='soc_database.db'))
+                # Get pending commands for this agent, holding the request open if asked to
+                wait = max(0, min(wait, 60))
+                if wait:
+                    commands = await cmd_manager.wait_for_commands(agent_id, wait)
+                else:
+                    commands = await cmd_manager.get_pending_commands(agent_id)
                 return {
                             "status": "success",
                             "commands": commands,
@@ -3027,11 +3148,31 @@ class SOCPlatformAPI:
                 logger.error(f"Commands error for {agent_id}: {e}")
                 return {"status": "error", "message": str(e), "commands": []}
 
+        @self.app.get("/api/agents/{agent_id}/commands/stream")
+        async def stream_agent_commands(agent_id: str, request: Request):
+            """Push commands to client agent over Server-Sent Events"""
+            from fastapi.responses import StreamingResponse
+            from core.server.command_queue.command_manager import get_command_manager
+            from core.server.storage.database_manager import DatabaseManager
+            cmd_manager = get_command_manager(DatabaseManager(db_path='soc_database.db'))
+            
+            async def event_stream():
+                while not await request.is_disconnected():
+                    commands = await cmd_manager.wait_for_commands(agent_id, 15)
+                    if commands:
+                        payload = json.dumps({"agent_id": agent_id, "commands": commands}, default=str)
+                        yield f"event: commands\ndata: {payload}\n\n"
+                    else:
+                        yield ": keepalive\n\n"
+            
+            return StreamingResponse(event_stream(), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
         @self.app.post("/api/agents/{agent_id}/commands/result")
         async def receive_command_result(agent_id: str, result_data: dict):
             """Receive command execution result from client agent"""
             try:
-                from core.server.command_queue.command_manager import CommandManager
+                from core.server.command_queue.command_manager import get_command_manager
                 from core.server.storage.database_manager import DatabaseManager
                 
                 command_id = result_data.get('command_id')
@@ -3039,9 +3180,7 @@ class SOCPlatformAPI:
                     logger.error(f"Command result missing command_id: {result_data}")
                     return {"status": "error", "message": "Missing command_id"}
                 
-                # Initialize CommandManager
-                db_manager = DatabaseManager(db_path='soc_database.db')
-                cmd_manager = CommandManager(db_manager)
+                cmd_manager = get_command_manager(DatabaseManager(db_path='soc_database.db'))
                 
                 # Enhanced result processing
                 success = result_data.get('success', False)
@@ -3072,6 +3211,10 @@ class SOCPlatformAPI:
                 # Store command result
                 await cmd_manager.receive_command_result(command_id, agent_id, enhanced_result_data)
                 
+                # Fold the outcome into the cached command set it was generated from
+                from agents.attack_agent.command_generation_service import get_command_generation_service
+                await get_command_generation_service().learn_from_execution(command_id, enhanced_result_data)
+                
                 logger.info(f"Command result received from {agent_id}: {command_id} - success: {final_success} (status: {status})")
                 
                 return {
@@ -3124,7 +3267,7 @@ class SOCPlatformAPI:
             """Get AI-generated REAL APT scenarios - NO FALLBACKS"""
             try:
                     # Check if GPT scenario requester is available
-                    if not self.gpt_scenario_requester:
+                    if not await self.components.aget('gpt_scenario_requester'):
                         return {
                             "status": "error",
                             "error": "GPT scenario requester not available - AI service unavailable",
@@ -3543,23 +3686,82 @@ class SOCPlatformAPI:
                 logger.error(f"Enhanced detection report error: {e}")
                 return {'status': 'error', 'message': str(e), 'data': {}}
 
+        async def build_security_posture_report(time_range_hours: int = 24,
+                                                generated_by: str = 'background_refresh'):
+            """Generate security posture report and PDF for the report cache"""
+            from ai_security_posture_report import security_posture_reporter
+            from enhanced_report_generator import EnhancedReportGenerator
+            from pdf_render_service import get_pdf_render_service
+            
+            logger.info(f"🔄 Generating NEW security posture report for {time_range_hours} hours ({generated_by})")
+            
+            # Generate the comprehensive report
+            report = await security_posture_reporter.generate_security_posture_report(time_range_hours)
+            
+            # Format for API
+            formatted_report = security_posture_reporter.format_report_for_api(report)
+            
+            response_data = {
+                'status': 'success',
+                'data': formatted_report['data'],
+                'metadata': {
+                    'reportId': formatted_report['reportId'],
+                    'generatedAt': formatted_report['generatedAt']
+                }
+            }
+            
+            # Enhance with operational details for security professionals
+            enhanced_generator = EnhancedReportGenerator(self.db_manager)
+            enhanced_response = await enhanced_generator.enhance_security_posture(response_data)
+            
+            # Render the professional PDF report in a worker process (reused if the content is unchanged)
+            pdf_job = await get_pdf_render_service().render('security_posture', enhanced_response)
+            pdf_filename = pdf_job['filename']
+            pdf_file_size = f"{pdf_job['file_size'] / 1024 / 1024:.1f} MB"
+            
+            # Add PDF information to the data array
+            enhanced_response['data'].append({
+                "type": "pdf_report",
+                "download_url": f"/api/downloads/{pdf_filename}",
+                "filename": pdf_filename,
+                "generated_at": datetime.utcnow().isoformat(),
+                "file_size": pdf_file_size,
+                "report_type": "security_posture",
+                "enhanced": True,
+                "cached": False,
+                "freshly_generated": not pdf_job['reused'],
+                "pdf_job_id": pdf_job['job_id']
+            })
+            
+            return enhanced_response, {
+                'generated_by': generated_by,
+                'time_range_hours': time_range_hours,
+                'enhanced': True,
+                'pdf_generated': True,
+                'pdf_filename': pdf_filename,
+                'pdf_file_size': pdf_file_size,
+                'pdf_job_id': pdf_job['job_id']
+            }
+        
         @self.app.get("/api/backend/security-posture-report")
         async def get_security_posture_report(time_range_hours: int = 24):
-            """Get cached security posture report (no regeneration - cost saving)"""
+            """Get cached security posture report (stale reports are refreshed in the background)"""
             try:
                 from report_cache_manager import get_report_cache_manager
                 
                 logger.info("Retrieving cached security posture report")
                 
-                # Get cached report
+                # Get cached report, scheduling a background refresh if stale
                 cache_manager = get_report_cache_manager()
-                cached_report = cache_manager.get_cached_report('security_posture')
+                cached_report = await cache_manager.get_report('security_posture')
                 
                 if cached_report:
                     # Return cached report
                     report_data = cached_report['report']
                     report_data['cached'] = True
                     report_data['cached_at'] = cached_report['generated_at']
+                    report_data['stale'] = cached_report['stale']
+                    report_data['refreshing'] = cache_manager.is_refreshing('security_posture')
                     
                     # Add PDF information to data array if it exists
                     if 'pdf_filename' in cached_report.get('metadata', {}):
@@ -3569,7 +3771,7 @@ class SOCPlatformAPI:
                             "download_url": f"/api/downloads/{pdf_filename}",
                             "filename": pdf_filename,
                             "generated_at": cached_report['generated_at'],
-                            "file_size": "2.1 MB",  # This would be calculated from actual file
+                            "file_size": cached_report['metadata'].get('pdf_file_size', '2.1 MB'),
                             "report_type": "security_posture",
                             "enhanced": True,
                             "cached": True,
@@ -3580,11 +3782,12 @@ class SOCPlatformAPI:
                     logger.info(f"Returned cached security posture report from {cached_report['generated_at']}")
                     return report_data
                 else:
-                    # No cached report found - inform user to generate one
+                    # No cached report yet - the first one is being generated in the background
                     logger.warning("No cached security posture report found")
                     return {
                         'status': 'no_cache',
-                        'message': 'No cached report available. Please click "Generate Security Posture Report" button to create a new report.',
+                        'message': 'No cached report available yet. A report is being generated in the background; please check back shortly.',
+                        'refreshing': cache_manager.is_refreshing('security_posture'),
                         'generatedAt': datetime.utcnow().isoformat()
                     }
                 
@@ -3596,65 +3799,21 @@ class SOCPlatformAPI:
         async def generate_security_posture_report(request_data: dict = None):
             """Generate a NEW security posture report (triggered by UI button) - SAVES TO CACHE"""
             try:
-                from ai_security_posture_report import security_posture_reporter
                 from report_cache_manager import get_report_cache_manager
-                from enhanced_report_generator import EnhancedReportGenerator
                 
                 # Extract time_range_hours from request body if provided
                 time_range_hours = 24
                 if request_data:
                     time_range_hours = request_data.get('time_range_hours', 24)
                 
-                logger.info(f"🔄 Generating NEW security posture report for {time_range_hours} hours (POST request from UI)")
-                
-                # Generate the comprehensive report
-                report = await security_posture_reporter.generate_security_posture_report(time_range_hours)
-                
-                # Format for API
-                formatted_report = security_posture_reporter.format_report_for_api(report)
-                
-                response_data = {
-                    'status': 'success',
-                    'data': formatted_report['data'],
-                    'metadata': {
-                        'reportId': formatted_report['reportId'],
-                        'generatedAt': formatted_report['generatedAt']
-                    }
-                }
+                logger.info(f"Security posture report requested for {time_range_hours} hours (POST request from UI)")
                 
-                # Enhance with operational details for security professionals
-                enhanced_generator = EnhancedReportGenerator(self.db_manager)
-                enhanced_response = await enhanced_generator.enhance_security_posture(response_data)
-                
-                # Generate professional PDF report
-                from pdf_report_generator import ProfessionalPDFGenerator
-                pdf_generator = ProfessionalPDFGenerator()
-                pdf_filepath = pdf_generator.generate_security_posture_pdf(enhanced_response)
-                pdf_filename = os.path.basename(pdf_filepath)
-                
-                # Add PDF information to the data array
-                enhanced_response['data'].append({
-                    "type": "pdf_report",
-                    "download_url": f"/api/downloads/{pdf_filename}",
-                    "filename": pdf_filename,
-                    "generated_at": datetime.utcnow().isoformat(),
-                    "file_size": f"{os.path.getsize(pdf_filepath) / 1024 / 1024:.1f} MB",
-                    "report_type": "security_posture",
-                    "enhanced": True,
-                    "cached": False,
-                    "freshly_generated": True
-                })
-                
-                # Save to cache
+                # Concurrent requests share a single regeneration, which also refreshes the cache
                 cache_manager = get_report_cache_manager()
-                cache_manager.save_report('security_posture', enhanced_response, {
-                    'generated_by': 'user_request',
-                    'time_range_hours': time_range_hours,
-                    'request_data': request_data,
-                    'enhanced': True,
-                    'pdf_generated': True,
-                    'pdf_filename': pdf_filename
-                })
+                refreshed = await cache_manager.refresh_report(
+                    'security_posture', time_range_hours=time_range_hours, generated_by='user_request'
+                )
+                pdf_filename = refreshed['metadata']['pdf_filename']
                 
                 logger.info("Enhanced security posture report and PDF generated successfully")
                 
@@ -3667,13 +3826,14 @@ class SOCPlatformAPI:
                             'message': 'Security posture report generated successfully',
                             'download_url': f'/api/downloads/{pdf_filename}',
                             'filename': pdf_filename,
-                            'file_size': f"{os.path.getsize(pdf_filepath) / 1024 / 1024:.1f} MB",
+                            'file_size': refreshed['metadata']['pdf_file_size'],
                             'generated_at': datetime.utcnow().isoformat(),
                             'report_type': 'security_posture',
-                            'time_range_hours': time_range_hours,
+                            'time_range_hours': refreshed['metadata']['time_range_hours'],
                             'enhanced': True,
                             'cached': False,
-                            'freshly_generated': True
+                            'freshly_generated': True,
+                            'pdf_job_id': refreshed['metadata'].get('pdf_job_id')
                         }
                     ],
                     'metadata': {
@@ -3720,23 +3880,68 @@ class SOCPlatformAPI:
                 logger.error(f"Detection stats error: {e}", exc_info=True)
                 return {'status': 'error', 'message': str(e)}
 
+        async def build_compliance_dashboard(generated_by: str = 'background_refresh'):
+            """Generate compliance dashboard and PDF for the report cache"""
+            from ai_compliance_dashboard import compliance_dashboard
+            from enhanced_report_generator import EnhancedReportGenerator
+            from pdf_render_service import get_pdf_render_service
+            
+            logger.info(f"🔄 Generating NEW compliance dashboard ({generated_by})")
+            
+            # Generate the comprehensive compliance dashboard
+            dashboard = await compliance_dashboard.generate_compliance_dashboard()
+            
+            # Enhance with detailed control analysis for security professionals
+            enhanced_generator = EnhancedReportGenerator(self.db_manager)
+            enhanced_dashboard = await enhanced_generator.enhance_compliance_dashboard(dashboard)
+            
+            # Render the professional PDF report in a worker process (reused if the content is unchanged)
+            pdf_job = await get_pdf_render_service().render('compliance_dashboard', enhanced_dashboard)
+            pdf_filename = pdf_job['filename']
+            pdf_file_size = f"{pdf_job['file_size'] / 1024 / 1024:.1f} MB"
+            
+            # Add PDF information to the data array
+            enhanced_dashboard['data'].append({
+                "type": "pdf_report",
+                "download_url": f"/api/downloads/{pdf_filename}",
+                "filename": pdf_filename,
+                "generated_at": datetime.utcnow().isoformat(),
+                "file_size": pdf_file_size,
+                "report_type": "compliance_dashboard",
+                "enhanced": True,
+                "cached": False,
+                "freshly_generated": not pdf_job['reused'],
+                "pdf_job_id": pdf_job['job_id']
+            })
+            
+            return enhanced_dashboard, {
+                'generated_by': generated_by,
+                'enhanced': True,
+                'pdf_generated': True,
+                'pdf_filename': pdf_filename,
+                'pdf_file_size': pdf_file_size,
+                'pdf_job_id': pdf_job['job_id']
+            }
+        
         @self.app.get("/api/backend/compliance-dashboard")
         async def get_compliance_dashboard():
-            """Get cached compliance dashboard (no regeneration - cost saving)"""
+            """Get cached compliance dashboard (stale reports are refreshed in the background)"""
             try:
                 from report_cache_manager import get_report_cache_manager
                 
                 logger.info("Retrieving cached compliance dashboard")
                 
-                # Get cached report
+                # Get cached report, scheduling a background refresh if stale
                 cache_manager = get_report_cache_manager()
-                cached_report = cache_manager.get_cached_report('compliance_dashboard')
+                cached_report = await cache_manager.get_report('compliance_dashboard')
                 
                 if cached_report:
                     # Return cached report
                     report_data = cached_report['report']
                     report_data['cached'] = True
                     report_data['cached_at'] = cached_report['generated_at']
+                    report_data['stale'] = cached_report['stale']
+                    report_data['refreshing'] = cache_manager.is_refreshing('compliance_dashboard')
                     
                     # Add PDF information to data array if it exists
                     if 'pdf_filename' in cached_report.get('metadata', {}):
@@ -3746,7 +3951,7 @@ class SOCPlatformAPI:
                             "download_url": f"/api/downloads/{pdf_filename}",
                             "filename": pdf_filename,
                             "generated_at": cached_report['generated_at'],
-                            "file_size": "1.8 MB",  # This would be calculated from actual file
+                            "file_size": cached_report['metadata'].get('pdf_file_size', '1.8 MB'),
                             "report_type": "compliance_dashboard",
                             "enhanced": True,
                             "cached": True,
@@ -3757,11 +3962,12 @@ class SOCPlatformAPI:
                     logger.info(f"Returned cached compliance dashboard from {cached_report['generated_at']}")
                     return report_data
                 else:
-                    # No cached report found - inform user to generate one
+                    # No cached report yet - the first one is being generated in the background
                     logger.warning("No cached compliance dashboard found")
                     return {
                         'status': 'no_cache',
-                        'message': 'No cached report available. Please click "Generate Compliance Dashboard" button to create a new report.',
+                        'message': 'No cached report available yet. A report is being generated in the background; please check back shortly.',
+                        'refreshing': cache_manager.is_refreshing('compliance_dashboard'),
                         'generatedAt': datetime.utcnow().isoformat()
                     }
                 
@@ -3777,47 +3983,14 @@ class SOCPlatformAPI:
         async def generate_compliance_dashboard(request_data: dict = None):
             """Generate a NEW compliance dashboard (triggered by UI button) - SAVES TO CACHE"""
             try:
-                from ai_compliance_dashboard import compliance_dashboard
                 from report_cache_manager import get_report_cache_manager
-                from enhanced_report_generator import EnhancedReportGenerator
-                
-                logger.info("🔄 Generating NEW compliance dashboard (POST request from UI)")
-                
-                # Generate the comprehensive compliance dashboard
-                dashboard = await compliance_dashboard.generate_compliance_dashboard()
-                
-                # Enhance with detailed control analysis for security professionals
-                enhanced_generator = EnhancedReportGenerator(self.db_manager)
-                enhanced_dashboard = await enhanced_generator.enhance_compliance_dashboard(dashboard)
-                
-                # Generate professional PDF report
-                from pdf_report_generator import ProfessionalPDFGenerator
-                pdf_generator = ProfessionalPDFGenerator()
-                pdf_filepath = pdf_generator.generate_compliance_dashboard_pdf(enhanced_dashboard)
-                pdf_filename = os.path.basename(pdf_filepath)
-                
-                # Add PDF information to the data array
-                enhanced_dashboard['data'].append({
-                    "type": "pdf_report",
-                    "download_url": f"/api/downloads/{pdf_filename}",
-                    "filename": pdf_filename,
-                    "generated_at": datetime.utcnow().isoformat(),
-                    "file_size": f"{os.path.getsize(pdf_filepath) / 1024 / 1024:.1f} MB",
-                    "report_type": "compliance_dashboard",
-                    "enhanced": True,
-                    "cached": False,
-                    "freshly_generated": True
-                })
-                
-                # Save to cache
+                
+                logger.info("Compliance dashboard requested (POST request from UI)")
+                
+                # Concurrent requests share a single regeneration, which also refreshes the cache
                 cache_manager = get_report_cache_manager()
-                cache_manager.save_report('compliance_dashboard', enhanced_dashboard, {
-                    'generated_by': 'user_request',
-                    'request_data': request_data,
-                    'enhanced': True,
-                    'pdf_generated': True,
-                    'pdf_filename': pdf_filename
-                })
+                refreshed = await cache_manager.refresh_report('compliance_dashboard', generated_by='user_request')
+                pdf_filename = refreshed['metadata']['pdf_filename']
                 
                 logger.info("Enhanced compliance dashboard and PDF generated successfully")
                 
@@ -3830,12 +4003,13 @@ class SOCPlatformAPI:
                             'message': 'Compliance dashboard report generated successfully',
                             'download_url': f'/api/downloads/{pdf_filename}',
                             'filename': pdf_filename,
-                            'file_size': f"{os.path.getsize(pdf_filepath) / 1024 / 1024:.1f} MB",
+                            'file_size': refreshed['metadata']['pdf_file_size'],
                             'generated_at': datetime.utcnow().isoformat(),
                             'report_type': 'compliance_dashboard',
                             'enhanced': True,
                             'cached': False,
-                            'freshly_generated': True
+                            'freshly_generated': True,
+                            'pdf_job_id': refreshed['metadata'].get('pdf_job_id')
                         }
                     ],
                     'metadata': {
@@ -3854,23 +4028,68 @@ class SOCPlatformAPI:
                     'generatedAt': datetime.utcnow().isoformat()
                 }
 
+        async def build_risk_assessment(generated_by: str = 'background_refresh'):
+            """Generate risk assessment and PDF for the report cache"""
+            from ai_risk_assessment import risk_assessment
+            from enhanced_report_generator import EnhancedReportGenerator
+            from pdf_render_service import get_pdf_render_service
+            
+            logger.info(f"🔄 Generating NEW risk assessment ({generated_by})")
+            
+            # Generate the comprehensive risk assessment
+            assessment = await risk_assessment.generate_risk_assessment()
+            
+            # Enhance with technical details for security professionals
+            enhanced_generator = EnhancedReportGenerator(self.db_manager)
+            enhanced_assessment = await enhanced_generator.enhance_risk_assessment(assessment)
+            
+            # Render the professional PDF report in a worker process (reused if the content is unchanged)
+            pdf_job = await get_pdf_render_service().render('risk_assessment', enhanced_assessment)
+            pdf_filename = pdf_job['filename']
+            pdf_file_size = f"{pdf_job['file_size'] / 1024 / 1024:.1f} MB"
+            
+            # Add PDF information to the data array
+            enhanced_assessment['data'].append({
+                "type": "pdf_report",
+                "download_url": f"/api/downloads/{pdf_filename}",
+                "filename": pdf_filename,
+                "generated_at": datetime.utcnow().isoformat(),
+                "file_size": pdf_file_size,
+                "report_type": "risk_assessment",
+                "enhanced": True,
+                "cached": False,
+                "freshly_generated": not pdf_job['reused'],
+                "pdf_job_id": pdf_job['job_id']
+            })
+            
+            return enhanced_assessment, {
+                'generated_by': generated_by,
+                'enhanced': True,
+                'pdf_generated': True,
+                'pdf_filename': pdf_filename,
+                'pdf_file_size': pdf_file_size,
+                'pdf_job_id': pdf_job['job_id']
+            }
+        
         @self.app.get("/api/backend/risk-assessment")
         async def get_risk_assessment():
-            """Get cached risk assessment (no regeneration - cost saving)"""
+            """Get cached risk assessment (stale reports are refreshed in the background)"""
             try:
                 from report_cache_manager import get_report_cache_manager
                 
                 logger.info("Retrieving cached risk assessment")
                 
-                # Get cached report
+                # Get cached report, scheduling a background refresh if stale
                 cache_manager = get_report_cache_manager()
-                cached_report = cache_manager.get_cached_report('risk_assessment')
+                cached_report = await cache_manager.get_report('risk_assessment')
                 
                 if cached_report:
                     # Return cached report
                     report_data = cached_report['report']
                     report_data['cached'] = True
                     report_data['cached_at'] = cached_report['generated_at']
+                    report_data['stale'] = cached_report['stale']
+                    report_data['refreshing'] = cache_manager.is_refreshing('risk_assessment')
                     
                     # Add PDF information to data array if it exists
                     if 'pdf_filename' in cached_report.get('metadata', {}):
@@ -3880,7 +4099,7 @@ class SOCPlatformAPI:
                             "download_url": f"/api/downloads/{pdf_filename}",
                             "filename": pdf_filename,
                             "generated_at": cached_report['generated_at'],
-                            "file_size": "2.3 MB",  # This would be calculated from actual file
+                            "file_size": cached_report['metadata'].get('pdf_file_size', '2.3 MB'),
                             "report_type": "risk_assessment",
                             "enhanced": True,
                             "cached": True,
@@ -3891,11 +4110,12 @@ class SOCPlatformAPI:
                     logger.info(f"Returned cached risk assessment from {cached_report['generated_at']}")
                     return report_data
                 else:
-                    # No cached report found - inform user to generate one
+                    # No cached report yet - the first one is being generated in the background
                     logger.warning("No cached risk assessment found")
                     return {
                         'status': 'no_cache',
-                        'message': 'No cached report available. Please click "Generate Risk Assessment" button to create a new report.',
+                        'message': 'No cached report available yet. A report is being generated in the background; please check back shortly.',
+                        'refreshing': cache_manager.is_refreshing('risk_assessment'),
                         'generatedAt': datetime.utcnow().isoformat()
                     }
                 
@@ -3909,49 +4129,16 @@ class SOCPlatformAPI:
 
         @self.app.post("/api/backend/risk-assessment")
         async def generate_risk_assessment(request_data: dict = None):
-            """Generate a NEW risk assessment report (triggered by UI button) - SAVES TO CACHE"""
+            """Generate a NEW risk assessment (triggered by UI button) - SAVES TO CACHE"""
             try:
-                from ai_risk_assessment import risk_assessment
                 from report_cache_manager import get_report_cache_manager
-                from enhanced_report_generator import EnhancedReportGenerator
-                
-                logger.info("🔄 Generating NEW risk assessment (POST request from UI)")
-                
-                # Generate the comprehensive risk assessment
-                assessment = await risk_assessment.generate_risk_assessment()
-                
-                # Enhance with technical details for security professionals
-                enhanced_generator = EnhancedReportGenerator(self.db_manager)
-                enhanced_assessment = await enhanced_generator.enhance_risk_assessment(assessment)
-                
-                # Generate professional PDF report
-                from pdf_report_generator import ProfessionalPDFGenerator
-                pdf_generator = ProfessionalPDFGenerator()
-                pdf_filepath = pdf_generator.generate_risk_assessment_pdf(enhanced_assessment)
-                pdf_filename = os.path.basename(pdf_filepath)
-                
-                # Add PDF information to the data array
-                enhanced_assessment['data'].append({
-                    "type": "pdf_report",
-                    "download_url": f"/api/downloads/{pdf_filename}",
-                    "filename": pdf_filename,
-                    "generated_at": datetime.utcnow().isoformat(),
-                    "file_size": f"{os.path.getsize(pdf_filepath) / 1024 / 1024:.1f} MB",
-                    "report_type": "risk_assessment",
-                    "enhanced": True,
-                    "cached": False,
-                    "freshly_generated": True
-                })
-                
-                # Save to cache
+                
+                logger.info("Risk assessment requested (POST request from UI)")
+                
+                # Concurrent requests share a single regeneration, which also refreshes the cache
                 cache_manager = get_report_cache_manager()
-                cache_manager.save_report('risk_assessment', enhanced_assessment, {
-                    'generated_by': 'user_request',
-                    'request_data': request_data,
-                    'enhanced': True,
-                    'pdf_generated': True,
-                    'pdf_filename': pdf_filename
-                })
+                refreshed = await cache_manager.refresh_report('risk_assessment', generated_by='user_request')
+                pdf_filename = refreshed['metadata']['pdf_filename']
                 
                 logger.info("Enhanced risk assessment and PDF generated successfully")
                 
@@ -3964,12 +4151,13 @@ class SOCPlatformAPI:
                             'message': 'Risk assessment report generated successfully',
                             'download_url': f'/api/downloads/{pdf_filename}',
                             'filename': pdf_filename,
-                            'file_size': f"{os.path.getsize(pdf_filepath) / 1024 / 1024:.1f} MB",
+                            'file_size': refreshed['metadata']['pdf_file_size'],
                             'generated_at': datetime.utcnow().isoformat(),
                             'report_type': 'risk_assessment',
                             'enhanced': True,
                             'cached': False,
-                            'freshly_generated': True
+                            'freshly_generated': True,
+                            'pdf_job_id': refreshed['metadata'].get('pdf_job_id')
                         }
                     ],
                     'metadata': {
@@ -3987,6 +4175,13 @@ class SOCPlatformAPI:
                     'message': str(e),
                     'generatedAt': datetime.utcnow().isoformat()
                 }
+        
+        # Register report generators so stale cached reports refresh in the background
+        from report_cache_manager import get_report_cache_manager
+        report_cache = get_report_cache_manager()
+        report_cache.register_generator('security_posture', build_security_posture_report)
+        report_cache.register_generator('compliance_dashboard', build_compliance_dashboard)
+        report_cache.register_generator('risk_assessment', build_risk_assessment)
 
                 # Add attack agents API
         @self.app.get("/api/backend/attack-agents")
@@ -4134,23 +4329,9 @@ class SOCPlatformAPI:
     async def _store_detection_result(self, detection_payload: Dict[str, Any]) -> str:
         """Store detection result in database and return detection_id"""
         try:
-            import sqlite3
             import uuid
-            conn = sqlite3.connect('soc_database.db')
-            # Create detection_results table if not exists
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS detection_results (
-                    id TEXT PRIMARY KEY,
-                    log_entry_id TEXT,
-                    threat_detected INTEGER,
-                    confidence_score REAL,
-                    threat_type TEXT,
-                    severity TEXT,
-                    ml_results TEXT,
-                    ai_analysis TEXT,
-                    detected_at TEXT
-                )
-            """)
+            from report_cache_manager import notify_data_change
+            conn = get_db_connection('soc_database.db')
             # Insert detection result
             detection_id = str(uuid.uuid4())
             conn.execute("""
@@ -4177,6 +4358,15 @@ class SOCPlatformAPI:
             
             conn.commit()
             conn.close()
+            notify_data_change('detections')
+            detection_events.publish(
+                detection_id,
+                detection_payload['agent_id'],
+                threat_type=detection_payload['threat_type'],
+                severity=detection_payload['severity'],
+                detected_at=detection_payload['detected_at'],
+                log_entry_id=detection_payload['log_entry_id']
+            )
             logger.info(f"Detection result stored: {detection_id}")
             return detection_id
         except Exception as e:
@@ -4188,12 +4378,13 @@ class SOCPlatformAPI:
         try:
             logger.info(f"Starting AI threat analysis for log: {log_entry.get('message', 'No message')[:50]}...")
             
-            if not getattr(self, 'detection_agent', None):
+            detection_agent = await self.components.aget('detection_agent')
+            if not detection_agent:
                 logger.warning("Detection agent not initialized; skipping dynamic analysis")
                 return
 
             logger.info("Detection agent found, calling analyze_threat...")
-            result = await self.detection_agent.analyze_threat(
+            result = await detection_agent.analyze_threat(
                 detection_data=log_entry,
                 context={"source": "log_ingest"}
             )
@@ -4352,7 +4543,7 @@ class SOCPlatformAPI:
         try:
             import re
             import uuid
-            import sqlite3
+            from report_cache_manager import notify_data_change
             message = log_entry.get('message', '').lower()
             source = log_entry.get('source', '').lower()
             level = log_entry.get('level', '').lower()
@@ -4395,7 +4586,7 @@ class SOCPlatformAPI:
             # Store detection result immediately
             if log_id:
                 detection_id = str(uuid.uuid4())
-                conn = sqlite3.connect('soc_database.db')
+                conn = get_db_connection('soc_database.db')
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -4421,6 +4612,10 @@ class SOCPlatformAPI:
                 
                 conn.commit()
                 conn.close()
+                notify_data_change('detections')
+                if threat_detected:
+                    detection_events.publish(detection_id, agent_id, threat_type=threat_type, severity=severity,
+                                             log_entry_id=log_id)
             return {
                 "threat_detected": threat_detected,
                 "threat_score": threat_score,
@@ -4759,11 +4954,10 @@ class SOCPlatformAPI:
             """Get a specific GPT interaction by ID"""
             try:
                 from core.server.storage.database_manager import DatabaseManager
-                import sqlite3
                 
                 db_manager = DatabaseManager(db_path="soc_database.db")
                 
-                conn = sqlite3.connect(db_manager.db_path)
+                conn = get_db_connection(db_manager.db_path)
                 cursor = conn.cursor()
                 
                 cursor.execute("SELECT * FROM gpt_interactions WHERE id = ?", (interaction_id,))
@@ -4926,7 +5120,8 @@ class SOCPlatformAPI:
             }
             
             # Use GPT to customize the scenario for this specific network
-            if self.gpt_scenario_requester:
+            gpt_scenario_requester = await self.components.aget('gpt_scenario_requester')
+            if gpt_scenario_requester:
                 try:
                     # Create a customization request
                     customization_request = f"""
@@ -4944,7 +5139,7 @@ class SOCPlatformAPI:
                     """
                     
                     # Generate customized scenario using GPT
-                    customized = await self.gpt_scenario_requester.request_custom_scenario(
+                    customized = await gpt_scenario_requester.request_custom_scenario(
                         user_request=customization_request,
                         network_context=network_context,
                         constraints={
@@ -4984,29 +5179,59 @@ class SOCPlatformAPI:
     def _add_pdf_download_endpoints(self):
         """Add PDF download endpoints"""
         
+        @self.app.get("/api/downloads/jobs/{job_id}")
+        async def get_pdf_job(job_id: str):
+            """Get the status of a PDF render job"""
+            from pdf_render_service import get_pdf_render_service
+            
+            job = get_pdf_render_service().get_job(job_id)
+            if job is None:
+                return {"error": "Job not found"}
+            return job
+        
         @self.app.get("/api/downloads/{filename}")
-        async def download_pdf(filename: str):
-            """Download generated PDF report"""
+        async def download_pdf(filename: str, request: Request):
+            """Download generated PDF report (supports HTTP Range requests)"""
             try:
-                import os
-                from fastapi.responses import FileResponse
+                from fastapi.responses import Response, StreamingResponse
+                from pdf_render_service import get_pdf_render_service, iter_file_range, parse_range_header
                 
-                # Security check - only allow PDF files
-                if not filename.endswith('.pdf'):
+                # Security check - only allow PDF files in the downloads directory
+                if not filename.endswith('.pdf') or os.path.basename(filename) != filename:
                     return {"error": "Invalid file type"}
                 
                 # Construct file path
-                file_path = os.path.join("server", "downloads", filename)
+                file_path = os.path.join(get_pdf_render_service().output_dir, filename)
                 
                 # Check if file exists
                 if not os.path.exists(file_path):
                     return {"error": "File not found"}
                 
-                # Return file for download
-                return FileResponse(
-                    path=file_path,
-                    filename=filename,
-                    media_type='application/pdf'
+                file_size = os.path.getsize(file_path)
+                headers = {
+                    "Accept-Ranges": "bytes",
+                    "Content-Disposition": f'attachment; filename="{filename}"'
+                }
+                
+                try:
+                    byte_range = parse_range_header(request.headers.get("range"), file_size)
+                except ValueError:
+                    return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+                
+                if byte_range is None:
+                    start, end, status_code = 0, file_size - 1, 200
+                else:
+                    start, end = byte_range
+                    status_code = 206
+                    headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+                headers["Content-Length"] = str(end - start + 1)
+                
+                # Stream the file in chunks instead of loading it into memory
+                return StreamingResponse(
+                    iter_file_range(file_path, start, end),
+                    status_code=status_code,
+                    media_type='application/pdf',
+                    headers=headers
                 )
                 
             except Exception as e:
@@ -5017,38 +5242,39 @@ class SOCPlatformAPI:
         async def list_available_pdfs():
             """List all available PDF reports"""
             try:
-                import os
-                import glob
-                
-                downloads_dir = "server/downloads"
-                if not os.path.exists(downloads_dir):
-                    return {"pdfs": []}
+                from pdf_render_service import get_pdf_render_service
                 
-                # Get all PDF files
-                pdf_files = glob.glob(os.path.join(downloads_dir, "*.pdf"))
+                pdf_service = get_pdf_render_service()
                 
                 pdf_list = []
-                for pdf_file in pdf_files:
-                    filename = os.path.basename(pdf_file)
-                    file_size = os.path.getsize(pdf_file)
-                    modified_time = os.path.getmtime(pdf_file)
-                    
+                for pdf in pdf_service.list_pdfs():
                     pdf_list.append({
-                        "filename": filename,
-                        "download_url": f"/api/downloads/{filename}",
-                        "file_size_mb": round(file_size / 1024 / 1024, 2),
-                        "modified_at": datetime.fromtimestamp(modified_time).isoformat()
+                        "filename": pdf['filename'],
+                        "download_url": f"/api/downloads/{pdf['filename']}",
+                        "file_size_mb": round(pdf['size'] / 1024 / 1024, 2),
+                        "modified_at": datetime.fromtimestamp(pdf['mtime']).isoformat()
                     })
                 
-                # Sort by modification time (newest first)
-                pdf_list.sort(key=lambda x: x["modified_at"], reverse=True)
-                
-                return {"pdfs": pdf_list}
+                return {"pdfs": pdf_list, "statistics": pdf_service.get_statistics()}
                 
             except Exception as e:
                 logger.error(f"PDF listing error: {e}")
                 return {"error": "Failed to list PDFs"}
         
+        @self.app.on_event("startup")
+        async def collect_old_pdfs():
+            from pdf_render_service import get_pdf_render_service
+            
+            # Trim downloads left over from earlier runs without delaying startup
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, get_pdf_render_service().collect_garbage)
+        
+        @self.app.on_event("shutdown")
+        async def stop_pdf_workers():
+            from pdf_render_service import get_pdf_render_service
+            
+            get_pdf_render_service().shutdown()
+        
         logger.info("PDF download endpoints added successfully")
     
     def get_app(self) -> FastAPI:
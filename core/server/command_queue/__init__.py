@@ -3,10 +3,16 @@ Command queue management package
 """
 
 from .command_manager import CommandManager, CommandStatus, CommandPriority, get_command_manager
+from .command_dispatcher import CommandDispatcher, get_command_dispatcher
+from .command_scheduler import CommandScheduler, TimerWheel
 
 __all__ = [
     'CommandManager',
     'CommandStatus', 
     'CommandPriority',
-    'get_command_manager'
+    'get_command_manager',
+    'CommandDispatcher',
+    'get_command_dispatcher',
+    'CommandScheduler',
+    'TimerWheel'
 ]
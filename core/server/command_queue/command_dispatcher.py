@@ -0,0 +1,547 @@
+"""
+Command Dispatch System
+Delivers queued commands to client agents from an in-memory pending index
+
+Which commands an agent receives, and how many it may have in flight, is
+decided by the CommandScheduler; a maintenance task advances its timeout
+wheel, retries or times out unanswered commands and prunes old rows.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from shared.database import get_db_connection
+from .command_scheduler import CommandScheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+# Statuses that end a command's life (eligible for cleanup)
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled', 'timeout')
+
+
+class CommandDispatcher:
+    """Per-agent pending command index with long-poll delivery and SQLite write-through"""
+    
+    def __init__(self, db_path: str, resync_interval: float = 60.0, cleanup_interval: float = 3600.0,
+                 retention_hours: int = 24):
+        self.db_path = db_path
+        self.resync_interval = resync_interval
+        self.cleanup_interval = cleanup_interval
+        self.retention_hours = retention_hours
+        
+        # Selection policy, concurrency limits, timeouts and retries
+        self.scheduler = CommandScheduler()
+        
+        # agent_id -> command_id -> command
+        self.pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        
+        # agent_id -> event set whenever a command is added for the agent
+        self._events: Dict[str, asyncio.Event] = {}
+        
+        # Commands handed out recently, so a concurrent resync cannot re-add them
+        self._recently_delivered: Dict[str, float] = {}
+        
+        # Called with the id of each command that timed out for good (no retries left)
+        self.timeout_listeners: List[Callable[[str], None]] = []
+        
+        self._loaded = False
+        self._resync_task: Optional[asyncio.Task] = None
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._last_cleanup = time.monotonic()
+        
+        # Statistics
+        self.stats = {
+            'commands_indexed': 0,
+            'commands_delivered': 0,
+            'long_polls': 0,
+            'long_poll_timeouts': 0,
+            'resyncs': 0,
+            'commands_timed_out': 0,
+            'commands_retried': 0,
+            'commands_recovered': 0,
+            'cleanups': 0
+        }
+    
+    def _event_for(self, agent_id: str) -> asyncio.Event:
+        """Get or create the wake-up event for an agent"""
+        event = self._events.get(agent_id)
+        if event is None:
+            event = asyncio.Event()
+            self._events[agent_id] = event
+        return event
+    
+    def _read_queued_commands(self) -> List[Dict[str, Any]]:
+        """Read all queued commands from SQLite (runs in a worker thread)"""
+        conn = get_db_connection(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, agent_id, scenario_id, technique, command_data, parameters, priority,
+                       created_at, timeout_at, retry_count, max_retries
+                FROM commands
+                WHERE status = 'queued'
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def _read_in_flight_commands(self) -> List[Dict[str, Any]]:
+        """Read commands sent before this process started (runs in a worker thread)"""
+        conn = get_db_connection(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, agent_id, scenario_id, technique, command_data, parameters, priority,
+                       created_at, timeout_at, retry_count, max_retries
+                FROM commands
+                WHERE status IN ('sent', 'executing')
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _command_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': row['id'],
+            'scenario_id': row['scenario_id'],
+            'technique': row['technique'],
+            'command_data': json.loads(row['command_data']) if row['command_data'] else {},
+            'parameters': json.loads(row['parameters']) if row['parameters'] else {},
+            'priority': row['priority'],
+            'created_at': row['created_at'],
+            'timeout_at': row['timeout_at'],
+            'retry_count': row['retry_count'] or 0,
+            'max_retries': row['max_retries']
+        }
+    
+    async def _resync(self) -> None:
+        """Index queued commands written to SQLite outside this dispatcher"""
+        try:
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(None, self._read_queued_commands)
+            
+            cutoff = time.monotonic() - 2 * self.resync_interval
+            self._recently_delivered = {
+                command_id: delivered_at
+                for command_id, delivered_at in self._recently_delivered.items()
+                if delivered_at >= cutoff
+            }
+            
+            added = 0
+            for row in rows:
+                agent_commands = self.pending.get(row['agent_id'], {})
+                if row['id'] in agent_commands or row['id'] in self._recently_delivered:
+                    continue
+                
+                try:
+                    command = self._command_from_row(row)
+                except Exception as e:
+                    logger.error(f"Failed to index command {row['id']}: {e}")
+                    continue
+                
+                self.add_command(row['agent_id'], command)
+                added += 1
+            
+            self.stats['resyncs'] += 1
+            if added:
+                logger.info(f"Command dispatcher indexed {added} queued commands from database")
+        
+        except Exception as e:
+            logger.error(f"Command dispatcher resync failed: {e}")
+    
+    async def _resync_loop(self) -> None:
+        """Periodically pick up commands queued by other writers"""
+        while True:
+            try:
+                await asyncio.sleep(self.resync_interval)
+                await self._resync()
+            except asyncio.CancelledError:
+                break
+    
+    async def _recover_in_flight(self) -> None:
+        """
+        Put commands that were sent before a restart back under timeout tracking
+        
+        Without this, commands whose agent never answered would stay in
+        'sent'/'executing' forever.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(None, self._read_in_flight_commands)
+            
+            now = time.monotonic()
+            utc_now = datetime.utcnow()
+            for row in rows:
+                try:
+                    command = self._command_from_row(row)
+                    remaining = self.scheduler.command_timeout
+                    if row['timeout_at']:
+                        remaining = (datetime.fromisoformat(str(row['timeout_at'])) - utc_now).total_seconds()
+                except Exception as e:
+                    logger.error(f"Failed to recover in-flight command {row['id']}: {e}")
+                    continue
+                
+                self.scheduler.track(row['agent_id'], command, now, now + max(remaining, 0.0))
+            
+            self.stats['commands_recovered'] += len(rows)
+            if rows:
+                logger.info(f"Command dispatcher recovered {len(rows)} in-flight commands from database")
+        
+        except Exception as e:
+            logger.error(f"Command dispatcher in-flight recovery failed: {e}")
+    
+    async def _ensure_started(self) -> None:
+        """Load queued and in-flight commands and start the background tasks on first use"""
+        if not self._loaded:
+            self._loaded = True
+            await self._resync()
+            await self._recover_in_flight()
+        
+        loop = asyncio.get_running_loop()
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = loop.create_task(self._resync_loop())
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = loop.create_task(self._maintenance_loop())
+    
+    async def _maintenance_loop(self) -> None:
+        """Advance the timeout wheel every tick and prune old commands periodically"""
+        while True:
+            try:
+                await asyncio.sleep(self.scheduler.timers.tick_seconds)
+                
+                expired = self.scheduler.advance()
+                if expired['timeout']:
+                    await self._expire_commands(expired['timeout'])
+                for command_id in expired['retry']:
+                    self._wake_owner(command_id)
+                
+                if time.monotonic() - self._last_cleanup >= self.cleanup_interval:
+                    self._last_cleanup = time.monotonic()
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, self.delete_old_commands, self.retention_hours)
+            
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Command dispatcher maintenance failed: {e}")
+    
+    async def _expire_commands(self, command_ids: List[str]) -> None:
+        """Retry or time out commands whose agent did not answer in time"""
+        records = [record for record in map(self.scheduler.release, command_ids) if record is not None]
+        if not records:
+            return
+        
+        retries = [record for record in records if self.scheduler.should_retry(record)]
+        timeouts = [record for record in records if not self.scheduler.should_retry(record)]
+        
+        loop = asyncio.get_running_loop()
+        transitioned = await loop.run_in_executor(
+            None, self._write_expirations,
+            [record.command_id for record in retries], [record.command_id for record in timeouts]
+        )
+        
+        now = time.monotonic()
+        for record in retries:
+            if record.command_id not in transitioned:
+                continue
+            command = record.command
+            command['retry_count'] = int(command.get('retry_count') or 0) + 1
+            command['not_before'] = now + self.scheduler.retry_delay(record)
+            command['queued_at'] = command['not_before']
+            self.pending.setdefault(record.agent_id, {})[record.command_id] = command
+            self.scheduler.schedule_wakeup(record.command_id, command['not_before'])
+            self.scheduler.stats['retries'] += 1
+            self.stats['commands_retried'] += 1
+        
+        timed_out = [record for record in timeouts if record.command_id in transitioned]
+        self.scheduler.stats['timeouts'] += len(timed_out)
+        self.stats['commands_timed_out'] += len(timed_out)
+        for record in timed_out:
+            for listener in self.timeout_listeners:
+                try:
+                    listener(record.command_id)
+                except Exception as e:
+                    logger.error(f"Command timeout listener failed: {e}")
+        
+        if transitioned:
+            logger.warning(f"Commands unanswered past their timeout: {len(transitioned)} "
+                           f"({len(transitioned) - len(timed_out)} requeued for retry, {len(timed_out)} timed out)")
+        
+        # Freed slots may let waiting agents receive more commands
+        for agent_id in {record.agent_id for record in records}:
+            self._wake(agent_id)
+    
+    def _write_expirations(self, retry_ids: List[str], timeout_ids: List[str]) -> set:
+        """Requeue or time out unanswered commands, skipping ones that finished meanwhile"""
+        transitioned = set()
+        conn = get_db_connection(self.db_path)
+        try:
+            with conn:
+                cursor = conn.cursor()
+                for command_id in retry_ids:
+                    cursor.execute('''
+                        UPDATE commands
+                        SET status = 'queued', sent_at = NULL, retry_count = COALESCE(retry_count, 0) + 1
+                        WHERE id = ? AND status IN ('sent', 'executing')
+                    ''', (command_id,))
+                    if cursor.rowcount:
+                        transitioned.add(command_id)
+                
+                completed_at = datetime.utcnow().isoformat()
+                for command_id in timeout_ids:
+                    cursor.execute('''
+                        UPDATE commands
+                        SET status = 'timeout', completed_at = ?
+                        WHERE id = ? AND status IN ('sent', 'executing')
+                    ''', (completed_at, command_id))
+                    if cursor.rowcount:
+                        transitioned.add(command_id)
+        finally:
+            conn.close()
+        return transitioned
+    
+    def delete_old_commands(self, max_age_hours: int) -> Dict[str, int]:
+        """Delete finished commands and results older than the retention window (blocking)"""
+        # Compare in SQLite's CURRENT_TIMESTAMP format, which the created_at defaults use
+        cutoff = (datetime.utcnow() - timedelta(hours=max_age_hours)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        conn = get_db_connection(self.db_path)
+        try:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    DELETE FROM commands
+                    WHERE status IN ({', '.join('?' for _ in TERMINAL_STATUSES)}) AND created_at < ?
+                ''', (*TERMINAL_STATUSES, cutoff))
+                deleted_commands = cursor.rowcount
+                
+                cursor.execute('DELETE FROM command_results WHERE received_at < ?', (cutoff,))
+                deleted_results = cursor.rowcount
+        finally:
+            conn.close()
+        
+        self.stats['cleanups'] += 1
+        if deleted_commands or deleted_results:
+            logger.info(f"Command cleanup: {deleted_commands} commands, {deleted_results} results")
+        return {'deleted_commands': deleted_commands, 'deleted_results': deleted_results}
+    
+    def _wake(self, agent_id: str) -> None:
+        event = self._events.get(agent_id)
+        if event is not None:
+            event.set()
+    
+    def _wake_owner(self, command_id: str) -> None:
+        for agent_id, agent_commands in self.pending.items():
+            if command_id in agent_commands:
+                self._wake(agent_id)
+                return
+    
+    def add_command(self, agent_id: str, command: Dict[str, Any]) -> None:
+        """Index a queued command and wake any agent waiting for it"""
+        command.setdefault('queued_at', time.monotonic())
+        self.pending.setdefault(agent_id, {})[command['id']] = command
+        self.stats['commands_indexed'] += 1
+        
+        self._wake(agent_id)
+    
+    def add_commands(self, agent_id: str, commands: List[Dict[str, Any]]) -> None:
+        """Index several queued commands for one agent, waking it once"""
+        if not commands:
+            return
+        
+        queued_at = time.monotonic()
+        agent_commands = self.pending.setdefault(agent_id, {})
+        for command in commands:
+            command.setdefault('queued_at', queued_at)
+            agent_commands[command['id']] = command
+        self.stats['commands_indexed'] += len(commands)
+        
+        self._wake(agent_id)
+    
+    def _drop_pending(self, command_id: str) -> bool:
+        """Remove an undelivered command, with its retry wake-up and the agent's idle fairness state"""
+        for agent_id, agent_commands in self.pending.items():
+            if agent_commands.pop(command_id, None) is not None:
+                self.scheduler.cancel_wakeup(command_id)
+                if not agent_commands:
+                    del self.pending[agent_id]
+                    self.scheduler.forget_agent(agent_id)
+                return True
+        return False
+    
+    def remove_command(self, command_id: str) -> bool:
+        """Drop a command from the pending index or in-flight tracking (e.g. when cancelled)"""
+        if self._drop_pending(command_id):
+            return True
+        
+        record = self.scheduler.release(command_id)
+        if record is not None:
+            self._wake(record.agent_id)
+            return True
+        return False
+    
+    def complete_command(self, command_id: str) -> bool:
+        """
+        A result arrived: free the command's concurrency slot and wake waiting agents
+        
+        A result can arrive after the command timed out and was requeued for a
+        retry; the retry is dropped then, so the command does not run twice.
+        """
+        was_saturated = self.scheduler.global_saturated
+        record = self.scheduler.completed(command_id)
+        if record is None:
+            return self._drop_pending(command_id)
+        
+        if was_saturated:
+            # The global limit was holding everyone back
+            for agent_id, agent_commands in self.pending.items():
+                if agent_commands:
+                    self._wake(agent_id)
+        else:
+            self._wake(record.agent_id)
+        return True
+    
+    def pending_count(self, agent_id: Optional[str] = None) -> int:
+        """Number of undelivered commands, for one agent or overall"""
+        if agent_id is not None:
+            return len(self.pending.get(agent_id, {}))
+        return sum(len(agent_commands) for agent_commands in self.pending.values())
+    
+    async def take_commands(self, agent_id: str) -> List[Dict[str, Any]]:
+        """
+        Remove and return the commands an agent may run now, marking them sent
+        
+        The scheduler picks them by priority and scenario fairness, within
+        the agent's and the global in-flight limits; the rest stay pending.
+        """
+        await self._ensure_started()
+        
+        agent_commands = self.pending.get(agent_id)
+        if not agent_commands:
+            self.pending.pop(agent_id, None)
+            self.scheduler.forget_agent(agent_id)
+            return []
+        
+        commands = self.scheduler.select(agent_id, agent_commands)
+        if not commands:
+            return []
+        
+        for command in commands:
+            del agent_commands[command['id']]
+        if not agent_commands:
+            del self.pending[agent_id]
+        
+        now = time.monotonic()
+        self.scheduler.dispatched(agent_id, commands, now)
+        
+        utc_now = datetime.utcnow()
+        sent = []
+        for command in commands:
+            self._recently_delivered[command['id']] = now
+            command.pop('not_before', None)
+            command['timeout_at'] = (utc_now + timedelta(seconds=self.scheduler.timeout_for(command))).isoformat()
+            sent.append((command['id'], command['timeout_at']))
+        
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._mark_sent, sent)
+        except Exception as e:
+            logger.error(f"Failed to mark commands sent for {agent_id}: {e}")
+        
+        self.stats['commands_delivered'] += len(commands)
+        return commands
+    
+    async def wait_for_commands(self, agent_id: str, timeout: float) -> List[Dict[str, Any]]:
+        """
+        Long-poll for commands
+        
+        Returns as soon as commands are pending for the agent, or an empty
+        list once the timeout expires.
+        """
+        commands = await self.take_commands(agent_id)
+        if commands or timeout <= 0:
+            return commands
+        
+        self.stats['long_polls'] += 1
+        event = self._event_for(agent_id)
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stats['long_poll_timeouts'] += 1
+                return []
+            
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            
+            commands = await self.take_commands(agent_id)
+            if commands:
+                return commands
+    
+    def _mark_sent(self, commands: List[Tuple[str, str]]) -> None:
+        """Write-through of delivered commands and their timeout deadlines (runs in a worker thread)"""
+        sent_at = datetime.utcnow().isoformat()
+        conn = get_db_connection(self.db_path)
+        try:
+            with conn:
+                conn.executemany('''
+                    UPDATE commands
+                    SET status = 'sent', sent_at = ?, timeout_at = ?
+                    WHERE id = ? AND status = 'queued'
+                ''', [(sent_at, timeout_at, command_id) for command_id, timeout_at in commands])
+        finally:
+            conn.close()
+    
+    async def stop(self) -> None:
+        """Stop the resync and maintenance tasks"""
+        for task in (self._resync_task, self._maintenance_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._resync_task = None
+        self._maintenance_task = None
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get dispatcher statistics, including queue depth and scheduler metrics"""
+        depths = sorted(
+            ((agent_id, len(agent_commands)) for agent_id, agent_commands in self.pending.items() if agent_commands),
+            key=lambda item: item[1], reverse=True
+        )
+        return {
+            **self.stats,
+            'pending_commands': self.pending_count(),
+            'agents_with_pending': len(depths),
+            'max_agent_queue_depth': depths[0][1] if depths else 0,
+            'deepest_queues': dict(depths[:10]),
+            'long_poll_agents': len(self._events),
+            'scheduler': self.scheduler.get_statistics()
+        }
+
+
+# Global dispatcher instances, one per database
+_command_dispatchers: Dict[str, CommandDispatcher] = {}
+
+def get_command_dispatcher(db_path: str) -> CommandDispatcher:
+    """Get or create the command dispatcher for a database"""
+    dispatcher = _command_dispatchers.get(db_path)
+    if dispatcher is None:
+        dispatcher = CommandDispatcher(db_path)
+        _command_dispatchers[db_path] = dispatcher
+    return dispatcher
@@ -5,14 +5,18 @@ Manages commands from PhantomStrike AI to client agents
 
 import asyncio
 import logging
-import sqlite3
 import json
 import uuid
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from enum import Enum
 
 from shared.models import LogEntry
+from shared.utils import data_change_tracker
+from shared.database import get_db_connection
+from shared.migrations import ensure_schema
+from .command_dispatcher import get_command_dispatcher
 
 
 logger = logging.getLogger(__name__)
@@ -44,15 +48,19 @@ class CommandManager:
         self.db_manager = database_manager
         self.db_path = database_manager.db_path
         
-        # Command tracking
+        # Shared in-memory pending index used to deliver commands to agents
+        self.dispatcher = get_command_dispatcher(self.db_path)
+        
+        # Command tracking (results are persisted; only the most recent are kept in memory)
         self.pending_commands = {}
         self.executing_commands = {}
-        self.command_results = {}
+        self.command_results = OrderedDict()
         
         # Configuration
         self.command_timeout = 300  # 5 minutes default
         self.max_concurrent_commands = 10
         self.cleanup_interval = 3600  # 1 hour
+        self.max_cached_results = 1000
         
         # Statistics
         self.stats = {
@@ -63,70 +71,16 @@ class CommandManager:
             'start_time': None
         }
         
-        # Initialize database
-        self._initialize_command_tables()
-    
-    def _initialize_command_tables(self):
-        """Initialize command-related database tables"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Commands table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS commands (
-                    id TEXT PRIMARY KEY,
-                    agent_id TEXT NOT NULL,
-                    scenario_id TEXT,
-                    technique TEXT NOT NULL,
-                    command_type TEXT DEFAULT 'attack',
-                    command_data TEXT NOT NULL,
-                    parameters TEXT,
-                    priority TEXT DEFAULT 'medium',
-                    status TEXT DEFAULT 'queued',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    sent_at TIMESTAMP,
-                    executed_at TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    timeout_at TIMESTAMP,
-                    retry_count INTEGER DEFAULT 0,
-                    max_retries INTEGER DEFAULT 3,
-                    created_by TEXT DEFAULT 'phantomstrike_ai',
-                    FOREIGN KEY (agent_id) REFERENCES agents (id)
-                )
-            ''')
-            
-            # Command results table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS command_results (
-                    id TEXT PRIMARY KEY,
-                    command_id TEXT NOT NULL,
-                    agent_id TEXT NOT NULL,
-                    success BOOLEAN DEFAULT FALSE,
-                    output TEXT,
-                    error_message TEXT,
-                    execution_time_ms INTEGER,
-                    result_data TEXT,
-                    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (command_id) REFERENCES commands (id),
-                    FOREIGN KEY (agent_id) REFERENCES agents (id)
-                )
-            ''')
-            
-            # Create indexes
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_agent_status ON commands (agent_id, status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_status ON commands (status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_created_at ON commands (created_at)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_command_results_command_id ON command_results (command_id)')
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info("Command queue database tables initialized")
-            
-        except Exception as e:
-            logger.error(f"Command table initialization failed: {e}")
-            raise
+        # The dispatcher's scheduler enforces the limits and timeouts configured here
+        self.dispatcher.scheduler.configure(
+            max_per_agent=self.max_concurrent_commands,
+            command_timeout=self.command_timeout
+        )
+        self.dispatcher.cleanup_interval = self.cleanup_interval
+        self.dispatcher.timeout_listeners.append(self._forget_timed_out_command)
+        
+        # Command tables are created by the schema migrations (once per process)
+        ensure_schema(self.db_path)
     
     async def queue_command(self, agent_id: str, technique: str, command_data: Dict, 
                            scenario_id: str = None, priority: CommandPriority = CommandPriority.MEDIUM,
@@ -141,7 +95,7 @@ class CommandManager:
             timeout_at = datetime.utcnow() + timedelta(seconds=timeout_seconds)
             
             # Store in database
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -166,6 +120,20 @@ class CommandManager:
             conn.commit()
             conn.close()
             
+            # Index for delivery, waking the agent if it is long-polling
+            self.dispatcher.add_command(agent_id, {
+                'id': command_id,
+                'scenario_id': scenario_id,
+                'technique': technique,
+                'command_data': command_data,
+                'parameters': parameters or {},
+                'priority': priority.value,
+                'created_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+                'timeout_at': timeout_at.isoformat(),
+                'timeout_seconds': timeout_seconds,
+                'retry_count': 0
+            })
+            
             # Track in memory
             self.pending_commands[command_id] = {
                 'agent_id': agent_id,
@@ -185,44 +153,142 @@ class CommandManager:
             logger.error(f"Command queuing failed: {e}")
             raise
     
-    async def get_pending_commands(self, agent_id: str) -> List[Dict]:
-        """Get pending commands for specific agent"""
+    async def queue_scenario_commands(self, agent_ids: List[str], commands: Dict[str, Dict],
+                                      scenario_id: str = None, scenario_name: str = None,
+                                      priority: CommandPriority = CommandPriority.MEDIUM,
+                                      timeout_seconds: int = None,
+                                      attack_tracker=None) -> Dict[str, Dict[str, Dict[str, str]]]:
+        """
+        Queue an agents x techniques command matrix in one transaction
+        
+        `commands` maps technique -> command info (script, description, ...).
+        When an attack tracker (AIDetectionMonitor) is given, a ground-truth
+        red_team_attacks row is written for every command in the same
+        transaction and linked through the command's attack_id. Each affected
+        agent is woken once. Returns {agent_id: {technique: {'command_id',
+        'attack_id'}}}.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Get pending commands for agent
-            cursor.execute('''
-                SELECT id, technique, command_data, parameters, priority, created_at, timeout_at
-                FROM commands 
-                WHERE agent_id = ? AND status = ?
-                ORDER BY priority DESC, created_at ASC
-            ''', (agent_id, CommandStatus.QUEUED.value))
+            if not agent_ids or not commands:
+                return {}
             
-            rows = cursor.fetchall()
-            conn.close()
+            if timeout_seconds is None:
+                timeout_seconds = self.command_timeout
             
-            commands = []
-            for row in rows:
-                try:
-                    command = {
-                        'id': row['id'],
-                        'technique': row['technique'],
-                        'command_data': json.loads(row['command_data']),
-                        'parameters': json.loads(row['parameters']) if row['parameters'] else {},
-                        'priority': row['priority'],
-                        'created_at': row['created_at'],
-                        'timeout_at': row['timeout_at']
-                    }
-                    commands.append(command)
+            now = datetime.utcnow()
+            timeout_at = now + timedelta(seconds=timeout_seconds)
+            created_at = now.strftime('%Y-%m-%d %H:%M:%S')
+            pairs = [(agent_id, technique) for agent_id in agent_ids for technique in commands]
+            
+            attacks = [
+                {
+                    'scenario_id': scenario_id,
+                    'attack_type': technique,
+                    'target_agent_id': agent_id,
+                    'expected_detection': True,
+                    'notes': f"GPT Scenario: {scenario_name or scenario_id} - {commands[technique].get('description', '')}"
+                }
+                for agent_id, technique in pairs
+            ] if attack_tracker is not None else []
+            
+            # Ground truth shares the commands transaction when both live in the same database
+            shared_transaction = attack_tracker is not None and attack_tracker.db_path == self.db_path
+            attack_ids = [None] * len(pairs)
+            if attack_tracker is not None and not shared_transaction:
+                attack_ids = await attack_tracker.record_red_team_attacks(attacks) or attack_ids
+            
+            conn = get_db_connection(self.db_path)
+            try:
+                with conn:
+                    cursor = conn.cursor()
+                    
+                    if shared_transaction:
+                        attack_ids = attack_tracker.insert_red_team_attacks(cursor, attacks)
                     
-                    # Mark as sent
-                    await self._update_command_status(row['id'], CommandStatus.SENT)
+                    queued = []
+                    for (agent_id, technique), attack_id in zip(pairs, attack_ids):
+                        cmd_info = commands[technique]
+                        queued.append((f"cmd_{uuid.uuid4().hex[:12]}", agent_id, technique, attack_id, {
+                            'script': cmd_info.get('script', ''),
+                            'description': cmd_info.get('description', ''),
+                            'mitre_technique': cmd_info.get('mitre_technique', ''),
+                            'destructive': cmd_info.get('destructive', False),
+                            'real_attack': cmd_info.get('real_attack', True),
+                            'ai_generated': True,
+                            'attack_id': attack_id  # Link to red team tracking
+                        }))
                     
-                except Exception as e:
-                    logger.error(f"Failed to process command {row['id']}: {e}")
-                    continue
+                    cursor.executemany('''
+                        INSERT INTO commands (
+                            id, agent_id, scenario_id, technique, command, command_data, parameters,
+                            priority, status, timeout_at, created_by
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', [
+                        (
+                            command_id,
+                            agent_id,
+                            scenario_id,
+                            technique,
+                            command_data['script'],
+                            json.dumps(command_data),
+                            '{}',
+                            priority.value,
+                            CommandStatus.QUEUED.value,
+                            timeout_at.isoformat(),
+                            'phantomstrike_ai'
+                        )
+                        for command_id, agent_id, technique, _, command_data in queued
+                    ])
+            finally:
+                conn.close()
+            
+            # Index for delivery and wake each affected agent once
+            id_matrix: Dict[str, Dict[str, Dict[str, str]]] = {}
+            by_agent: Dict[str, List[Dict]] = {}
+            for command_id, agent_id, technique, attack_id, command_data in queued:
+                by_agent.setdefault(agent_id, []).append({
+                    'id': command_id,
+                    'scenario_id': scenario_id,
+                    'technique': technique,
+                    'command_data': command_data,
+                    'parameters': {},
+                    'priority': priority.value,
+                    'created_at': created_at,
+                    'timeout_at': timeout_at.isoformat(),
+                    'timeout_seconds': timeout_seconds,
+                    'retry_count': 0
+                })
+                self.pending_commands[command_id] = {
+                    'agent_id': agent_id,
+                    'technique': technique,
+                    'status': CommandStatus.QUEUED,
+                    'queued_at': now,
+                    'timeout_at': timeout_at
+                }
+                id_matrix.setdefault(agent_id, {})[technique] = {
+                    'command_id': command_id,
+                    'attack_id': attack_id
+                }
+            
+            for agent_id, agent_commands in by_agent.items():
+                self.dispatcher.add_commands(agent_id, agent_commands)
+            
+            self.stats['commands_queued'] += len(queued)
+            data_change_tracker.record_change('commands')
+            
+            logger.info(f"Queued {len(queued)} scenario commands for {len(by_agent)} agents "
+                        f"(scenario: {scenario_id})")
+            
+            return id_matrix
+        
+        except Exception as e:
+            logger.error(f"Scenario command queuing failed: {e}")
+            raise
+    
+    async def get_pending_commands(self, agent_id: str) -> List[Dict]:
+        """Get pending commands for specific agent (served from the in-memory index)"""
+        try:
+            commands = await self.dispatcher.take_commands(agent_id)
             
             if commands:
                 logger.info(f"Retrieved {len(commands)} pending commands for {agent_id}")
@@ -233,6 +299,20 @@ class CommandManager:
             logger.error(f"Get pending commands failed: {e}")
             return []
     
+    async def wait_for_commands(self, agent_id: str, timeout: float) -> List[Dict]:
+        """Long-poll for commands, returning as soon as any are queued for the agent"""
+        try:
+            commands = await self.dispatcher.wait_for_commands(agent_id, timeout)
+            
+            if commands:
+                logger.info(f"Delivered {len(commands)} commands to {agent_id}")
+            
+            return commands
+        
+        except Exception as e:
+            logger.error(f"Wait for commands failed: {e}")
+            return []
+    
     async def receive_command_result(self, command_id: str, agent_id: str, 
                                    result_data: Dict) -> bool:
         """Receive command execution result from agent"""
@@ -243,7 +323,7 @@ class CommandManager:
             execution_time = result_data.get('execution_time_ms', 0)
             
             # Store result in database
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Insert result
@@ -275,6 +355,9 @@ class CommandManager:
             conn.commit()
             conn.close()
             
+            # Free the command's concurrency slot so the agent can receive more
+            self.dispatcher.complete_command(command_id)
+            
             # Update memory tracking
             if command_id in self.pending_commands:
                 del self.pending_commands[command_id]
@@ -282,7 +365,8 @@ class CommandManager:
             if command_id in self.executing_commands:
                 del self.executing_commands[command_id]
             
-            self.command_results[command_id] = result_data
+            self._remember_result(command_id, result_data)
+            data_change_tracker.record_change('commands')
             
             # Update statistics
             if success:
@@ -298,10 +382,23 @@ class CommandManager:
             logger.error(f"Command result processing failed: {e}")
             return False
     
+    def _remember_result(self, command_id: str, result_data: Dict) -> None:
+        """Keep a command result in memory, evicting the oldest beyond max_cached_results"""
+        self.command_results[command_id] = result_data
+        self.command_results.move_to_end(command_id)
+        while len(self.command_results) > self.max_cached_results:
+            self.command_results.popitem(last=False)
+    
+    def _forget_timed_out_command(self, command_id: str) -> None:
+        """Drop tracking for a command the dispatcher timed out with no retries left"""
+        self.pending_commands.pop(command_id, None)
+        self.executing_commands.pop(command_id, None)
+        self.stats['commands_timeout'] += 1
+    
     async def _update_command_status(self, command_id: str, status: CommandStatus) -> None:
         """Update command status in database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             timestamp_field = None
@@ -337,8 +434,9 @@ class CommandManager:
             await self._update_command_status(command_id, CommandStatus.CANCELLED)
             
             # Remove from tracking
-            if command_id in self.pending_commands:
-                del self.pending_commands[command_id]
+            self.dispatcher.remove_command(command_id)
+            self.pending_commands.pop(command_id, None)
+            self.executing_commands.pop(command_id, None)
             
             logger.info(f"Command cancelled: {command_id}")
             return True
@@ -347,44 +445,19 @@ class CommandManager:
             logger.error(f"Command cancellation failed: {e}")
             return False
     
+    def set_scenario_weight(self, scenario_id: str, weight: float) -> None:
+        """Give a scenario a larger (or smaller) share of each agent's command slots"""
+        self.dispatcher.scheduler.set_scenario_weight(scenario_id, weight)
+    
     async def cleanup_old_commands(self, max_age_hours: int = 24) -> Dict:
-        """Clean up old completed/failed commands"""
+        """Clean up old completed/failed/cancelled/timed-out commands (also run periodically by the dispatcher)"""
         try:
-            cutoff_time = datetime.utcnow() - timedelta(hours=max_age_hours)
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Delete old commands
-            cursor.execute('''
-                DELETE FROM commands 
-                WHERE status IN (?, ?, ?) AND created_at < ?
-            ''', (
-                CommandStatus.COMPLETED.value,
-                CommandStatus.FAILED.value,
-                CommandStatus.CANCELLED.value,
-                cutoff_time.isoformat()
-            ))
-            
-            deleted_commands = cursor.rowcount
-            
-            # Delete old results
-            cursor.execute('''
-                DELETE FROM command_results 
-                WHERE received_at < ?
-            ''', (cutoff_time.isoformat(),))
-            
-            deleted_results = cursor.rowcount
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Cleanup completed: {deleted_commands} commands, {deleted_results} results")
+            loop = asyncio.get_running_loop()
+            deleted = await loop.run_in_executor(None, self.dispatcher.delete_old_commands, max_age_hours)
             
             return {
                 'success': True,
-                'deleted_commands': deleted_commands,
-                'deleted_results': deleted_results,
+                **deleted,
                 'cleanup_completed_at': datetime.utcnow().isoformat()
             }
             
@@ -395,7 +468,7 @@ class CommandManager:
     async def get_command_statistics(self) -> Dict:
         """Get command queue statistics"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get status counts
@@ -425,16 +498,20 @@ class CommandManager:
             return {
                 'queue_statistics': {
                     'pending_commands': len(self.pending_commands),
-                    'executing_commands': len(self.executing_commands),
+                    'undelivered_commands': self.dispatcher.pending_count(),
+                    'executing_commands': len(self.dispatcher.scheduler.in_flight),
                     'completed_results': len(self.command_results),
                     'status_distribution': status_counts,
                     'top_agents': agent_counts,
                     'total_queued': self.stats['commands_queued'],
                     'total_executed': self.stats['commands_executed'],
                     'total_failed': self.stats['commands_failed'],
+                    'total_timeout': self.dispatcher.stats['commands_timed_out'],
+                    'total_retried': self.dispatcher.stats['commands_retried'],
                     'success_rate': (self.stats['commands_executed'] / 
                                    max(self.stats['commands_queued'], 1)) * 100
                 },
+                'scheduler': self.dispatcher.get_statistics(),
                 'generated_at': datetime.utcnow().isoformat()
             }
             
@@ -0,0 +1,325 @@
+"""
+Command Scheduling Policy
+Decides which queued commands an agent receives and tracks them until they finish
+
+Commands are handed out in priority order, interleaved across scenarios by
+weight (stride scheduling) so one large campaign cannot starve another on
+the same endpoint. Per-agent and global in-flight limits keep campaigns from
+flooding endpoints; dispatched commands sit on a timer wheel until their
+result arrives or they time out, and timed-out commands are retried with
+exponential backoff until their retry budget is spent.
+"""
+
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+# Delivery order for command priorities (lower ranks are delivered first)
+PRIORITY_RANK = {
+    'critical': 0,
+    'high': 1,
+    'medium': 2,
+    'low': 3
+}
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule/cancel, expiry in tick-sized steps"""
+    
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 512):
+        self.tick_seconds = tick_seconds
+        self.slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._ticks: Dict[Hashable, int] = {}
+        self._current_tick = int(time.monotonic() // tick_seconds)
+    
+    def __len__(self) -> int:
+        return len(self._ticks)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._ticks
+    
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Schedule (or reschedule) a key to expire at a monotonic deadline"""
+        self.cancel(key)
+        tick = max(math.ceil(deadline / self.tick_seconds), self._current_tick + 1)
+        self.slots[tick % len(self.slots)][key] = tick
+        self._ticks[key] = tick
+    
+    def cancel(self, key: Hashable) -> bool:
+        tick = self._ticks.pop(key, None)
+        if tick is None:
+            return False
+        self.slots[tick % len(self.slots)].pop(key, None)
+        return True
+    
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Move the wheel forward to `now` and return the keys that expired"""
+        target_tick = int((time.monotonic() if now is None else now) // self.tick_seconds)
+        if target_tick <= self._current_tick:
+            return []
+        
+        expired = []
+        steps = min(target_tick - self._current_tick, len(self.slots))
+        for step in range(1, steps + 1):
+            slot = self.slots[(self._current_tick + step) % len(self.slots)]
+            due = [key for key, tick in slot.items() if tick <= target_tick]
+            for key in due:
+                del slot[key]
+                del self._ticks[key]
+            expired.extend(due)
+        
+        self._current_tick = target_tick
+        return expired
+
+
+class LatencySamples:
+    """Rolling latency samples with percentile summaries"""
+    
+    def __init__(self, max_samples: int = 1000):
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+    
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+    
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        
+        def percentile(fraction: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3) if ordered else 0.0
+        
+        return {
+            'count': self.count,
+            'avg_seconds': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_seconds': percentile(0.5),
+            'p95_seconds': percentile(0.95),
+            'max_seconds': round(ordered[-1], 3) if ordered else 0.0
+        }
+
+
+@dataclass
+class InFlightCommand:
+    """A command handed to an agent and not yet finished"""
+    command_id: str
+    agent_id: str
+    scenario_id: Optional[str]
+    command: Dict[str, Any]
+    dispatched_at: float
+    deadline: float
+
+
+class CommandScheduler:
+    """Priority/fairness selection, concurrency limits, timeouts and retries"""
+    
+    def __init__(self, max_per_agent: int = 10, max_global: int = 500, command_timeout: float = 300,
+                 max_retries: int = 3, retry_backoff_seconds: float = 5.0, max_backoff_seconds: float = 300.0,
+                 tick_seconds: float = 1.0):
+        self.max_per_agent = max_per_agent
+        self.max_global = max_global
+        self.command_timeout = command_timeout
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        
+        self.timers = TimerWheel(tick_seconds)
+        self.in_flight: Dict[str, InFlightCommand] = {}
+        self.in_flight_per_agent: Dict[str, int] = {}
+        
+        # Stride scheduling state: per-agent virtual time of each scenario
+        self.scenario_weights: Dict[str, float] = {}
+        self._passes: Dict[str, Dict[Optional[str], float]] = {}
+        
+        self.wait_times = LatencySamples()
+        self.execution_times = LatencySamples()
+        
+        self.stats = {
+            'dispatched': 0,
+            'completed': 0,
+            'timeouts': 0,
+            'retries': 0,
+            'deferred_agent_limit': 0,
+            'deferred_global_limit': 0
+        }
+    
+    def configure(self, max_per_agent: Optional[int] = None, max_global: Optional[int] = None,
+                  command_timeout: Optional[float] = None, max_retries: Optional[int] = None) -> None:
+        if max_per_agent is not None:
+            self.max_per_agent = max_per_agent
+        if max_global is not None:
+            self.max_global = max_global
+        if command_timeout is not None:
+            self.command_timeout = command_timeout
+        if max_retries is not None:
+            self.max_retries = max_retries
+    
+    def set_scenario_weight(self, scenario_id: str, weight: float) -> None:
+        """Relative share of an agent's command slots a scenario receives"""
+        self.scenario_weights[scenario_id] = max(float(weight), 0.01)
+    
+    @property
+    def global_saturated(self) -> bool:
+        return len(self.in_flight) >= self.max_global
+    
+    def capacity(self, agent_id: str) -> int:
+        """How many more commands the agent may be given right now"""
+        agent_slots = self.max_per_agent - self.in_flight_per_agent.get(agent_id, 0)
+        global_slots = self.max_global - len(self.in_flight)
+        if agent_slots <= 0:
+            self.stats['deferred_agent_limit'] += 1
+        elif global_slots <= 0:
+            self.stats['deferred_global_limit'] += 1
+        return max(0, min(agent_slots, global_slots))
+    
+    def select(self, agent_id: str, pending: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Choose the commands to deliver to an agent
+        
+        Highest priority first; within a priority level scenarios take turns
+        in proportion to their weight, oldest command first within a scenario.
+        Commands waiting out a retry backoff are skipped.
+        """
+        limit = self.capacity(agent_id)
+        if limit <= 0 or not pending:
+            return []
+        
+        now = time.monotonic()
+        by_rank: Dict[int, Dict[Optional[str], List[Dict[str, Any]]]] = {}
+        for command in pending.values():
+            if command.get('not_before', 0) > now:
+                continue
+            rank = PRIORITY_RANK.get(command.get('priority'), len(PRIORITY_RANK))
+            by_rank.setdefault(rank, {}).setdefault(command.get('scenario_id'), []).append(command)
+        
+        passes = self._passes.setdefault(agent_id, {})
+        floor = min(passes.values()) if passes else 0.0
+        
+        selected = []
+        for rank in sorted(by_rank):
+            queues = by_rank[rank]
+            for scenario_id, commands in queues.items():
+                # Oldest last, so pop() takes it; queue order breaks created_at ties
+                commands.sort(key=lambda command: str(command.get('created_at') or ''))
+                commands.reverse()
+                # A scenario that was idle rejoins at the current virtual time instead of catching up
+                passes[scenario_id] = max(passes.get(scenario_id, floor), floor)
+            
+            while queues and len(selected) < limit:
+                scenario_id = min(queues, key=lambda scenario: passes[scenario])
+                commands = queues[scenario_id]
+                selected.append(commands.pop())
+                passes[scenario_id] += 1.0 / self.scenario_weights.get(scenario_id, 1.0)
+                if not commands:
+                    del queues[scenario_id]
+            
+            if len(selected) >= limit:
+                break
+        
+        return selected
+    
+    def timeout_for(self, command: Dict[str, Any]) -> float:
+        return float(command.get('timeout_seconds') or self.command_timeout)
+    
+    def dispatched(self, agent_id: str, commands: List[Dict[str, Any]], now: Optional[float] = None) -> None:
+        """Start tracking delivered commands against the limits and the timeout wheel"""
+        now = time.monotonic() if now is None else now
+        for command in commands:
+            deadline = now + self.timeout_for(command)
+            self.track(agent_id, command, now, deadline)
+            
+            queued_at = command.pop('queued_at', None)
+            if queued_at is not None:
+                self.wait_times.add(now - queued_at)
+            self.stats['dispatched'] += 1
+    
+    def track(self, agent_id: str, command: Dict[str, Any], dispatched_at: float, deadline: float) -> None:
+        """Track an in-flight command (also used to recover commands sent before a restart)"""
+        command_id = command['id']
+        if command_id in self.in_flight:
+            return
+        self.in_flight[command_id] = InFlightCommand(
+            command_id, agent_id, command.get('scenario_id'), command, dispatched_at, deadline
+        )
+        self.in_flight_per_agent[agent_id] = self.in_flight_per_agent.get(agent_id, 0) + 1
+        self.timers.schedule(('timeout', command_id), deadline)
+    
+    def release(self, command_id: str) -> Optional[InFlightCommand]:
+        """Stop tracking a command, freeing its concurrency slot"""
+        record = self.in_flight.pop(command_id, None)
+        if record is None:
+            return None
+        
+        self.timers.cancel(('timeout', command_id))
+        remaining = self.in_flight_per_agent.get(record.agent_id, 0) - 1
+        if remaining > 0:
+            self.in_flight_per_agent[record.agent_id] = remaining
+        else:
+            self.in_flight_per_agent.pop(record.agent_id, None)
+        return record
+    
+    def completed(self, command_id: str) -> Optional[InFlightCommand]:
+        """A result arrived: free the slot and record the execution time"""
+        record = self.release(command_id)
+        if record is not None:
+            self.execution_times.add(time.monotonic() - record.dispatched_at)
+            self.stats['completed'] += 1
+        return record
+    
+    def should_retry(self, record: InFlightCommand) -> bool:
+        retry_count = int(record.command.get('retry_count') or 0)
+        max_retries = record.command.get('max_retries')
+        max_retries = self.max_retries if max_retries is None else int(max_retries)
+        return retry_count < max_retries
+    
+    def retry_delay(self, record: InFlightCommand) -> float:
+        retry_count = int(record.command.get('retry_count') or 0)
+        return min(self.retry_backoff_seconds * (2 ** retry_count), self.max_backoff_seconds)
+    
+    def schedule_wakeup(self, command_id: str, at: float) -> None:
+        """Wake the owning agent when a backed-off command becomes eligible"""
+        self.timers.schedule(('retry', command_id), at)
+    
+    def cancel_wakeup(self, command_id: str) -> None:
+        self.timers.cancel(('retry', command_id))
+    
+    def advance(self, now: Optional[float] = None) -> Dict[str, List[str]]:
+        """Advance the timer wheel; returns expired command timeouts and due retries"""
+        expired = {'timeout': [], 'retry': []}
+        for kind, command_id in self.timers.advance(now):
+            expired[kind].append(command_id)
+        return expired
+    
+    def forget_agent(self, agent_id: str) -> None:
+        """Drop fairness state for an agent with nothing queued or in flight"""
+        if not self.in_flight_per_agent.get(agent_id):
+            self._passes.pop(agent_id, None)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        oldest = min((record.dispatched_at for record in self.in_flight.values()), default=None)
+        return {
+            **self.stats,
+            'in_flight': len(self.in_flight),
+            'agents_in_flight': len(self.in_flight_per_agent),
+            'agents_at_limit': sum(1 for count in self.in_flight_per_agent.values() if count >= self.max_per_agent),
+            'oldest_in_flight_seconds': round(now - oldest, 1) if oldest is not None else 0.0,
+            'timers': len(self.timers),
+            'limits': {
+                'max_per_agent': self.max_per_agent,
+                'max_global': self.max_global,
+                'command_timeout': self.command_timeout,
+                'max_retries': self.max_retries
+            },
+            'scenario_weights': dict(self.scenario_weights),
+            'wait_time': self.wait_times.summary(),
+            'execution_time': self.execution_times.summary()
+        }
@@ -200,10 +200,9 @@ class LogIngester:
                         if self._should_run_detection(log_entry):
                             await self.detection_queue.put(log_entry)
                 
-                # Update topology if topology monitor available
+                # Update topology if topology monitor available (one hand-off per batch)
                 if self.topology_monitor:
-                    for log_entry in log_batch.logs:
-                        await self.topology_monitor.process_log_entry(log_entry)
+                    await self.topology_monitor.process_log_batch(log_batch.logs)
                 
                 # Update statistics
                 self.stats['logs_processed'] += log_batch.batch_size
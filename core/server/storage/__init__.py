@@ -3,5 +3,6 @@ Storage management package
 """
 
 from .database_manager import DatabaseManager
+from .agent_state_store import AgentStateStore
 
-__all__ = ['DatabaseManager']
+__all__ = ['DatabaseManager', 'AgentStateStore']
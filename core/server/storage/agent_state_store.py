@@ -0,0 +1,268 @@
+"""
+In-memory agent state table with batched SQLite write-back
+"""
+
+import asyncio
+import logging
+import sqlite3
+from typing import Dict, Any, List, Optional, Set
+from datetime import datetime
+
+from shared.database import get_db_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+# Columns of the agents table managed by the state store
+AGENT_COLUMNS = [
+    'id', 'hostname', 'ip_address', 'platform', 'os_version', 'agent_version',
+    'status', 'last_heartbeat', 'last_log_sent', 'capabilities', 'log_sources',
+    'configuration', 'security_zone', 'importance', 'logs_sent_count', 'bytes_sent',
+    'errors_count', 'created_at', 'updated_at', 'system_info', 'quick_summary'
+]
+
+# Fields copied verbatim when present in agent data
+PASSTHROUGH_FIELDS = [
+    'status', 'capabilities', 'system_info', 'quick_summary', 'last_log_sent',
+    'log_sources', 'configuration', 'security_zone', 'importance',
+    'logs_sent_count', 'bytes_sent', 'errors_count'
+]
+
+# Fields only copied when present and non-empty
+NON_EMPTY_FIELDS = ['hostname', 'ip_address', 'platform', 'os_version']
+
+
+class AgentStateStore:
+    """Absorbs agent heartbeats in memory and flushes dirty agents in one transaction"""
+    
+    def __init__(self, db_path: str, flush_interval: float = 5.0):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        
+        # Agent rows keyed by agent id, plus ids changed since the last flush
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        self.dirty: Set[str] = set()
+        
+        # Columns actually present in the agents table (older databases lack some)
+        self.columns: List[str] = list(AGENT_COLUMNS)
+        
+        self._loaded = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        
+        # Statistics
+        self.stats = {
+            'updates_absorbed': 0,
+            'flushes': 0,
+            'rows_flushed': 0,
+            'flush_errors': 0,
+            'last_flush_at': None
+        }
+    
+    def _ensure_loaded(self) -> None:
+        """Load existing agents from SQLite on first access"""
+        if self._loaded:
+            return
+        
+        try:
+            conn = get_db_connection(self.db_path)
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            cursor.execute('PRAGMA table_info(agents)')
+            table_columns = {row['name'] for row in cursor.fetchall()}
+            if table_columns:
+                self.columns = [column for column in AGENT_COLUMNS if column in table_columns]
+            
+            cursor.execute('SELECT * FROM agents')
+            for row in cursor.fetchall():
+                row_data = dict(row)
+                self.agents[row_data['id']] = {column: row_data.get(column) for column in AGENT_COLUMNS}
+            
+            conn.close()
+            logger.info(f"Agent state store loaded {len(self.agents)} agents")
+        
+        except Exception as e:
+            logger.error(f"Failed to load agent state: {e}")
+        
+        self._loaded = True
+    
+    def _ensure_flush_task(self) -> None:
+        """Start the periodic flush task once an event loop is running"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        
+        self._flush_task = loop.create_task(self._flush_loop())
+    
+    async def _flush_loop(self) -> None:
+        """Flush dirty agents every flush_interval seconds"""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Agent state flush loop error: {e}")
+    
+    def upsert(self, agent_data: Dict[str, Any]) -> bool:
+        """
+        Merge agent data into the in-memory table and mark the agent dirty
+        
+        Args:
+            agent_data: Agent fields keyed like DatabaseManager.store_agent_info input
+        
+        Returns:
+            True if the agent is new or its status changed
+        """
+        self._ensure_loaded()
+        
+        agent_id = agent_data.get('agent_id') or agent_data.get('id')
+        if not agent_id:
+            raise ValueError("agent_id is required")
+        
+        now = datetime.now().isoformat()
+        existing = self.agents.get(agent_id)
+        
+        if existing is None:
+            row = {column: None for column in AGENT_COLUMNS}
+            row.update({
+                'id': agent_id,
+                'os_version': '',
+                'status': 'active',
+                'agent_version': 'client_endpoint',
+                'capabilities': '[]',
+                'system_info': '{}',
+                'quick_summary': '{}',
+                'security_zone': 'internal',
+                'importance': 'medium',
+                'logs_sent_count': 0,
+                'bytes_sent': 0,
+                'errors_count': 0,
+                'last_heartbeat': now,
+                'created_at': now
+            })
+            status_changed = True
+        else:
+            row = existing
+            status_changed = 'status' in agent_data and agent_data['status'] != existing['status']
+        
+        for field in PASSTHROUGH_FIELDS:
+            if field in agent_data:
+                row[field] = agent_data[field]
+        
+        for field in NON_EMPTY_FIELDS:
+            if agent_data.get(field):
+                row[field] = agent_data[field]
+        
+        if agent_data.get('agent_type'):
+            row['agent_version'] = agent_data['agent_type']
+        elif agent_data.get('agent_version'):
+            row['agent_version'] = agent_data['agent_version']
+        
+        if 'last_heartbeat' in agent_data:
+            last_heartbeat = agent_data['last_heartbeat']
+            if isinstance(last_heartbeat, datetime):
+                last_heartbeat = last_heartbeat.isoformat()
+            row['last_heartbeat'] = last_heartbeat or now
+        
+        row['updated_at'] = now
+        
+        self.agents[agent_id] = row
+        self.dirty.add(agent_id)
+        self.stats['updates_absorbed'] += 1
+        
+        self._ensure_flush_task()
+        
+        return status_changed
+    
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Get a copy of an agent row"""
+        self._ensure_loaded()
+        
+        row = self.agents.get(agent_id)
+        return dict(row) if row else None
+    
+    def get_all(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get copies of all agent rows ordered by most recent heartbeat"""
+        self._ensure_loaded()
+        
+        rows = [dict(row) for row in self.agents.values()
+                if status is None or row['status'] == status]
+        rows.sort(key=lambda row: row['last_heartbeat'] or '', reverse=True)
+        return rows
+    
+    async def flush(self) -> int:
+        """Write all dirty agents to SQLite in a single UPSERT transaction"""
+        if not self.dirty:
+            return 0
+        
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        
+        async with self._flush_lock:
+            agent_ids = list(self.dirty)
+            self.dirty.clear()
+            rows = [tuple(self.agents[agent_id][column] for column in self.columns)
+                    for agent_id in agent_ids if agent_id in self.agents]
+            
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._write_rows, rows)
+                
+                self.stats['flushes'] += 1
+                self.stats['rows_flushed'] += len(rows)
+                self.stats['last_flush_at'] = datetime.utcnow().isoformat()
+                
+                logger.debug(f"Flushed {len(rows)} agents to database")
+                return len(rows)
+            
+            except Exception as e:
+                # Keep the agents dirty so the next flush retries them
+                self.dirty.update(agent_ids)
+                self.stats['flush_errors'] += 1
+                logger.error(f"Agent state flush failed: {e}")
+                return 0
+    
+    def _write_rows(self, rows: List[tuple]) -> None:
+        """Execute the batched UPSERT (runs in a worker thread)"""
+        update_columns = [column for column in self.columns if column not in ('id', 'created_at')]
+        
+        conn = get_db_connection(self.db_path)
+        try:
+            with conn:
+                conn.executemany(f'''
+                    INSERT INTO agents ({', '.join(self.columns)})
+                    VALUES ({', '.join('?' for _ in self.columns)})
+                    ON CONFLICT(id) DO UPDATE SET
+                        {', '.join(f'{column} = excluded.{column}' for column in update_columns)}
+                ''', rows)
+        finally:
+            conn.close()
+    
+    async def stop(self) -> None:
+        """Stop the flush task and write any remaining dirty agents"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        
+        await self.flush()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get state store statistics"""
+        return {
+            **self.stats,
+            'agents_tracked': len(self.agents),
+            'dirty_agents': len(self.dirty),
+            'flush_interval': self.flush_interval
+        }
@@ -11,6 +11,12 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 from shared.models import LogEntry, LogBatch, AgentInfo, DetectionResult
+from shared.utils import data_change_tracker
+from shared.detection_events import detection_events
+from shared.log_events import log_events
+from .agent_state_store import AgentStateStore
+from shared.database import get_db_connection
+from shared.migrations import ensure_schema
 
 
 logger = logging.getLogger(__name__)
@@ -49,6 +55,9 @@ class DatabaseManager:
         # Initialize databases
         self._initialize_sqlite()
         
+        # In-memory agent table absorbing heartbeats, flushed to SQLite in batches
+        self.agent_state = AgentStateStore(db_path)
+        
         if enable_elasticsearch:
             self._initialize_elasticsearch()
         
@@ -59,173 +68,12 @@ class DatabaseManager:
         logger.info(f"DatabaseManager singleton initialized with db_path={db_path}")
     
     def _initialize_sqlite(self) -> None:
-        """Initialize SQLite database with required tables"""
+        """Initialize SQLite database by applying pending schema migrations"""
         try:
             # Ensure database directory exists
             Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create agents table (extend existing if needed)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS agents (
-                    id TEXT PRIMARY KEY,
-                    hostname TEXT,
-                    ip_address TEXT,
-                    platform TEXT,
-                    os_version TEXT,
-                    agent_version TEXT,
-                    status TEXT DEFAULT 'offline',
-                    last_heartbeat TIMESTAMP,
-                    last_log_sent TIMESTAMP,
-                    capabilities TEXT,  -- JSON array
-                    log_sources TEXT,   -- JSON array
-                    configuration TEXT, -- JSON object
-                    security_zone TEXT DEFAULT 'internal',
-                    importance TEXT DEFAULT 'medium',
-                    logs_sent_count INTEGER DEFAULT 0,
-                    bytes_sent INTEGER DEFAULT 0,
-                    errors_count INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    system_info TEXT,      -- Enhanced system information (JSON)
-                    quick_summary TEXT     -- Quick system summary (JSON)
-                )
-            ''')
-            
-            # Add new columns to existing agents table if they don't exist
-            try:
-                cursor.execute("ALTER TABLE agents ADD COLUMN system_info TEXT")
-            except sqlite3.OperationalError:
-                pass  # Column already exists
-            
-            try:
-                cursor.execute("ALTER TABLE agents ADD COLUMN quick_summary TEXT")
-            except sqlite3.OperationalError:
-                pass  # Column already exists
-            
-            # Create log_entries table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS log_entries (
-                    id TEXT PRIMARY KEY,
-                    agent_id TEXT,
-                    source TEXT,
-                    timestamp TIMESTAMP,
-                    collected_at TIMESTAMP,
-                    processed_at TIMESTAMP,
-                    message TEXT,
-                    raw_data TEXT,
-                    level TEXT,
-                    parsed_data TEXT,    -- JSON object
-                    enriched_data TEXT,  -- JSON object
-                    event_id TEXT,
-                    event_type TEXT,
-                    process_info TEXT,   -- JSON object
-                    network_info TEXT,   -- JSON object
-                    attack_technique TEXT,
-                    attack_command TEXT,
-                    attack_result TEXT,
-                    threat_score REAL DEFAULT 0.0,
-                    threat_level TEXT DEFAULT 'benign',
-                    tags TEXT,           -- JSON array
-                    metadata TEXT,       -- JSON object
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (agent_id) REFERENCES agents (id)
-                )
-            ''')
-            
-            # Create detection_results table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS detection_results (
-                    id TEXT PRIMARY KEY,
-                    log_entry_id TEXT,
-                    threat_detected BOOLEAN DEFAULT FALSE,
-                    confidence_score REAL DEFAULT 0.0,
-                    threat_type TEXT,
-                    severity TEXT DEFAULT 'low',
-                    ml_results TEXT,     -- JSON object
-                    ai_analysis TEXT,    -- JSON object
-                    rule_matches TEXT,   -- JSON array
-                    mitre_techniques TEXT, -- JSON array
-                    tactics TEXT,        -- JSON array
-                    analyst_notes TEXT,
-                    false_positive BOOLEAN DEFAULT FALSE,
-                    verified BOOLEAN DEFAULT FALSE,
-                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (log_entry_id) REFERENCES log_entries (id)
-                )
-            ''')
-            
-            # Create log_batches table for tracking
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS log_batches (
-                    id TEXT PRIMARY KEY,
-                    agent_id TEXT,
-                    batch_size INTEGER,
-                    compressed BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP,
-                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (agent_id) REFERENCES agents (id)
-                )
-            ''')
-            
-            # Create gpt_interactions table for tracking all GPT API calls (MUST BE BEFORE commands table)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS gpt_interactions (
-                    id TEXT PRIMARY KEY,
-                    interaction_type TEXT NOT NULL,
-                    model TEXT DEFAULT 'gpt-3.5-turbo',
-                    prompt TEXT NOT NULL,
-                    response TEXT NOT NULL,
-                    tokens_used INTEGER DEFAULT 0,
-                    response_time_ms INTEGER,
-                    success BOOLEAN DEFAULT TRUE,
-                    error_message TEXT,
-                    metadata TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    user_request TEXT,
-                    result_summary TEXT
-                )
-            ''')
-            
-            # Create commands table for tracking attack commands (references gpt_interactions)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS commands (
-                    id TEXT PRIMARY KEY,
-                    agent_id TEXT,
-                    command TEXT NOT NULL,
-                    command_type TEXT,
-                    platform TEXT,
-                    status TEXT DEFAULT 'pending',
-                    gpt_interaction_id TEXT,
-                    scenario_id TEXT,
-                    result TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    executed_at TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    FOREIGN KEY (agent_id) REFERENCES agents (id),
-                    FOREIGN KEY (gpt_interaction_id) REFERENCES gpt_interactions (id)
-                )
-            ''')
-            
-            # Create indexes for better performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_entries_agent_id ON log_entries (agent_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_entries_timestamp ON log_entries (timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_entries_level ON log_entries (level)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_entries_source ON log_entries (source)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_entries_threat_score ON log_entries (threat_score)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_detection_results_threat_detected ON detection_results (threat_detected)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_detection_results_severity ON detection_results (severity)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_gpt_interactions_type ON gpt_interactions (interaction_type)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_gpt_interactions_created_at ON gpt_interactions (created_at)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_gpt_interactions_success ON gpt_interactions (success)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_agent_id ON commands (agent_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_status ON commands (status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_gpt_interaction_id ON commands (gpt_interaction_id)')
-            
-            conn.commit()
-            conn.close()
+            ensure_schema(self.db_path)
             
             logger.info("SQLite database initialized successfully")
             
@@ -268,7 +116,7 @@ class DatabaseManager:
             import uuid
             interaction_id = str(uuid.uuid4())
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -321,7 +169,7 @@ class DatabaseManager:
             List of GPT interactions
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             query = "SELECT * FROM gpt_interactions WHERE 1=1"
@@ -373,7 +221,7 @@ class DatabaseManager:
             Dictionary with interaction statistics
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Total interactions
@@ -471,7 +319,7 @@ class DatabaseManager:
     async def store_log_batch(self, log_batch: LogBatch) -> None:
         """Store a batch of logs"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Store batch metadata
@@ -494,6 +342,9 @@ class DatabaseManager:
             conn.commit()
             conn.close()
             
+            # Wake detection consumers as soon as the batch is committed
+            log_events.publish(len(log_batch.logs))
+            
             # Store in Elasticsearch if enabled
             if self.enable_elasticsearch and self._elasticsearch_client:
                 await self._store_logs_elasticsearch(log_batch.logs)
@@ -614,7 +465,7 @@ class DatabaseManager:
     async def store_detection_result(self, detection_result: DetectionResult) -> None:
         """Store detection result"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -645,6 +496,18 @@ class DatabaseManager:
             conn.commit()
             conn.close()
             
+            data_change_tracker.record_change('detections')
+            if detection_result.threat_detected:
+                detection_events.publish(
+                    detection_result.id,
+                    (detection_result.ai_analysis or {}).get('agent_id') or (detection_result.ml_results or {}).get('agent_id'),
+                    threat_type=detection_result.threat_type,
+                    severity=detection_result.severity,
+                    techniques=detection_result.mitre_techniques,
+                    detected_at=detection_result.detected_at.isoformat(),
+                    log_entry_id=detection_result.log_entry_id
+                )
+        
         except Exception as e:
             logger.error(f"Failed to store detection result: {e}")
             raise
@@ -652,36 +515,25 @@ class DatabaseManager:
     async def register_agent(self, agent_info: AgentInfo) -> None:
         """Register or update agent information"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO agents (
-                    id, hostname, ip_address, platform, os_version, agent_version,
-                    status, last_heartbeat, capabilities, log_sources, configuration,
-                    security_zone, importance, logs_sent_count, bytes_sent, errors_count
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                agent_info.id,
-                agent_info.hostname,
-                agent_info.ip_address,
-                agent_info.platform,
-                agent_info.os_version,
-                agent_info.agent_version,
-                agent_info.status,
-                agent_info.last_heartbeat.isoformat(),
-                json.dumps(agent_info.capabilities),
-                json.dumps(agent_info.log_sources),
-                json.dumps(agent_info.configuration),
-                agent_info.security_zone,
-                agent_info.importance,
-                agent_info.logs_sent_count,
-                agent_info.bytes_sent,
-                agent_info.errors_count
-            ))
-            
-            conn.commit()
-            conn.close()
+            if self.agent_state.upsert({
+                'agent_id': agent_info.id,
+                'hostname': agent_info.hostname,
+                'ip_address': agent_info.ip_address,
+                'platform': agent_info.platform,
+                'os_version': agent_info.os_version,
+                'agent_version': agent_info.agent_version,
+                'status': agent_info.status,
+                'last_heartbeat': agent_info.last_heartbeat,
+                'capabilities': json.dumps(agent_info.capabilities),
+                'log_sources': json.dumps(agent_info.log_sources),
+                'configuration': json.dumps(agent_info.configuration),
+                'security_zone': agent_info.security_zone,
+                'importance': agent_info.importance,
+                'logs_sent_count': agent_info.logs_sent_count,
+                'bytes_sent': agent_info.bytes_sent,
+                'errors_count': agent_info.errors_count
+            }):
+                data_change_tracker.record_change('agents')
             
         except Exception as e:
             logger.error(f"Failed to register agent: {e}")
@@ -690,33 +542,24 @@ class DatabaseManager:
     async def update_agent_heartbeat(self, agent_id: str, statistics: Dict[str, Any] = None) -> None:
         """Update agent heartbeat and statistics"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if self.agent_state.get(agent_id) is None:
+                return
             
-            update_fields = ['last_heartbeat = ?', 'status = ?']
-            update_values = [datetime.utcnow().isoformat(), 'online']
+            heartbeat_data = {
+                'agent_id': agent_id,
+                'last_heartbeat': datetime.utcnow(),
+                'status': 'online'
+            }
             
             if statistics:
-                update_fields.extend([
-                    'logs_sent_count = ?',
-                    'bytes_sent = ?', 
-                    'errors_count = ?'
-                ])
-                update_values.extend([
-                    statistics.get('logs_sent', 0),
-                    statistics.get('bytes_sent', 0),
-                    statistics.get('connection_errors', 0)
-                ])
-            
-            update_values.append(agent_id)  # For WHERE clause
-            
-            cursor.execute(f'''
-                UPDATE agents SET {', '.join(update_fields)}
-                WHERE id = ?
-            ''', update_values)
+                heartbeat_data.update({
+                    'logs_sent_count': statistics.get('logs_sent', 0),
+                    'bytes_sent': statistics.get('bytes_sent', 0),
+                    'errors_count': statistics.get('connection_errors', 0)
+                })
             
-            conn.commit()
-            conn.close()
+            if self.agent_state.upsert(heartbeat_data):
+                data_change_tracker.record_change('agents')
             
         except Exception as e:
             logger.error(f"Failed to update agent heartbeat: {e}")
@@ -724,13 +567,7 @@ class DatabaseManager:
     async def get_agent_info(self, agent_id: str) -> Optional[AgentInfo]:
         """Get agent information"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM agents WHERE id = ?', (agent_id,))
-            row = cursor.fetchone()
-            conn.close()
+            row = self.agent_state.get(agent_id)
             
             if row:
                 agent_info = AgentInfo()
@@ -763,7 +600,7 @@ class DatabaseManager:
                             hours: int = 24, limit: int = 1000) -> List[Dict[str, Any]]:
         """Get recent log entries"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -785,29 +622,95 @@ class DatabaseManager:
             rows = cursor.fetchall()
             conn.close()
             
-            logs = []
+            return [self._parse_log_row(row) for row in rows]
+            
+        except Exception as e:
+            logger.error(f"Failed to get recent logs: {e}")
+            return []
+    
+    async def get_recent_logs_for_agents(self, agent_ids: List[str], hours: int = 1,
+                                         limit_per_agent: int = 100) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the most recent log entries of several agents in one query, grouped by agent"""
+        if not agent_ids:
+            return {}
+        
+        try:
+            conn = get_db_connection(self.db_path)
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            since_time = datetime.utcnow() - timedelta(hours=hours)
+            agent_ids = list(agent_ids)
+            
+            # Chunked to stay under SQLite's bound-parameter limit
+            rows = []
+            for start in range(0, len(agent_ids), 500):
+                chunk = agent_ids[start:start + 500]
+                cursor.execute(f'''
+                    SELECT * FROM (
+                        SELECT *, ROW_NUMBER() OVER (
+                            PARTITION BY agent_id ORDER BY timestamp DESC
+                        ) AS agent_row
+                        FROM log_entries
+                        WHERE agent_id IN ({', '.join('?' for _ in chunk)}) AND timestamp >= ?
+                    )
+                    WHERE agent_row <= ?
+                    ORDER BY agent_id, timestamp ASC
+                ''', chunk + [since_time.isoformat(), limit_per_agent])
+                rows.extend(cursor.fetchall())
+            
+            conn.close()
+            
+            logs_by_agent: Dict[str, List[Dict[str, Any]]] = {}
             for row in rows:
-                log_data = dict(row)
-                # Parse JSON fields
-                log_data['parsed_data'] = json.loads(row['parsed_data'] or '{}')
-                log_data['enriched_data'] = json.loads(row['enriched_data'] or '{}')
-                log_data['process_info'] = json.loads(row['process_info'] or '{}')
-                log_data['network_info'] = json.loads(row['network_info'] or '{}')
-                log_data['tags'] = json.loads(row['tags'] or '[]')
-                log_data['metadata'] = json.loads(row['metadata'] or '{}')
-                logs.append(log_data)
+                log_data = self._parse_log_row(row)
+                log_data.pop('agent_row', None)
+                logs_by_agent.setdefault(log_data['agent_id'], []).append(log_data)
             
-            return logs
+            return logs_by_agent
+        
+        except Exception as e:
+            logger.error(f"Failed to get recent logs for {len(agent_ids)} agents: {e}")
+            return {}
+    
+    async def get_logs_since(self, since: str, limit: int = 5000) -> List[Dict[str, Any]]:
+        """Get log entries with timestamp >= since, oldest first (for incremental consumers)"""
+        try:
+            conn = get_db_connection(self.db_path)
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
             
+            cursor.execute('''
+                SELECT * FROM log_entries
+                WHERE timestamp >= ?
+                ORDER BY timestamp ASC LIMIT ?
+            ''', (since, limit))
+            
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [self._parse_log_row(row) for row in rows]
+        
         except Exception as e:
-            logger.error(f"Failed to get recent logs: {e}")
+            logger.error(f"Failed to get logs since {since}: {e}")
             return []
     
+    def _parse_log_row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a log_entries row to a dict with JSON fields parsed"""
+        log_data = dict(row)
+        log_data['parsed_data'] = json.loads(row['parsed_data'] or '{}')
+        log_data['enriched_data'] = json.loads(row['enriched_data'] or '{}')
+        log_data['process_info'] = json.loads(row['process_info'] or '{}')
+        log_data['network_info'] = json.loads(row['network_info'] or '{}')
+        log_data['tags'] = json.loads(row['tags'] or '[]')
+        log_data['metadata'] = json.loads(row['metadata'] or '{}')
+        return log_data
+    
     async def get_detection_results(self, hours: int = 24, 
                                   threat_detected_only: bool = True) -> List[Dict[str, Any]]:
         """Get recent detection results"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -847,95 +750,10 @@ class DatabaseManager:
             return []
     
     async def store_agent_info(self, agent_data: dict) -> None:
-        """Store agent information in database"""
+        """Store agent information (buffered in memory, flushed in batches)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            agent_id = agent_data.get('agent_id')
-            
-            # Check if agent already exists
-            cursor.execute('SELECT * FROM agents WHERE id = ?', (agent_id,))
-            existing_agent = cursor.fetchone()
-            
-            if existing_agent:
-                # Update existing agent with new data (preserve existing data)
-                update_fields = []
-                update_values = []
-                
-                if 'status' in agent_data:
-                    update_fields.append('status = ?')
-                    update_values.append(agent_data['status'])
-                
-                if 'last_heartbeat' in agent_data:
-                    update_fields.append('last_heartbeat = ?')
-                    update_values.append(agent_data['last_heartbeat'].isoformat() if agent_data['last_heartbeat'] else datetime.now().isoformat())
-                
-                if 'hostname' in agent_data and agent_data['hostname']:
-                    update_fields.append('hostname = ?')
-                    update_values.append(agent_data['hostname'])
-                
-                if 'ip_address' in agent_data and agent_data['ip_address']:
-                    update_fields.append('ip_address = ?')
-                    update_values.append(agent_data['ip_address'])
-                
-                if 'platform' in agent_data and agent_data['platform']:
-                    update_fields.append('platform = ?')
-                    update_values.append(agent_data['platform'])
-                
-                if 'agent_type' in agent_data and agent_data['agent_type']:
-                    update_fields.append('agent_version = ?')
-                    update_values.append(agent_data['agent_type'])
-                
-                if 'os_version' in agent_data and agent_data['os_version']:
-                    update_fields.append('os_version = ?')
-                    update_values.append(agent_data['os_version'])
-                
-                if 'capabilities' in agent_data:
-                    update_fields.append('capabilities = ?')
-                    update_values.append(agent_data['capabilities'])
-                
-                if 'system_info' in agent_data:
-                    update_fields.append('system_info = ?')
-                    update_values.append(agent_data['system_info'])
-                
-                if 'quick_summary' in agent_data:
-                    update_fields.append('quick_summary = ?')
-                    update_values.append(agent_data['quick_summary'])
-                
-                update_fields.append('updated_at = ?')
-                update_values.append(datetime.now().isoformat())
-                update_values.append(agent_id)
-                
-                if update_fields:
-                    cursor.execute(f'''
-                        UPDATE agents SET {', '.join(update_fields)} WHERE id = ?
-                    ''', update_values)
-            else:
-                # Insert new agent
-                cursor.execute('''
-                    INSERT INTO agents (
-                        id, hostname, ip_address, platform, os_version, status, last_heartbeat, 
-                        agent_version, capabilities, system_info, quick_summary, created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    agent_id,
-                    agent_data.get('hostname'),
-                    agent_data.get('ip_address'),
-                    agent_data.get('platform'),
-                    agent_data.get('os_version', ''),
-                    agent_data.get('status', 'active'),
-                    agent_data.get('last_heartbeat').isoformat() if agent_data.get('last_heartbeat') else datetime.now().isoformat(),
-                    agent_data.get('agent_type', 'client_endpoint'),
-                    agent_data.get('capabilities', '[]'),
-                    agent_data.get('system_info', '{}'),
-                    agent_data.get('quick_summary', '{}'),
-                    datetime.now().isoformat(),
-                    datetime.now().isoformat()
-                ))
-            
-            conn.commit()
-            conn.close()
+            if self.agent_state.upsert(agent_data):
+                data_change_tracker.record_change('agents')
             
         except Exception as e:
             logger.error(f"Failed to store agent info: {e}")
@@ -943,7 +761,7 @@ class DatabaseManager:
     async def store_log_entry(self, log_data: dict) -> None:
         """Store log entry in database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Generate a unique ID for the log entry
@@ -967,6 +785,7 @@ class DatabaseManager:
             
             conn.commit()
             conn.close()
+            log_events.publish(1)
             
         except Exception as e:
             logger.error(f"Failed to store log entry: {e}")
@@ -974,7 +793,7 @@ class DatabaseManager:
     async def store_log_entry_with_id(self, log_data: dict) -> str:
         """Store log entry in database and return the log ID"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Generate a unique ID for the log entry
@@ -998,6 +817,7 @@ class DatabaseManager:
             
             conn.commit()
             conn.close()
+            log_events.publish(1)
             
             return log_id
             
@@ -1017,7 +837,7 @@ class DatabaseManager:
     async def get_log_entries(self, limit: int = 100, offset: int = 0, agent_id: str = None) -> list:
         """Get log entries from database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Build query
@@ -1070,30 +890,18 @@ class DatabaseManager:
             return []
     
     async def get_all_agents(self) -> list:
-        """Get all agents from database"""
+        """Get all agents from the in-memory agent state table"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, hostname, ip_address, platform, status, last_heartbeat, agent_version
-                FROM agents 
-                ORDER BY last_heartbeat DESC
-            ''')
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
             agents = []
-            for row in rows:
+            for row in self.agent_state.get_all():
                 agents.append({
-                    'agent_id': row[0],
-                    'hostname': row[1],
-                    'ip_address': row[2],
-                    'platform': row[3],
-                    'status': row[4],
-                    'last_heartbeat': row[5],
-                    'agent_type': row[6] if row[6] else 'client_endpoint'
+                    'agent_id': row['id'],
+                    'hostname': row['hostname'],
+                    'ip_address': row['ip_address'],
+                    'platform': row['platform'],
+                    'status': row['status'],
+                    'last_heartbeat': row['last_heartbeat'],
+                    'agent_type': row['agent_version'] if row['agent_version'] else 'client_endpoint'
                 })
             
             return agents
@@ -1102,26 +910,16 @@ class DatabaseManager:
             logger.error(f"Failed to get all agents: {e}")
             return []
     
+    async def flush_agent_state(self) -> int:
+        """Write buffered agent updates to SQLite immediately"""
+        return await self.agent_state.flush()
+    
     async def get_pending_commands(self, agent_id: str) -> List[Dict]:
         """Get pending commands for an agent"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
-            # Create commands table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS commands (
-                    command_id TEXT PRIMARY KEY,
-                    agent_id TEXT NOT NULL,
-                    technique TEXT,
-                    command_data TEXT,
-                    status TEXT DEFAULT 'queued',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    executed_at TIMESTAMP,
-                    result TEXT
-                )
-            """)
-            
             # Get pending commands for the agent
             cursor.execute("""
                 SELECT command_id, technique, command_data, status, created_at
@@ -1150,22 +948,9 @@ class DatabaseManager:
     async def store_command_result(self, result_info: Dict) -> bool:
         """Store command execution result"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
-            # Create command results table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS command_results (
-                    result_id TEXT PRIMARY KEY,
-                    command_id TEXT NOT NULL,
-                    agent_id TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    output TEXT,
-                    exit_code INTEGER,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
             # Store command result
             result_id = f"result_{int(datetime.now().timestamp())}"
             cursor.execute("""
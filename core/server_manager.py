@@ -194,6 +194,13 @@ class LogForwardingServer:
             
             if self.topology_monitor:
                 await self.topology_monitor.stop()
+            
+            # Write back buffered agent heartbeats
+            await self.database_manager.agent_state.stop()
+            
+            # Stop the command dispatcher resync task
+            from core.server.command_queue.command_dispatcher import get_command_dispatcher
+            await get_command_dispatcher(self.database_manager.db_path).stop()
                 
             logger.info("Background tasks stopped")
         except Exception as e:
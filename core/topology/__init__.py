@@ -4,10 +4,21 @@ Network topology package
 
 from .network_mapper import NetworkTopologyMapper, NetworkNode, NetworkTopology
 from .continuous_topology_monitor import ContinuousTopologyMonitor
+from .incremental_engine import IncrementalTopologyEngine, get_topology_engine
+from .attack_graph import AttackGraph, get_attack_graph
+from .change_bus import TopologyChangeBus, get_topology_change_bus
+from .stream_aggregator import StreamingTopologyAggregator
 
 __all__ = [
     'NetworkTopologyMapper', 
     'NetworkNode', 
     'NetworkTopology',
-    'ContinuousTopologyMonitor'
+    'ContinuousTopologyMonitor',
+    'IncrementalTopologyEngine',
+    'get_topology_engine',
+    'AttackGraph',
+    'get_attack_graph',
+    'TopologyChangeBus',
+    'get_topology_change_bus',
+    'StreamingTopologyAggregator'
 ]
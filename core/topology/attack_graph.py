@@ -0,0 +1,517 @@
+"""
+Attack Graph Engine
+Sparse attack graph over network nodes with bounded k-shortest-path search toward high-value targets
+"""
+
+import heapq
+import hashlib
+import logging
+import threading
+from itertools import count
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# Cost of moving between security zones (source zone, target zone); missing pairs are not traversable
+ZONE_TRANSITIONS: Dict[Tuple[str, str], float] = {
+    ('external', 'dmz'): 2.0,
+    ('dmz', 'internal'): 2.0,
+    ('dmz', 'corporate'): 2.0,
+    ('corporate', 'internal'): 1.5,
+    ('internal', 'corporate'): 1.5,
+    ('internal', 'secure'): 3.0,
+    ('corporate', 'secure'): 3.0
+}
+
+# Cost of a lateral move inside a zone
+SAME_ZONE_COST = 1.0
+
+# Cost of following an observed trust relationship (cheaper than a generic zone move)
+TRUST_EDGE_COST = 0.5
+
+# Virtual super-source connected to every entry point
+_SOURCE = ('__source__',)
+
+
+def zone_transition_cost(source_zone: Optional[str], target_zone: Optional[str]) -> Optional[float]:
+    """Cost of an attack step between zones, or None if the step is not possible"""
+    if source_zone is not None and source_zone == target_zone:
+        return SAME_ZONE_COST
+    return ZONE_TRANSITIONS.get((source_zone, target_zone))
+
+
+def graph_fingerprint(items: Iterable[Tuple]) -> str:
+    """Stable version token for graphs built from plain records (no topology version)"""
+    digest = hashlib.sha1()
+    for item in sorted(repr(item) for item in items):
+        digest.update(item.encode())
+    return digest.hexdigest()
+
+
+class AttackGraph:
+    """
+    Adjacency-list attack graph
+    
+    Lateral movement allowed by security zones is kept implicit: every node
+    links to a virtual hub for its zone, and each hub fans out lazily to the
+    members of reachable zones. The graph therefore stays O(nodes + trust
+    edges) instead of materializing every zone-permitted node pair.
+    """
+    
+    def __init__(self, zone_transitions: Optional[Dict[Tuple[str, str], float]] = None):
+        self.zone_transitions = ZONE_TRANSITIONS if zone_transitions is None else zone_transitions
+        
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.adjacency: Dict[str, Dict[str, float]] = {}
+        
+        # zone -> members, plus lazily derived zone links and reverse edges
+        self._zones: Dict[str, List[str]] = {}
+        self._hub_targets: Dict[str, List[Tuple[str, float]]] = {}
+        self._hub_sources: Dict[str, List[Tuple[str, float]]] = {}
+        self._reverse: Optional[Dict[str, Dict[str, float]]] = None
+        
+        # Cached search results for this graph version
+        self._path_cache: Dict[Tuple, List[List[str]]] = {}
+    
+    def add_node(self, node_id: str, zone: Optional[str] = None, cost: float = 0.0, **attributes) -> None:
+        """Add a node; `cost` is the extra effort to compromise it"""
+        self.nodes[node_id] = {'zone': zone, 'cost': max(cost, 0.0), **attributes}
+        self.adjacency.setdefault(node_id, {})
+        if zone is not None:
+            self._zones.setdefault(zone, []).append(node_id)
+        self._invalidate()
+    
+    def add_edge(self, source: str, target: str, weight: float = TRUST_EDGE_COST,
+                 bidirectional: bool = False) -> None:
+        """Add an explicit edge (e.g. a trust relationship) between known nodes"""
+        if source == target or source not in self.nodes or target not in self.nodes:
+            return
+        current = self.adjacency[source].get(target)
+        if current is None or weight < current:
+            self.adjacency[source][target] = weight
+        if bidirectional:
+            self.add_edge(target, source, weight)
+        self._reverse = None
+        self._path_cache.clear()
+    
+    def _invalidate(self) -> None:
+        self._hub_targets.clear()
+        self._hub_sources.clear()
+        self._reverse = None
+        self._path_cache.clear()
+    
+    def _reachable_zones(self, zone: str) -> List[Tuple[str, float]]:
+        """Zones a hub fans out to, with the transition cost"""
+        targets = self._hub_targets.get(zone)
+        if targets is None:
+            targets = []
+            for target_zone in self._zones:
+                cost = (SAME_ZONE_COST if target_zone == zone
+                        else self.zone_transitions.get((zone, target_zone)))
+                if cost is not None:
+                    targets.append((target_zone, cost))
+            self._hub_targets[zone] = targets
+        return targets
+    
+    def _entering_zones(self, zone: str) -> List[Tuple[str, float]]:
+        """Zones whose hubs fan out to `zone`, with the transition cost"""
+        sources = self._hub_sources.get(zone)
+        if sources is None:
+            sources = [(source_zone, cost) for source_zone in self._zones
+                       for target_zone, cost in self._reachable_zones(source_zone) if target_zone == zone]
+            self._hub_sources[zone] = sources
+        return sources
+    
+    def _reverse_adjacency(self) -> Dict[str, Dict[str, float]]:
+        if self._reverse is None:
+            self._reverse = {node_id: {} for node_id in self.nodes}
+            for source, neighbours in self.adjacency.items():
+                for target, weight in neighbours.items():
+                    self._reverse[target][source] = weight
+        return self._reverse
+    
+    @staticmethod
+    def _hub(zone: str) -> Tuple[str, str]:
+        return ('__zone__', zone)
+    
+    @staticmethod
+    def _hub_visit(zone: str, via: str) -> Tuple[str, str, str]:
+        """A pass through a zone hub, keyed by the real node it was entered from"""
+        return ('__zone__', zone, via)
+    
+    @staticmethod
+    def _is_real(node: Hashable) -> bool:
+        return not isinstance(node, tuple)
+    
+    def reachable_from(self, sources: Iterable[str], max_hops: Optional[int] = None) -> Set[str]:
+        """Nodes reachable from any source (BFS, each zone hub expanded once)"""
+        visited: Set[str] = set()
+        expanded_zones: Set[str] = set()
+        queue = deque()
+        
+        for source in sources:
+            if source in self.nodes and source not in visited:
+                visited.add(source)
+                queue.append((source, 0))
+        
+        while queue:
+            node_id, hops = queue.popleft()
+            if max_hops is not None and hops >= max_hops:
+                continue
+            
+            neighbours = list(self.adjacency.get(node_id, {}))
+            zone = self.nodes[node_id]['zone']
+            if zone is not None and zone not in expanded_zones:
+                expanded_zones.add(zone)
+                for target_zone, _ in self._reachable_zones(zone):
+                    neighbours.extend(self._zones[target_zone])
+            
+            for neighbour in neighbours:
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    queue.append((neighbour, hops + 1))
+        
+        return visited
+    
+    def distances_to(self, targets: Iterable[str]) -> Dict[Hashable, float]:
+        """
+        Cost from every node (and zone hub) to the nearest target
+        
+        Reverse multi-target Dijkstra; nodes missing from the result cannot
+        reach any target. Used as the A* heuristic and for pruning.
+        """
+        reverse = self._reverse_adjacency()
+        tie = count()
+        dist: Dict[Hashable, float] = {}
+        heap = []
+        for target in targets:
+            if target in self.nodes:
+                dist[target] = 0.0
+                heap.append((0.0, next(tie), target))
+        heapq.heapify(heap)
+        settled: Set[Hashable] = set()
+        
+        def relax(node: Hashable, cost: float) -> None:
+            if cost < dist.get(node, float('inf')):
+                dist[node] = cost
+                heapq.heappush(heap, (cost, next(tie), node))
+        
+        while heap:
+            cost, _, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            
+            if not self._is_real(node):
+                # Every member of a zone reaches its hub for free
+                for member in self._zones.get(node[1], []):
+                    relax(member, cost)
+                continue
+            
+            entry_cost = cost + self.nodes[node]['cost']
+            for predecessor, weight in reverse[node].items():
+                relax(predecessor, entry_cost + weight)
+            
+            zone = self.nodes[node]['zone']
+            if zone is not None:
+                for source_zone, transition_cost in self._entering_zones(zone):
+                    relax(self._hub(source_zone), entry_cost + transition_cost)
+        
+        return dist
+    
+    def _fan_out_order(self, heuristic: Dict[Hashable, float]) -> Dict[str, List[Tuple[float, str]]]:
+        """Zone members that can reach a target, sorted by entry cost plus heuristic"""
+        order = {}
+        for zone, members in self._zones.items():
+            order[zone] = sorted((self.nodes[member]['cost'] + heuristic[member], member)
+                                 for member in members if member in heuristic)
+        return order
+    
+    def _shortest_path(self, sources: List[str], target: str, max_hops: int,
+                       heuristic: Dict[Hashable, float], fan_out_order: Dict[str, List[Tuple[float, str]]],
+                       blocked_nodes: Set[Hashable] = frozenset(),
+                       blocked_edges: Set[Tuple[Hashable, Hashable]] = frozenset(),
+                       start: Hashable = _SOURCE, start_hops: int = -1) -> Optional[Tuple[float, List[Hashable]]]:
+        """
+        A* from `start` (the virtual source by default) to `target`
+        
+        `heuristic` holds admissible costs-to-target; nodes without one cannot
+        reach the target and are never expanded. Zone hubs are transit-only:
+        each real node gets its own hub visit, so a path may cross the same
+        zone hub more than once. A hub's fan-out is a lazy iterator over members
+        in heuristic order, so each search only touches the few members that
+        can lie on a cheap path. Paths are not extended beyond `max_hops` steps
+        (counted from the virtual source, `start_hops` being the steps to `start`).
+        
+        Search states are (node, hops), so a cheap but long route to a node does
+        not hide a costlier, shorter one that still fits the hop limit. A node is
+        expanded again only when reached in fewer hops than any earlier visit.
+        """
+        tie = count()
+        start_state = (start, start_hops)
+        dist: Dict[Tuple[Hashable, int], float] = {start_state: 0.0}
+        previous: Dict[Tuple[Hashable, int], Tuple[Hashable, int]] = {}
+        # Fewest hops each node was expanded with
+        settled_hops: Dict[Hashable, int] = {}
+        heap: List[Tuple] = [(self._estimate(heuristic, start, 0.0), next(tie), start_state, None)]
+        
+        def relax(state: Tuple[Hashable, int], neighbour: Hashable, cost: float) -> None:
+            node, node_hops = state
+            if neighbour in blocked_nodes or (node, neighbour) in blocked_edges:
+                return
+            neighbour_hops = node_hops + (1 if self._is_real(neighbour) else 0)
+            if settled_hops.get(neighbour, max_hops + 1) <= neighbour_hops:
+                return
+            estimate = self._estimate(heuristic, neighbour)
+            if estimate is None:
+                return
+            neighbour_state = (neighbour, neighbour_hops)
+            if cost < dist.get(neighbour_state, float('inf')):
+                dist[neighbour_state] = cost
+                previous[neighbour_state] = state
+                heapq.heappush(heap, (cost + estimate, next(tie), neighbour_state, None))
+        
+        while heap:
+            _, _, state, fan_out = heapq.heappop(heap)
+            
+            if fan_out is not None:
+                # Lazy hub fan-out: emit one zone member and re-queue the next one
+                members, index, base = fan_out
+                if index + 1 < len(members):
+                    heapq.heappush(heap, (base + members[index + 1][0], next(tie), state,
+                                          (members, index + 1, base)))
+                member = members[index][1]
+                relax(state, member, base + self.nodes[member]['cost'])
+                continue
+            
+            node, node_hops = state
+            # With a consistent heuristic an earlier visit in no more hops was also no costlier
+            if settled_hops.get(node, max_hops + 1) <= node_hops:
+                continue
+            settled_hops[node] = node_hops
+            cost = dist[state]
+            
+            if node == target:
+                path = [state]
+                while path[-1] != start_state:
+                    path.append(previous[path[-1]])
+                path.reverse()
+                return cost, [path_node for path_node, _ in path]
+            
+            if node == _SOURCE:
+                for source in sources:
+                    relax(state, source, self.nodes[source]['cost'])
+                continue
+            
+            if not self._is_real(node):
+                for target_zone, transition_cost in self._reachable_zones(node[1]):
+                    members = fan_out_order.get(target_zone)
+                    if members:
+                        base = cost + transition_cost
+                        heapq.heappush(heap, (base + members[0][0], next(tie), state, (members, 0, base)))
+                continue
+            
+            if node_hops >= max_hops:
+                continue
+            
+            for neighbour, weight in self.adjacency[node].items():
+                relax(state, neighbour, cost + weight + self.nodes[neighbour]['cost'])
+            
+            zone = self.nodes[node]['zone']
+            if zone is not None:
+                relax(state, self._hub_visit(zone, node), cost)
+        
+        return None
+    
+    def _estimate(self, heuristic: Dict[Hashable, float], node: Hashable,
+                  default: Optional[float] = None) -> Optional[float]:
+        """Heuristic for a search state; hub visits share their zone hub's estimate"""
+        if not self._is_real(node) and len(node) == 3:
+            node = self._hub(node[1])
+        return heuristic.get(node, default)
+    
+    def k_shortest_paths(self, sources: Iterable[str], target: str, k: int = 3, max_hops: int = 6,
+                         heuristic: Optional[Dict[Hashable, float]] = None,
+                         fan_out_order: Optional[Dict[str, List[Tuple[float, str]]]] = None
+                         ) -> List[Tuple[float, List[str]]]:
+        """
+        Yen's k loopless shortest paths from any source to a target
+        
+        Returns:
+            (cost, path) pairs, cheapest first; paths contain real node ids only
+        """
+        sources = [source for source in sources if source in self.nodes]
+        if not sources or target not in self.nodes:
+            return []
+        
+        if heuristic is None:
+            heuristic = self.distances_to([target])
+        if fan_out_order is None:
+            fan_out_order = self._fan_out_order(heuristic)
+        
+        first = self._shortest_path(sources, target, max_hops, heuristic, fan_out_order)
+        if first is None:
+            return []
+        
+        accepted: List[Tuple[float, List[Hashable]]] = [first]
+        candidates: List[Tuple[float, int, List[Hashable]]] = []
+        seen_paths = {tuple(first[1])}
+        # A trust edge and a zone move between the same hosts give one real path
+        distinct = {self._real_path(first[1])}
+        tie = count()
+        
+        while len(distinct) < k:
+            _, last_path = accepted[-1]
+            
+            for index in range(len(last_path) - 1):
+                spur_node = last_path[index]
+                root_path = last_path[:index + 1]
+                
+                blocked_edges = {
+                    (path[index], path[index + 1])
+                    for _, path in accepted
+                    if len(path) > index + 1 and path[:index + 1] == root_path
+                }
+                # Hub visits are transit-only; only hosts already on the root are excluded
+                blocked_nodes = {node for node in root_path[:-1] if self._is_real(node)}
+                
+                spur = self._shortest_path(sources, target, max_hops, heuristic, fan_out_order,
+                                           blocked_nodes, blocked_edges, start=spur_node,
+                                           start_hops=sum(1 for node in root_path if self._is_real(node)) - 1)
+                if spur is None:
+                    continue
+                
+                candidate = root_path[:-1] + spur[1]
+                key = tuple(candidate)
+                if key in seen_paths:
+                    continue
+                seen_paths.add(key)
+                heapq.heappush(candidates, (self._path_cost(candidate), next(tie), candidate))
+            
+            if not candidates:
+                break
+            cost, _, path = heapq.heappop(candidates)
+            accepted.append((cost, path))
+            distinct.add(self._real_path(path))
+        
+        results = []
+        emitted = set()
+        for cost, path in accepted:
+            real_path = self._real_path(path)
+            if len(real_path) - 1 > max_hops or real_path in emitted:
+                continue
+            emitted.add(real_path)
+            results.append((cost, list(real_path)))
+        return results
+    
+    def _real_path(self, path: List[Hashable]) -> Tuple[str, ...]:
+        return tuple(node for node in path if self._is_real(node))
+    
+    def _path_cost(self, path: List[Hashable]) -> float:
+        """Cost of a path through real and hub nodes"""
+        total = 0.0
+        for node, neighbour in zip(path, path[1:]):
+            if not self._is_real(neighbour):
+                continue
+            if node == _SOURCE:
+                total += self.nodes[neighbour]['cost']
+            elif self._is_real(node):
+                total += self.adjacency[node][neighbour] + self.nodes[neighbour]['cost']
+            else:
+                target_zone = self.nodes[neighbour]['zone']
+                transition = (SAME_ZONE_COST if node[1] == target_zone
+                              else self.zone_transitions.get((node[1], target_zone), 0.0))
+                total += transition + self.nodes[neighbour]['cost']
+        return total
+    
+    def attack_paths(self, entry_points: Iterable[str], targets: Iterable[str], k: int = 3,
+                     max_hops: int = 6, max_paths: int = 50, max_targets: int = 10) -> List[List[str]]:
+        """
+        Cheapest attack paths from entry points to targets
+        
+        Targets are taken in the given (priority) order; those unreachable from
+        every entry point are pruned before searching, and at most `max_targets`
+        are searched. Results are cached on the graph, so repeated queries
+        against the same topology version are free.
+        """
+        entry_points = sorted({node_id for node_id in entry_points if node_id in self.nodes})
+        targets = list(OrderedDict.fromkeys(node_id for node_id in targets if node_id in self.nodes))
+        cache_key = (tuple(entry_points), tuple(targets), k, max_hops, max_paths, max_targets)
+        
+        cached = self._path_cache.get(cache_key)
+        if cached is not None:
+            return [list(path) for path in cached]
+        
+        reachable = self.reachable_from(entry_points, max_hops=max_hops)
+        targets = [target for target in targets if target in reachable][:max_targets]
+        
+        scored: List[Tuple[float, List[str]]] = []
+        for target in targets:
+            sources = [entry for entry in entry_points if entry != target]
+            scored.extend(self.k_shortest_paths(sources, target, k=k, max_hops=max_hops))
+        
+        scored.sort(key=lambda item: (item[0], len(item[1])))
+        paths = [path for _, path in scored if len(path) > 1][:max_paths]
+        
+        self._path_cache[cache_key] = paths
+        return [list(path) for path in paths]
+    
+    def count_possible_edges(self) -> int:
+        """Number of node pairs with a direct attack step, computed without enumerating them"""
+        total = 0
+        for zone, members in self._zones.items():
+            for target_zone, _ in self._reachable_zones(zone):
+                if target_zone == zone:
+                    total += len(members) * (len(members) - 1)
+                else:
+                    total += len(members) * len(self._zones[target_zone])
+        
+        for source, neighbours in self.adjacency.items():
+            source_zone = self.nodes[source]['zone']
+            for target in neighbours:
+                if zone_transition_cost(source_zone, self.nodes[target]['zone']) is None:
+                    total += 1
+        return total
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get graph statistics"""
+        return {
+            'nodes': len(self.nodes),
+            'explicit_edges': sum(len(neighbours) for neighbours in self.adjacency.values()),
+            'zones': {zone: len(members) for zone, members in self._zones.items()},
+            'cached_queries': len(self._path_cache)
+        }
+
+
+# Graphs cached by caller key and topology version
+_attack_graphs: 'OrderedDict[str, Tuple[Any, AttackGraph]]' = OrderedDict()
+_attack_graphs_lock = threading.Lock()
+_MAX_CACHED_GRAPHS = 16
+
+def get_attack_graph(key: str, version: Any, builder: Callable[[], AttackGraph]) -> AttackGraph:
+    """
+    Get the attack graph for `key` at `version`, building it on a miss
+    
+    Args:
+        key: Graph owner (e.g. the topology database path)
+        version: Topology version or fingerprint; a new value rebuilds the graph
+        builder: Builds the graph when no cached copy matches
+    """
+    with _attack_graphs_lock:
+        cached = _attack_graphs.get(key)
+        if cached is not None and cached[0] == version:
+            _attack_graphs.move_to_end(key)
+            return cached[1]
+    
+    graph = builder()
+    
+    with _attack_graphs_lock:
+        _attack_graphs[key] = (version, graph)
+        _attack_graphs.move_to_end(key)
+        while len(_attack_graphs) > _MAX_CACHED_GRAPHS:
+            _attack_graphs.popitem(last=False)
+    
+    return graph
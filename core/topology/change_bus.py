@@ -0,0 +1,237 @@
+"""
+Topology Change Bus
+In-process fan-out of topology changes to independent subscribers
+
+Each subscriber has its own bounded pending set, so a slow subscriber only
+delays itself. Repeated changes to the same agent are coalesced while a
+subscriber is busy, and a subscriber that falls too far behind is told to
+resynchronize instead of growing its backlog without bound. Fan-out itself
+is the shared event bus (shared.event_bus).
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from shared.event_bus import EventBus, Subscription
+
+logger = logging.getLogger(__name__)
+
+
+ChangeCallback = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+class TopologySubscription(Subscription):
+    """One subscriber's coalesced view of the change feed"""
+    
+    def __init__(self, bus: 'TopologyChangeBus', name: str, max_pending: int = 1000,
+                 slow_consumer_seconds: float = 5.0):
+        super().__init__(bus)
+        self.name = name
+        self.max_pending = max_pending
+        self.slow_consumer_seconds = slow_consumer_seconds
+        
+        # agent_id -> change types not yet delivered (None marks a removal)
+        self._pending: 'OrderedDict[str, Optional[Set[str]]]' = OrderedDict()
+        self._pending_since: Optional[float] = None
+        self._resync_required = False
+        self._topology_version = 0
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.slow = False
+        
+        self.stats = {
+            'published': 0,
+            'coalesced': 0,
+            'delivered': 0,
+            'overflows': 0,
+            'slow_deliveries': 0,
+            'last_delivery_seconds': 0.0
+        }
+    
+    def _offer(self, change: Dict[str, Any]) -> None:
+        """Merge a change into the pending set (never blocks the publisher)"""
+        if self.closed:
+            return
+        
+        self.stats['published'] += 1
+        self._topology_version = max(self._topology_version, change['version'])
+        
+        if not self._resync_required:
+            for agent_id, change_types in change['changed'].items():
+                if agent_id in self._pending:
+                    self.stats['coalesced'] += 1
+                pending = self._pending.get(agent_id)
+                if pending is None:
+                    self._pending[agent_id] = set(change_types)
+                else:
+                    pending.update(change_types)
+            for agent_id in change['removed']:
+                if agent_id in self._pending:
+                    self.stats['coalesced'] += 1
+                self._pending[agent_id] = None
+            
+            if len(self._pending) > self.max_pending:
+                # Too far behind: drop the details and ask for a resync
+                self.stats['overflows'] += 1
+                self._pending.clear()
+                self._resync_required = True
+                if not self.slow:
+                    logger.warning(f"Topology subscriber '{self.name}' overflowed; it will be asked to resync")
+                self.slow = True
+        
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        self._event.set()
+    
+    @property
+    def lag_seconds(self) -> float:
+        """How long the oldest undelivered change has been waiting"""
+        return time.monotonic() - self._pending_since if self._pending_since is not None else 0.0
+    
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending) or self._resync_required
+    
+    def _drain(self) -> Dict[str, Any]:
+        changed = {agent_id: sorted(types) for agent_id, types in self._pending.items() if types is not None}
+        removed = [agent_id for agent_id, types in self._pending.items() if types is None]
+        notification = {
+            'event': 'topology_changed',
+            'timestamp': datetime.utcnow().isoformat(),
+            'topology_version': self._topology_version,
+            'changed_agents': list(changed) + removed,
+            'changes': changed,
+            'removed_agents': removed,
+            'change_count': len(changed) + len(removed),
+            'full_resync_required': self._resync_required
+        }
+        self._pending.clear()
+        self._pending_since = None
+        self._resync_required = False
+        self._event.clear()
+        return notification
+    
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next coalesced notification (None on timeout or close)"""
+        while not self.has_pending:
+            if self.closed:
+                return None
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            self._event.clear()
+        
+        self.stats['delivered'] += 1
+        return self._drain()
+    
+    def _wake(self) -> None:
+        self._event.set()
+    
+    def close(self) -> None:
+        """Stop receiving changes"""
+        super().close()
+        if self._task and not self._task.done():
+            self._task.cancel()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'pending': len(self._pending),
+            'lag_seconds': round(self.lag_seconds, 3),
+            'slow': self.slow,
+            **self.stats
+        }
+
+
+class TopologyChangeBus(EventBus):
+    """Publishes topology deltas to subscribers without waiting on them"""
+    
+    def __init__(self):
+        super().__init__('Topology change')
+        self.subscriptions: List[TopologySubscription] = []
+        self.topology_version = 0
+    
+    def publish(self, version: int, changed: Dict[str, Iterable[str]], removed: Iterable[str] = ()) -> None:
+        """Fan a committed topology delta out to every subscriber"""
+        removed = list(removed)
+        if not changed and not removed:
+            return
+        
+        self.topology_version = max(self.topology_version, version)
+        self._fan_out({'version': version, 'changed': changed, 'removed': removed})
+    
+    def subscribe(self, callback: Optional[ChangeCallback] = None, name: Optional[str] = None,
+                  max_pending: int = 1000, slow_consumer_seconds: float = 5.0) -> TopologySubscription:
+        """Subscribe to changes; with a callback, deliveries run in the subscriber's own task"""
+        if name is None:
+            name = getattr(callback, '__qualname__', None) or f"subscriber-{len(self.subscriptions) + 1}"
+        
+        subscription = TopologySubscription(self, name, max_pending, slow_consumer_seconds)
+        self._add(subscription)
+        
+        if callback is not None:
+            subscription._task = asyncio.ensure_future(self._deliver(subscription, callback))
+        return subscription
+    
+    async def _deliver(self, subscription: TopologySubscription, callback: ChangeCallback) -> None:
+        while not subscription.closed:
+            notification = await subscription.get()
+            if notification is None:
+                continue
+            
+            started = time.monotonic()
+            try:
+                result = callback(notification)
+                if inspect.isawaitable(result):
+                    await result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Topology subscriber '{subscription.name}' failed: {e}")
+            
+            elapsed = time.monotonic() - started
+            subscription.stats['last_delivery_seconds'] = round(elapsed, 3)
+            if elapsed > subscription.slow_consumer_seconds:
+                subscription.stats['slow_deliveries'] += 1
+                if not subscription.slow:
+                    logger.warning(f"Slow topology subscriber '{subscription.name}': delivery took {elapsed:.1f}s")
+                subscription.slow = True
+            else:
+                subscription.slow = False
+    
+    def check_slow_consumers(self) -> List[str]:
+        """Names of subscribers whose oldest pending change is older than their threshold"""
+        slow = []
+        for subscription in self.subscriptions:
+            if subscription.has_pending and subscription.lag_seconds > subscription.slow_consumer_seconds:
+                if not subscription.slow:
+                    logger.warning(f"Topology subscriber '{subscription.name}' is lagging "
+                                   f"{subscription.lag_seconds:.1f}s behind")
+                subscription.slow = True
+                slow.append(subscription.name)
+        return slow
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'topology_version': self.topology_version,
+            'subscribers': [subscription.get_statistics() for subscription in self.subscriptions],
+            **self.stats
+        }
+
+
+# Global change bus shared by the topology monitor, attack agents and API streams
+_change_bus: Optional[TopologyChangeBus] = None
+
+
+def get_topology_change_bus() -> TopologyChangeBus:
+    """Get the process-wide topology change bus"""
+    global _change_bus
+    if _change_bus is None:
+        _change_bus = TopologyChangeBus()
+    return _change_bus
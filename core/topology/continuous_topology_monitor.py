@@ -5,32 +5,43 @@ Real-time network topology updates from streaming logs
 
 import asyncio
 import logging
-from typing import Dict, Any, Set, List
+import time
+from typing import Dict, Any, Set, List, Optional
 from datetime import datetime, timedelta
 from collections import defaultdict
 
-from .network_mapper import NetworkTopologyMapper, NetworkNode
+from .network_mapper import NetworkTopologyMapper
+from .change_bus import TopologySubscription, get_topology_change_bus
+from .stream_aggregator import StreamingTopologyAggregator
 from shared.models import LogEntry
 
 
 logger = logging.getLogger(__name__)
 
 
+# Change kinds the streaming aggregator summarizes; logs with other kinds are applied whole
+AGGREGATED_CHANGES = {'ip_address', 'network_connection', 'service_discovery'}
+
+
 class ContinuousTopologyMonitor:
     """Continuously monitors and updates network topology from real-time logs"""
     
     def __init__(self, database_manager, topology_mapper: NetworkTopologyMapper):
         self.db_manager = database_manager
         self.topology_mapper = topology_mapper
+        self.engine = topology_mapper.engine
         
-        # Real-time processing
+        # Real-time processing (queue items are batches of log entries)
         self.running = False
         self.update_queue = asyncio.Queue(maxsize=1000)
+        self.max_coalesced_batches = 50
         self.batch_update_interval = 30  # seconds
-        self.full_refresh_interval = 300  # 5 minutes
+        self.full_refresh_interval = 300  # 5 minutes (incremental catch-up from stored logs)
         
-        # Change tracking
+        # Change tracking; agents whose batches were dropped under backpressure are
+        # refreshed from stored logs by the batch updater
         self.pending_changes = defaultdict(set)
+        self.stale_agents: Set[str] = set()
         self.last_full_refresh = None
         self.topology_version = 0
         
@@ -41,11 +52,17 @@ class ContinuousTopologyMonitor:
             'nodes_updated': 0,
             'services_discovered': 0,
             'relationships_found': 0,
+            'batches_processed': 0,
+            'batches_dropped': 0,
+            'agents_refreshed': 0,
             'start_time': None
         }
         
-        # Subscribers for topology changes
-        self.change_subscribers = []
+        # Subscribers for topology changes; each gets its own coalescing queue
+        # on the shared change bus so a slow one cannot hold up the others
+        self.change_bus = get_topology_change_bus()
+        self.change_subscribers: List[TopologySubscription] = []
+        self.slow_consumer_check_interval = 5  # seconds
     
     async def start(self) -> None:
         """Start continuous topology monitoring"""
@@ -56,6 +73,17 @@ class ContinuousTopologyMonitor:
         self.running = True
         self.stats['start_time'] = datetime.utcnow()
         
+        # Attack agents receive changes through the bus like any other subscriber
+        self.change_subscribers.append(
+            self.change_bus.subscribe(self._notify_attack_agents, name='attack_agents')
+        )
+        
+        # Load the persisted graph and catch up before streaming updates
+        delta = await self.engine.catch_up(hours=24)
+        self.topology_version = self.engine.version
+        if delta:
+            await self._notify_topology_changes(delta)
+        
         # Start monitoring tasks
         tasks = [
             asyncio.create_task(self._real_time_processor()),
@@ -75,22 +103,48 @@ class ContinuousTopologyMonitor:
         """Stop continuous monitoring"""
         logger.info("Stopping Continuous Network Topology Monitor")
         self.running = False
+        
+        for subscription in self.change_subscribers:
+            subscription.close()
+        self.change_subscribers.clear()
+        
+        # Persist changes applied since the last batch
+        try:
+            await self.engine.commit()
+        except Exception as e:
+            logger.error(f"Final topology commit failed: {e}")
     
     async def process_log_entry(self, log_entry: LogEntry) -> None:
         """Process individual log entry for topology updates"""
+        await self.process_log_batch([log_entry])
+    
+    async def process_log_batch(self, log_entries: List[LogEntry]) -> None:
+        """Queue the topology-relevant entries of an ingested batch as a single update"""
         try:
             if not self.running:
                 return
             
-            # Check if log entry contains network-relevant information
-            if await self._is_topology_relevant(log_entry):
-                await self.update_queue.put(log_entry)
+            # Check if log entries contain network-relevant information
+            relevant = [log_entry for log_entry in log_entries if self._is_relevant(log_entry)]
+            if not relevant:
+                return
+            
+            try:
+                self.update_queue.put_nowait(relevant)
+            except asyncio.QueueFull:
+                # Never block ingestion; re-read these agents' logs on the next batch update
+                self.stale_agents.update(log_entry.agent_id for log_entry in relevant)
+                self.stats['batches_dropped'] += 1
         
         except Exception as e:
-            logger.error(f"Failed to process log entry for topology: {e}")
+            logger.error(f"Failed to process log batch for topology: {e}")
     
     async def _is_topology_relevant(self, log_entry: LogEntry) -> bool:
         """Check if log entry is relevant for network topology"""
+        return self._is_relevant(log_entry)
+    
+    def _is_relevant(self, log_entry: LogEntry) -> bool:
+        """Synchronous topology relevance check (runs once per ingested log)"""
         try:
             # Network-relevant indicators
             network_indicators = [
@@ -124,24 +178,32 @@ class ContinuousTopologyMonitor:
             return False
     
     async def _real_time_processor(self) -> None:
-        """Process log entries in real-time for topology updates"""
+        """Apply queued log batches to the topology graph"""
         logger.info("Starting real-time topology processor")
         
         while self.running:
             try:
-                # Get log entry from queue
-                log_entry = await asyncio.wait_for(
+                # Wait for a batch, then coalesce whatever else is already queued
+                log_entries = list(await asyncio.wait_for(
                     self.update_queue.get(), timeout=1.0
-                )
+                ))
+                batches = 1
+                while batches < self.max_coalesced_batches and not self.update_queue.empty():
+                    log_entries.extend(self.update_queue.get_nowait())
+                    batches += 1
                 
-                # Process for topology changes
-                changes = await self._extract_topology_changes(log_entry)
+                # Apply the logs to the topology graph right away; the batch
+                # updater recomputes touched nodes and commits a new version
+                await self.engine.apply_logs([log_entry.to_dict() for log_entry in log_entries])
                 
-                if changes:
-                    # Track changes for batch processing
-                    agent_id = log_entry.agent_id
-                    self.pending_changes[agent_id].update(changes)
-                    self.stats['real_time_updates'] += 1
+                # Track changes for batch processing
+                for log_entry in log_entries:
+                    changes = self._extract_changes(log_entry)
+                    if changes:
+                        self.pending_changes[log_entry.agent_id].update(changes)
+                        self.stats['real_time_updates'] += 1
+                
+                self.stats['batches_processed'] += batches
                 
             except asyncio.TimeoutError:
                 continue
@@ -151,6 +213,10 @@ class ContinuousTopologyMonitor:
     
     async def _extract_topology_changes(self, log_entry: LogEntry) -> Set[str]:
         """Extract topology changes from log entry"""
+        return self._extract_changes(log_entry)
+    
+    def _extract_changes(self, log_entry: LogEntry) -> Set[str]:
+        """Synchronous change classification for a log entry"""
         changes = set()
         
         try:
@@ -194,7 +260,7 @@ class ContinuousTopologyMonitor:
             try:
                 await asyncio.sleep(self.batch_update_interval)
                 
-                if self.pending_changes:
+                if self.pending_changes or self.stale_agents or self.engine.dirty:
                     await self._process_pending_changes()
             
             except Exception as e:
@@ -202,137 +268,114 @@ class ContinuousTopologyMonitor:
                 await asyncio.sleep(self.batch_update_interval)
     
     async def _process_pending_changes(self) -> None:
-        """Process all pending topology changes"""
+        """Commit topology changes applied since the last batch"""
         try:
-            if not self.pending_changes:
-                return
+            if self.stale_agents:
+                await self._refresh_stale_agents()
             
-            logger.info(f"Processing topology changes for {len(self.pending_changes)} agents")
+            if not self.pending_changes and not self.engine.dirty:
+                return
             
-            # Get recent logs for changed agents
-            changed_agents = list(self.pending_changes.keys())
+            logger.info(f"Processing topology changes for {len(self.engine.dirty)} agents")
             
-            for agent_id in changed_agents:
-                changes = self.pending_changes[agent_id]
-                
-                # Get recent logs for this agent
-                recent_logs = await self.db_manager.get_recent_logs(
-                    agent_id=agent_id, hours=1, limit=100
-                )
-                
-                # Update topology for this agent
-                await self._update_agent_topology(agent_id, recent_logs, changes)
+            for changes in self.pending_changes.values():
+                if 'service_discovery' in changes:
+                    self.stats['services_discovered'] += 1
+                if 'network_connection' in changes:
+                    self.stats['relationships_found'] += 1
             
             # Clear pending changes
             self.pending_changes.clear()
             
-            # Increment topology version
-            self.topology_version += 1
-            
-            # Notify subscribers of changes
-            await self._notify_topology_changes(changed_agents)
-            
-            logger.info(f"Topology updated (version {self.topology_version})")
+            delta = await self.engine.commit()
+            if delta:
+                await self._apply_delta(delta)
             
         except Exception as e:
             logger.error(f"Pending changes processing failed: {e}")
     
-    async def _update_agent_topology(self, agent_id: str, recent_logs: List[Dict], 
-                                   changes: Set[str]) -> None:
-        """Update topology for specific agent"""
-        try:
-            # Get or create node
-            if agent_id not in self.topology_mapper.topology.nodes:
-                node = NetworkNode(
-                    agent_id=agent_id,
-                    hostname=f'agent-{agent_id}'
-                )
-                self.topology_mapper.topology.nodes[agent_id] = node
+    async def _refresh_stale_agents(self) -> None:
+        """Re-read recent logs of agents whose real-time batches were dropped, in one query"""
+        agent_ids = list(self.stale_agents)
+        self.stale_agents.clear()
+        
+        logs_by_agent = await self.db_manager.get_recent_logs_for_agents(agent_ids, hours=1, limit_per_agent=100)
+        for agent_id, recent_logs in logs_by_agent.items():
+            await self._update_agent_topology(agent_id, recent_logs, {'refresh'})
+        
+        self.stats['agents_refreshed'] += len(agent_ids)
+        logger.info(f"Refreshed topology for {len(agent_ids)} agents from stored logs")
+    
+    async def _apply_delta(self, delta: Dict[str, Any]) -> None:
+        """Record a committed topology delta and notify subscribers"""
+        for changes in delta['changed'].values():
+            if 'node_added' in changes:
                 self.stats['nodes_added'] += 1
             else:
-                node = self.topology_mapper.topology.nodes[agent_id]
                 self.stats['nodes_updated'] += 1
+        
+        self.topology_version = delta['version']
+        
+        await self._notify_topology_changes(delta)
+        
+        logger.info(f"Topology updated (version {self.topology_version})")
+    
+    async def _update_agent_topology(self, agent_id: str, recent_logs: List[Dict], 
+                                   changes: Set[str]) -> None:
+        """Apply a batch of an agent's logs to the topology (committed by the batch updater)"""
+        try:
+            await self.engine.apply_logs(recent_logs)
             
-            # Process each relevant log
-            for log_data in recent_logs:
-                await self.topology_mapper._process_log_for_topology(log_data)
-            
-            # Re-analyze node if significant changes
-            if any(change in changes for change in ['service_discovery', 'system_info']):
-                await self.topology_mapper._classify_node_role(node)
-                await self.topology_mapper._assess_node_importance(node)
-                
-                if 'service_discovery' in changes:
-                    self.stats['services_discovered'] += 1
-            
-            # Update relationships if network changes
-            if 'network_connection' in changes:
-                await self.topology_mapper._discover_relationships()
-                self.stats['relationships_found'] += 1
-            
-            # Update last activity
-            node.last_activity = datetime.utcnow()
+            if changes:
+                self.pending_changes[agent_id].update(changes)
             
         except Exception as e:
             logger.error(f"Agent topology update failed: {e}")
     
     async def _periodic_full_refresh(self) -> None:
-        """Periodically refresh complete topology"""
-        logger.info("Starting periodic full topology refresh")
+        """Periodically catch up with logs stored outside the real-time path"""
+        logger.info("Starting periodic topology catch-up")
         
         while self.running:
             try:
                 await asyncio.sleep(self.full_refresh_interval)
                 
-                logger.info("Performing full topology refresh...")
-                
-                # Build complete topology from logs
-                fresh_topology = await self.topology_mapper.build_topology_from_logs(hours=24)
-                
-                # Update our cached topology
-                self.topology_mapper.topology = fresh_topology
-                self.topology_version += 1
+                # Applies only logs newer than the engine watermark (no full replay)
+                delta = await self.engine.catch_up(hours=24)
                 self.last_full_refresh = datetime.utcnow()
                 
-                # Notify all subscribers
-                await self._notify_topology_changes(list(fresh_topology.nodes.keys()))
-                
-                logger.info(f"Full topology refresh completed (version {self.topology_version})")
+                if delta:
+                    await self._apply_delta(delta)
                 
             except Exception as e:
                 logger.error(f"Periodic refresh failed: {e}")
                 await asyncio.sleep(self.full_refresh_interval)
     
     async def _change_notifier(self) -> None:
-        """Notify subscribers of topology changes"""
+        """Watch change bus subscribers for slow consumers"""
         while self.running:
             try:
-                await asyncio.sleep(5)  # Check for notifications every 5 seconds
+                await asyncio.sleep(self.slow_consumer_check_interval)
                 
-                # This would be implemented based on your notification requirements
-                # For now, just log significant changes
+                # Deliveries happen in each subscriber's own task; this only
+                # reports the ones falling behind
+                slow = self.change_bus.check_slow_consumers()
+                if slow:
+                    logger.warning(f"Slow topology subscribers: {', '.join(slow)}")
                 
             except Exception as e:
                 logger.error(f"Change notifier error: {e}")
-                await asyncio.sleep(5)
+                await asyncio.sleep(self.slow_consumer_check_interval)
     
-    async def _notify_topology_changes(self, changed_agents: List[str]) -> None:
-        """Notify subscribers about topology changes"""
+    async def _notify_topology_changes(self, delta: Dict[str, Any]) -> None:
+        """Publish a committed topology delta to subscribers (never waits on them)"""
         try:
-            notification = {
-                'event': 'topology_changed',
-                'timestamp': datetime.utcnow().isoformat(),
-                'topology_version': self.topology_version,
-                'changed_agents': changed_agents,
-                'change_count': len(changed_agents)
-            }
-            
-            # Notify attack agents about topology changes
-            await self._notify_attack_agents(notification)
+            self.change_bus.publish(delta['version'], delta['changed'], delta['removed'])
             
             # Log significant changes
-            if len(changed_agents) > 5:
-                logger.info(f"Significant topology change: {len(changed_agents)} agents updated")
+            change_count = len(delta['changed']) + len(delta['removed'])
+            if change_count > 5:
+                logger.info(f"Significant topology change: {change_count} agents updated")
         
         except Exception as e:
             logger.error(f"Change notification failed: {e}")
@@ -355,10 +398,12 @@ class ContinuousTopologyMonitor:
         except Exception as e:
             logger.error(f"Attack agent notification failed: {e}")
     
-    def subscribe_to_changes(self, callback) -> None:
-        """Subscribe to topology changes"""
-        self.change_subscribers.append(callback)
-        logger.info("New subscriber added to topology changes")
+    def subscribe_to_changes(self, callback, name: str = None) -> TopologySubscription:
+        """Subscribe to topology changes (callback runs in its own delivery task)"""
+        subscription = self.change_bus.subscribe(callback, name=name)
+        self.change_subscribers.append(subscription)
+        logger.info(f"New subscriber added to topology changes: {subscription.name}")
+        return subscription
     
     def get_topology_status(self) -> Dict[str, Any]:
         """Get current topology monitoring status"""
@@ -369,6 +414,7 @@ class ContinuousTopologyMonitor:
             'topology_version': self.topology_version,
             'last_full_refresh': self.last_full_refresh.isoformat() if self.last_full_refresh else None,
             'pending_changes': len(self.pending_changes),
+            'stale_agents': len(self.stale_agents),
             'queue_size': self.update_queue.qsize(),
             'runtime_seconds': runtime,
             'statistics': {
@@ -380,51 +426,83 @@ class ContinuousTopologyMonitor:
                 'active_nodes': self.topology_mapper.topology.active_nodes,
                 'high_value_targets': len(self.topology_mapper.topology.high_value_targets),
                 'attack_paths': len(self.topology_mapper.topology.attack_paths)
-            }
+            },
+            'engine': self.engine.get_statistics(),
+            'change_bus': self.change_bus.get_statistics()
         }
+    
+    def get_changes_since(self, since_version: int) -> Dict[str, Any]:
+        """Topology delta feed (see IncrementalTopologyEngine.get_changes_since)"""
+        return self.engine.get_changes_since(since_version)
 
 
 class StreamingTopologyBuilder:
-    """Builds topology from streaming log data"""
+    """Builds topology from streaming log data through windowed traffic sketches"""
     
-    def __init__(self, topology_monitor: ContinuousTopologyMonitor):
+    def __init__(self, topology_monitor: ContinuousTopologyMonitor,
+                 aggregator: Optional[StreamingTopologyAggregator] = None):
         self.monitor = topology_monitor
-        self.stream_buffer = []
+        
+        # Connection, port and service telemetry is folded into per-agent
+        # sketches; only logs carrying other topology facts are kept whole
+        self.aggregator = aggregator or StreamingTopologyAggregator()
+        self.stream_buffer: List[LogEntry] = []
         self.buffer_size = 100
+        self.flush_interval = 5.0  # seconds
+        self._observed_since_flush = 0
+        self._last_flush = time.monotonic()
+        self._last_expiry = time.monotonic()
     
     async def process_log_stream(self, log_stream) -> None:
         """Process streaming logs for topology updates"""
         try:
             async for log_entry in log_stream:
-                # Add to monitor queue
-                await self.monitor.process_log_entry(log_entry)
+                self.observe(log_entry)
                 
-                # Buffer for batch processing
-                self.stream_buffer.append(log_entry)
-                
-                if len(self.stream_buffer) >= self.buffer_size:
+                if (self._observed_since_flush >= self.buffer_size
+                        or time.monotonic() - self._last_flush >= self.flush_interval):
                     await self._process_buffer()
+            
+            await self._process_buffer()
         
         except Exception as e:
             logger.error(f"Stream processing failed: {e}")
     
+    def observe(self, log_entry: LogEntry) -> None:
+        """Fold a log entry into the sketches, keeping it only if it has non-traffic facts"""
+        self.aggregator.observe(log_entry)
+        if self.monitor._extract_changes(log_entry) - AGGREGATED_CHANGES:
+            self.stream_buffer.append(log_entry)
+        self._observed_since_flush += 1
+    
     async def _process_buffer(self) -> None:
-        """Process buffered log entries"""
+        """Apply aggregated deltas and buffered log entries"""
         try:
-            if not self.stream_buffer:
-                return
+            self._observed_since_flush = 0
+            self._last_flush = time.monotonic()
             
-            # Group by agent for efficient processing
-            agent_logs = defaultdict(list)
-            for log_entry in self.stream_buffer:
-                agent_logs[log_entry.agent_id].append(log_entry)
+            # Compact traffic deltas: only facts first seen since the last flush
+            for agent_id, delta in self.aggregator.drain_deltas().items():
+                changes = await self.monitor.engine.apply_summary(delta)
+                if changes:
+                    self.monitor.pending_changes[agent_id].update(changes)
             
-            # Process each agent's logs
-            for agent_id, logs in agent_logs.items():
-                await self._update_agent_from_logs(agent_id, logs)
+            if self.stream_buffer:
+                # Group by agent for efficient processing
+                agent_logs = defaultdict(list)
+                for log_entry in self.stream_buffer:
+                    agent_logs[log_entry.agent_id].append(log_entry)
+                
+                # Clear buffer
+                self.stream_buffer.clear()
+                
+                # Process each agent's logs
+                for agent_id, logs in agent_logs.items():
+                    await self._update_agent_from_logs(agent_id, logs)
             
-            # Clear buffer
-            self.stream_buffer.clear()
+            if time.monotonic() - self._last_expiry >= self.aggregator.window_seconds:
+                self.aggregator.expire()
+                self._last_expiry = time.monotonic()
         
         except Exception as e:
             logger.error(f"Buffer processing failed: {e}")
@@ -435,8 +513,7 @@ class StreamingTopologyBuilder:
             changes = set()
             
             for log_entry in logs:
-                entry_changes = await self.monitor._extract_topology_changes(log_entry)
-                changes.update(entry_changes)
+                changes.update(self.monitor._extract_changes(log_entry))
             
             if changes:
                 # Convert LogEntry objects to dict format for processing
@@ -445,3 +522,13 @@ class StreamingTopologyBuilder:
         
         except Exception as e:
             logger.error(f"Agent update from logs failed: {e}")
+    
+    def get_traffic_summary(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Windowed traffic summary for an agent (top destinations, distinct ports, services)"""
+        return self.aggregator.get_agent_summary(agent_id)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'buffered_logs': len(self.stream_buffer),
+            'aggregator': self.aggregator.get_statistics()
+        }
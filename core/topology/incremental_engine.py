@@ -0,0 +1,587 @@
+"""
+Incremental Topology Engine
+Applies per-log deltas to a persistent network graph instead of replaying all recent logs
+"""
+
+import asyncio
+import logging
+import json
+from typing import Dict, Any, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+from collections import OrderedDict, defaultdict, deque
+
+from .network_mapper import NetworkNode, NetworkTopology
+from shared.database import get_db_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+# Change kinds that require the node's role, importance and zone to be recomputed
+RECLASSIFY_CHANGES = {'node_added', 'addresses', 'services', 'connections', 'users', 'attributes'}
+
+
+class IncrementalTopologyEngine:
+    """Maintains the network topology incrementally and versions every committed change"""
+    
+    def __init__(self, topology_mapper, retention_hours: int = 24,
+                 max_deltas: int = 1000, batch_size: int = 5000):
+        # The mapper supplies the log extractors and classifiers
+        self.mapper = topology_mapper
+        self.db_path = getattr(topology_mapper.db_manager, 'db_path', 'soc_database.db')
+        self.retention_hours = retention_hours
+        self.batch_size = batch_size
+        
+        self.topology = NetworkTopology()
+        self.version = 0
+        self.deltas = deque(maxlen=max_deltas)
+        self.last_delta: Optional[Dict[str, Any]] = None
+        
+        # Uncommitted changes: agent_id -> change kinds, plus removed agents
+        self.dirty: Dict[str, Set[str]] = defaultdict(set)
+        self.removed: Set[str] = set()
+        
+        # Graph indexes (the IP index lives on the topology itself)
+        self._unresolved: Dict[str, Set[str]] = defaultdict(set)
+        self._edges: Set[Tuple[str, str]] = set()
+        self._membership: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+        
+        # Log de-duplication between real-time application and catch-up reads
+        self._applied_ids: OrderedDict = OrderedDict()
+        self._max_applied_ids = 100000
+        self.watermark: Optional[str] = None
+        self._watermark_ids: Set[str] = set()
+        
+        self._loaded = False
+        self._lock: Optional[asyncio.Lock] = None
+        
+        # Statistics
+        self.stats = {
+            'logs_applied': 0,
+            'logs_skipped': 0,
+            'summaries_applied': 0,
+            'nodes_reclassified': 0,
+            'commits': 0,
+            'full_rebuilds': 0,
+            'last_commit_at': None
+        }
+    
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+    
+    @staticmethod
+    def _node_signature(node: NetworkNode) -> Tuple:
+        """Cheap fingerprint of a node (collections only grow while applying logs)"""
+        return (
+            len(node.ip_addresses), node.subnet, node.security_zone,
+            len(node.running_services), len(node.open_ports),
+            len(node.outbound_connections), len(node.inbound_connections),
+            len(node.logged_users), len(node.admin_users),
+            node.hostname, node.platform, node.domain, node.vulnerability_score
+        )
+    
+    @staticmethod
+    def _classify_changes(before: Tuple, after: Tuple) -> Set[str]:
+        changes = set()
+        if before[0:3] != after[0:3]:
+            changes.add('addresses')
+        if before[3:5] != after[3:5]:
+            changes.add('services')
+        if before[5:7] != after[5:7]:
+            changes.add('connections')
+        if before[7:9] != after[7:9]:
+            changes.add('users')
+        if before[9:12] != after[9:12]:
+            changes.add('attributes')
+        if before[12] != after[12]:
+            changes.add('vulnerability')
+        return changes
+    
+    async def apply_log(self, log_data: Dict[str, Any], advance_watermark: bool = False) -> Set[str]:
+        """
+        Apply a single log entry to the graph
+        
+        Args:
+            log_data: Log entry dict (as returned by DatabaseManager or LogEntry.to_dict())
+            advance_watermark: Whether this log counts toward the catch-up watermark
+        
+        Returns:
+            Change kinds recorded for the log's agent
+        """
+        log_id = log_data.get('id')
+        if advance_watermark:
+            # Logs already applied live (or skipped) still move catch-up past them
+            self._advance_watermark(log_data)
+        
+        if log_id and log_id in self._applied_ids:
+            self.stats['logs_skipped'] += 1
+            return set()
+        
+        agent_id = log_data.get('agent_id')
+        if not agent_id:
+            return set()
+        
+        node = self.topology.nodes.get(agent_id)
+        if node is None:
+            before = None
+            before_ips, before_outbound = set(), set()
+        else:
+            before = self._node_signature(node)
+            before_ips, before_outbound = set(node.ip_addresses), set(node.outbound_connections)
+        
+        await self.mapper._process_log_for_topology(log_data)
+        
+        node = self.topology.nodes.get(agent_id)
+        if node is None:
+            return set()
+        
+        if before is None:
+            changes = {'node_added'}
+            self.removed.discard(agent_id)
+        else:
+            changes = self._classify_changes(before, self._node_signature(node))
+        
+        for ip in node.ip_addresses - before_ips:
+            self._index_ip(ip, agent_id)
+        for target_ip in node.outbound_connections - before_outbound:
+            self._link_outbound(agent_id, target_ip)
+        
+        self.dirty[agent_id].update(changes or {'activity'})
+        self._remember_applied(log_id)
+        self.stats['logs_applied'] += 1
+        return changes
+    
+    def _advance_watermark(self, log_data: Dict[str, Any]) -> None:
+        timestamp = log_data.get('timestamp')
+        if not isinstance(timestamp, str):
+            return
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+            self._watermark_ids = set()
+        log_id = log_data.get('id')
+        if timestamp == self.watermark and log_id:
+            self._watermark_ids.add(log_id)
+    
+    async def apply_logs(self, logs: List[Dict[str, Any]]) -> Dict[str, Set[str]]:
+        """Apply a batch of log entries; returns the change kinds per agent"""
+        changes_by_agent: Dict[str, Set[str]] = defaultdict(set)
+        for log_data in logs:
+            changes = await self.apply_log(log_data)
+            if changes:
+                changes_by_agent[log_data['agent_id']].update(changes)
+        return changes_by_agent
+    
+    async def apply_summary(self, summary: Dict[str, Any]) -> Set[str]:
+        """
+        Apply a compact traffic delta from the streaming aggregator
+        
+        Args:
+            summary: Delta from StreamingTopologyAggregator.drain_deltas() with newly
+                     seen source IPs, destinations, ports and services for one agent
+        
+        Returns:
+            Change kinds recorded for the agent
+        """
+        agent_id = summary.get('agent_id')
+        if not agent_id:
+            return set()
+        
+        node = self.topology.nodes.get(agent_id)
+        if node is None:
+            node = NetworkNode(agent_id=agent_id, hostname=f'agent-{agent_id}')
+            self.topology.nodes[agent_id] = node
+            self.removed.discard(agent_id)
+            before = None
+            before_ips, before_outbound = set(), set()
+        else:
+            before = self._node_signature(node)
+            before_ips, before_outbound = set(node.ip_addresses), set(node.outbound_connections)
+        
+        if summary.get('last_seen'):
+            try:
+                last_seen = datetime.fromisoformat(summary['last_seen'])
+                if before is None or last_seen > node.last_activity:
+                    node.last_activity = last_seen
+            except (TypeError, ValueError):
+                pass
+        
+        for ip in summary.get('source_ips', []):
+            if self.mapper._is_valid_ip(ip) and not ip.startswith(('127.', '0.')):
+                node.ip_addresses.add(ip)
+        if node.subnet is None:
+            for ip in node.ip_addresses:
+                subnet = self.mapper._get_subnet(ip)
+                if subnet:
+                    node.subnet = subnet
+                    break
+        
+        node.outbound_connections.update(summary.get('destinations', []))
+        node.open_ports.update(summary.get('ports', []))
+        node.running_services.update(summary.get('services', []))
+        
+        if before is None:
+            changes = {'node_added'}
+        else:
+            changes = self._classify_changes(before, self._node_signature(node))
+        
+        for ip in node.ip_addresses - before_ips:
+            self._index_ip(ip, agent_id)
+        for target_ip in node.outbound_connections - before_outbound:
+            self._link_outbound(agent_id, target_ip)
+        
+        self.dirty[agent_id].update(changes or {'activity'})
+        self.stats['summaries_applied'] += 1
+        return changes
+    
+    def _remember_applied(self, log_id: Optional[str]) -> None:
+        if not log_id:
+            return
+        self._applied_ids[log_id] = None
+        if len(self._applied_ids) > self._max_applied_ids:
+            self._applied_ids.popitem(last=False)
+    
+    def _index_ip(self, ip: str, agent_id: str) -> None:
+        """Index a node address and resolve connections waiting on it"""
+        self.topology.index_ip(ip, agent_id)
+        for source_id in self._unresolved.pop(ip, set()):
+            if self._add_edge(source_id, agent_id):
+                self.dirty[source_id].add('edges')
+    
+    def _link_outbound(self, agent_id: str, target_ip: str) -> None:
+        """Record a connection-based trust relationship, or remember it until the target appears"""
+        target_id = self.topology.find_node_by_ip(target_ip)
+        if target_id is None:
+            self._unresolved[target_ip].add(agent_id)
+        elif self._add_edge(agent_id, target_id):
+            self.dirty[agent_id].add('edges')
+    
+    def _add_edge(self, source_id: str, target_id: str) -> bool:
+        if source_id == target_id:
+            return False
+        edge = (source_id, target_id)
+        if edge in self._edges or (target_id, source_id) in self._edges:
+            return False
+        self._edges.add(edge)
+        self.topology.trust_relationships.append(edge)
+        return True
+    
+    def _remove_from(self, groups: Dict[str, List[str]], key: Optional[str], agent_id: str) -> None:
+        members = groups.get(key) if key is not None else None
+        if members and agent_id in members:
+            members.remove(agent_id)
+            if not members:
+                del groups[key]
+    
+    def _clear_derived(self, agent_id: str) -> None:
+        """Remove a node from every derived grouping before it is reclassified"""
+        subnet, domain, zone = self._membership.pop(agent_id, (None, None, None))
+        if subnet is not None:
+            self.topology.remove_subnet_member(subnet, agent_id)
+        self._remove_from(self.topology.domains, domain, agent_id)
+        self._remove_from(self.topology.security_zones, zone, agent_id)
+        
+        for derived in (self.topology.domain_controllers, self.topology.servers,
+                        self.topology.high_value_targets):
+            while agent_id in derived:
+                derived.remove(agent_id)
+    
+    async def _reclassify_node(self, node: NetworkNode) -> None:
+        """Recompute role, importance and groupings for one node"""
+        agent_id = node.agent_id
+        previous_domain = self._membership.get(agent_id, (None, None, None))[1]
+        self._clear_derived(agent_id)
+        
+        node.role = 'endpoint'
+        await self.mapper._classify_node_role(node)
+        await self.mapper._assess_node_importance(node)
+        
+        if node.subnet:
+            self.topology.add_subnet_member(node.subnet, agent_id)
+        if node.domain:
+            members = self.topology.domains.setdefault(node.domain, [])
+            if node.domain != previous_domain:
+                # Nodes in the same domain trust each other
+                for member in members:
+                    self._add_edge(member, agent_id)
+            members.append(agent_id)
+        self.topology.security_zones.setdefault(node.security_zone, []).append(agent_id)
+        
+        self._membership[agent_id] = (node.subnet, node.domain, node.security_zone)
+        self.stats['nodes_reclassified'] += 1
+    
+    def remove_node(self, agent_id: str) -> None:
+        """Drop a node and its relationships from the graph"""
+        node = self.topology.nodes.pop(agent_id, None)
+        if node is None:
+            return
+        
+        self._clear_derived(agent_id)
+        self.topology.unindex_node(node)
+        for sources in self._unresolved.values():
+            sources.discard(agent_id)
+        
+        self._edges = {edge for edge in self._edges if agent_id not in edge}
+        self.topology.trust_relationships = [edge for edge in self.topology.trust_relationships
+                                             if agent_id not in edge]
+        
+        self.dirty.pop(agent_id, None)
+        self.removed.add(agent_id)
+    
+    def prune_stale_nodes(self) -> int:
+        """Remove nodes with no activity inside the retention window"""
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        stale = []
+        for agent_id, node in self.topology.nodes.items():
+            try:
+                if node.last_activity < cutoff:
+                    stale.append(agent_id)
+            except TypeError:
+                continue
+        
+        for agent_id in stale:
+            self.remove_node(agent_id)
+        return len(stale)
+    
+    async def commit(self) -> Optional[Dict[str, Any]]:
+        """
+        Recompute touched nodes, persist them and publish a versioned delta
+        
+        Returns:
+            The delta, or None if nothing changed since the last commit
+        """
+        if not self.dirty and not self.removed:
+            return None
+        
+        # Bump first so attack graph caches key on the version being committed
+        self.version += 1
+        
+        reclassified = False
+        for agent_id, changes in self.dirty.items():
+            node = self.topology.nodes.get(agent_id)
+            if node and (changes & RECLASSIFY_CHANGES or agent_id not in self._membership):
+                await self._reclassify_node(node)
+                reclassified = True
+        
+        # Attack paths are derived from zones, roles and importance
+        if reclassified or self.removed:
+            self.topology.attack_paths = []
+            await self.mapper._calculate_attack_paths()
+        
+        self.mapper._update_topology_statistics()
+        
+        delta = {
+            'version': self.version,
+            'timestamp': datetime.utcnow().isoformat(),
+            'changed': {agent_id: sorted(changes) for agent_id, changes in self.dirty.items()
+                        if agent_id in self.topology.nodes},
+            'removed': sorted(self.removed)
+        }
+        
+        await self._persist(list(delta['changed'].keys()), delta['removed'])
+        
+        self.deltas.append(delta)
+        self.last_delta = delta
+        self.dirty.clear()
+        self.removed.clear()
+        
+        self.stats['commits'] += 1
+        self.stats['last_commit_at'] = delta['timestamp']
+        return delta
+    
+    async def catch_up(self, hours: int = 24) -> Optional[Dict[str, Any]]:
+        """
+        Apply logs stored since the watermark and commit
+        
+        On first use the persisted graph is loaded; with no persisted state the
+        last `hours` of logs are replayed once to bootstrap it.
+        """
+        async with self._get_lock():
+            await self._ensure_loaded()
+            
+            since = self.watermark or (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+            while True:
+                logs = await self.mapper.db_manager.get_logs_since(since, limit=self.batch_size)
+                for log_data in logs:
+                    if log_data.get('id') in self._watermark_ids:
+                        continue
+                    await self.apply_log(log_data, advance_watermark=True)
+                
+                # Stop once a batch no longer moves the watermark (nothing left past it)
+                if len(logs) < self.batch_size or self.watermark is None or self.watermark == since:
+                    break
+                since = self.watermark
+            
+            self.prune_stale_nodes()
+            return await self.commit()
+    
+    async def rebuild(self, hours: int = 24) -> Optional[Dict[str, Any]]:
+        """Discard the graph and replay the last `hours` of logs (explicit full refresh only)"""
+        async with self._get_lock():
+            await self._ensure_loaded()
+            
+            for agent_id in list(self.topology.nodes.keys()):
+                self.remove_node(agent_id)
+            
+            self.topology = NetworkTopology()
+            self._unresolved.clear()
+            self._edges.clear()
+            self._membership.clear()
+            self._applied_ids.clear()
+            self.watermark = None
+            self._watermark_ids = set()
+            self.stats['full_rebuilds'] += 1
+        
+        return await self.catch_up(hours=hours)
+    
+    def get_changes_since(self, since_version: int) -> Dict[str, Any]:
+        """
+        Delta feed for consumers holding topology version `since_version`
+        
+        Returns the current state of every node changed since that version, or
+        asks for a full resync when the version is older than the retained deltas.
+        """
+        if since_version >= self.version:
+            return {'version': self.version, 'full_resync_required': False,
+                    'changed_nodes': {}, 'removed_nodes': []}
+        
+        oldest = self.deltas[0]['version'] if self.deltas else self.version + 1
+        if since_version < oldest - 1:
+            return {'version': self.version, 'full_resync_required': True,
+                    'changed_nodes': {}, 'removed_nodes': []}
+        
+        changed: Set[str] = set()
+        removed: Set[str] = set()
+        for delta in self.deltas:
+            if delta['version'] <= since_version:
+                continue
+            for agent_id in delta['changed']:
+                changed.add(agent_id)
+                removed.discard(agent_id)
+            for agent_id in delta['removed']:
+                removed.add(agent_id)
+                changed.discard(agent_id)
+        
+        return {
+            'version': self.version,
+            'full_resync_required': False,
+            'changed_nodes': {agent_id: self.topology.nodes[agent_id].to_dict()
+                              for agent_id in changed if agent_id in self.topology.nodes},
+            'removed_nodes': sorted(removed),
+            'attack_paths': self.topology.attack_paths,
+            'high_value_targets': self.topology.high_value_targets
+        }
+    
+    async def _ensure_loaded(self) -> None:
+        """Load the persisted graph once"""
+        if self._loaded:
+            return
+        self._loaded = True
+        
+        try:
+            loop = asyncio.get_running_loop()
+            node_rows, state = await loop.run_in_executor(None, self._read_state)
+        except Exception as e:
+            logger.error(f"Failed to load persisted topology: {e}")
+            return
+        
+        for node_data in node_rows:
+            try:
+                node = NetworkNode.from_dict(node_data)
+            except Exception as e:
+                logger.error(f"Skipping persisted topology node: {e}")
+                continue
+            self.topology.nodes[node.agent_id] = node
+            for ip in node.ip_addresses:
+                self.topology.index_ip(ip, node.agent_id)
+        
+        for node in self.topology.nodes.values():
+            for target_ip in node.outbound_connections:
+                self._link_outbound(node.agent_id, target_ip)
+            await self._reclassify_node(node)
+        
+        self.dirty.clear()
+        self.version = int(state.get('version') or 0)
+        self.watermark = state.get('watermark')
+        self._watermark_ids = set(json.loads(state.get('watermark_ids') or '[]'))
+        
+        if self.topology.nodes:
+            await self.mapper._calculate_attack_paths()
+            self.mapper._update_topology_statistics()
+            logger.info(f"Loaded persisted topology: {len(self.topology.nodes)} nodes (version {self.version})")
+    
+    def _read_state(self) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """Read persisted nodes and engine state (runs in a worker thread)"""
+        conn = get_db_connection(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT node_data FROM topology_nodes')
+            nodes = [json.loads(row[0]) for row in cursor.fetchall()]
+            cursor.execute('SELECT key, value FROM topology_state')
+            state = {row[0]: row[1] for row in cursor.fetchall()}
+            return nodes, state
+        finally:
+            conn.close()
+    
+    async def _persist(self, changed: List[str], removed: List[str]) -> None:
+        """Write changed nodes and engine state in one transaction"""
+        now = datetime.utcnow().isoformat()
+        node_rows = [(agent_id, json.dumps(self.topology.nodes[agent_id].to_dict()), now)
+                     for agent_id in changed]
+        state_rows = [
+            ('version', str(self.version)),
+            ('watermark', self.watermark),
+            ('watermark_ids', json.dumps(sorted(self._watermark_ids)))
+        ]
+        
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write_state, node_rows, removed, state_rows)
+        except Exception as e:
+            logger.error(f"Failed to persist topology: {e}")
+    
+    def _write_state(self, node_rows: List[tuple], removed: List[str], state_rows: List[tuple]) -> None:
+        conn = get_db_connection(self.db_path)
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO topology_nodes (agent_id, node_data, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(agent_id) DO UPDATE SET
+                        node_data = excluded.node_data, updated_at = excluded.updated_at
+                ''', node_rows)
+                conn.executemany('DELETE FROM topology_nodes WHERE agent_id = ?',
+                                 [(agent_id,) for agent_id in removed])
+                conn.executemany('''
+                    INSERT INTO topology_state (key, value) VALUES (?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                ''', state_rows)
+        finally:
+            conn.close()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get engine statistics"""
+        return {
+            **self.stats,
+            'version': self.version,
+            'watermark': self.watermark,
+            'nodes': len(self.topology.nodes),
+            'edges': len(self._edges),
+            'indexed_ips': len(self.topology.ip_index),
+            'unresolved_connections': sum(len(sources) for sources in self._unresolved.values()),
+            'pending_changes': len(self.dirty),
+            'retained_deltas': len(self.deltas)
+        }
+
+
+# Global engine instances, one per database
+_topology_engines: Dict[str, IncrementalTopologyEngine] = {}
+
+def get_topology_engine(topology_mapper) -> IncrementalTopologyEngine:
+    """Get or create the shared topology engine for the mapper's database"""
+    db_path = getattr(topology_mapper.db_manager, 'db_path', 'soc_database.db')
+    engine = _topology_engines.get(db_path)
+    if engine is None:
+        engine = IncrementalTopologyEngine(topology_mapper)
+        _topology_engines[db_path] = engine
+    return engine
@@ -0,0 +1,195 @@
+"""
+IP address indexing for the network topology
+Interned address parsing and a CIDR prefix tree for subnet and zone lookups
+"""
+
+import ipaddress
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+@lru_cache(maxsize=65536)
+def parse_ip(ip: str) -> Optional[IPAddress]:
+    """Parse an address once; repeated calls return the same interned object"""
+    try:
+        return ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def parse_network(cidr: str) -> Optional[IPNetwork]:
+    """Parse a CIDR once; repeated calls return the same interned object"""
+    try:
+        return ipaddress.ip_network(cidr, strict=False)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=65536)
+def subnet_for_ip(ip: str) -> Optional[str]:
+    """The /24 subnet of a private IPv4 address"""
+    address = parse_ip(ip)
+    if address is None or not address.is_private or address.version != 4:
+        return None
+    octets = ip.split('.')
+    return f"{octets[0]}.{octets[1]}.{octets[2]}.0/24"
+
+
+class _PrefixNode:
+    __slots__ = ('children', 'network', 'value')
+    
+    def __init__(self):
+        self.children: List[Optional['_PrefixNode']] = [None, None]
+        self.network: Optional[IPNetwork] = None
+        self.value: Any = None
+
+
+class PrefixTree:
+    """Binary radix tree mapping CIDR prefixes to values with longest-prefix match"""
+    
+    def __init__(self):
+        # One root per address family
+        self._roots: Dict[int, _PrefixNode] = {4: _PrefixNode(), 6: _PrefixNode()}
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @staticmethod
+    def _bits(network: IPNetwork) -> Iterator[int]:
+        value = int(network.network_address)
+        width = network.max_prefixlen
+        for position in range(network.prefixlen):
+            yield (value >> (width - 1 - position)) & 1
+    
+    def insert(self, cidr: Union[str, IPNetwork], value: Any) -> None:
+        """Insert or replace the value stored for a prefix"""
+        network = parse_network(cidr) if isinstance(cidr, str) else cidr
+        if network is None:
+            raise ValueError(f"Invalid network: {cidr}")
+        
+        node = self._roots[network.version]
+        for bit in self._bits(network):
+            child = node.children[bit]
+            if child is None:
+                child = _PrefixNode()
+                node.children[bit] = child
+            node = child
+        
+        if node.network is None:
+            self._size += 1
+        node.network = network
+        node.value = value
+    
+    def remove(self, cidr: Union[str, IPNetwork]) -> bool:
+        """Remove a prefix, pruning branches left empty"""
+        network = parse_network(cidr) if isinstance(cidr, str) else cidr
+        if network is None:
+            return False
+        
+        path: List[Tuple[_PrefixNode, int]] = []
+        node = self._roots[network.version]
+        for bit in self._bits(network):
+            child = node.children[bit]
+            if child is None:
+                return False
+            path.append((node, bit))
+            node = child
+        
+        if node.network is None:
+            return False
+        node.network = None
+        node.value = None
+        self._size -= 1
+        
+        for parent, bit in reversed(path):
+            child = parent.children[bit]
+            if child.network is not None or child.children[0] or child.children[1]:
+                break
+            parent.children[bit] = None
+        return True
+    
+    def get(self, cidr: Union[str, IPNetwork]) -> Any:
+        """Exact-match lookup of a prefix"""
+        network = parse_network(cidr) if isinstance(cidr, str) else cidr
+        if network is None:
+            return None
+        
+        node = self._roots[network.version]
+        for bit in self._bits(network):
+            node = node.children[bit]
+            if node is None:
+                return None
+        return node.value if node.network is not None else None
+    
+    def longest_match(self, ip: Union[str, IPAddress]) -> Optional[Tuple[IPNetwork, Any]]:
+        """Most specific prefix containing an address, as (network, value)"""
+        address = parse_ip(ip) if isinstance(ip, str) else ip
+        if address is None:
+            return None
+        
+        node = self._roots[address.version]
+        value = int(address)
+        width = address.max_prefixlen
+        best = (node.network, node.value) if node.network is not None else None
+        
+        for position in range(width):
+            node = node.children[(value >> (width - 1 - position)) & 1]
+            if node is None:
+                break
+            if node.network is not None:
+                best = (node.network, node.value)
+        return best
+    
+    def lookup(self, ip: Union[str, IPAddress]) -> Any:
+        """Value of the most specific prefix containing an address"""
+        match = self.longest_match(ip)
+        return match[1] if match else None
+    
+    def covered(self, cidr: Union[str, IPNetwork]) -> Iterator[Tuple[IPNetwork, Any]]:
+        """All stored prefixes inside a network, as (network, value)"""
+        network = parse_network(cidr) if isinstance(cidr, str) else cidr
+        if network is None:
+            return
+        
+        node = self._roots[network.version]
+        for bit in self._bits(network):
+            node = node.children[bit]
+            if node is None:
+                return
+        
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.network is not None:
+                yield node.network, node.value
+            stack.extend(child for child in node.children if child is not None)
+
+
+# Security zones by address range; more specific prefixes win
+ZONE_PREFIXES = {
+    '192.168.0.0/16': 'internal',
+    '10.0.0.0/8': 'corporate',
+    '172.0.0.0/8': 'dmz'
+}
+
+_zone_tree = PrefixTree()
+for _cidr, _zone in ZONE_PREFIXES.items():
+    _zone_tree.insert(_cidr, _zone)
+
+
+@lru_cache(maxsize=65536)
+def zone_for_ip(ip: str) -> Optional[str]:
+    """Security zone of an address, 'external' for public ones, None if unknown"""
+    address = parse_ip(ip)
+    if address is None:
+        return None
+    zone = _zone_tree.lookup(address)
+    if zone is None and not address.is_private:
+        return 'external'
+    return zone
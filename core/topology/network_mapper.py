@@ -7,7 +7,7 @@ import asyncio
 import logging
 import sqlite3
 import json
-import ipaddress
+import re
 from typing import Dict, List, Set, Optional, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
@@ -15,6 +15,8 @@ from dataclasses import dataclass, field
 
 from shared.models import LogEntry
 from shared.utils import get_system_info
+from .ip_index import PrefixTree, parse_ip, subnet_for_ip, zone_for_ip
+from .attack_graph import AttackGraph, get_attack_graph
 
 
 logger = logging.getLogger(__name__)
@@ -81,6 +83,32 @@ class NetworkNode:
             'exposed_services': self.exposed_services,
             'last_activity': self.last_activity.isoformat()
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NetworkNode':
+        """Create from dictionary (inverse of to_dict)"""
+        return cls(
+            agent_id=data['agent_id'],
+            hostname=data.get('hostname') or f"agent-{data['agent_id']}",
+            ip_addresses=set(data.get('ip_addresses', [])),
+            mac_addresses=set(data.get('mac_addresses', [])),
+            platform=data.get('platform', 'unknown'),
+            os_version=data.get('os_version', 'unknown'),
+            subnet=data.get('subnet'),
+            domain=data.get('domain'),
+            security_zone=data.get('security_zone', 'unknown'),
+            open_ports=set(data.get('open_ports', [])),
+            running_services=set(data.get('running_services', [])),
+            role=data.get('role', 'endpoint'),
+            importance=data.get('importance', 'medium'),
+            outbound_connections=set(data.get('outbound_connections', [])),
+            inbound_connections=set(data.get('inbound_connections', [])),
+            logged_users=set(data.get('logged_users', [])),
+            admin_users=set(data.get('admin_users', [])),
+            vulnerability_score=data.get('vulnerability_score', 0.0),
+            exposed_services=list(data.get('exposed_services', [])),
+            last_activity=datetime.fromisoformat(data['last_activity']) if data.get('last_activity') else datetime.utcnow()
+        )
 
 
 @dataclass
@@ -105,6 +133,57 @@ class NetworkTopology:
     active_nodes: int = 0
     last_updated: datetime = field(default_factory=datetime.utcnow)
     
+    # Lookup indexes: IP -> owning agent, subnet CIDR -> member list
+    ip_index: Dict[str, str] = field(default_factory=dict, repr=False, compare=False)
+    subnet_tree: PrefixTree = field(default_factory=PrefixTree, repr=False, compare=False)
+    
+    def index_ip(self, ip: str, agent_id: str) -> bool:
+        """Map an address to its node (first owner wins); True if newly indexed"""
+        if ip in self.ip_index:
+            return False
+        self.ip_index[ip] = agent_id
+        return True
+    
+    def unindex_node(self, node: 'NetworkNode') -> None:
+        """Drop a node's addresses from the IP index"""
+        for ip in node.ip_addresses:
+            if self.ip_index.get(ip) == node.agent_id:
+                del self.ip_index[ip]
+    
+    def find_node_by_ip(self, ip: str) -> Optional[str]:
+        """Agent owning an address"""
+        return self.ip_index.get(ip)
+    
+    def add_subnet_member(self, subnet: str, agent_id: str) -> None:
+        """Add a node to a subnet group, indexing new subnets in the prefix tree"""
+        members = self.subnets.get(subnet)
+        if members is None:
+            members = []
+            self.subnets[subnet] = members
+            try:
+                self.subnet_tree.insert(subnet, members)
+            except ValueError:
+                pass
+        members.append(agent_id)
+    
+    def remove_subnet_member(self, subnet: str, agent_id: str) -> None:
+        """Remove a node from a subnet group, dropping the group once empty"""
+        members = self.subnets.get(subnet)
+        if members and agent_id in members:
+            members.remove(agent_id)
+            if not members:
+                del self.subnets[subnet]
+                self.subnet_tree.remove(subnet)
+    
+    def find_subnet(self, ip: str) -> Optional[str]:
+        """Most specific known subnet containing an address"""
+        match = self.subnet_tree.longest_match(ip)
+        return str(match[0]) if match else None
+    
+    def nodes_in_network(self, cidr: str) -> List[str]:
+        """Agents in every known subnet inside a network (e.g. 10.0.0.0/16)"""
+        return [agent_id for _, members in self.subnet_tree.covered(cidr) for agent_id in members]
+    
     def to_dict(self) -> Dict:
         return {
             'nodes': {k: v.to_dict() for k, v in self.nodes.items()},
@@ -127,7 +206,10 @@ class NetworkTopologyMapper:
     
     def __init__(self, database_manager):
         self.db_manager = database_manager
-        self.topology = NetworkTopology()
+        
+        # Topology graph is owned by the shared incremental engine for this database
+        from .incremental_engine import get_topology_engine
+        self.engine = get_topology_engine(self)
         
         # Pattern matchers for log analysis
         self.service_patterns = {
@@ -167,36 +249,26 @@ class NetworkTopologyMapper:
             ]
         }
     
+    @property
+    def topology(self) -> NetworkTopology:
+        return self.engine.topology
+    
+    @topology.setter
+    def topology(self, value: NetworkTopology) -> None:
+        self.engine.topology = value
+    
     async def build_topology_from_logs(self, hours: int = 24) -> NetworkTopology:
-        """Build network topology from recent logs"""
-        logger.info(f"Building network topology from logs (last {hours} hours)")
-        
+        """Bring network topology up to date with logs stored since the last update"""
         try:
-            # Get recent logs
-            logs = await self.db_manager.get_recent_logs(hours=hours, limit=50000)
+            # Only logs newer than the engine watermark are applied; the last
+            # `hours` of logs are replayed only when no persisted graph exists
+            delta = await self.engine.catch_up(hours=hours)
             
-            # Reset topology
-            self.topology = NetworkTopology()
-            
-            # Process logs to extract network information
-            for log_data in logs:
-                await self._process_log_for_topology(log_data)
-            
-            # Analyze and classify nodes
-            await self._analyze_network_nodes()
-            
-            # Discover network relationships
-            await self._discover_relationships()
-            
-            # Calculate attack paths
-            await self._calculate_attack_paths()
-            
-            # Update statistics
-            self._update_topology_statistics()
-            
-            logger.info(f"Topology built: {self.topology.total_nodes} nodes, "
-                       f"{len(self.topology.subnets)} subnets, "
-                       f"{len(self.topology.domain_controllers)} DCs")
+            if delta:
+                logger.info(f"Topology updated to version {delta['version']}: "
+                           f"{len(delta['changed'])} nodes changed, {len(delta['removed'])} removed "
+                           f"({self.topology.total_nodes} nodes, {len(self.topology.subnets)} subnets, "
+                           f"{len(self.topology.domain_controllers)} DCs)")
             
             return self.topology
             
@@ -204,6 +276,18 @@ class NetworkTopologyMapper:
             logger.error(f"Failed to build network topology: {e}")
             return self.topology
     
+    async def rebuild_topology_from_logs(self, hours: int = 24) -> NetworkTopology:
+        """Discard the topology and rebuild it from the last `hours` of logs"""
+        logger.info(f"Rebuilding network topology from logs (last {hours} hours)")
+        
+        try:
+            await self.engine.rebuild(hours=hours)
+            return self.topology
+        
+        except Exception as e:
+            logger.error(f"Failed to rebuild network topology: {e}")
+            return self.topology
+    
     async def _process_log_for_topology(self, log_data: Dict) -> None:
         """Process individual log entry for topology information"""
         try:
@@ -267,9 +351,9 @@ class NetworkTopologyMapper:
                     node.ip_addresses.add(ip)
             
             # Hostname from various sources
-            for field in ['hostname', 'computer', 'computer_name']:
-                if field in parsed_data:
-                    node.hostname = parsed_data[field]
+            for hostname_field in ['hostname', 'computer', 'computer_name']:
+                if hostname_field in parsed_data:
+                    node.hostname = parsed_data[hostname_field]
                     break
             
             # Domain information
@@ -370,9 +454,9 @@ class NetworkTopologyMapper:
             
             # Extract usernames
             user_fields = ['user', 'username', 'target_user', 'logon_user']
-            for field in user_fields:
-                if field in parsed_data:
-                    username = parsed_data[field]
+            for user_field in user_fields:
+                if user_field in parsed_data:
+                    username = parsed_data[user_field]
                     if username and username not in ['system', 'anonymous', '$']:
                         node.logged_users.add(username)
                         
@@ -405,14 +489,9 @@ class NetworkTopologyMapper:
         try:
             # Determine security zone based on IP ranges
             for ip in node.ip_addresses:
-                if ip.startswith('192.168.'):
-                    node.security_zone = 'internal'
-                elif ip.startswith('10.'):
-                    node.security_zone = 'corporate'
-                elif ip.startswith('172.'):
-                    node.security_zone = 'dmz'
-                elif not self._is_private_ip(ip):
-                    node.security_zone = 'external'
+                zone = zone_for_ip(ip)
+                if zone:
+                    node.security_zone = zone
             
             # Check for vulnerability indicators
             message = log_data.get('message', '').lower()
@@ -441,9 +520,7 @@ class NetworkTopologyMapper:
                 
                 # Group by subnets
                 if node.subnet:
-                    if node.subnet not in self.topology.subnets:
-                        self.topology.subnets[node.subnet] = []
-                    self.topology.subnets[node.subnet].append(agent_id)
+                    self.topology.add_subnet_member(node.subnet, agent_id)
                 
                 # Group by domains
                 if node.domain:
@@ -562,7 +639,11 @@ class NetworkTopologyMapper:
                     for node2 in nodes[i+1:]:
                         self.topology.trust_relationships.append((node1, node2))
             
-            # Analyze network connectivity patterns
+            # Analyze network connectivity patterns (one index lookup per connection)
+            for agent_id, node in self.topology.nodes.items():
+                for ip in node.ip_addresses:
+                    self.topology.index_ip(ip, agent_id)
+            
             for agent_id, node in self.topology.nodes.items():
                 # Find nodes that this node connects to
                 for target_ip in node.outbound_connections:
@@ -576,34 +657,35 @@ class NetworkTopologyMapper:
     async def _calculate_attack_paths(self) -> None:
         """Calculate potential attack paths through the network"""
         try:
-            # Simple attack path calculation
-            # From external -> DMZ -> internal -> domain controllers
-            
-            external_nodes = self.topology.security_zones.get('external', [])
-            dmz_nodes = self.topology.security_zones.get('dmz', [])
-            internal_nodes = self.topology.security_zones.get('internal', [])
-            domain_controllers = self.topology.domain_controllers
-            
-            # Generate attack paths
-            for ext_node in external_nodes[:3]:  # Limit to avoid explosion
-                for dmz_node in dmz_nodes[:3]:
-                    for int_node in internal_nodes[:3]:
-                        for dc_node in domain_controllers[:2]:
-                            path = [ext_node, dmz_node, int_node, dc_node]
-                            self.topology.attack_paths.append(path)
-            
-            # Also create direct paths to high-value targets
-            for hvt in self.topology.high_value_targets[:5]:
-                # Simple path: any endpoint -> HVT
-                endpoints = [n for n, node in self.topology.nodes.items() 
-                           if node.role == 'endpoint'][:3]
-                for endpoint in endpoints:
-                    if endpoint != hvt:
-                        self.topology.attack_paths.append([endpoint, hvt])
+            # Graph is rebuilt only when the topology version changes
+            graph = get_attack_graph(f"topology:{self.engine.db_path}", self.engine.version,
+                                     self._build_attack_graph)
+            
+            # Attacks start from exposed zones, or from any endpoint if none are known
+            zones = self.topology.security_zones
+            entry_points = zones.get('external', []) + zones.get('dmz', [])
+            if not entry_points:
+                entry_points = [agent_id for agent_id, node in self.topology.nodes.items()
+                                if node.role == 'endpoint']
+            
+            targets = self.topology.domain_controllers + self.topology.high_value_targets
+            
+            self.topology.attack_paths = graph.attack_paths(entry_points, targets, k=3, max_paths=50)
             
         except Exception as e:
             logger.error(f"Failed to calculate attack paths: {e}")
     
+    def _build_attack_graph(self) -> AttackGraph:
+        """Attack graph over topology nodes: zones for lateral movement plus observed trust"""
+        graph = AttackGraph()
+        for agent_id, node in self.topology.nodes.items():
+            # More vulnerable nodes are cheaper to compromise
+            graph.add_node(agent_id, zone=node.security_zone, cost=1.0 - node.vulnerability_score,
+                           role=node.role)
+        for source, target in self.topology.trust_relationships:
+            graph.add_edge(source, target, bidirectional=True)
+        return graph
+    
     def _update_topology_statistics(self) -> None:
         """Update topology statistics"""
         self.topology.total_nodes = len(self.topology.nodes)
@@ -619,37 +701,20 @@ class NetworkTopologyMapper:
     
     def _is_valid_ip(self, ip: str) -> bool:
         """Check if string is valid IP address"""
-        try:
-            ipaddress.ip_address(ip)
-            return True
-        except ValueError:
-            return False
+        return parse_ip(ip) is not None
     
     def _is_private_ip(self, ip: str) -> bool:
         """Check if IP is private/internal"""
-        try:
-            return ipaddress.ip_address(ip).is_private
-        except ValueError:
-            return False
+        address = parse_ip(ip)
+        return address is not None and address.is_private
     
     def _get_subnet(self, ip: str) -> Optional[str]:
         """Get subnet for IP address"""
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            if ip_obj.is_private:
-                # Return /24 subnet
-                octets = ip.split('.')
-                return f"{octets[0]}.{octets[1]}.{octets[2]}.0/24"
-        except ValueError:
-            pass
-        return None
+        return subnet_for_ip(ip)
     
     def _find_node_by_ip(self, ip: str) -> Optional[str]:
         """Find node by IP address"""
-        for agent_id, node in self.topology.nodes.items():
-            if ip in node.ip_addresses:
-                return agent_id
-        return None
+        return self.topology.find_node_by_ip(ip)
     
     async def get_attack_context_for_agent(self, agent_id: str) -> Dict:
         """Get attack context for specific agent (for attack agent use)"""
@@ -672,7 +737,7 @@ class NetworkTopologyMapper:
             for hvt_id in self.topology.high_value_targets:
                 hvt_node = self.topology.nodes.get(hvt_id)
                 if hvt_node and (hvt_node.subnet == node.subnet or 
-                               hvt_id in node.outbound_connections):
+                               any(self._find_node_by_ip(ip) == hvt_id for ip in node.outbound_connections)):
                     reachable_hvts.append(hvt_id)
             
             return {
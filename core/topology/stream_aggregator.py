@@ -0,0 +1,385 @@
+"""
+Streaming Topology Aggregator
+Windowed, constant-memory traffic summaries per agent for topology updates
+
+Each agent keeps a ring of fixed-length windows (24 hourly windows by
+default). A window holds bounded sketches instead of log objects: top-K
+destination IPs and ports (Space-Saving), a HyperLogLog of distinct ports,
+a capped service set and connection counts. New facts seen since the last
+drain are emitted as compact per-agent deltas for the topology engine.
+"""
+
+import hashlib
+import logging
+import math
+import re
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from shared.models import LogEntry
+
+
+logger = logging.getLogger(__name__)
+
+
+# Process names that identify a network service
+SERVICE_INDICATORS = ['httpd', 'nginx', 'sshd', 'smbd', 'mysqld', 'postgres']
+
+_PORT_PATTERN = re.compile(r':(\d+)\b')
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**precision one-byte registers"""
+    
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+    
+    @staticmethod
+    def _hash(value: Any) -> int:
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+    
+    def add(self, value: Any) -> None:
+        hashed = self._hash(value)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def merge(self, other: 'HyperLogLog') -> None:
+        for index, rank in enumerate(other.registers):
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+    
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class TopKCounter:
+    """Space-Saving heavy-hitter counter holding at most k items"""
+    
+    def __init__(self, k: int = 16):
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+    
+    def add(self, item: str, count: int = 1) -> None:
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.k:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # Replace the smallest counter; its count bounds the newcomer's error
+            smallest = min(self.counts, key=self.counts.__getitem__)
+            floor = self.counts.pop(smallest)
+            del self.errors[smallest]
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+    
+    def merge(self, other: 'TopKCounter') -> None:
+        for item, count in other.counts.items():
+            self.add(item, count)
+    
+    def guaranteed(self, item: str) -> int:
+        """Lower bound on an item's true count (0 if untracked)"""
+        return self.counts.get(item, 0) - self.errors.get(item, 0)
+    
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        ranked = sorted(self.counts.items(), key=lambda entry: (-entry[1], entry[0]))
+        return ranked[:n] if n is not None else ranked
+    
+    def __contains__(self, item: str) -> bool:
+        return item in self.counts
+
+
+class TrafficWindow:
+    """Sketches for one agent over one time window"""
+    
+    __slots__ = ('index', 'destinations', 'ports', 'distinct_ports', 'services', 'connections', 'logs')
+    
+    def __init__(self, index: int, top_k: int, hll_precision: int):
+        self.index = index
+        self.destinations = TopKCounter(top_k)
+        self.ports = TopKCounter(top_k)
+        self.distinct_ports = HyperLogLog(hll_precision)
+        self.services: Set[str] = set()
+        self.connections = 0
+        self.logs = 0
+
+
+class AgentTrafficSketch:
+    """Ring of traffic windows for one agent"""
+    
+    def __init__(self, agent_id: str, window_count: int, top_k: int, hll_precision: int,
+                 max_source_ips: int):
+        self.agent_id = agent_id
+        self.top_k = top_k
+        self.hll_precision = hll_precision
+        self.windows: Deque[TrafficWindow] = deque(maxlen=window_count)
+        self.source_ips: Set[str] = set()
+        self.max_source_ips = max_source_ips
+        self.last_seen: Optional[datetime] = None
+        
+        # Facts already emitted, bounded by the sketch sizes
+        self.reported_destinations: Set[str] = set()
+        self.reported_ports: Set[str] = set()
+        self.reported_services: Set[str] = set()
+    
+    def window(self, index: int) -> TrafficWindow:
+        """Window for a time index, rotating older ones out of the ring"""
+        if self.windows and self.windows[-1].index == index:
+            return self.windows[-1]
+        for window in reversed(self.windows):
+            if window.index == index:
+                return window
+        
+        if self.windows and index < self.windows[-1].index:
+            # Late log for a window not in the ring: fold into the nearest newer one
+            if index < self.windows[0].index:
+                return self.windows[0]
+            for window in self.windows:
+                if window.index > index:
+                    return window
+        
+        window = TrafficWindow(index, self.top_k, self.hll_precision)
+        self.windows.append(window)
+        return window
+    
+    def expire(self, oldest_index: int) -> None:
+        while self.windows and self.windows[0].index < oldest_index:
+            self.windows.popleft()
+    
+    def summary(self) -> Dict[str, Any]:
+        """Merged view over every window in the ring"""
+        destinations = TopKCounter(self.top_k)
+        ports = TopKCounter(self.top_k)
+        distinct_ports = HyperLogLog(self.hll_precision)
+        services: Set[str] = set()
+        for window in self.windows:
+            destinations.merge(window.destinations)
+            ports.merge(window.ports)
+            distinct_ports.merge(window.distinct_ports)
+            services |= window.services
+        
+        return {
+            'agent_id': self.agent_id,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
+            'source_ips': sorted(self.source_ips),
+            'top_destinations': destinations.top(),
+            'top_ports': ports.top(),
+            'distinct_ports': distinct_ports.count(),
+            'services': sorted(services),
+            'connections': sum(window.connections for window in self.windows),
+            'logs': sum(window.logs for window in self.windows),
+            'connections_per_window': [(window.index, window.connections) for window in self.windows]
+        }
+
+
+class StreamingTopologyAggregator:
+    """Folds streaming log entries into per-agent windowed sketches"""
+    
+    def __init__(self, window_seconds: int = 3600, window_count: int = 24, top_k: int = 16,
+                 hll_precision: int = 10, max_services: int = 64, max_source_ips: int = 16,
+                 min_report_count: int = 2):
+        self.window_seconds = window_seconds
+        self.window_count = window_count
+        self.top_k = top_k
+        self.hll_precision = hll_precision
+        self.max_services = max_services
+        self.max_source_ips = max_source_ips
+        
+        # Destinations and ports become topology facts once a window has
+        # seen them at least this many times (one-off noise stays in the sketch)
+        self.min_report_count = min_report_count
+        
+        self.sketches: Dict[str, AgentTrafficSketch] = {}
+        
+        # Agents with facts not yet drained: agent_id -> delta under construction
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        
+        self.stats = {
+            'logs_observed': 0,
+            'connections_observed': 0,
+            'deltas_emitted': 0,
+            'agents_expired': 0
+        }
+    
+    def _window_index(self, timestamp: Optional[datetime]) -> int:
+        if not isinstance(timestamp, datetime):
+            timestamp = datetime.utcnow()
+        if timestamp.tzinfo is None:
+            # Log timestamps are naive UTC
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return int(timestamp.timestamp() // self.window_seconds)
+    
+    def _sketch(self, agent_id: str) -> AgentTrafficSketch:
+        sketch = self.sketches.get(agent_id)
+        if sketch is None:
+            sketch = AgentTrafficSketch(agent_id, self.window_count, self.top_k, self.hll_precision,
+                                        self.max_source_ips)
+            self.sketches[agent_id] = sketch
+        return sketch
+    
+    def _delta(self, agent_id: str) -> Dict[str, Any]:
+        delta = self._pending.get(agent_id)
+        if delta is None:
+            delta = {'agent_id': agent_id, 'last_seen': None, 'source_ips': set(), 'destinations': set(),
+                     'ports': set(), 'services': set(), 'connections': 0, 'logs': 0}
+            self._pending[agent_id] = delta
+        return delta
+    
+    @staticmethod
+    def _extract_ports(log_entry: LogEntry) -> Iterable[int]:
+        network_info = log_entry.network_info or {}
+        port = network_info.get('destination_port') or network_info.get('port')
+        if port:
+            try:
+                yield int(port)
+            except (TypeError, ValueError):
+                pass
+            return
+        for match in _PORT_PATTERN.finditer(log_entry.raw_data or ''):
+            value = int(match.group(1))
+            if 1 <= value <= 65535:
+                yield value
+    
+    @staticmethod
+    def _extract_service(log_entry: LogEntry) -> Optional[str]:
+        process_name = (log_entry.process_info or {}).get('process_name', '').lower()
+        for service in SERVICE_INDICATORS:
+            if service in process_name:
+                return service
+        return None
+    
+    def observe(self, log_entry: LogEntry) -> None:
+        """Fold one log entry into its agent's current window"""
+        agent_id = log_entry.agent_id
+        if not agent_id:
+            return
+        
+        sketch = self._sketch(agent_id)
+        window = sketch.window(self._window_index(log_entry.timestamp))
+        delta = self._delta(agent_id)
+        window.logs += 1
+        delta['logs'] += 1
+        
+        if log_entry.timestamp and (sketch.last_seen is None or log_entry.timestamp > sketch.last_seen):
+            sketch.last_seen = log_entry.timestamp
+            delta['last_seen'] = log_entry.timestamp
+        
+        network_info = log_entry.network_info or {}
+        source_ip = network_info.get('source_ip')
+        if source_ip and source_ip not in sketch.source_ips and len(sketch.source_ips) < self.max_source_ips:
+            sketch.source_ips.add(source_ip)
+            delta['source_ips'].add(source_ip)
+        
+        destination_ip = network_info.get('destination_ip')
+        if destination_ip:
+            window.connections += 1
+            delta['connections'] += 1
+            self.stats['connections_observed'] += 1
+            window.destinations.add(destination_ip)
+            if (destination_ip not in sketch.reported_destinations
+                    and window.destinations.guaranteed(destination_ip) >= self.min_report_count):
+                delta['destinations'].add(destination_ip)
+        
+        for port in self._extract_ports(log_entry):
+            port_key = str(port)
+            window.distinct_ports.add(port_key)
+            window.ports.add(port_key)
+            if (port_key not in sketch.reported_ports
+                    and window.ports.guaranteed(port_key) >= self.min_report_count):
+                delta['ports'].add(port)
+        
+        service = self._extract_service(log_entry)
+        if service and (service in window.services or len(window.services) < self.max_services):
+            # Every window records its services so the summary survives older
+            # windows aging out; only services not yet reported become deltas
+            window.services.add(service)
+            if service not in sketch.reported_services:
+                delta['services'].add(service)
+        
+        self.stats['logs_observed'] += 1
+    
+    def drain_deltas(self) -> Dict[str, Dict[str, Any]]:
+        """Compact per-agent deltas of facts first seen since the last drain"""
+        deltas = {}
+        for agent_id, pending in self._pending.items():
+            sketch = self.sketches.get(agent_id)
+            if sketch is None:
+                continue
+            
+            sketch.reported_destinations |= pending['destinations']
+            sketch.reported_ports |= {str(port) for port in pending['ports']}
+            sketch.reported_services |= pending['services']
+            self._bound_reported(sketch)
+            
+            deltas[agent_id] = {
+                'agent_id': agent_id,
+                'last_seen': pending['last_seen'].isoformat() if pending['last_seen'] else None,
+                'source_ips': sorted(pending['source_ips']),
+                'destinations': sorted(pending['destinations']),
+                'ports': sorted(pending['ports']),
+                'services': sorted(pending['services']),
+                'connections': pending['connections'],
+                'logs': pending['logs']
+            }
+        
+        self._pending.clear()
+        self.stats['deltas_emitted'] += len(deltas)
+        return deltas
+    
+    def _bound_reported(self, sketch: AgentTrafficSketch) -> None:
+        """Keep only reported facts still tracked by the sketches (constant memory)"""
+        limit = self.top_k * self.window_count
+        if len(sketch.reported_destinations) > limit:
+            tracked = set()
+            for window in sketch.windows:
+                tracked.update(window.destinations.counts)
+            sketch.reported_destinations &= tracked
+        if len(sketch.reported_ports) > limit:
+            tracked = set()
+            for window in sketch.windows:
+                tracked.update(window.ports.counts)
+            sketch.reported_ports &= tracked
+    
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Drop windows older than the ring and agents with no windows left"""
+        oldest_index = self._window_index(now) - self.window_count + 1
+        expired = []
+        for agent_id, sketch in self.sketches.items():
+            sketch.expire(oldest_index)
+            if not sketch.windows and agent_id not in self._pending:
+                expired.append(agent_id)
+        
+        for agent_id in expired:
+            del self.sketches[agent_id]
+        self.stats['agents_expired'] += len(expired)
+        return len(expired)
+    
+    def get_agent_summary(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Merged traffic summary for an agent over the whole ring"""
+        sketch = self.sketches.get(agent_id)
+        return sketch.summary() if sketch else None
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'agents': len(self.sketches),
+            'pending_agents': len(self._pending),
+            'window_seconds': self.window_seconds,
+            'window_count': self.window_count,
+            **self.stats
+        }
@@ -4,7 +4,6 @@ Enhanced AI Detection Report System for CodeGrey SOC Platform
 Comprehensive threat analysis, MITRE ATT&CK mapping, and executive summaries
 """
 
-import sqlite3
 import json
 import logging
 import os
@@ -13,6 +12,8 @@ from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from collections import defaultdict, Counter
 import asyncio
+from shared.database import get_db_connection
+from shared.mitre_index import get_mitre_index
 
 logger = logging.getLogger(__name__)
 
@@ -80,34 +81,9 @@ class EnhancedAIDetectionReporter:
     
     def __init__(self, db_path: str = "soc_database.db"):
         self.db_path = db_path
-        self.mitre_techniques_db = self._load_mitre_techniques()
+        self.mitre_index = get_mitre_index()
         self.threat_intelligence_db = self._load_threat_intelligence()
     
-    def _load_mitre_techniques(self) -> Dict[str, Dict[str, Any]]:
-        """Load MITRE ATT&CK techniques database"""
-        return {
-            "T1055": {"name": "Process Injection", "tactic": "Defense Evasion", "description": "Injection of malicious code into running processes"},
-            "T1059": {"name": "Command and Scripting Interpreter", "tactic": "Execution", "description": "Use of command line interfaces for execution"},
-            "T1071": {"name": "Application Layer Protocol", "tactic": "Command and Control", "description": "Communication using application layer protocols"},
-            "T1083": {"name": "File and Directory Discovery", "tactic": "Discovery", "description": "Enumeration of files and directories"},
-            "T1105": {"name": "Ingress Tool Transfer", "tactic": "Command and Control", "description": "Transfer of tools from external systems"},
-            "T1112": {"name": "Modify Registry", "tactic": "Defense Evasion", "description": "Modification of Windows registry"},
-            "T1124": {"name": "System Time Discovery", "tactic": "Discovery", "description": "Gathering system time information"},
-            "T1135": {"name": "Network Share Discovery", "tactic": "Discovery", "description": "Discovery of network shares"},
-            "T1140": {"name": "Deobfuscate/Decode Files or Information", "tactic": "Defense Evasion", "description": "Deobfuscation of files or information"},
-            "T1204": {"name": "User Execution", "tactic": "Execution", "description": "Execution of malicious code by user interaction"},
-            "T1218": {"name": "Signed Binary Proxy Execution", "tactic": "Defense Evasion", "description": "Use of signed binaries for malicious purposes"},
-            "T1486": {"name": "Data Encrypted for Impact", "tactic": "Impact", "description": "Encryption of data for ransom or destruction"},
-            "T1566": {"name": "Phishing", "tactic": "Initial Access", "description": "Social engineering attacks via email or messaging"},
-            "T1573": {"name": "Encrypted Channel", "tactic": "Command and Control", "description": "Use of encrypted communication channels"},
-            "T1053": {"name": "Scheduled Task/Job", "tactic": "Execution", "description": "Use of scheduled tasks for persistence and execution"},
-            "T1070": {"name": "Indicator Removal", "tactic": "Defense Evasion", "description": "Removal of forensic artifacts"},
-            "T1082": {"name": "System Information Discovery", "tactic": "Discovery", "description": "Gathering system information"},
-            "T1090": {"name": "Proxy", "tactic": "Command and Control", "description": "Use of proxy servers for communication"},
-            "T1027": {"name": "Obfuscated Files or Information", "tactic": "Defense Evasion", "description": "Obfuscation of files or information"},
-            "T1041": {"name": "Exfiltration Over C2 Channel", "tactic": "Exfiltration", "description": "Data exfiltration over command and control channels"}
-        }
-    
     def _load_threat_intelligence(self) -> Dict[str, ThreatIntelligence]:
         """Load threat intelligence database"""
         # This would typically load from external threat feeds
@@ -172,7 +148,7 @@ class EnhancedAIDetectionReporter:
                                 include_benign: bool = False) -> List[Dict[str, Any]]:
         """Get detection data from database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Build query
@@ -301,9 +277,12 @@ class EnhancedAIDetectionReporter:
             tactics = detection.get('tactics', [])
             
             for technique_id in mitre_techniques:
-                if technique_id in self.mitre_techniques_db:
-                    technique_info = self.mitre_techniques_db[technique_id]
-                    
+                # Unlisted sub-techniques are described by their parent technique
+                technique_info = self.mitre_index.describe(technique_id)
+                if technique_info is None and self.mitre_index.is_valid_id(technique_id):
+                    technique_info = {'name': technique_id, 'tactic': tactics[0] if tactics else 'Unknown',
+                                      'description': ''}
+                if technique_info is not None:
                     # Calculate confidence based on detection confidence and evidence
                     evidence = []
                     if detection.get('rule_matches'):
@@ -418,7 +397,7 @@ class EnhancedAIDetectionReporter:
         """Calculate detection trends and statistics"""
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # Get hourly detection counts
@@ -4,10 +4,11 @@ Enhanced Missed Threat Detection with Multiple Ground Truth Sources
 Combines heuristics, red team data, analyst feedback, and attack simulations
 """
 
-import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 import logging
+from shared.database import get_db_connection
+from shared.migrations import ensure_schema
 
 logger = logging.getLogger(__name__)
 
@@ -20,60 +21,9 @@ class EnhancedMissedDetection:
         self._ensure_ground_truth_tables()
     
     def _ensure_ground_truth_tables(self):
-        """Create tables for ground truth tracking"""
+        """Ensure ground truth tracking tables exist (created by the schema migrations)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Red Team Attacks Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS red_team_attacks (
-                    id TEXT PRIMARY KEY,
-                    scenario_id TEXT,
-                    attack_type TEXT,
-                    target_agent_id TEXT,
-                    attack_timestamp TEXT,
-                    expected_detection BOOLEAN DEFAULT 1,
-                    was_detected BOOLEAN DEFAULT 0,
-                    detection_id TEXT,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Analyst Review Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS analyst_reviews (
-                    id TEXT PRIMARY KEY,
-                    log_entry_id TEXT,
-                    detection_result_id TEXT,
-                    analyst_verdict TEXT,  -- 'threat', 'benign', 'unclear'
-                    confidence INTEGER,     -- 1-5
-                    threat_type TEXT,
-                    notes TEXT,
-                    reviewed_by TEXT,
-                    reviewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Known Attack Indicators Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS attack_indicators (
-                    id TEXT PRIMARY KEY,
-                    indicator_type TEXT,    -- 'ip', 'hash', 'domain', 'pattern'
-                    indicator_value TEXT,
-                    threat_type TEXT,
-                    severity TEXT,
-                    source TEXT,           -- 'threat_intel', 'manual', 'ml'
-                    first_seen TEXT,
-                    last_seen TEXT,
-                    active BOOLEAN DEFAULT 1
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
-            
+            ensure_schema(self.db_path)
         except Exception as e:
             logger.error(f"Failed to create ground truth tables: {e}")
     
@@ -91,7 +41,7 @@ class EnhancedMissedDetection:
         """
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             # 1. RED TEAM ATTACKS MISSED (Ground Truth)
@@ -215,7 +165,7 @@ class EnhancedMissedDetection:
         try:
             import uuid
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             attack_id = str(uuid.uuid4())
@@ -248,7 +198,7 @@ class EnhancedMissedDetection:
     async def mark_attack_detected(self, attack_id: str, detection_id: str):
         """Mark a red team attack as detected"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -270,7 +220,7 @@ class EnhancedMissedDetection:
         try:
             import uuid
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             review_id = str(uuid.uuid4())
@@ -307,7 +257,7 @@ class EnhancedMissedDetection:
         try:
             import uuid
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             indicator_id = str(uuid.uuid4())
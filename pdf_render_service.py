@@ -0,0 +1,379 @@
+"""
+PDF Render Service
+Renders report PDFs in a process pool, reuses identical renders and bounds the downloads directory
+
+ReportLab builds a whole document in one blocking call, so rendering inside
+the API process froze every request until the PDF was written. Renders now
+run in worker processes behind a job id the API can poll. Output files are
+named by a hash of the report content (volatile timestamps excluded), so an
+unchanged report reuses the PDF already on disk, and old files are garbage
+collected against an age and total size budget.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+DOWNLOADS_DIR = os.path.join("server", "downloads")
+
+# Report type -> (ProfessionalPDFGenerator method, filename prefix)
+PDF_RENDERERS = {
+    'risk_assessment': ('generate_risk_assessment_pdf', 'Risk_Assessment_Report'),
+    'security_posture': ('generate_security_posture_pdf', 'Security_Posture_Report'),
+    'compliance_dashboard': ('generate_compliance_dashboard_pdf', 'Compliance_Dashboard_Report')
+}
+
+# Keys that change on every generation without the report content changing
+VOLATILE_REPORT_KEYS = frozenset({
+    'generatedAt', 'generated_at', 'lastUpdated', 'lastAudited', 'lastCalculated',
+    'nextAuditDate', 'nextAssessmentDate', 'reportId', 'report_id', 'snapshotSeconds',
+    'cached', 'cached_at', 'stale', 'refreshing'
+})
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_TRACKED_JOBS = 200
+
+
+def report_content_hash(report_data: Dict[str, Any]) -> str:
+    """SHA-256 of the report with volatile keys removed"""
+    def strip(value):
+        if isinstance(value, dict):
+            return {key: strip(item) for key, item in value.items() if key not in VOLATILE_REPORT_KEYS}
+        if isinstance(value, (list, tuple)):
+            return [strip(item) for item in value]
+        return value
+    
+    canonical = json.dumps(strip(report_data), sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _render_in_worker(report_type: str, report_data: Dict[str, Any], output_dir: str, filename: str) -> int:
+    """Render one PDF (runs in a worker process); returns the file size"""
+    from pdf_report_generator import ProfessionalPDFGenerator
+    
+    method, _ = PDF_RENDERERS[report_type]
+    # Build under a temporary name so readers never see a partial file
+    partial_name = f".{filename}.{os.getpid()}.part"
+    partial_path = getattr(ProfessionalPDFGenerator(output_dir), method)(report_data, filename=partial_name)
+    
+    final_path = os.path.join(output_dir, filename)
+    os.replace(partial_path, final_path)
+    return os.path.getsize(final_path)
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "bytes=" Range header
+    
+    Returns:
+        Inclusive (start, end) byte offsets, or None to send the whole file
+    
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+    
+    spec = range_header[len('bytes='):].strip()
+    if ',' in spec:
+        # Multipart ranges are not supported; fall back to the whole file
+        return None
+    
+    start_text, _, end_text = spec.partition('-')
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else file_size - 1
+        else:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError(f"Unsatisfiable range: {range_header}")
+            start = max(0, file_size - length)
+            end = file_size - 1
+    except (TypeError, ValueError):
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    
+    end = min(end, file_size - 1)
+    if start < 0 or start > end:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    return start, end
+
+
+def iter_file_range(path: str, start: int, end: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield bytes start..end (inclusive) of a file in chunks"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class PDFRenderService:
+    """Runs PDF renders in worker processes and manages the downloads directory"""
+    
+    def __init__(self, output_dir: str = DOWNLOADS_DIR, max_workers: Optional[int] = None,
+                 max_total_mb: Optional[float] = None, max_age_days: Optional[float] = None):
+        self.output_dir = output_dir
+        self.max_workers = max_workers or int(os.getenv('PDF_RENDER_WORKERS', '2'))
+        self.max_total_bytes = int((max_total_mb or float(os.getenv('PDF_DOWNLOADS_MAX_MB', '500'))) * 1024 * 1024)
+        self.max_age_seconds = (max_age_days or float(os.getenv('PDF_DOWNLOADS_MAX_AGE_DAYS', '7'))) * 86400
+        
+        self._executor: Optional[ProcessPoolExecutor] = None
+        
+        # Recent jobs by id, and the job currently rendering each content hash
+        self.jobs: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._inflight_jobs: Dict[str, str] = {}
+        
+        self.stats = {
+            'renders': 0,
+            'reused': 0,
+            'coalesced': 0,
+            'failures': 0,
+            'collected_files': 0,
+            'collected_bytes': 0
+        }
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers do not inherit the server's threads, locks or sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+    
+    def filename_for(self, report_type: str, content_hash: str) -> str:
+        _, prefix = PDF_RENDERERS[report_type]
+        return f"{prefix}_{content_hash[:16]}.pdf"
+    
+    def _new_job(self, report_type: str, content_hash: str, filename: str) -> Dict[str, Any]:
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'report_type': report_type,
+            'state': 'rendering',
+            'content_hash': content_hash,
+            'filename': filename,
+            'download_url': f"/api/downloads/{filename}",
+            'file_size': None,
+            'reused': False,
+            'error': None,
+            'created_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'render_seconds': None
+        }
+        self.jobs[job['job_id']] = job
+        while len(self.jobs) > MAX_TRACKED_JOBS:
+            self.jobs.popitem(last=False)
+        return job
+    
+    def _finish_job(self, job: Dict[str, Any], file_size: int, reused: bool = False) -> None:
+        job['state'] = 'completed'
+        job['file_size'] = file_size
+        job['reused'] = reused
+        job['finished_at'] = datetime.utcnow().isoformat()
+    
+    def submit(self, report_type: str, report_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Start rendering a report PDF without waiting for it (call from the event loop)
+        
+        Identical report content reuses the PDF on disk, and a render already
+        running for the same content is joined rather than repeated.
+        
+        Returns:
+            Job status dict (state is 'completed' straight away for reused files)
+        """
+        if report_type not in PDF_RENDERERS:
+            raise ValueError(f"No PDF renderer for {report_type}")
+        
+        content_hash = report_content_hash(report_data)
+        filename = self.filename_for(report_type, content_hash)
+        filepath = os.path.join(self.output_dir, filename)
+        
+        if content_hash in self._inflight_jobs and self._inflight_jobs[content_hash] in self.jobs:
+            self.stats['coalesced'] += 1
+            return self.jobs[self._inflight_jobs[content_hash]]
+        
+        job = self._new_job(report_type, content_hash, filename)
+        
+        if os.path.exists(filepath):
+            # Touch the file so garbage collection treats it as recently used
+            os.utime(filepath)
+            self._finish_job(job, os.path.getsize(filepath), reused=True)
+            self.stats['reused'] += 1
+            return job
+        
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        future = loop.run_in_executor(
+            self._get_executor(), _render_in_worker, report_type, report_data, self.output_dir, filename
+        )
+        self._inflight[content_hash] = future
+        self._inflight_jobs[content_hash] = job['job_id']
+        
+        def _on_done(finished: asyncio.Future):
+            self._inflight.pop(content_hash, None)
+            self._inflight_jobs.pop(content_hash, None)
+            job['render_seconds'] = round(time.perf_counter() - started, 3)
+            exception = None if finished.cancelled() else finished.exception()
+            if finished.cancelled() or exception is not None:
+                error = 'cancelled' if finished.cancelled() else str(exception)
+                if isinstance(exception, BrokenProcessPool):
+                    # A worker died; start a fresh pool for the next render
+                    self._executor = None
+                job['state'] = 'failed'
+                job['error'] = error
+                job['finished_at'] = datetime.utcnow().isoformat()
+                self.stats['failures'] += 1
+                logger.error(f"PDF render failed for {report_type}: {error}")
+                return
+            self._finish_job(job, finished.result())
+            self.stats['renders'] += 1
+            logger.info(f"Rendered {filename} in {job['render_seconds']}s")
+            self.collect_garbage(keep={filename})
+        
+        future.add_done_callback(_on_done)
+        return job
+    
+    async def render(self, report_type: str, report_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Render a report PDF and wait for it without blocking the event loop
+        
+        Returns:
+            Completed job status dict
+        
+        Raises:
+            RuntimeError: If the render failed
+        """
+        job = self.submit(report_type, report_data)
+        future = self._inflight.get(job['content_hash'])
+        if future is not None:
+            # Shield so a cancelled caller does not cancel a render others may share
+            # (the done callback registered in submit() has recorded the outcome by then)
+            try:
+                await asyncio.shield(future)
+            except Exception:
+                pass
+        
+        if job['state'] != 'completed':
+            raise RuntimeError(f"PDF render failed: {job['error']}")
+        return job
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+    
+    def list_pdfs(self) -> List[Dict[str, Any]]:
+        """PDFs in the downloads directory, newest first"""
+        pdfs = []
+        try:
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.pdf') and not entry.name.startswith('.') and entry.is_file():
+                        stat = entry.stat()
+                        pdfs.append({'filename': entry.name, 'path': entry.path,
+                                     'size': stat.st_size, 'mtime': stat.st_mtime})
+        except FileNotFoundError:
+            return []
+        pdfs.sort(key=lambda pdf: pdf['mtime'], reverse=True)
+        return pdfs
+    
+    def collect_garbage(self, keep: Optional[set] = None) -> Dict[str, int]:
+        """
+        Delete PDFs older than the age budget, then the oldest until the size budget holds
+        
+        The newest PDF of each report type is always kept, since cached
+        reports link to it, as is anything named in `keep`.
+        """
+        keep = set(keep or ())
+        pdfs = self.list_pdfs()
+        
+        prefixes = [prefix for _, prefix in PDF_RENDERERS.values()]
+        newest_seen = set()
+        for pdf in pdfs:
+            prefix = next((p for p in prefixes if pdf['filename'].startswith(f"{p}_")), None)
+            if prefix is not None and prefix not in newest_seen:
+                newest_seen.add(prefix)
+                keep.add(pdf['filename'])
+        
+        now = time.time()
+        total_bytes = sum(pdf['size'] for pdf in pdfs)
+        removed_files = removed_bytes = 0
+        
+        # Oldest first
+        for pdf in reversed(pdfs):
+            if pdf['filename'] in keep:
+                continue
+            expired = now - pdf['mtime'] > self.max_age_seconds
+            if not expired and total_bytes <= self.max_total_bytes:
+                continue
+            try:
+                os.remove(pdf['path'])
+            except OSError as e:
+                logger.error(f"Failed to remove old PDF {pdf['filename']}: {e}")
+                continue
+            total_bytes -= pdf['size']
+            removed_files += 1
+            removed_bytes += pdf['size']
+        
+        # Partial files left behind by a crashed worker
+        try:
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.part') and now - entry.stat().st_mtime > 3600:
+                        os.remove(entry.path)
+        except OSError as e:
+            logger.error(f"Failed to clean partial PDFs: {e}")
+        
+        if removed_files:
+            self.stats['collected_files'] += removed_files
+            self.stats['collected_bytes'] += removed_bytes
+            logger.info(f"Removed {removed_files} old PDFs ({removed_bytes / 1024 / 1024:.1f} MB)")
+        
+        return {'removed_files': removed_files, 'removed_bytes': removed_bytes, 'total_bytes': total_bytes}
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        pdfs = self.list_pdfs()
+        return {
+            **self.stats,
+            'rendering': len(self._inflight),
+            'files': len(pdfs),
+            'total_mb': round(sum(pdf['size'] for pdf in pdfs) / 1024 / 1024, 2),
+            'max_total_mb': round(self.max_total_bytes / 1024 / 1024, 2),
+            'max_age_days': round(self.max_age_seconds / 86400, 2)
+        }
+    
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+_pdf_render_service = None
+
+def get_pdf_render_service() -> PDFRenderService:
+    """Get singleton instance of PDFRenderService"""
+    global _pdf_render_service
+    if _pdf_render_service is None:
+        _pdf_render_service = PDFRenderService()
+    return _pdf_render_service
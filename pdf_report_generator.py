@@ -111,11 +111,11 @@ class ProfessionalPDFGenerator:
             rightIndent=20
         ))
     
-    def generate_risk_assessment_pdf(self, report_data: Dict[str, Any]) -> str:
+    def generate_risk_assessment_pdf(self, report_data: Dict[str, Any], filename: Optional[str] = None) -> str:
         """Generate professional Risk Assessment PDF report"""
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"Risk_Assessment_Report_{timestamp}.pdf"
+            filename = filename or f"Risk_Assessment_Report_{timestamp}.pdf"
             filepath = os.path.join(self.output_dir, filename)
             
             doc = SimpleDocTemplate(
@@ -170,11 +170,11 @@ class ProfessionalPDFGenerator:
             logger.error(f"Error generating Risk Assessment PDF: {e}")
             raise
     
-    def generate_security_posture_pdf(self, report_data: Dict[str, Any]) -> str:
+    def generate_security_posture_pdf(self, report_data: Dict[str, Any], filename: Optional[str] = None) -> str:
         """Generate professional Security Posture PDF report"""
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"Security_Posture_Report_{timestamp}.pdf"
+            filename = filename or f"Security_Posture_Report_{timestamp}.pdf"
             filepath = os.path.join(self.output_dir, filename)
             
             doc = SimpleDocTemplate(
@@ -233,11 +233,11 @@ class ProfessionalPDFGenerator:
             logger.error(f"Error generating Security Posture PDF: {e}")
             raise
     
-    def generate_compliance_dashboard_pdf(self, report_data: Dict[str, Any]) -> str:
+    def generate_compliance_dashboard_pdf(self, report_data: Dict[str, Any], filename: Optional[str] = None) -> str:
         """Generate professional Compliance Dashboard PDF report"""
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"Compliance_Dashboard_Report_{timestamp}.pdf"
+            filename = filename or f"Compliance_Dashboard_Report_{timestamp}.pdf"
             filepath = os.path.join(self.output_dir, filename)
             
             doc = SimpleDocTemplate(
@@ -1,59 +1,180 @@
 """
 Report Cache Manager
 Manages caching of generated reports to reduce costs and improve performance
+
+Cached reports are considered stale once their TTL expires or enough of the
+data they depend on (detections, agents, commands) has changed. Stale reports
+are still served while a single background regeneration refreshes them.
 """
 
+import asyncio
 import sqlite3
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
 from pathlib import Path
 
+from shared.utils import data_change_tracker
+from shared.migrations import ensure_schema
+from shared.database import get_db_connection
+
 logger = logging.getLogger(__name__)
 
 
+# Per-report freshness policy
+#   ttl_seconds:           maximum age before a report is stale
+#   depends_on:            data change sources that invalidate the report
+#   min_changes:           number of dependent changes needed to invalidate
+#   min_refresh_interval:  minimum age before change-driven invalidation applies
+REPORT_CACHE_POLICIES = {
+    'security_posture': {
+        'ttl_seconds': 3600,
+        'depends_on': ['detections', 'agents'],
+        'min_changes': 25,
+        'min_refresh_interval': 300
+    },
+    'compliance_dashboard': {
+        'ttl_seconds': 6 * 3600,
+        'depends_on': ['detections', 'agents'],
+        'min_changes': 50,
+        'min_refresh_interval': 900
+    },
+    'risk_assessment': {
+        'ttl_seconds': 3600,
+        'depends_on': ['detections', 'agents', 'commands'],
+        'min_changes': 25,
+        'min_refresh_interval': 300
+    }
+}
+
+DEFAULT_CACHE_POLICY = {
+    'ttl_seconds': 3600,
+    'depends_on': [],
+    'min_changes': 1,
+    'min_refresh_interval': 0
+}
+
+# Report generators return (report_data, metadata)
+ReportGenerator = Callable[..., Awaitable[Tuple[Dict[str, Any], Dict[str, Any]]]]
+
+
+def notify_data_change(source: str, count: int = 1) -> None:
+    """Record a data change that may invalidate cached reports"""
+    data_change_tracker.record_change(source, count)
+
+
 class ReportCacheManager:
     """Manages report caching in database"""
     
     def __init__(self, db_path: str = "soc_database.db"):
         self.db_path = db_path
+        
+        # In-memory mirror of report_cache rows (report JSON kept serialized
+        # so every reader gets its own copy)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        
+        # Registered report generators and in-flight regenerations, keyed by
+        # report type and generator arguments
+        self._generators: Dict[str, ReportGenerator] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'regenerations': 0,
+            'coalesced_requests': 0,
+            'regeneration_failures': 0
+        }
+        
         self._initialize_cache_table()
     
     def _initialize_cache_table(self):
-        """Create report_cache table if it doesn't exist"""
+        """Ensure report_cache table exists (created by the schema migrations)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS report_cache (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    report_type TEXT NOT NULL,
-                    report_data TEXT NOT NULL,
-                    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT,
-                    UNIQUE(report_type)
-                )
-            ''')
-            
-            # Create index for faster lookups
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_report_cache_type 
-                ON report_cache(report_type)
-            ''')
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info("Report cache table initialized successfully")
-            
+            ensure_schema(self.db_path)
         except Exception as e:
             logger.error(f"Failed to initialize report cache table: {e}")
     
+    def get_policy(self, report_type: str) -> Dict[str, Any]:
+        """Get freshness policy for a report type"""
+        return REPORT_CACHE_POLICIES.get(report_type, DEFAULT_CACHE_POLICY)
+    
+    def register_generator(self, report_type: str, generator: ReportGenerator) -> None:
+        """
+        Register the coroutine used to regenerate a report type
+        
+        Args:
+            report_type: Type of report
+            generator: Async callable returning (report_data, metadata)
+        """
+        self._generators[report_type] = generator
+        logger.info(f"Registered report generator for {report_type}")
+    
+    def _load_entry(self, report_type: str) -> Optional[Dict[str, Any]]:
+        """Load cache entry from memory, falling back to the database"""
+        entry = self._entries.get(report_type)
+        if entry is not None:
+            return entry
+        
+        conn = get_db_connection(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT report_data, generated_at, metadata
+            FROM report_cache
+            WHERE report_type = ?
+            ORDER BY generated_at DESC
+            LIMIT 1
+        ''', (report_type,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return None
+        
+        entry = {
+            'report_json': row['report_data'],
+            'generated_at': row['generated_at'],
+            'metadata': json.loads(row['metadata']) if row['metadata'] else {}
+        }
+        self._entries[report_type] = entry
+        return entry
+    
+    def get_staleness(self, report_type: str, entry: Dict[str, Any]) -> Optional[str]:
+        """
+        Determine whether a cache entry is stale
+        
+        Returns:
+            Reason the entry is stale, or None if it is fresh
+        """
+        policy = self.get_policy(report_type)
+        
+        try:
+            age_seconds = (datetime.utcnow() - datetime.fromisoformat(str(entry['generated_at']))).total_seconds()
+        except ValueError:
+            return 'unknown_age'
+        
+        if age_seconds >= policy['ttl_seconds']:
+            return 'ttl_expired'
+        
+        if age_seconds < policy['min_refresh_interval'] or not policy['depends_on']:
+            return None
+        
+        changes = data_change_tracker.changes_since(
+            entry['metadata'].get('data_versions'), policy['depends_on']
+        )
+        if changes is not None and changes >= policy['min_changes']:
+            return 'data_changed'
+        
+        return None
+    
     def get_cached_report(self, report_type: str) -> Optional[Dict[str, Any]]:
         """
-        Retrieve cached report from database
+        Retrieve cached report
         
         Args:
             report_type: Type of report ('risk_assessment', 'security_posture', 'compliance_dashboard')
@@ -62,43 +183,141 @@ class ReportCacheManager:
             Cached report dict or None if not found
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT report_data, generated_at, metadata
-                FROM report_cache
-                WHERE report_type = ?
-                ORDER BY generated_at DESC
-                LIMIT 1
-            ''', (report_type,))
+            entry = self._load_entry(report_type)
             
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                report_data = json.loads(row['report_data'])
-                generated_at = row['generated_at']
-                metadata = json.loads(row['metadata']) if row['metadata'] else {}
+            if entry:
+                stale_reason = self.get_staleness(report_type, entry)
                 
-                logger.info(f"Retrieved cached {report_type} report from {generated_at}")
+                logger.info(f"Retrieved cached {report_type} report from {entry['generated_at']}")
                 
                 return {
-                    'report': report_data,
-                    'generated_at': generated_at,
-                    'metadata': metadata,
-                    'cached': True
+                    'report': json.loads(entry['report_json']),
+                    'generated_at': entry['generated_at'],
+                    'metadata': dict(entry['metadata']),
+                    'cached': True,
+                    'stale': stale_reason is not None,
+                    'stale_reason': stale_reason
                 }
             
             logger.info(f"No cached {report_type} report found")
             return None
-            
+        
         except Exception as e:
             logger.error(f"Failed to retrieve cached report: {e}")
             return None
     
-    def save_report(self, report_type: str, report_data: Dict[str, Any], 
+    async def get_report(self, report_type: str, revalidate: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve cached report, refreshing it in the background when stale
+        
+        Stale or missing reports trigger one background regeneration if a
+        generator is registered; the stale copy is returned meanwhile.
+        
+        Args:
+            report_type: Type of report
+            revalidate: Whether to schedule regeneration for stale or missing reports
+        
+        Returns:
+            Cached report dict or None if not found
+        """
+        cached_report = self.get_cached_report(report_type)
+        
+        if cached_report is None:
+            self.stats['misses'] += 1
+        elif cached_report['stale']:
+            self.stats['stale_hits'] += 1
+        else:
+            self.stats['hits'] += 1
+        
+        if revalidate and report_type in self._generators:
+            if cached_report is None or cached_report['stale']:
+                reason = cached_report['stale_reason'] if cached_report else 'missing'
+                logger.info(f"Revalidating {report_type} report in background ({reason})")
+                self._start_refresh(report_type, {})
+        
+        return cached_report
+    
+    async def refresh_report(self, report_type: str, **kwargs) -> Dict[str, Any]:
+        """
+        Regenerate a report now, joining any regeneration already in flight
+        
+        Concurrent callers with the same arguments share a single regeneration
+        of the report type.
+        
+        Args:
+            report_type: Type of report
+            **kwargs: Arguments passed to the registered generator
+        
+        Returns:
+            Freshly generated report dict
+        """
+        if report_type not in self._generators:
+            raise ValueError(f"No report generator registered for {report_type}")
+        
+        task = self._start_refresh(report_type, kwargs)
+        
+        # Shield so a disconnecting client does not cancel the shared regeneration
+        return await asyncio.shield(task)
+    
+    def is_refreshing(self, report_type: str) -> bool:
+        """Check whether a regeneration is in flight for a report type"""
+        return any(key[0] == report_type and not task.done() for key, task in self._inflight.items())
+    
+    @staticmethod
+    def _inflight_key(report_type: str, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        """Single-flight key: only regenerations with the same arguments are shared"""
+        return report_type, json.dumps(kwargs, sort_keys=True, default=str)
+    
+    def _start_refresh(self, report_type: str, kwargs: Dict[str, Any]) -> asyncio.Task:
+        """Start regeneration unless one with the same arguments is already running (single-flight)"""
+        key = self._inflight_key(report_type, kwargs)
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            self.stats['coalesced_requests'] += 1
+            return task
+        
+        task = asyncio.ensure_future(self._regenerate(report_type, kwargs))
+        self._inflight[key] = task
+        
+        def _on_done(finished: asyncio.Task):
+            if self._inflight.get(key) is finished:
+                del self._inflight[key]
+            # Background refreshes may have no awaiter; retrieve the exception
+            if not finished.cancelled():
+                finished.exception()
+        
+        task.add_done_callback(_on_done)
+        return task
+    
+    async def _regenerate(self, report_type: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the registered generator and store the result"""
+        policy = self.get_policy(report_type)
+        
+        # Snapshot before generating so changes made meanwhile keep the report stale
+        data_versions = data_change_tracker.snapshot(policy['depends_on'])
+        
+        try:
+            self.stats['regenerations'] += 1
+            report_data, metadata = await self._generators[report_type](**kwargs)
+        except Exception as e:
+            self.stats['regeneration_failures'] += 1
+            logger.error(f"Failed to regenerate {report_type} report: {e}", exc_info=True)
+            raise
+        
+        metadata = dict(metadata or {})
+        metadata['data_versions'] = data_versions
+        self.save_report(report_type, report_data, metadata)
+        
+        return {
+            'report': report_data,
+            'generated_at': self._entries.get(report_type, {}).get('generated_at'),
+            'metadata': metadata,
+            'cached': False,
+            'stale': False,
+            'stale_reason': None
+        }
+    
+    def save_report(self, report_type: str, report_data: Dict[str, Any],
                    metadata: Optional[Dict[str, Any]] = None) -> bool:
         """
         Save report to cache
@@ -112,24 +331,37 @@ class ReportCacheManager:
             True if successful, False otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
+            if metadata is None or 'data_versions' not in metadata:
+                metadata = dict(metadata or {})
+                metadata['data_versions'] = data_change_tracker.snapshot(
+                    self.get_policy(report_type)['depends_on']
+                )
+            
             report_json = json.dumps(report_data)
-            metadata_json = json.dumps(metadata) if metadata else None
+            metadata_json = json.dumps(metadata, default=str)
+            generated_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
             
             # Use REPLACE to update existing cache or insert new
             cursor.execute('''
                 INSERT OR REPLACE INTO report_cache (report_type, report_data, generated_at, metadata)
-                VALUES (?, ?, CURRENT_TIMESTAMP, ?)
-            ''', (report_type, report_json, metadata_json))
+                VALUES (?, ?, ?, ?)
+            ''', (report_type, report_json, generated_at, metadata_json))
             
             conn.commit()
             conn.close()
             
+            self._entries[report_type] = {
+                'report_json': report_json,
+                'generated_at': generated_at,
+                'metadata': json.loads(metadata_json)
+            }
+            
             logger.info(f"Successfully cached {report_type} report")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Failed to save report to cache: {e}")
             return False
@@ -145,21 +377,23 @@ class ReportCacheManager:
             True if successful, False otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             cursor = conn.cursor()
             
             if report_type:
                 cursor.execute('DELETE FROM report_cache WHERE report_type = ?', (report_type,))
+                self._entries.pop(report_type, None)
                 logger.info(f"Cleared cache for {report_type}")
             else:
                 cursor.execute('DELETE FROM report_cache')
+                self._entries.clear()
                 logger.info("Cleared all cached reports")
             
             conn.commit()
             conn.close()
             
             return True
-            
+        
         except Exception as e:
             logger.error(f"Failed to clear cache: {e}")
             return False
@@ -167,7 +401,7 @@ class ReportCacheManager:
     def get_cache_info(self) -> Dict[str, Any]:
         """Get information about cached reports"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection(self.db_path)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -177,20 +411,27 @@ class ReportCacheManager:
                 ORDER BY generated_at DESC
             ''')
             
+            rows = cursor.fetchall()
+            conn.close()
+            
             cached_reports = []
-            for row in cursor.fetchall():
+            for row in rows:
+                entry = self._load_entry(row['report_type'])
+                stale_reason = self.get_staleness(row['report_type'], entry) if entry else None
                 cached_reports.append({
                     'type': row['report_type'],
-                    'generated_at': row['generated_at']
+                    'generated_at': row['generated_at'],
+                    'stale': stale_reason is not None,
+                    'stale_reason': stale_reason,
+                    'refreshing': self.is_refreshing(row['report_type'])
                 })
             
-            conn.close()
-            
             return {
                 'total_cached_reports': len(cached_reports),
-                'reports': cached_reports
+                'reports': cached_reports,
+                'statistics': dict(self.stats)
             }
-            
+        
         except Exception as e:
             logger.error(f"Failed to get cache info: {e}")
             return {'total_cached_reports': 0, 'reports': []}
@@ -205,5 +446,3 @@ def get_report_cache_manager(db_path: str = "soc_database.db") -> ReportCacheMan
     if _report_cache_manager is None:
         _report_cache_manager = ReportCacheManager(db_path)
     return _report_cache_manager
-
-
@@ -0,0 +1,132 @@
+"""
+Component Registry
+Lazily initialized heavy components with readiness tracking
+
+Agents and models register a factory instead of being built at import time.
+A component is created on first use, or ahead of time by a background warmup
+started once the API is listening, so the server answers health checks
+immediately after a restart and reports per-component readiness meanwhile.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class Component:
+    """A registered factory and the state of the object it builds"""
+    
+    def __init__(self, name: str, factory: Callable[[], Any], warmup: bool = True):
+        self.name = name
+        self.factory = factory
+        self.warmup = warmup
+        self.state = 'pending'  # pending, loading, ready, failed
+        self.instance: Any = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.lock = threading.Lock()
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'load_seconds': self.load_seconds,
+            'error': self.error
+        }
+
+
+class ComponentRegistry:
+    """Builds each registered component once, on first use or during warmup"""
+    
+    def __init__(self):
+        self.components: Dict[str, Component] = {}
+        self.warmup_started_at: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+    
+    def register(self, name: str, factory: Callable[[], Any], warmup: bool = True) -> None:
+        """Register a factory; `warmup` includes it in the background warmup"""
+        if name not in self.components:
+            self.components[name] = Component(name, factory, warmup)
+    
+    def get(self, name: str) -> Optional[Any]:
+        """
+        The component instance, building it on first use
+        
+        Blocks while another thread is building it. Returns None if the
+        component is unknown or its factory failed; failures are not retried.
+        """
+        component = self.components.get(name)
+        if component is None:
+            return None
+        if component.state == 'ready':
+            return component.instance
+        
+        with component.lock:
+            if component.state == 'pending':
+                component.state = 'loading'
+                started = time.perf_counter()
+                try:
+                    component.instance = component.factory()
+                    component.state = 'ready'
+                    logger.info(f"Component {name} ready")
+                except Exception as e:
+                    component.error = str(e)
+                    component.state = 'failed'
+                    logger.warning(f"Component {name} not available: {e}")
+                component.load_seconds = round(time.perf_counter() - started, 3)
+        
+        return component.instance
+    
+    async def aget(self, name: str) -> Optional[Any]:
+        """get() without blocking the event loop"""
+        component = self.components.get(name)
+        if component is not None and component.state == 'ready':
+            return component.instance
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, name)
+    
+    def is_ready(self, name: str) -> bool:
+        component = self.components.get(name)
+        return component is not None and component.state == 'ready'
+    
+    def is_failed(self, name: str) -> bool:
+        component = self.components.get(name)
+        return component is not None and component.state == 'failed'
+    
+    async def warmup(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Build components one after another in a worker thread, leaving the event loop free"""
+        if names is None:
+            names = [name for name, component in self.components.items() if component.warmup]
+        
+        self.warmup_started_at = time.time()
+        started = time.perf_counter()
+        for name in names:
+            await self.aget(name)
+        self.warmup_seconds = round(time.perf_counter() - started, 3)
+        
+        logger.info(f"Component warmup finished in {self.warmup_seconds}s")
+        return self.status()
+    
+    @property
+    def ready(self) -> bool:
+        """Whether every warmup component finished loading (successfully or not)"""
+        return all(component.state in ('ready', 'failed')
+                   for component in self.components.values() if component.warmup)
+    
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: component.status() for name, component in self.components.items()}
+    
+    def pending(self) -> List[str]:
+        return [name for name, component in self.components.items() if component.state in ('pending', 'loading')]
+
+
+# Global registry for the API process
+component_registry = ComponentRegistry()
+
+
+def get_component_registry() -> ComponentRegistry:
+    """Get the process-wide component registry"""
+    return component_registry
@@ -0,0 +1,315 @@
+"""
+Shared SQLite connection factory with query instrumentation
+"""
+
+import re
+import time
+import sqlite3
+import logging
+import threading
+import weakref
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000]
+
+# Statements slower than this get an EXPLAIN QUERY PLAN snapshot
+SLOW_QUERY_MS = 50.0
+
+# VM instructions between progress handler callbacks (scan work proxy)
+PROGRESS_STEP = 1000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint_sql(sql: str) -> str:
+    """Normalize a statement so executions differing only in literals group together"""
+    fingerprint = _STRING_LITERAL.sub('?', sql)
+    fingerprint = _NUMBER_LITERAL.sub('?', fingerprint)
+    fingerprint = _IN_LIST.sub('(?+)', fingerprint)
+    return _WHITESPACE.sub(' ', fingerprint).strip()
+
+
+class QueryStatsCollector:
+    """Aggregates per-fingerprint timings, row counts and query plans"""
+    
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.enabled = True
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.started_at = datetime.utcnow().isoformat()
+    
+    def needs_plan(self, fingerprint: str, elapsed_ms: float) -> bool:
+        """Whether a slow execution should capture a query plan snapshot"""
+        if elapsed_ms < self.slow_query_ms:
+            return False
+        entry = self._stats.get(fingerprint)
+        return entry is None or entry['plan'] is None
+    
+    def record(self, fingerprint: str, sql: str, elapsed_ms: float, rows_returned: int,
+               rows_affected: int, vm_steps: int, error: Optional[str] = None,
+               plan: Optional[List[str]] = None) -> None:
+        """Record one statement execution"""
+        with self._lock:
+            entry = self._stats.get(fingerprint)
+            if entry is None:
+                entry = {
+                    'fingerprint': fingerprint,
+                    'sample_sql': _WHITESPACE.sub(' ', sql).strip()[:500],
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                    'slow_count': 0,
+                    'rows_returned': 0,
+                    'rows_affected': 0,
+                    'vm_steps': 0,
+                    'errors': 0,
+                    'last_error': None,
+                    'plan': None,
+                    'full_scans': [],
+                    'last_seen': None
+                }
+                self._stats[fingerprint] = entry
+            
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['histogram'][self._bucket_index(elapsed_ms)] += 1
+            entry['rows_returned'] += rows_returned
+            entry['rows_affected'] += max(rows_affected, 0)
+            entry['vm_steps'] += vm_steps
+            entry['last_seen'] = datetime.utcnow().isoformat()
+            
+            if elapsed_ms >= self.slow_query_ms:
+                entry['slow_count'] += 1
+            
+            if error:
+                entry['errors'] += 1
+                entry['last_error'] = error
+            
+            if plan is not None:
+                entry['plan'] = plan
+                entry['full_scans'] = [match.group(1) for match in
+                                       (_FULL_SCAN.match(detail) for detail in plan) if match]
+                if entry['full_scans']:
+                    logger.warning(f"Slow query ({elapsed_ms:.1f} ms) scans {', '.join(entry['full_scans'])}: "
+                                   f"{entry['sample_sql'][:200]}")
+    
+    @staticmethod
+    def _bucket_index(elapsed_ms: float) -> int:
+        for index, upper in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= upper:
+                return index
+        return len(LATENCY_BUCKETS_MS)
+    
+    def get_statistics(self, sort_by: str = 'total_ms', limit: int = 50) -> Dict[str, Any]:
+        """Get per-fingerprint statistics, heaviest statements first"""
+        with self._lock:
+            entries = [dict(entry, histogram=list(entry['histogram'])) for entry in self._stats.values()]
+        
+        for entry in entries:
+            entry['avg_ms'] = entry['total_ms'] / entry['count'] if entry['count'] else 0.0
+            entry['steps_per_row'] = (entry['vm_steps'] / entry['rows_returned']
+                                      if entry['rows_returned'] else None)
+        
+        if entries and sort_by not in entries[0]:
+            sort_by = 'total_ms'
+        entries.sort(key=lambda entry: entry[sort_by] or 0, reverse=True)
+        
+        return {
+            'enabled': self.enabled,
+            'since': self.started_at,
+            'slow_query_ms': self.slow_query_ms,
+            'histogram_buckets_ms': LATENCY_BUCKETS_MS + ['inf'],
+            'fingerprints': len(entries),
+            'total_executions': sum(entry['count'] for entry in entries),
+            'full_scan_statements': [
+                {'fingerprint': entry['fingerprint'], 'tables': entry['full_scans'], 'avg_ms': entry['avg_ms']}
+                for entry in entries if entry['full_scans']
+            ],
+            'statements': entries[:limit]
+        }
+    
+    def reset(self) -> None:
+        """Discard all collected statistics"""
+        with self._lock:
+            self._stats.clear()
+            self.started_at = datetime.utcnow().isoformat()
+
+
+# Global collector instance
+query_stats = QueryStatsCollector()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to the query stats collector"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending: Optional[Dict[str, Any]] = None
+    
+    def _finish(self, error: Optional[str] = None) -> None:
+        """Record the statement currently being executed or fetched"""
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        
+        fingerprint = fingerprint_sql(pending['sql'])
+        plan = None
+        if query_stats.needs_plan(fingerprint, pending['elapsed_ms']):
+            plan = self.connection._explain(pending['sql'], pending['parameters'])
+        
+        query_stats.record(fingerprint, pending['sql'], pending['elapsed_ms'], pending['rows'],
+                           self.rowcount, self.connection._vm_steps - pending['steps_start'], error, plan)
+    
+    def _timed(self, method, *args):
+        """Run a cursor method, charging its time to the current statement"""
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        except Exception as e:
+            if self._pending is not None:
+                self._pending['elapsed_ms'] += (time.perf_counter() - started) * 1000
+            self._finish(str(e))
+            raise
+        finally:
+            if self._pending is not None:
+                self._pending['elapsed_ms'] += (time.perf_counter() - started) * 1000
+    
+    def execute(self, sql, parameters=()):
+        self._finish()
+        if not query_stats.enabled:
+            return super().execute(sql, parameters)
+        
+        self._pending = {'sql': sql, 'parameters': parameters, 'elapsed_ms': 0.0, 'rows': 0,
+                         'steps_start': self.connection._vm_steps}
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._finish()
+        return self
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        if not query_stats.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        
+        self._pending = {'sql': sql, 'parameters': None, 'elapsed_ms': 0.0, 'rows': 0,
+                         'steps_start': self.connection._vm_steps}
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._finish()
+        return self
+    
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if self._pending is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._pending['rows'] += 1
+        return row
+    
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if self._pending is not None:
+            self._pending['rows'] += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+    
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._pending is not None:
+            self._pending['rows'] += len(rows)
+            self._finish()
+        return rows
+    
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        finally:
+            if self._pending is not None:
+                self._pending['rows'] += 1
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors report to the query stats collector"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._vm_steps = 0
+        self._cursors = weakref.WeakSet()
+        self.set_progress_handler(self._count_steps, PROGRESS_STEP)
+    
+    def _count_steps(self) -> int:
+        self._vm_steps += PROGRESS_STEP
+        return 0
+    
+    def _explain(self, sql: str, parameters) -> Optional[List[str]]:
+        """Capture EXPLAIN QUERY PLAN details for a statement"""
+        if parameters is None or not sql.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            return None
+        try:
+            plan_cursor = sqlite3.Connection.cursor(self)
+            plan_cursor.row_factory = None
+            plan_cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            plan = [row[-1] for row in plan_cursor.fetchall()]
+            plan_cursor.close()
+            return plan
+        except Exception as e:
+            logger.debug(f"EXPLAIN QUERY PLAN failed: {e}")
+            return None
+    
+    def cursor(self, factory=InstrumentedCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, InstrumentedCursor):
+            self._cursors.add(cursor)
+        return cursor
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def close(self):
+        # Record statements whose results were never fully fetched
+        for cursor in list(self._cursors):
+            cursor._finish()
+        super().close()
+
+
+def get_db_connection(db_path: str = 'soc_database.db', **kwargs) -> sqlite3.Connection:
+    """
+    Open an instrumented SQLite connection
+    
+    Drop-in replacement for sqlite3.connect(); statements run through the
+    returned connection are recorded in the global query_stats collector.
+    """
+    kwargs.setdefault('factory', InstrumentedConnection)
+    return sqlite3.connect(db_path, **kwargs)
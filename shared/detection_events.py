@@ -0,0 +1,91 @@
+"""
+Detection Events
+In-process publish/subscribe feed of newly stored detections
+
+Detection writers publish after their insert commits; consumers such as the
+attack orchestrator subscribe (optionally filtered by agent) instead of
+polling the detection tables. Publishing never blocks: each subscription has
+a bounded queue that drops its oldest events when the consumer falls behind.
+Fan-out itself is the shared event bus (shared.event_bus).
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from shared.event_bus import EventBus, Subscription
+
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionSubscription(Subscription):
+    """One consumer's bounded queue of detection events"""
+    
+    def __init__(self, bus: 'DetectionEventBus', agent_ids: Optional[Iterable[str]] = None,
+                 max_queue: int = 1000):
+        super().__init__(bus)
+        self.agent_ids: Optional[Set[str]] = set(agent_ids) if agent_ids is not None else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+    
+    def matches(self, event: Dict[str, Any]) -> bool:
+        return self.agent_ids is None or event.get('agent_id') in self.agent_ids
+    
+    def _offer(self, event: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+    
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next detection event, or None on timeout or once closed"""
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return event
+    
+    def _wake(self) -> None:
+        # Wake a consumer blocked in get()
+        if not self.queue.full():
+            self.queue.put_nowait(None)
+
+
+class DetectionEventBus(EventBus):
+    """Fans detection events out to subscribers, from any thread"""
+    
+    def __init__(self):
+        super().__init__('Detection')
+        self.subscriptions: List[DetectionSubscription] = []
+    
+    def subscribe(self, agent_ids: Optional[Iterable[str]] = None, max_queue: int = 1000) -> DetectionSubscription:
+        """Subscribe to detections, optionally only for the given agents (call from the event loop)"""
+        return self._add(DetectionSubscription(self, agent_ids, max_queue))
+    
+    def publish(self, detection_id: str, agent_id: Optional[str], threat_type: Optional[str] = None,
+                severity: Optional[str] = None, techniques: Optional[List[str]] = None,
+                detected_at: Optional[str] = None, **details: Any) -> None:
+        """Publish a stored detection; safe to call from worker threads"""
+        if not self.subscriptions:
+            return
+        
+        event = {
+            'detection_id': detection_id,
+            'agent_id': agent_id,
+            'threat_type': threat_type or 'unknown',
+            'severity': severity,
+            'techniques': list(techniques or []),
+            'detected_at': detected_at or datetime.utcnow().isoformat(),
+            **details
+        }
+        self._fan_out(event)
+
+
+# Global detection event bus shared by detection writers and attack orchestration
+detection_events = DetectionEventBus()
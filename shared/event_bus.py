@@ -0,0 +1,96 @@
+"""
+Event Bus
+Generic in-process publish/subscribe fan-out behind the event feeds
+
+Publishing never blocks and is safe from worker threads: each subscription
+is bound to the event loop it was created on, and events published from
+another thread are handed over to that loop. How a subscription buffers
+what it is offered (a bounded queue, a coalesced pending set, a counter)
+is up to the subclass.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One subscriber of an EventBus; subclasses decide how events are buffered"""
+    
+    def __init__(self, bus: 'EventBus'):
+        self.bus = bus
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Created outside the event loop: events are offered inline
+            self.loop = None
+        self.closed = False
+    
+    def matches(self, event: Any) -> bool:
+        """Whether the subscriber wants an event"""
+        return True
+    
+    def _offer(self, event: Any) -> None:
+        """Buffer an event (runs on the subscriber's loop and must not block)"""
+        raise NotImplementedError
+    
+    def _wake(self) -> None:
+        """Wake a consumer blocked waiting for events"""
+    
+    def close(self) -> None:
+        """Stop receiving events"""
+        if not self.closed:
+            self.closed = True
+            self._wake()
+            self.bus._remove(self)
+
+
+class EventBus:
+    """Fans events out to subscriptions without waiting on them, from any thread"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.subscriptions: List[Subscription] = []
+        self.stats = {'published': 0, 'delivered': 0, 'subscribers_added': 0, 'subscribers_removed': 0}
+    
+    def _add(self, subscription: Subscription) -> Subscription:
+        self.subscriptions.append(subscription)
+        self.stats['subscribers_added'] += 1
+        return subscription
+    
+    def _remove(self, subscription: Subscription) -> None:
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+            self.stats['subscribers_removed'] += 1
+    
+    def _fan_out(self, event: Any) -> None:
+        """Offer an event to every matching subscription"""
+        self.stats['published'] += 1
+        if not self.subscriptions:
+            return
+        
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        
+        for subscription in list(self.subscriptions):
+            if not subscription.matches(event):
+                continue
+            try:
+                if subscription.loop is None or subscription.loop is running_loop:
+                    subscription._offer(event)
+                else:
+                    subscription.loop.call_soon_threadsafe(subscription._offer, event)
+                self.stats['delivered'] += 1
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self._remove(subscription)
+            except Exception as e:
+                logger.error(f"{self.name} event delivery failed: {e}")
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {**self.stats, 'subscribers': len(self.subscriptions)}
@@ -0,0 +1,282 @@
+"""
+Execution State Store
+Durable, bounded-memory state for long-running attack executions
+
+Each record is written through to SQLite as zlib-compressed JSON next to a
+small uncompressed summary, so listings never decode full result payloads.
+Only a bounded LRU of recently used records stays in memory; records that
+are still running are pinned there so the task driving them and the API
+reading them share one object. Finished records expire after a TTL, and
+unfinished records found at startup can be recovered after a restart.
+"""
+
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .database import get_db_connection
+from .migrations import ensure_schema
+
+
+logger = logging.getLogger(__name__)
+
+
+# Statuses after which a record no longer changes and may expire
+TERMINAL_STATUSES = frozenset({'completed', 'failed', 'stopped', 'rejected', 'interrupted', 'cancelled'})
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class ExecutionStateStore:
+    """Namespaced execution records: SQLite on disk, an LRU of hot records in memory"""
+    
+    def __init__(self, namespace: str, db_path: str = 'soc_database.db',
+                 encode: Callable[[Any], Dict] = _identity, decode: Callable[[Dict], Any] = _identity,
+                 max_hot: int = 128, completed_ttl_seconds: float = 7 * 24 * 3600,
+                 terminal_statuses: Iterable[str] = TERMINAL_STATUSES, eviction_interval: int = 100,
+                 pin_unfinished: bool = True):
+        self.namespace = namespace
+        self.db_path = db_path
+        self.encode = encode
+        self.decode = decode
+        self.max_hot = max_hot
+        self.completed_ttl_seconds = completed_ttl_seconds
+        self.terminal_statuses = frozenset(terminal_statuses)
+        self.eviction_interval = eviction_interval
+        # Pin unfinished records when a running task keeps mutating the cached object
+        self.pin_unfinished = pin_unfinished
+        
+        self._hot: 'OrderedDict[str, Any]' = OrderedDict()
+        self._hot_status: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._schema_ready = False
+        self._saves_since_eviction = 0
+        
+        self.stats = {
+            'saves': 0,
+            'hot_hits': 0,
+            'disk_loads': 0,
+            'misses': 0,
+            'hot_evictions': 0,
+            'expired': 0,
+            'bytes_written': 0
+        }
+    
+    def _connect(self):
+        if not self._schema_ready:
+            ensure_schema(self.db_path)
+            self._schema_ready = True
+        return get_db_connection(self.db_path)
+    
+    def is_terminal(self, status: Optional[str]) -> bool:
+        return status in self.terminal_statuses
+    
+    def _remember(self, key: str, value: Any, status: str) -> None:
+        self._hot[key] = value
+        self._hot_status[key] = status
+        self._hot.move_to_end(key)
+        
+        if len(self._hot) <= self.max_hot:
+            return
+        # Evict the least recently used records; running ones stay pinned
+        for candidate in list(self._hot):
+            if len(self._hot) <= self.max_hot:
+                break
+            if candidate != key and (not self.pin_unfinished or self.is_terminal(self._hot_status.get(candidate))):
+                del self._hot[candidate]
+                del self._hot_status[candidate]
+                self.stats['hot_evictions'] += 1
+    
+    def save(self, key: str, value: Any, status: str, summary: Optional[Dict[str, Any]] = None) -> None:
+        """Write a record through to disk and keep it hot"""
+        payload = zlib.compress(json.dumps(self.encode(value), default=str).encode())
+        now = time.time()
+        completed_at = now if self.is_terminal(status) else None
+        
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    INSERT INTO execution_state
+                    (namespace, execution_key, status, summary, payload, updated_at, completed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(namespace, execution_key) DO UPDATE SET
+                        status = excluded.status,
+                        summary = excluded.summary,
+                        payload = excluded.payload,
+                        updated_at = excluded.updated_at,
+                        completed_at = CASE WHEN excluded.completed_at IS NULL THEN NULL
+                                            ELSE COALESCE(execution_state.completed_at, excluded.completed_at) END
+                ''', (self.namespace, key, status, json.dumps(summary or {}, default=str), payload, now, completed_at))
+                conn.commit()
+            finally:
+                conn.close()
+            
+            self._remember(key, value, status)
+            self.stats['saves'] += 1
+            self.stats['bytes_written'] += len(payload)
+            
+            self._saves_since_eviction += 1
+            if self._saves_since_eviction >= self.eviction_interval:
+                self.evict_expired()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """A record from the hot set, loading it from disk if needed"""
+        with self._lock:
+            value = self._hot.get(key)
+            if value is not None:
+                self._hot.move_to_end(key)
+                self.stats['hot_hits'] += 1
+                return value
+            
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    'SELECT status, payload FROM execution_state WHERE namespace = ? AND execution_key = ?',
+                    (self.namespace, key)
+                ).fetchone()
+            finally:
+                conn.close()
+            
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            
+            value = self.decode(json.loads(zlib.decompress(row[1])))
+            self._remember(key, value, row[0])
+            self.stats['disk_loads'] += 1
+            return value
+    
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+    
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            self._hot.pop(key, None)
+            self._hot_status.pop(key, None)
+            conn = self._connect()
+            try:
+                cursor = conn.execute(
+                    'DELETE FROM execution_state WHERE namespace = ? AND execution_key = ?',
+                    (self.namespace, key)
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+            finally:
+                conn.close()
+    
+    def summaries(self, statuses: Optional[Iterable[str]] = None,
+                  limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Key, status and summary of records, newest first, without decoding payloads"""
+        query = 'SELECT execution_key, status, summary, updated_at FROM execution_state WHERE namespace = ?'
+        params: List[Any] = [self.namespace]
+        if statuses is not None:
+            statuses = list(statuses)
+            if not statuses:
+                return []
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        query += ' ORDER BY updated_at DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(query, params).fetchall()
+            finally:
+                conn.close()
+        
+        return [
+            {'key': key, 'status': status, 'summary': json.loads(summary or '{}'), 'updated_at': updated_at}
+            for key, status, summary, updated_at in rows
+        ]
+    
+    def unfinished(self) -> List[str]:
+        """Keys of records that never reached a terminal status (e.g. cut off by a restart)"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    'SELECT execution_key FROM execution_state WHERE namespace = ? AND completed_at IS NULL',
+                    (self.namespace,)
+                ).fetchall()
+            finally:
+                conn.close()
+        return [row[0] for row in rows]
+    
+    def evict_expired(self) -> int:
+        """Delete finished records older than the TTL"""
+        with self._lock:
+            self._saves_since_eviction = 0
+            cutoff = time.time() - self.completed_ttl_seconds
+            conn = self._connect()
+            try:
+                expired = [row[0] for row in conn.execute(
+                    'SELECT execution_key FROM execution_state WHERE namespace = ? AND completed_at < ?',
+                    (self.namespace, cutoff)
+                ).fetchall()]
+                if expired:
+                    conn.execute(
+                        'DELETE FROM execution_state WHERE namespace = ? AND completed_at < ?',
+                        (self.namespace, cutoff)
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+            
+            for key in expired:
+                self._hot.pop(key, None)
+                self._hot_status.pop(key, None)
+            
+            self.stats['expired'] += len(expired)
+            if expired:
+                logger.info(f"Expired {len(expired)} finished {self.namespace} executions")
+            return len(expired)
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        with self._lock:
+            pinned = sum(1 for status in self._hot_status.values()
+                         if self.pin_unfinished and not self.is_terminal(status))
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    'SELECT status, COUNT(*), SUM(LENGTH(payload)) FROM execution_state WHERE namespace = ? '
+                    'GROUP BY status',
+                    (self.namespace,)
+                ).fetchall()
+            finally:
+                conn.close()
+        
+        return {
+            **self.stats,
+            'namespace': self.namespace,
+            'hot': len(self._hot),
+            'pinned': pinned,
+            'max_hot': self.max_hot,
+            'completed_ttl_seconds': self.completed_ttl_seconds,
+            'stored': {status: count for status, count, _ in rows},
+            'stored_bytes': sum(size or 0 for _, _, size in rows)
+        }
+
+
+# Stores shared per namespace within the process
+_stores: Dict[str, ExecutionStateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_execution_state_store(namespace: str, **options: Any) -> ExecutionStateStore:
+    """Get the process-wide store for a namespace (options apply on first use)"""
+    with _stores_lock:
+        store = _stores.get(namespace)
+        if store is None:
+            store = ExecutionStateStore(namespace, **options)
+            _stores[namespace] = store
+        return store
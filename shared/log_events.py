@@ -0,0 +1,95 @@
+"""
+Log Events
+In-process notification feed for newly ingested logs
+
+The ingestion pipeline publishes after each committed batch; the detection
+workflow waits on a subscription instead of polling, gathers notifications
+for a short window into a micro-batch, and then reads everything past its
+persisted cursor. Notifications only say how many logs arrived - the rows
+themselves are always read by cursor, so a dropped or coalesced notification
+can never lose or duplicate a log. Fan-out itself is the shared event bus
+(shared.event_bus).
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+from shared.event_bus import EventBus, Subscription
+
+
+logger = logging.getLogger(__name__)
+
+
+class LogSubscription(Subscription):
+    """One consumer's count of logs ingested since it last drained"""
+    
+    def __init__(self, bus: 'LogEventBus'):
+        super().__init__(bus)
+        self.pending = 0
+        self._arrived = asyncio.Event()
+    
+    def _offer(self, count: int) -> None:
+        if self.closed:
+            return
+        self.pending += count
+        self._arrived.set()
+    
+    async def wait_batch(self, max_items: int = 100, max_wait: float = 0.25,
+                         timeout: Optional[float] = None) -> int:
+        """
+        Wait for a micro-batch of ingested logs
+        
+        Blocks until logs arrive (or `timeout` passes), then keeps collecting for
+        up to `max_wait` seconds or until `max_items` logs are pending.
+        
+        Returns:
+            Number of logs signalled (0 on timeout or once closed)
+        """
+        try:
+            await asyncio.wait_for(self._arrived.wait(), timeout)
+        except asyncio.TimeoutError:
+            return 0
+        
+        deadline = self.loop.time() + max_wait
+        while not self.closed and self.pending < max_items:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                break
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        
+        count, self.pending = self.pending, 0
+        self._arrived.clear()
+        return count
+    
+    def _wake(self) -> None:
+        # Wake a consumer blocked in wait_batch()
+        self._arrived.set()
+
+
+class LogEventBus(EventBus):
+    """Fans ingestion notifications out to subscribers, from any thread"""
+    
+    def __init__(self):
+        super().__init__('Log')
+        self.subscriptions: List[LogSubscription] = []
+        self.stats['published_logs'] = 0
+    
+    def subscribe(self) -> LogSubscription:
+        """Subscribe to ingestion notifications (call from the event loop)"""
+        return self._add(LogSubscription(self))
+    
+    def publish(self, count: int) -> None:
+        """Announce `count` newly committed logs; safe to call from worker threads"""
+        if count <= 0:
+            return
+        self.stats['published_logs'] += count
+        self._fan_out(count)
+
+
+# Global log event bus shared by the ingestion pipeline and detection workflows
+log_events = LogEventBus()
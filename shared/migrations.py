@@ -0,0 +1,547 @@
+"""
+Versioned SQLite schema migrations
+Applied once per process at startup; components call ensure_schema() instead of running their own DDL
+"""
+
+import os
+import logging
+import threading
+from typing import Callable, Dict, List, Set, Tuple
+from datetime import datetime
+
+from .database import get_db_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+def _table_columns(cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _add_missing_columns(cursor, table: str, columns: List[Tuple[str, str]]) -> None:
+    """Add columns an older database was created without"""
+    existing = set(_table_columns(cursor, table))
+    for column, declaration in columns:
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+            logger.info(f"Added column {table}.{column}")
+
+
+def _create_index(cursor, name: str, table: str, columns: List[str]) -> None:
+    """Create an index unless its columns are missing or an identical index already exists"""
+    table_columns = set(_table_columns(cursor, table))
+    if not set(columns) <= table_columns:
+        logger.warning(f"Skipping index {name}: {table} lacks {sorted(set(columns) - table_columns)}")
+        return
+    
+    cursor.execute(f"PRAGMA index_list({table})")
+    for index_row in cursor.fetchall():
+        index_name = index_row[1]
+        cursor.execute(f"PRAGMA index_info({index_name})")
+        if [row[2] for row in cursor.fetchall()] == columns:
+            return
+    
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+def _migration_001_baseline_tables(cursor) -> None:
+    """Tables previously created by DatabaseManager, CommandManager and the report modules"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agents (
+            id TEXT PRIMARY KEY,
+            hostname TEXT,
+            ip_address TEXT,
+            platform TEXT,
+            os_version TEXT,
+            agent_version TEXT,
+            status TEXT DEFAULT 'offline',
+            last_heartbeat TIMESTAMP,
+            last_log_sent TIMESTAMP,
+            capabilities TEXT,  -- JSON array
+            log_sources TEXT,   -- JSON array
+            configuration TEXT, -- JSON object
+            security_zone TEXT DEFAULT 'internal',
+            importance TEXT DEFAULT 'medium',
+            logs_sent_count INTEGER DEFAULT 0,
+            bytes_sent INTEGER DEFAULT 0,
+            errors_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            system_info TEXT,      -- Enhanced system information (JSON)
+            quick_summary TEXT     -- Quick system summary (JSON)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_entries (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT,
+            source TEXT,
+            timestamp TIMESTAMP,
+            collected_at TIMESTAMP,
+            processed_at TIMESTAMP,
+            message TEXT,
+            raw_data TEXT,
+            level TEXT,
+            parsed_data TEXT,    -- JSON object
+            enriched_data TEXT,  -- JSON object
+            event_id TEXT,
+            event_type TEXT,
+            process_info TEXT,   -- JSON object
+            network_info TEXT,   -- JSON object
+            attack_technique TEXT,
+            attack_command TEXT,
+            attack_result TEXT,
+            threat_score REAL DEFAULT 0.0,
+            threat_level TEXT DEFAULT 'benign',
+            tags TEXT,           -- JSON array
+            metadata TEXT,       -- JSON object
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (agent_id) REFERENCES agents (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS detection_results (
+            id TEXT PRIMARY KEY,
+            log_entry_id TEXT,
+            threat_detected BOOLEAN DEFAULT FALSE,
+            confidence_score REAL DEFAULT 0.0,
+            threat_type TEXT,
+            severity TEXT DEFAULT 'low',
+            ml_results TEXT,     -- JSON object
+            ai_analysis TEXT,    -- JSON object
+            rule_matches TEXT,   -- JSON array
+            mitre_techniques TEXT, -- JSON array
+            tactics TEXT,        -- JSON array
+            analyst_notes TEXT,
+            false_positive BOOLEAN DEFAULT FALSE,
+            verified BOOLEAN DEFAULT FALSE,
+            detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (log_entry_id) REFERENCES log_entries (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_batches (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT,
+            batch_size INTEGER,
+            compressed BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (agent_id) REFERENCES agents (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS gpt_interactions (
+            id TEXT PRIMARY KEY,
+            interaction_type TEXT NOT NULL,
+            model TEXT DEFAULT 'gpt-3.5-turbo',
+            prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            tokens_used INTEGER DEFAULT 0,
+            response_time_ms INTEGER,
+            success BOOLEAN DEFAULT TRUE,
+            error_message TEXT,
+            metadata TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_request TEXT,
+            result_summary TEXT
+        )
+    ''')
+    
+    # Union of the GPT-tracking and command-queue definitions of commands
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS commands (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            command TEXT,
+            command_type TEXT DEFAULT 'attack',
+            platform TEXT,
+            status TEXT DEFAULT 'queued',
+            gpt_interaction_id TEXT,
+            scenario_id TEXT,
+            result TEXT,
+            technique TEXT,
+            command_data TEXT,
+            parameters TEXT,
+            priority TEXT DEFAULT 'medium',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP,
+            executed_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            timeout_at TIMESTAMP,
+            retry_count INTEGER DEFAULT 0,
+            max_retries INTEGER DEFAULT 3,
+            created_by TEXT DEFAULT 'phantomstrike_ai',
+            FOREIGN KEY (agent_id) REFERENCES agents (id),
+            FOREIGN KEY (gpt_interaction_id) REFERENCES gpt_interactions (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS command_results (
+            id TEXT PRIMARY KEY,
+            command_id TEXT NOT NULL,
+            agent_id TEXT NOT NULL,
+            success BOOLEAN DEFAULT FALSE,
+            output TEXT,
+            error_message TEXT,
+            execution_time_ms INTEGER,
+            result_data TEXT,
+            received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (command_id) REFERENCES commands (id),
+            FOREIGN KEY (agent_id) REFERENCES agents (id)
+        )
+    ''')
+    
+    # Ground truth tracking (AIDetectionMonitor / EnhancedMissedDetection)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS red_team_attacks (
+            id TEXT PRIMARY KEY,
+            scenario_id TEXT,
+            attack_type TEXT,
+            target_agent_id TEXT,
+            attack_timestamp TEXT,
+            expected_detection BOOLEAN DEFAULT 1,
+            was_detected BOOLEAN DEFAULT 0,
+            detection_id TEXT,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analyst_reviews (
+            id TEXT PRIMARY KEY,
+            log_entry_id TEXT,
+            detection_result_id TEXT,
+            analyst_verdict TEXT,  -- 'threat', 'benign', 'unclear'
+            confidence INTEGER,     -- 1-5
+            threat_type TEXT,
+            notes TEXT,
+            reviewed_by TEXT,
+            reviewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attack_indicators (
+            id TEXT PRIMARY KEY,
+            indicator_type TEXT,    -- 'ip', 'hash', 'domain', 'pattern'
+            indicator_value TEXT,
+            threat_type TEXT,
+            severity TEXT,
+            source TEXT,           -- 'threat_intel', 'manual', 'ml'
+            first_seen TEXT,
+            last_seen TEXT,
+            active BOOLEAN DEFAULT 1
+        )
+    ''')
+    
+    # Compliance history tracking (AIComplianceDashboardDynamic)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS compliance_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            framework_id TEXT,
+            score REAL,
+            recorded_at TEXT,
+            metadata TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS framework_controls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            framework_id TEXT,
+            control_id TEXT,
+            control_name TEXT,
+            implemented BOOLEAN DEFAULT 0,
+            last_checked TEXT,
+            UNIQUE(framework_id, control_id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_type TEXT NOT NULL,
+            report_data TEXT NOT NULL,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT,
+            UNIQUE(report_type)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS golden_images (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            image_type TEXT DEFAULT 'snapshot',
+            created_at TIMESTAMP,
+            created_by TEXT,
+            checksum TEXT,
+            size_bytes INTEGER,
+            metadata TEXT,
+            status TEXT DEFAULT 'ready',
+            restore_count INTEGER DEFAULT 0,
+            last_restored TIMESTAMP,
+            notes TEXT
+        )
+    ''')
+    
+    # Indexes the individual components used to create
+    for name, table, columns in [
+        ('idx_log_entries_agent_id', 'log_entries', ['agent_id']),
+        ('idx_log_entries_timestamp', 'log_entries', ['timestamp']),
+        ('idx_log_entries_level', 'log_entries', ['level']),
+        ('idx_log_entries_source', 'log_entries', ['source']),
+        ('idx_log_entries_threat_score', 'log_entries', ['threat_score']),
+        ('idx_detection_results_threat_detected', 'detection_results', ['threat_detected']),
+        ('idx_detection_results_severity', 'detection_results', ['severity']),
+        ('idx_gpt_interactions_type', 'gpt_interactions', ['interaction_type']),
+        ('idx_gpt_interactions_created_at', 'gpt_interactions', ['created_at']),
+        ('idx_gpt_interactions_success', 'gpt_interactions', ['success']),
+        ('idx_commands_agent_id', 'commands', ['agent_id']),
+        ('idx_commands_status', 'commands', ['status']),
+        ('idx_commands_gpt_interaction_id', 'commands', ['gpt_interaction_id']),
+        ('idx_command_results_command_id', 'command_results', ['command_id']),
+        ('idx_report_cache_type', 'report_cache', ['report_type'])
+    ]:
+        _create_index(cursor, name, table, columns)
+
+
+def _migration_002_reconcile_columns(cursor) -> None:
+    """Bring tables created by older code paths up to the current column set"""
+    _add_missing_columns(cursor, 'agents', [
+        ('platform', 'TEXT'),
+        ('last_log_sent', 'TIMESTAMP'),
+        ('capabilities', 'TEXT'),
+        ('log_sources', 'TEXT'),
+        ('configuration', 'TEXT'),
+        ('security_zone', "TEXT DEFAULT 'internal'"),
+        ('importance', "TEXT DEFAULT 'medium'"),
+        ('logs_sent_count', 'INTEGER DEFAULT 0'),
+        ('bytes_sent', 'INTEGER DEFAULT 0'),
+        ('errors_count', 'INTEGER DEFAULT 0'),
+        ('system_info', 'TEXT'),
+        ('quick_summary', 'TEXT')
+    ])
+    
+    _add_missing_columns(cursor, 'log_entries', [
+        ('tags', 'TEXT'),
+        ('metadata', 'TEXT')
+    ])
+    
+    _add_missing_columns(cursor, 'detection_results', [
+        ('log_entry_id', 'TEXT'),
+        ('confidence_score', 'REAL DEFAULT 0.0'),
+        ('ml_results', 'TEXT'),
+        ('ai_analysis', 'TEXT'),
+        ('rule_matches', 'TEXT'),
+        ('mitre_techniques', 'TEXT'),
+        ('tactics', 'TEXT'),
+        ('analyst_notes', 'TEXT'),
+        ('false_positive', 'BOOLEAN DEFAULT FALSE'),
+        ('verified', 'BOOLEAN DEFAULT FALSE')
+    ])
+    
+    _add_missing_columns(cursor, 'commands', [
+        ('command', 'TEXT'),
+        ('command_type', 'TEXT'),
+        ('platform', 'TEXT'),
+        ('gpt_interaction_id', 'TEXT'),
+        ('scenario_id', 'TEXT'),
+        ('result', 'TEXT'),
+        ('technique', 'TEXT'),
+        ('command_data', 'TEXT'),
+        ('parameters', 'TEXT'),
+        ('priority', "TEXT DEFAULT 'medium'"),
+        ('sent_at', 'TIMESTAMP'),
+        ('executed_at', 'TIMESTAMP'),
+        ('completed_at', 'TIMESTAMP'),
+        ('timeout_at', 'TIMESTAMP'),
+        ('retry_count', 'INTEGER DEFAULT 0'),
+        ('max_retries', 'INTEGER DEFAULT 3'),
+        ('created_by', "TEXT DEFAULT 'phantomstrike_ai'")
+    ])
+
+
+def _migration_003_query_indexes(cursor) -> None:
+    """Composite indexes for the report, monitor and command delivery filters"""
+    for name, table, columns in [
+        # Time-window counts in the monitors and report modules
+        ('idx_detection_results_detected_at', 'detection_results', ['detected_at']),
+        ('idx_detection_results_threat_time', 'detection_results', ['threat_detected', 'detected_at']),
+        # LEFT JOIN detection_results ON log_entry_id in the missed-threat queries
+        ('idx_detection_results_log_entry_id', 'detection_results', ['log_entry_id']),
+        ('idx_log_entries_agent_timestamp', 'log_entries', ['agent_id', 'timestamp']),
+        # Command delivery and recent-command listings
+        ('idx_commands_created_at', 'commands', ['created_at']),
+        ('idx_commands_agent_status_created', 'commands', ['agent_id', 'status', 'created_at']),
+        # Active agent listings ordered by heartbeat
+        ('idx_agents_status_heartbeat', 'agents', ['status', 'last_heartbeat']),
+        # Ground truth lookups
+        ('idx_red_team_attacks_timestamp', 'red_team_attacks', ['attack_timestamp']),
+        ('idx_analyst_reviews_reviewed_at', 'analyst_reviews', ['reviewed_at']),
+        ('idx_analyst_reviews_log_entry_id', 'analyst_reviews', ['log_entry_id'])
+    ]:
+        _create_index(cursor, name, table, columns)
+
+
+def _migration_004_topology_state(cursor) -> None:
+    """Persistent state for the incremental topology engine"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS topology_nodes (
+            agent_id TEXT PRIMARY KEY,
+            node_data TEXT NOT NULL,  -- NetworkNode.to_dict() JSON
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS topology_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+
+def _migration_005_command_scheduling(cursor) -> None:
+    """Index for the scheduler's queued/in-flight scans and timeout recovery"""
+    _create_index(cursor, 'idx_commands_status_timeout', 'commands', ['status', 'timeout_at'])
+
+
+def _migration_006_execution_state(cursor) -> None:
+    """Durable attack execution records (shared.execution_state_store)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS execution_state (
+            namespace TEXT NOT NULL,
+            execution_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            summary TEXT,  -- small JSON used for listings
+            payload BLOB NOT NULL,  -- zlib-compressed JSON of the full record
+            updated_at REAL NOT NULL,
+            completed_at REAL,  -- set once the record reaches a terminal status
+            PRIMARY KEY (namespace, execution_key)
+        )
+    ''')
+
+    _create_index(cursor, 'idx_execution_state_completed', 'execution_state', ['namespace', 'completed_at'])
+    _create_index(cursor, 'idx_execution_state_updated', 'execution_state', ['namespace', 'updated_at'])
+
+
+def _migration_007_stream_cursors(cursor) -> None:
+    """High-water marks of incremental table consumers (e.g. the detection workflow over log_entries)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stream_cursors (
+            consumer TEXT PRIMARY KEY,
+            position INTEGER NOT NULL DEFAULT 0,  -- last processed rowid
+            updated_at TEXT
+        )
+    ''')
+
+
+# Ordered schema history; append new migrations, never edit applied ones
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, 'baseline_tables', _migration_001_baseline_tables),
+    (2, 'reconcile_columns', _migration_002_reconcile_columns),
+    (3, 'query_indexes', _migration_003_query_indexes),
+    (4, 'topology_state', _migration_004_topology_state),
+    (5, 'command_scheduling', _migration_005_command_scheduling),
+    (6, 'execution_state', _migration_006_execution_state),
+    (7, 'stream_cursors', _migration_007_stream_cursors)
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(db_path: str = 'soc_database.db') -> int:
+    """
+    Apply pending migrations, each in its own transaction
+    
+    Returns:
+        Schema version after migrating
+    """
+    conn = get_db_connection(db_path, isolation_level=None)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        ''')
+        
+        applied = 0
+        for version, name, migration in MIGRATIONS:
+            # IMMEDIATE takes the write lock so concurrent processes apply each version once
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+                if cursor.fetchone():
+                    cursor.execute('COMMIT')
+                    continue
+                
+                migration(cursor)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)',
+                    (version, name, datetime.utcnow().isoformat())
+                )
+                cursor.execute('COMMIT')
+                applied += 1
+                logger.info(f"Applied schema migration {version:03d}_{name}")
+            
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+        
+        if applied:
+            cursor.execute('PRAGMA optimize')
+        
+        cursor.execute('SELECT MAX(version) FROM schema_migrations')
+        return cursor.fetchone()[0] or 0
+    
+    finally:
+        conn.close()
+
+
+# Databases already migrated by this process
+_migrated_paths: Set[str] = set()
+_migration_lock = threading.Lock()
+
+
+def ensure_schema(db_path: str = 'soc_database.db') -> None:
+    """Run migrations for a database the first time it is used in this process"""
+    key = os.path.abspath(db_path)
+    if key in _migrated_paths:
+        return
+    
+    with _migration_lock:
+        if key in _migrated_paths:
+            return
+        
+        version = run_migrations(db_path)
+        _migrated_paths.add(key)
+        logger.info(f"Database schema at version {version} ({db_path})")
+
+
+def get_schema_version(db_path: str = 'soc_database.db') -> Dict[str, int]:
+    """Applied and expected schema versions for a database"""
+    conn = get_db_connection(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'")
+        if not cursor.fetchone():
+            return {'applied': 0, 'expected': SCHEMA_VERSION}
+        
+        cursor.execute('SELECT MAX(version) FROM schema_migrations')
+        return {'applied': cursor.fetchone()[0] or 0, 'expected': SCHEMA_VERSION}
+    finally:
+        conn.close()
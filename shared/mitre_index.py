@@ -0,0 +1,413 @@
+"""
+MITRE ATT&CK Index
+One shared, read-only index of ATT&CK techniques for reports, scenario validation and detection enrichment
+
+Built once per process from ml_models/cybersecurity_knowledge_base.json
+(names, descriptions, platforms) merged with the enterprise tactic mapping
+below, which the knowledge base does not carry. Sub-techniques link to their
+parent and inherit its tactics. Lookups by id, name and tactic are dict
+lookups; a prefix trie over ids and name words serves fuzzy search.
+"""
+
+import ast
+import json
+import logging
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+KNOWLEDGE_BASE_PATH = Path(__file__).resolve().parent.parent / 'ml_models' / 'cybersecurity_knowledge_base.json'
+
+TECHNIQUE_ID_PATTERN = re.compile(r'^T\d{4}(?:\.\d{3})?$')
+
+# Enterprise techniques and their tactics: id -> (name, tactics[, description])
+CORE_TECHNIQUES = {
+    "T1001": ("Data Obfuscation", ("Command and Control",)),
+    "T1003": ("OS Credential Dumping", ("Credential Access",)),
+    "T1005": ("Data from Local System", ("Collection",)),
+    "T1010": ("Application Window Discovery", ("Discovery",)),
+    "T1012": ("Query Registry", ("Discovery",)),
+    "T1016": ("System Network Configuration Discovery", ("Discovery",)),
+    "T1018": ("Remote System Discovery", ("Discovery",)),
+    "T1020": ("Automated Exfiltration", ("Exfiltration",)),
+    "T1021": ("Remote Services", ("Lateral Movement",)),
+    "T1027": ("Obfuscated Files or Information", ("Defense Evasion",), "Obfuscation of files or information"),
+    "T1030": ("Data Transfer Size Limits", ("Exfiltration",)),
+    "T1033": ("System Owner/User Discovery", ("Discovery",)),
+    "T1036": ("Masquerading", ("Defense Evasion",)),
+    "T1037": ("Boot or Logon Initialization Scripts", ("Persistence", "Privilege Escalation")),
+    "T1041": ("Exfiltration Over C2 Channel", ("Exfiltration",), "Data exfiltration over command and control channels"),
+    "T1046": ("Network Service Discovery", ("Discovery",)),
+    "T1047": ("Windows Management Instrumentation", ("Execution",)),
+    "T1048": ("Exfiltration Over Alternative Protocol", ("Exfiltration",)),
+    "T1049": ("System Network Connections Discovery", ("Discovery",)),
+    "T1053": ("Scheduled Task/Job", ("Execution", "Persistence", "Privilege Escalation"),
+              "Use of scheduled tasks for persistence and execution"),
+    "T1055": ("Process Injection", ("Defense Evasion", "Privilege Escalation"),
+              "Injection of malicious code into running processes"),
+    "T1056": ("Input Capture", ("Collection", "Credential Access")),
+    "T1057": ("Process Discovery", ("Discovery",)),
+    "T1059": ("Command and Scripting Interpreter", ("Execution",), "Use of command line interfaces for execution"),
+    "T1068": ("Exploitation for Privilege Escalation", ("Privilege Escalation",)),
+    "T1069": ("Permission Groups Discovery", ("Discovery",)),
+    "T1070": ("Indicator Removal", ("Defense Evasion",), "Removal of forensic artifacts"),
+    "T1071": ("Application Layer Protocol", ("Command and Control",),
+              "Communication using application layer protocols"),
+    "T1074": ("Data Staged", ("Collection",)),
+    "T1078": ("Valid Accounts", ("Defense Evasion", "Persistence", "Privilege Escalation", "Initial Access")),
+    "T1082": ("System Information Discovery", ("Discovery",), "Gathering system information"),
+    "T1083": ("File and Directory Discovery", ("Discovery",), "Enumeration of files and directories"),
+    "T1087": ("Account Discovery", ("Discovery",)),
+    "T1090": ("Proxy", ("Command and Control",), "Use of proxy servers for communication"),
+    "T1095": ("Non-Application Layer Protocol", ("Command and Control",)),
+    "T1098": ("Account Manipulation", ("Persistence", "Privilege Escalation")),
+    "T1105": ("Ingress Tool Transfer", ("Command and Control",), "Transfer of tools from external systems"),
+    "T1110": ("Brute Force", ("Credential Access",)),
+    "T1112": ("Modify Registry", ("Defense Evasion",), "Modification of Windows registry"),
+    "T1113": ("Screen Capture", ("Collection",)),
+    "T1119": ("Automated Collection", ("Collection",)),
+    "T1123": ("Audio Capture", ("Collection",)),
+    "T1124": ("System Time Discovery", ("Discovery",), "Gathering system time information"),
+    "T1133": ("External Remote Services", ("Persistence", "Initial Access")),
+    "T1134": ("Access Token Manipulation", ("Defense Evasion", "Privilege Escalation")),
+    "T1135": ("Network Share Discovery", ("Discovery",), "Discovery of network shares"),
+    "T1136": ("Create Account", ("Persistence",)),
+    "T1137": ("Office Application Startup", ("Persistence",)),
+    "T1140": ("Deobfuscate/Decode Files or Information", ("Defense Evasion",),
+              "Deobfuscation of files or information"),
+    "T1189": ("Drive-by Compromise", ("Initial Access",)),
+    "T1190": ("Exploit Public-Facing Application", ("Initial Access",)),
+    "T1195": ("Supply Chain Compromise", ("Initial Access",)),
+    "T1197": ("BITS Jobs", ("Defense Evasion", "Persistence")),
+    "T1199": ("Trusted Relationship", ("Initial Access",)),
+    "T1203": ("Exploitation for Client Execution", ("Execution",)),
+    "T1204": ("User Execution", ("Execution",), "Execution of malicious code by user interaction"),
+    "T1210": ("Exploitation of Remote Services", ("Lateral Movement",)),
+    "T1218": ("System Binary Proxy Execution", ("Defense Evasion",), "Use of signed binaries for malicious purposes"),
+    "T1219": ("Remote Access Software", ("Command and Control",)),
+    "T1484": ("Domain or Tenant Policy Modification", ("Defense Evasion", "Privilege Escalation")),
+    "T1485": ("Data Destruction", ("Impact",)),
+    "T1486": ("Data Encrypted for Impact", ("Impact",), "Encryption of data for ransom or destruction"),
+    "T1489": ("Service Stop", ("Impact",)),
+    "T1490": ("Inhibit System Recovery", ("Impact",)),
+    "T1496": ("Resource Hijacking", ("Impact",)),
+    "T1499": ("Endpoint Denial of Service", ("Impact",)),
+    "T1505": ("Server Software Component", ("Persistence",)),
+    "T1518": ("Software Discovery", ("Discovery",)),
+    "T1531": ("Account Access Removal", ("Impact",)),
+    "T1543": ("Create or Modify System Process", ("Persistence", "Privilege Escalation")),
+    "T1546": ("Event Triggered Execution", ("Persistence", "Privilege Escalation")),
+    "T1547": ("Boot or Logon Autostart Execution", ("Persistence", "Privilege Escalation")),
+    "T1548": ("Abuse Elevation Control Mechanism", ("Privilege Escalation", "Defense Evasion")),
+    "T1550": ("Use Alternate Authentication Material", ("Defense Evasion", "Lateral Movement")),
+    "T1552": ("Unsecured Credentials", ("Credential Access",)),
+    "T1555": ("Credentials from Password Stores", ("Credential Access",)),
+    "T1557": ("Adversary-in-the-Middle", ("Credential Access", "Collection")),
+    "T1558": ("Steal or Forge Kerberos Tickets", ("Credential Access",)),
+    "T1560": ("Archive Collected Data", ("Collection",)),
+    "T1562": ("Impair Defenses", ("Defense Evasion",)),
+    "T1564": ("Hide Artifacts", ("Defense Evasion",)),
+    "T1566": ("Phishing", ("Initial Access",), "Social engineering attacks via email or messaging"),
+    "T1567": ("Exfiltration Over Web Service", ("Exfiltration",)),
+    "T1569": ("System Services", ("Execution",)),
+    "T1570": ("Lateral Tool Transfer", ("Lateral Movement",)),
+    "T1571": ("Non-Standard Port", ("Command and Control",)),
+    "T1572": ("Protocol Tunneling", ("Command and Control",)),
+    "T1573": ("Encrypted Channel", ("Command and Control",), "Use of encrypted communication channels"),
+    "T1574": ("Hijack Execution Flow", ("Persistence", "Privilege Escalation", "Defense Evasion")),
+    "T1583": ("Acquire Infrastructure", ("Resource Development",)),
+    "T1588": ("Obtain Capabilities", ("Resource Development",)),
+    "T1595": ("Active Scanning", ("Reconnaissance",)),
+    "T1609": ("Container Administration Command", ("Execution",)),
+    "T1610": ("Deploy Container", ("Defense Evasion", "Execution")),
+    "T1611": ("Escape to Host", ("Privilege Escalation",)),
+    "T1613": ("Container and Resource Discovery", ("Discovery",)),
+    "T1650": ("Acquire Access", ("Resource Development",)),
+    # Frequently reported sub-techniques (tactics come from the parent)
+    "T1003.001": ("LSASS Memory", ()),
+    "T1021.001": ("Remote Desktop Protocol", ()),
+    "T1021.002": ("SMB/Windows Admin Shares", ()),
+    "T1021.004": ("SSH", ()),
+    "T1053.003": ("Cron", ()),
+    "T1053.005": ("Scheduled Task", ()),
+    "T1055.001": ("Dynamic-link Library Injection", ()),
+    "T1059.001": ("PowerShell", ()),
+    "T1059.003": ("Windows Command Shell", ()),
+    "T1059.004": ("Unix Shell", ()),
+    "T1059.006": ("Python", ()),
+    "T1070.001": ("Clear Windows Event Logs", ()),
+    "T1071.001": ("Web Protocols", ()),
+    "T1071.004": ("DNS", ()),
+    "T1078.002": ("Domain Accounts", ()),
+    "T1078.003": ("Local Accounts", ()),
+    "T1110.001": ("Password Guessing", ()),
+    "T1110.003": ("Password Spraying", ()),
+    "T1218.011": ("Rundll32", ()),
+    "T1543.003": ("Windows Service", ()),
+    "T1547.001": ("Registry Run Keys / Startup Folder", ()),
+    "T1562.001": ("Disable or Modify Tools", ()),
+    "T1566.001": ("Spearphishing Attachment", ()),
+    "T1566.002": ("Spearphishing Link", ())
+}
+
+_CITATION = re.compile(r'\s*\(Citation:[^)]*\)')
+_MARKDOWN_LINK = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+_HTML_TAG = re.compile(r'<[^>]+>')
+_WORD = re.compile(r'[a-z0-9]+')
+
+# Marks the values stored at a trie node (never a single-character key)
+_TERMINAL = ''
+
+
+def _platforms(value: Any) -> List[str]:
+    """Platform list from the knowledge base, where it is usually stored as a stringified list"""
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            value = value.strip('[]').split(',')
+    if isinstance(value, str):
+        value = [value]
+    return [str(platform).strip(" '\"") for platform in value or () if str(platform).strip(" '\"")]
+
+
+def _summarize(description: str, max_length: int = 300) -> str:
+    """First sentence of a knowledge base description, without markup or citations"""
+    text = _HTML_TAG.sub('', _MARKDOWN_LINK.sub(r'\1', _CITATION.sub('', description or ''))).strip()
+    end = text.find('. ')
+    if end != -1:
+        text = text[:end + 1]
+    return text[:max_length]
+
+
+class Technique:
+    """One ATT&CK technique or sub-technique"""
+    
+    __slots__ = ('id', 'name', 'tactics', 'description', 'platforms', 'parent', 'subtechniques')
+    
+    def __init__(self, technique_id: str, name: str, tactics: Tuple[str, ...] = (), description: str = '',
+                 platforms: Tuple[str, ...] = (), parent: Optional[str] = None):
+        self.id = technique_id
+        self.name = name
+        self.tactics = tactics
+        self.description = description
+        self.platforms = platforms
+        self.parent = parent
+        self.subtechniques: Tuple[str, ...] = ()
+    
+    @property
+    def tactic(self) -> str:
+        """Primary tactic, for callers that report a single one"""
+        return self.tactics[0] if self.tactics else 'Unknown'
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'tactic': self.tactic,
+            'tactics': list(self.tactics),
+            'description': self.description,
+            'platforms': list(self.platforms),
+            'parent': self.parent,
+            'subtechniques': list(self.subtechniques)
+        }
+
+
+class _PrefixTrie:
+    """Maps string prefixes to the technique ids stored under matching keys"""
+    
+    __slots__ = ('root',)
+    
+    def __init__(self):
+        self.root: Dict[str, Any] = {}
+    
+    def insert(self, key: str, technique_id: str) -> None:
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        values = node.setdefault(_TERMINAL, [])
+        if technique_id not in values:
+            values.append(technique_id)
+    
+    def search(self, prefix: str, limit: int) -> List[str]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        
+        # Breadth first, so shorter completions (closer matches) come first
+        found: List[str] = []
+        level = [node]
+        while level and len(found) < limit:
+            next_level = []
+            for current in level:
+                for key, child in current.items():
+                    if key == _TERMINAL:
+                        found.extend(value for value in child if value not in found)
+                    else:
+                        next_level.append(child)
+            level = next_level
+        return found[:limit]
+
+
+class MitreIndex:
+    """Read-only ATT&CK lookups shared by the whole process"""
+    
+    def __init__(self, knowledge_base_path: Optional[Path] = None):
+        self.techniques: Dict[str, Technique] = {}
+        self.by_name: Dict[str, Tuple[str, ...]] = {}
+        self.by_tactic: Dict[str, Tuple[str, ...]] = {}
+        self._trie = _PrefixTrie()
+        self._build(knowledge_base_path or KNOWLEDGE_BASE_PATH)
+    
+    def _build(self, knowledge_base_path: Path) -> None:
+        interned: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        
+        def shared_tuple(values: Iterable[str]) -> Tuple[str, ...]:
+            # Techniques with the same tactics or platforms share one tuple
+            key = tuple(sys.intern(value) for value in values)
+            return interned.setdefault(key, key)
+        
+        for technique_id, entry in CORE_TECHNIQUES.items():
+            name, tactics = entry[0], entry[1]
+            description = entry[2] if len(entry) > 2 else ''
+            self.techniques[technique_id] = Technique(technique_id, name, shared_tuple(tactics), description)
+        
+        try:
+            with open(knowledge_base_path, 'r', encoding='utf-8') as f:
+                knowledge_base = json.load(f)
+            for item in knowledge_base.get('mitre_techniques', []):
+                technique_id = str(item.get('id', '')).strip().upper()
+                if not TECHNIQUE_ID_PATTERN.match(technique_id):
+                    continue
+                technique = self.techniques.get(technique_id)
+                if technique is None:
+                    technique = self.techniques[technique_id] = Technique(technique_id, item.get('name') or technique_id)
+                else:
+                    technique.name = item.get('name') or technique.name
+                technique.description = _summarize(item.get('description', '')) or technique.description
+                technique.platforms = shared_tuple(_platforms(item.get('platform')))
+        except Exception as e:
+            # The built-in mapping alone still serves every lookup
+            logger.error(f"Failed to load MITRE knowledge base {knowledge_base_path}: {e}")
+        
+        # Parent links, inherited tactics and the secondary indexes
+        children: Dict[str, List[str]] = {}
+        for technique_id, technique in self.techniques.items():
+            if '.' in technique_id:
+                parent_id = technique_id.split('.', 1)[0]
+                technique.parent = parent_id
+                parent = self.techniques.get(parent_id)
+                if parent is not None:
+                    children.setdefault(parent_id, []).append(technique_id)
+                    if not technique.tactics:
+                        technique.tactics = parent.tactics
+        
+        by_name: Dict[str, List[str]] = {}
+        by_tactic: Dict[str, List[str]] = {}
+        for technique_id in sorted(self.techniques):
+            technique = self.techniques[technique_id]
+            technique.subtechniques = tuple(sorted(children.get(technique_id, ())))
+            by_name.setdefault(technique.name.lower(), []).append(technique_id)
+            for tactic in technique.tactics:
+                by_tactic.setdefault(tactic, []).append(technique_id)
+            
+            self._trie.insert(technique_id.lower(), technique_id)
+            self._trie.insert(technique.name.lower(), technique_id)
+            for word in _WORD.findall(technique.name.lower()):
+                self._trie.insert(word, technique_id)
+        
+        self.by_name = {name: tuple(ids) for name, ids in by_name.items()}
+        self.by_tactic = {tactic: tuple(ids) for tactic, ids in by_tactic.items()}
+        
+        logger.info(f"MITRE index built: {len(self.techniques)} techniques, {len(self.by_tactic)} tactics")
+    
+    @staticmethod
+    def normalize_id(technique_id: str) -> str:
+        return str(technique_id or '').strip().upper()
+    
+    @staticmethod
+    def is_valid_id(technique_id: str) -> bool:
+        """Whether a string is a well-formed technique id (T1234 or T1234.001)"""
+        return bool(TECHNIQUE_ID_PATTERN.match(MitreIndex.normalize_id(technique_id)))
+    
+    def get(self, technique_id: str) -> Optional[Technique]:
+        return self.techniques.get(self.normalize_id(technique_id))
+    
+    def __contains__(self, technique_id: str) -> bool:
+        return self.normalize_id(technique_id) in self.techniques
+    
+    def __len__(self) -> int:
+        return len(self.techniques)
+    
+    def resolve(self, technique_id: str) -> Optional[Technique]:
+        """The technique, or its parent for a sub-technique the index does not list"""
+        technique_id = self.normalize_id(technique_id)
+        technique = self.techniques.get(technique_id)
+        if technique is None and '.' in technique_id:
+            technique = self.techniques.get(technique_id.split('.', 1)[0])
+        return technique
+    
+    def describe(self, technique_id: str) -> Optional[Dict[str, Any]]:
+        """name/tactic/description for a technique id, falling back to the parent technique"""
+        technique = self.resolve(technique_id)
+        if technique is None:
+            return None
+        return {
+            'name': technique.name,
+            'tactic': technique.tactic,
+            'tactics': list(technique.tactics),
+            'description': technique.description
+        }
+    
+    def find_by_name(self, name: str) -> List[Technique]:
+        """Techniques with exactly this name (case-insensitive)"""
+        return [self.techniques[technique_id] for technique_id in self.by_name.get(str(name or '').strip().lower(), ())]
+    
+    def techniques_for_tactic(self, tactic: str) -> Tuple[str, ...]:
+        return self.by_tactic.get(tactic, ())
+    
+    def tactics_for(self, technique_ids: Iterable[str]) -> List[str]:
+        """Distinct tactics of the given techniques, in first-seen order"""
+        tactics: List[str] = []
+        for technique_id in technique_ids:
+            technique = self.resolve(technique_id)
+            if technique is not None:
+                tactics.extend(tactic for tactic in technique.tactics if tactic not in tactics)
+        return tactics
+    
+    def search(self, query: str, limit: int = 10) -> List[Technique]:
+        """Prefix search over technique ids, full names and name words"""
+        query = str(query or '').strip().lower()
+        if not query:
+            return []
+        return [self.techniques[technique_id] for technique_id in self._trie.search(query, limit)]
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'techniques': len(self.techniques),
+            'subtechniques': sum(1 for technique in self.techniques.values() if technique.parent),
+            'tactics': {tactic: len(ids) for tactic, ids in self.by_tactic.items()}
+        }
+
+
+# Global index, built on first use (or by the API's component warmup)
+_mitre_index: Optional[MitreIndex] = None
+_mitre_index_lock = threading.Lock()
+
+
+def get_mitre_index() -> MitreIndex:
+    """Get the process-wide MITRE ATT&CK index"""
+    global _mitre_index
+    if _mitre_index is None:
+        with _mitre_index_lock:
+            if _mitre_index is None:
+                _mitre_index = MitreIndex()
+    return _mitre_index
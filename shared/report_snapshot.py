@@ -0,0 +1,225 @@
+"""
+Report Snapshot
+One consistent, pre-aggregated read of the data behind the AI reports
+
+The risk, security posture and compliance reports used to run a separate
+query (and open a separate connection) for every figure, rescanning the
+same tables a dozen times. A snapshot reads each table once inside a single
+read transaction, so every section of a report sees the same data, and keeps
+grouped counts (by threat type, severity, resolution state and time bucket;
+by agent; by technique) that the report sections filter and sum in memory.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .database import get_db_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+# Threat detections grouped by everything the reports filter on, with one
+# conditional count per time bucket the reports use
+THREAT_GROUPS_SQL = """
+    SELECT threat_type, severity, verified, false_positive,
+           COUNT(*) AS total,
+           SUM(detected_at > datetime('now', '-30 days')) AS last_30d,
+           SUM(detected_at > datetime('now', '-7 days')) AS last_7d,
+           SUM(detected_at BETWEEN datetime('now', '-14 days') AND datetime('now', '-7 days')) AS previous_7d,
+           SUM(CASE WHEN detected_at > datetime('now', '-30 days') THEN confidence_score ELSE 0 END) AS confidence_sum_30d,
+           SUM(CASE WHEN detected_at > datetime('now', '-7 days')
+                    THEN (julianday(datetime('now')) - julianday(detected_at)) * 24 ELSE 0 END) AS age_hours_sum_7d,
+           SUM(detected_at >= :window_start AND detected_at <= :window_end) AS in_window,
+           SUM(detected_at >= :window_start AND detected_at < :window_mid) AS window_first_half,
+           SUM(detected_at >= :window_mid AND detected_at <= :window_end) AS window_second_half
+    FROM detection_results
+    WHERE threat_detected = 1
+    GROUP BY threat_type, severity, verified, false_positive
+"""
+
+RECENT_THREATS_SQL = """
+    SELECT detected_at, threat_type, severity, verified
+    FROM detection_results
+    WHERE threat_detected = 1
+    ORDER BY detected_at DESC
+    LIMIT 20
+"""
+
+# Agent rows with the quick_summary checks evaluated by SQLite, so NULL and
+# LIKE semantics match the per-figure queries these replace. json_extract() raises
+# on malformed JSON, so only valid summaries (summary_json) are inspected
+AGENTS_SQL = """
+    SELECT id, hostname, ip_address, platform, os_version, status,
+           quick_summary, system_info, last_heartbeat,
+           COALESCE(json_extract(summary_json, '$.antivirus') = 'unknown'
+                    OR json_extract(summary_json, '$.firewall') = 'unknown', 0) AS controls_unknown,
+           COALESCE(json_extract(summary_json, '$.antivirus') != 'unknown'
+                    AND json_extract(summary_json, '$.firewall') != 'unknown', 0) AS controls_known,
+           COALESCE(json_extract(summary_json, '$.antivirus') != 'unknown', 0) AS antivirus_known,
+           COALESCE(json_extract(summary_json, '$.updates') LIKE '%up to date%'
+                    OR json_extract(summary_json, '$.updates') LIKE '%current%', 0) AS updates_current,
+           COALESCE(json_extract(summary_json, '$.updates') LIKE '%pending%'
+                    OR json_extract(summary_json, '$.updates') = 'unknown', 0) AS updates_pending,
+           COALESCE(last_heartbeat > datetime('now', '-7 days'), 0) AS heartbeat_recent
+    FROM (SELECT *, CASE WHEN json_valid(quick_summary) THEN quick_summary END AS summary_json FROM agents)
+"""
+
+COMMAND_GROUPS_SQL = """
+    SELECT technique,
+           COUNT(*) AS total,
+           SUM(created_at > datetime('now', '-30 days')) AS last_30d,
+           SUM(status = 'completed' AND created_at > datetime('now', '-30 days')) AS completed_30d,
+           SUM(status = 'completed' AND result LIKE '%success%'
+               AND created_at > datetime('now', '-7 days')) AS succeeded_7d
+    FROM commands
+    GROUP BY technique
+"""
+
+FRAMEWORK_CONTROLS_SQL = """
+    SELECT framework_id, COUNT(*) AS total, SUM(CASE WHEN implemented = 1 THEN 1 ELSE 0 END) AS implemented
+    FROM framework_controls
+    GROUP BY framework_id
+"""
+
+COMPLIANCE_HISTORY_SQL = """
+    SELECT score, recorded_at FROM compliance_history
+    WHERE framework_id = 'OVERALL'
+    ORDER BY recorded_at DESC
+    LIMIT 10
+"""
+
+
+def _matches(row: Dict[str, Any], match: Dict[str, Any]) -> bool:
+    for key, expected in match.items():
+        value = row.get(key)
+        if isinstance(expected, (tuple, list, set, frozenset)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+@dataclass
+class ReportSnapshot:
+    """Grouped report data read in one transaction"""
+    taken_at: datetime
+    window_start: Optional[datetime] = None
+    window_end: Optional[datetime] = None
+    threat_groups: List[Dict[str, Any]] = field(default_factory=list)
+    recent_threats: List[Dict[str, Any]] = field(default_factory=list)
+    agents: List[Dict[str, Any]] = field(default_factory=list)
+    command_groups: List[Dict[str, Any]] = field(default_factory=list)
+    framework_controls: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    compliance_history: List[Tuple[float, str]] = field(default_factory=list)
+    load_seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+    
+    def threats(self, bucket: str = 'total', **match: Any) -> float:
+        """Sum a bucket over threat groups, e.g. threats('last_7d', severity=('high', 'critical'), verified=0)"""
+        return sum(group[bucket] or 0 for group in self.threat_groups if _matches(group, match))
+    
+    def threats_by_type(self, bucket: str = 'total', **match: Any) -> Dict[str, int]:
+        """Per threat type sums of a bucket (untyped detections are left out)"""
+        counts: Dict[str, int] = {}
+        for group in self.threat_groups:
+            if group['threat_type'] is not None and group[bucket] and _matches(group, match):
+                counts[group['threat_type']] = counts.get(group['threat_type'], 0) + group[bucket]
+        return counts
+    
+    def agent_count(self, **match: Any) -> int:
+        """Agents matching all conditions, e.g. agent_count(status='active', controls_known=1)"""
+        return sum(1 for agent in self.agents if _matches(agent, match))
+    
+    def commands(self, bucket: str = 'total') -> int:
+        return sum(group[bucket] or 0 for group in self.command_groups)
+
+
+def _rows(conn, sql: str, params=(), errors: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    try:
+        cursor = conn.execute(sql, params)
+    except Exception as e:
+        # A missing optional table leaves its part of the snapshot empty
+        logger.error(f"Report snapshot query failed: {e}")
+        if errors is not None:
+            errors.append(str(e))
+        return []
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _json_object(row: Dict[str, Any], column: str, errors: List[str]) -> Dict[str, Any]:
+    """Decode a JSON object column; a bad value reads as {} rather than failing every report"""
+    value = row.get(column)
+    if not value:
+        return {}
+    try:
+        decoded = json.loads(value)
+        if not isinstance(decoded, dict):
+            raise ValueError(f"expected an object, got {type(decoded).__name__}")
+    except (TypeError, ValueError) as e:
+        message = f"Agent {row.get('id')}: unreadable {column}: {e}"
+        logger.error(f"Report snapshot {message}")
+        errors.append(message)
+        return {}
+    return decoded
+
+
+def take_report_snapshot(db_path: str = 'soc_database.db', window_start: Optional[datetime] = None,
+                         window_end: Optional[datetime] = None) -> ReportSnapshot:
+    """
+    Read everything the reports need in one transaction
+    
+    `window_start`/`window_end` add counts for a caller-defined window and
+    its two halves (compared as ISO strings, like the posture report did).
+    """
+    started = time.perf_counter()
+    snapshot = ReportSnapshot(taken_at=datetime.utcnow(), window_start=window_start, window_end=window_end)
+    
+    window_end = window_end or datetime.now()
+    window_start = window_start or window_end
+    window = {
+        'window_start': window_start.isoformat(),
+        'window_mid': (window_start + (window_end - window_start) / 2).isoformat(),
+        'window_end': window_end.isoformat()
+    }
+    
+    conn = get_db_connection(db_path)
+    try:
+        # Every read below sees the same database state
+        conn.execute('BEGIN')
+        snapshot.threat_groups = _rows(conn, THREAT_GROUPS_SQL, window, snapshot.errors)
+        snapshot.recent_threats = _rows(conn, RECENT_THREATS_SQL, errors=snapshot.errors)
+        snapshot.agents = _rows(conn, AGENTS_SQL, errors=snapshot.errors)
+        snapshot.command_groups = _rows(conn, COMMAND_GROUPS_SQL, errors=snapshot.errors)
+        snapshot.framework_controls = {
+            row['framework_id']: (row['total'] or 0, row['implemented'] or 0)
+            for row in _rows(conn, FRAMEWORK_CONTROLS_SQL, errors=snapshot.errors)
+        }
+        snapshot.compliance_history = [
+            (row['score'], row['recorded_at']) for row in _rows(conn, COMPLIANCE_HISTORY_SQL, errors=snapshot.errors)
+        ]
+        conn.rollback()
+    finally:
+        conn.close()
+    
+    for agent in snapshot.agents:
+        agent['quick_summary'] = _json_object(agent, 'quick_summary', snapshot.errors)
+        agent['system_info'] = _json_object(agent, 'system_info', snapshot.errors)
+    
+    snapshot.load_seconds = round(time.perf_counter() - started, 4)
+    return snapshot
+
+
+async def load_report_snapshot(db_path: str = 'soc_database.db', window_start: Optional[datetime] = None,
+                               window_end: Optional[datetime] = None) -> ReportSnapshot:
+    """take_report_snapshot() in a worker thread, leaving the event loop free"""
+    return await asyncio.get_running_loop().run_in_executor(
+        None, take_report_snapshot, db_path, window_start, window_end
+    )
@@ -325,3 +325,38 @@ class RateLimiter:
             return True
         
         return False
+
+
+class DataChangeTracker:
+    """Monotonic per-source change counters used to invalidate derived data"""
+
+    def __init__(self):
+        # Counters restart with the process, so snapshots carry the epoch they were taken in
+        self.epoch = datetime.utcnow().isoformat()
+        self.counters: Dict[str, int] = {}
+
+    def record_change(self, source: str, count: int = 1) -> None:
+        """Record that data of the given source has changed"""
+        self.counters[source] = self.counters.get(source, 0) + count
+
+    def snapshot(self, sources: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Capture the current counters for later comparison"""
+        if sources is None:
+            sources = list(self.counters.keys())
+
+        return {
+            'epoch': self.epoch,
+            'versions': {source: self.counters.get(source, 0) for source in sources}
+        }
+
+    def changes_since(self, snapshot: Optional[Dict[str, Any]], sources: List[str]) -> Optional[int]:
+        """Number of changes since snapshot, or None if it was taken in another process"""
+        if not snapshot or snapshot.get('epoch') != self.epoch:
+            return None
+
+        versions = snapshot.get('versions', {})
+        return sum(self.counters.get(source, 0) - versions.get(source, 0) for source in sources)
+
+
+# Global change tracker shared by storage writers and cached views
+data_change_tracker = DataChangeTracker()
@@ -0,0 +1,529 @@
+"""
+Workflow Checkpointer
+Durable, pruned LangGraph checkpoints in SQLite
+
+A checkpoint row holds only channel versions; each (channel, version) points
+at a content-addressed blob, so a step that rewrites an unchanged channel adds
+a small reference row instead of another copy of the value. Every thread keeps
+only its newest `keep_last` checkpoints, idle threads are compacted down to
+their latest checkpoint, and resume_thread() continues a paused thread from
+where it stopped instead of replaying the graph.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .database import get_db_connection
+
+try:
+    from langgraph.checkpoint.base import (
+        WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata,
+        CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata
+    )
+    from langgraph.checkpoint.serde.types import TASKS
+    LANGGRAPH_AVAILABLE = True
+except ImportError:
+    BaseCheckpointSaver = object
+    LANGGRAPH_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        type TEXT,
+        checkpoint BLOB,  -- checkpoint without channel values
+        metadata_type TEXT,
+        metadata BLOB,
+        channel_versions TEXT,  -- JSON {channel: version}, used for pruning
+        created_at REAL NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    );
+    CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        channel TEXT NOT NULL,
+        version TEXT NOT NULL,
+        type TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+    );
+    CREATE TABLE IF NOT EXISTS checkpoint_content (
+        content_hash TEXT PRIMARY KEY,
+        blob BLOB
+    );
+    CREATE TABLE IF NOT EXISTS checkpoint_writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT,
+        blob BLOB,
+        task_path TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    );
+    CREATE INDEX IF NOT EXISTS idx_checkpoints_created ON checkpoints(created_at);
+    CREATE INDEX IF NOT EXISTS idx_checkpoint_blobs_content ON checkpoint_blobs(content_hash);
+'''
+
+
+def _thread_config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> Dict[str, Any]:
+    return {
+        'configurable': {
+            'thread_id': thread_id,
+            'checkpoint_ns': checkpoint_ns,
+            'checkpoint_id': checkpoint_id
+        }
+    }
+
+
+class SqliteWorkflowCheckpointer(BaseCheckpointSaver):
+    """LangGraph checkpoint saver with delta storage and per-thread retention"""
+    
+    def __init__(self, db_path: str, keep_last: int = 5, gc_interval: int = 200, serde=None):
+        if not LANGGRAPH_AVAILABLE:
+            raise ImportError("LangGraph not installed. Run: pip install langgraph")
+        super().__init__(serde=serde)
+        
+        self.db_path = db_path
+        self.keep_last = max(keep_last, 2)  # the parent checkpoint carries pending sends
+        self.gc_interval = gc_interval
+        
+        self._conn = None
+        self._lock = threading.Lock()
+        self._prunes_since_gc = 0
+        
+        self.stats = {
+            'checkpoints_written': 0,
+            'blobs_written': 0,
+            'blobs_deduplicated': 0,
+            'checkpoints_pruned': 0,
+            'blobs_pruned': 0,
+            'content_collected': 0,
+            'threads_compacted': 0,
+            'threads_deleted': 0
+        }
+    
+    def _connection(self):
+        """Open the database on first use (directories and schema included)"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            conn = get_db_connection(self.db_path, check_same_thread=False)
+            # Must precede table creation to take effect on a new database
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.executescript(SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+    
+    # ---- reads ----
+    
+    def _load_channel_values(self, cursor, thread_id: str, checkpoint_ns: str,
+                             channel_versions: Dict[str, Any]) -> Dict[str, Any]:
+        wanted = {channel: str(version) for channel, version in channel_versions.items()}
+        if not wanted:
+            return {}
+        
+        cursor.execute('''
+            SELECT b.channel, b.version, b.type, c.blob
+            FROM checkpoint_blobs b JOIN checkpoint_content c ON c.content_hash = b.content_hash
+            WHERE b.thread_id = ? AND b.checkpoint_ns = ?
+        ''', (thread_id, checkpoint_ns))
+        
+        values = {}
+        for channel, version, value_type, blob in cursor.fetchall():
+            if wanted.get(channel) == version and value_type != 'empty':
+                values[channel] = self.serde.loads_typed((value_type, blob))
+        return values
+    
+    def _build_tuple(self, cursor, thread_id: str, checkpoint_ns: str, row: Tuple) -> 'CheckpointTuple':
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+        
+        cursor.execute('''
+            SELECT task_id, channel, type, blob FROM checkpoint_writes
+            WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?
+            ORDER BY task_id, idx
+        ''', (thread_id, checkpoint_ns, checkpoint_id))
+        pending_writes = [
+            (task_id, channel, self.serde.loads_typed((value_type, blob)))
+            for task_id, channel, value_type, blob in cursor.fetchall()
+        ]
+        
+        pending_sends = []
+        if parent_checkpoint_id:
+            cursor.execute('''
+                SELECT type, blob FROM checkpoint_writes
+                WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ?
+                ORDER BY task_path, task_id, idx
+            ''', (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS))
+            pending_sends = [self.serde.loads_typed((value_type, blob)) for value_type, blob in cursor.fetchall()]
+        
+        return CheckpointTuple(
+            config=_thread_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint={
+                **checkpoint,
+                'channel_values': self._load_channel_values(
+                    cursor, thread_id, checkpoint_ns, checkpoint['channel_versions']
+                ),
+                'pending_sends': pending_sends
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=(
+                _thread_config(thread_id, checkpoint_ns, parent_checkpoint_id) if parent_checkpoint_id else None
+            ),
+            pending_writes=pending_writes
+        )
+    
+    def get_tuple(self, config: Dict[str, Any]) -> Optional['CheckpointTuple']:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = get_checkpoint_id(config)
+        
+        query = '''
+            SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata
+            FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+        '''
+        params: List[Any] = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            query += ' AND checkpoint_id = ?'
+            params.append(checkpoint_id)
+        query += ' ORDER BY checkpoint_id DESC LIMIT 1'
+        
+        with self._lock:
+            cursor = self._connection().cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            return self._build_tuple(cursor, thread_id, checkpoint_ns, row) if row else None
+    
+    def list(self, config: Optional[Dict[str, Any]], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> Iterator['CheckpointTuple']:
+        query = '''
+            SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint,
+                   metadata_type, metadata
+            FROM checkpoints WHERE 1 = 1
+        '''
+        params: List[Any] = []
+        if config is not None:
+            query += ' AND thread_id = ?'
+            params.append(config['configurable']['thread_id'])
+            checkpoint_ns = config['configurable'].get('checkpoint_ns')
+            if checkpoint_ns is not None:
+                query += ' AND checkpoint_ns = ?'
+                params.append(checkpoint_ns)
+            if get_checkpoint_id(config):
+                query += ' AND checkpoint_id = ?'
+                params.append(get_checkpoint_id(config))
+        if before is not None and get_checkpoint_id(before):
+            query += ' AND checkpoint_id < ?'
+            params.append(get_checkpoint_id(before))
+        query += ' ORDER BY checkpoint_id DESC'
+        
+        with self._lock:
+            cursor = self._connection().cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                checkpoint_tuple = self._build_tuple(cursor, thread_id, checkpoint_ns, tuple(row))
+                if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                results.append(checkpoint_tuple)
+                if limit is not None and len(results) >= limit:
+                    break
+        
+        yield from results
+    
+    # ---- writes ----
+    
+    def put(self, config: Dict[str, Any], checkpoint: 'Checkpoint', metadata: 'CheckpointMetadata',
+            new_versions: 'ChannelVersions') -> Dict[str, Any]:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        parent_checkpoint_id = config['configurable'].get('checkpoint_id')
+        
+        stored = checkpoint.copy()
+        stored.pop('pending_sends', None)
+        values = stored.pop('channel_values')
+        
+        # Only channels written since the parent checkpoint get new versions
+        blobs = []
+        for channel, version in new_versions.items():
+            value_type, blob = self.serde.dumps_typed(values[channel]) if channel in values else ('empty', b'')
+            content_hash = hashlib.sha256(value_type.encode() + b'\0' + blob).hexdigest()
+            blobs.append((channel, str(version), value_type, content_hash, blob))
+        
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        channel_versions = json.dumps({channel: str(version) for channel, version in stored['channel_versions'].items()})
+        
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.cursor()
+            try:
+                for channel, version, value_type, content_hash, blob in blobs:
+                    # Unchanged values hash to content that is already stored
+                    cursor.execute(
+                        'INSERT OR IGNORE INTO checkpoint_content (content_hash, blob) VALUES (?, ?)',
+                        (content_hash, blob)
+                    )
+                    if cursor.rowcount:
+                        self.stats['blobs_written'] += 1
+                    else:
+                        self.stats['blobs_deduplicated'] += 1
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO checkpoint_blobs
+                        (thread_id, checkpoint_ns, channel, version, type, content_hash)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (thread_id, checkpoint_ns, channel, version, value_type, content_hash))
+                
+                cursor.execute('''
+                    INSERT OR REPLACE INTO checkpoints
+                    (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint,
+                     metadata_type, metadata, channel_versions, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (thread_id, checkpoint_ns, checkpoint['id'], parent_checkpoint_id, checkpoint_type,
+                      checkpoint_blob, metadata_type, metadata_blob, channel_versions, time.time()))
+                
+                self._prune(cursor, thread_id, checkpoint_ns, self.keep_last)
+                conn.commit()
+                self.stats['checkpoints_written'] += 1
+            except Exception:
+                conn.rollback()
+                raise
+        
+        return _thread_config(thread_id, checkpoint_ns, checkpoint['id'])
+    
+    def put_writes(self, config: Dict[str, Any], writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = '') -> None:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = config['configurable']['checkpoint_id']
+        
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, value_type, blob, task_path))
+        
+        # Special channels (errors, interrupts) replace earlier writes; regular ones are written once
+        verb = 'INSERT OR REPLACE' if all(channel in WRITES_IDX_MAP for channel, _ in writes) else 'INSERT OR IGNORE'
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(f'''
+                {verb} INTO checkpoint_writes
+                (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, blob, task_path)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+    
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            for table in ('checkpoints', 'checkpoint_blobs', 'checkpoint_writes'):
+                conn.execute(f'DELETE FROM {table} WHERE thread_id = ?', (thread_id,))
+            conn.commit()
+            self.stats['threads_deleted'] += 1
+    
+    # ---- retention ----
+    
+    def _prune(self, cursor, thread_id: str, checkpoint_ns: str, keep: int) -> int:
+        """Drop a thread's checkpoints beyond the newest `keep`, and blobs no survivor references"""
+        cursor.execute('''
+            SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+            ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?
+        ''', (thread_id, checkpoint_ns, keep))
+        stale = [(thread_id, checkpoint_ns, row[0]) for row in cursor.fetchall()]
+        if not stale:
+            return 0
+        
+        cursor.executemany(
+            'DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?', stale
+        )
+        cursor.executemany(
+            'DELETE FROM checkpoint_writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?', stale
+        )
+        
+        cursor.execute(
+            'SELECT channel_versions FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?',
+            (thread_id, checkpoint_ns)
+        )
+        referenced = set()
+        for (channel_versions,) in cursor.fetchall():
+            referenced.update(json.loads(channel_versions or '{}').items())
+        
+        cursor.execute(
+            'SELECT channel, version FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ?',
+            (thread_id, checkpoint_ns)
+        )
+        unreferenced = [
+            (thread_id, checkpoint_ns, channel, version)
+            for channel, version in cursor.fetchall() if (channel, version) not in referenced
+        ]
+        cursor.executemany('''
+            DELETE FROM checkpoint_blobs
+            WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?
+        ''', unreferenced)
+        
+        self.stats['checkpoints_pruned'] += len(stale)
+        self.stats['blobs_pruned'] += len(unreferenced)
+        
+        self._prunes_since_gc += 1
+        if self._prunes_since_gc >= self.gc_interval:
+            self._collect_content(cursor)
+        return len(stale)
+    
+    def _collect_content(self, cursor) -> int:
+        """Delete blob content no longer referenced by any thread"""
+        self._prunes_since_gc = 0
+        cursor.execute('''
+            DELETE FROM checkpoint_content
+            WHERE content_hash NOT IN (SELECT content_hash FROM checkpoint_blobs)
+        ''')
+        self.stats['content_collected'] += cursor.rowcount
+        return cursor.rowcount
+    
+    def compact(self, idle_seconds: float = 3600, delete_after_seconds: Optional[float] = None) -> Dict[str, int]:
+        """
+        Compact threads that have gone quiet
+        
+        Threads idle for `idle_seconds` keep only their latest checkpoint (still
+        resumable); threads idle for `delete_after_seconds` are removed.
+        """
+        now = time.time()
+        result = {'threads_compacted': 0, 'threads_deleted': 0, 'checkpoints_removed': 0}
+        
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT thread_id, checkpoint_ns, MAX(created_at), COUNT(*) FROM checkpoints
+                GROUP BY thread_id, checkpoint_ns
+            ''')
+            
+            for thread_id, checkpoint_ns, last_activity, count in cursor.fetchall():
+                idle = now - last_activity
+                if delete_after_seconds is not None and idle >= delete_after_seconds:
+                    for table in ('checkpoints', 'checkpoint_blobs', 'checkpoint_writes'):
+                        cursor.execute(
+                            f'DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?', (thread_id, checkpoint_ns)
+                        )
+                    result['threads_deleted'] += 1
+                    result['checkpoints_removed'] += count
+                elif idle >= idle_seconds and count > 1:
+                    result['checkpoints_removed'] += self._prune(cursor, thread_id, checkpoint_ns, 1)
+                    result['threads_compacted'] += 1
+            
+            self._collect_content(cursor)
+            conn.commit()
+            conn.execute('PRAGMA incremental_vacuum')
+        
+        self.stats['threads_compacted'] += result['threads_compacted']
+        self.stats['threads_deleted'] += result['threads_deleted']
+        if result['threads_compacted'] or result['threads_deleted']:
+            logger.info(f"Compacted {result['threads_compacted']} and deleted {result['threads_deleted']} "
+                        f"checkpoint threads in {self.db_path}")
+        return result
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        with self._lock:
+            cursor = self._connection().cursor()
+            cursor.execute('SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints')
+            threads, checkpoints = cursor.fetchone()
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(blob)), 0) FROM checkpoint_content')
+            content_rows, content_bytes = cursor.fetchone()
+        
+        return {
+            **self.stats,
+            'db_path': self.db_path,
+            'keep_last': self.keep_last,
+            'threads': threads,
+            'checkpoints': checkpoints,
+            'content_blobs': content_rows,
+            'content_bytes': content_bytes
+        }
+    
+    # ---- async interface (SQLite calls run in the default executor) ----
+    
+    async def _run(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: function(*args, **kwargs))
+    
+    async def aget_tuple(self, config: Dict[str, Any]) -> Optional['CheckpointTuple']:
+        return await self._run(self.get_tuple, config)
+    
+    async def alist(self, config: Optional[Dict[str, Any]], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[Dict[str, Any]] = None,
+                    limit: Optional[int] = None) -> AsyncIterator['CheckpointTuple']:
+        results = await self._run(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in results:
+            yield checkpoint_tuple
+    
+    async def aput(self, config: Dict[str, Any], checkpoint: 'Checkpoint', metadata: 'CheckpointMetadata',
+                   new_versions: 'ChannelVersions') -> Dict[str, Any]:
+        return await self._run(self.put, config, checkpoint, metadata, new_versions)
+    
+    async def aput_writes(self, config: Dict[str, Any], writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = '') -> None:
+        await self._run(self.put_writes, config, writes, task_id, task_path)
+    
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._run(self.delete_thread, thread_id)
+
+
+async def resume_thread(graph, thread_id: str, updates: Optional[Dict[str, Any]] = None,
+                        as_node: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Continue a checkpointed graph thread from where it stopped
+    
+    Args:
+        graph: Compiled graph with a checkpointer
+        thread_id: Thread to resume
+        updates: State updates to apply first (e.g. an approval)
+        as_node: Node the updates are attributed to; routing continues from its edges
+    
+    Returns:
+        Final state of the resumed run
+    """
+    config = {'configurable': {'thread_id': thread_id}}
+    snapshot = await graph.aget_state(config)
+    if not snapshot.values:
+        raise ValueError(f"No checkpoint found for thread {thread_id}")
+    
+    if updates:
+        await graph.aupdate_state(config, updates, as_node=as_node)
+    
+    return await graph.ainvoke(None, config)
+
+
+# Checkpointers shared per database file within the process
+_checkpointers: Dict[str, SqliteWorkflowCheckpointer] = {}
+_checkpointers_lock = threading.Lock()
+
+
+def get_workflow_checkpointer(db_path: str, **options: Any) -> SqliteWorkflowCheckpointer:
+    """Get the process-wide checkpointer for a database file (options apply on first use)"""
+    key = os.path.abspath(db_path)
+    with _checkpointers_lock:
+        checkpointer = _checkpointers.get(key)
+        if checkpointer is None:
+            checkpointer = SqliteWorkflowCheckpointer(db_path, **options)
+            _checkpointers[key] = checkpointer
+        return checkpointer
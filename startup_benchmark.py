@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Server Startup Benchmark
+Measures how long the API takes to import and how long each lazy component takes to warm up
+
+Each measurement runs in a fresh interpreter so module caches do not hide
+import cost. The import-time report (python -X importtime) lists the modules
+that dominate cold start - anything heavy showing up under core.langserve_api
+belongs behind the component registry instead.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+WARMUP_SNIPPET = """
+import asyncio, json, time
+started = time.perf_counter()
+from core.langserve_api import soc_api
+imported = time.perf_counter() - started
+status = asyncio.run(soc_api.components.warmup())
+print(json.dumps({'import_seconds': imported, 'warmup_seconds': soc_api.components.warmup_seconds,
+                  'components': status}))
+"""
+
+
+def profile_imports(module: str):
+    """Import `module` in a fresh interpreter; return wall time and per-module import times"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - started
+    
+    modules = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+    
+    return {
+        'module': module,
+        'ok': result.returncode == 0,
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode else None,
+        'wall_seconds': round(wall_seconds, 3),
+        'modules': modules
+    }
+
+
+def profile_warmup():
+    """Import the API and run the component warmup in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-c', WARMUP_SNIPPET], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'ok': False, 'error': result.stderr.strip().splitlines()[-1] if result.stderr else 'unknown'}
+    return {'ok': True, **json.loads(result.stdout.strip().splitlines()[-1])}
+
+
+def print_report(profile, warmup, top: int):
+    print("=" * 80)
+    print("SERVER STARTUP BENCHMARK")
+    print("=" * 80)
+    
+    print(f"\n1. IMPORT {profile['module']}: {profile['wall_seconds']:.3f}s wall clock")
+    if not profile['ok']:
+        print(f"   ❌ Import failed: {profile['error']}")
+    
+    print(f"\n2. TOP {top} MODULES BY CUMULATIVE IMPORT TIME:")
+    for entry in sorted(profile['modules'], key=lambda m: m['cumulative_ms'], reverse=True)[:top]:
+        print(f"   {entry['cumulative_ms']:10.1f} ms  {entry['module']}")
+    
+    print(f"\n3. TOP {top} MODULES BY OWN IMPORT TIME:")
+    for entry in sorted(profile['modules'], key=lambda m: m['self_ms'], reverse=True)[:top]:
+        print(f"   {entry['self_ms']:10.1f} ms  {entry['module']}")
+    
+    if warmup is not None:
+        print("\n4. COMPONENT WARMUP:")
+        if not warmup['ok']:
+            print(f"   ❌ Warmup failed: {warmup['error']}")
+        else:
+            for name, status in warmup['components'].items():
+                marker = '✅' if status['state'] == 'ready' else '❌'
+                print(f"   {marker} {name}: {status['state']} in {status['load_seconds']}s"
+                      + (f" ({status['error']})" if status['error'] else ''))
+            print(f"   Total warmup: {warmup['warmup_seconds']}s (after the API was already answering)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure API cold start and component warmup')
+    parser.add_argument('--module', default='core.langserve_api', help='Module to profile')
+    parser.add_argument('--top', type=int, default=20, help='Number of modules to list')
+    parser.add_argument('--warmup', action='store_true', help='Also time the background component warmup')
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+    
+    profile = profile_imports(args.module)
+    warmup = profile_warmup() if args.warmup else None
+    
+    if args.json:
+        print(json.dumps({'imports': profile, 'warmup': warmup}, indent=2))
+    else:
+        print_report(profile, warmup, args.top)
+    
+    return 0 if profile['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script to verify command retry handling in the command dispatcher
+A result that arrives after the command timed out must cancel its retry
+"""
+
+import sys
+import os
+import asyncio
+import sqlite3
+import tempfile
+
+from shared.migrations import ensure_schema
+from core.server.command_queue.command_dispatcher import CommandDispatcher
+
+def _scratch_database():
+    db_path = os.path.join(tempfile.mkdtemp(), 'soc_database.db')
+    ensure_schema(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO commands (id, agent_id, technique, status) VALUES ('cmd-1', 'agent-1', 'T1033', 'queued')")
+    conn.commit()
+    conn.close()
+    return db_path
+
+def test_late_result_cancels_retry():
+    """Verify: A late result for a command requeued for retry stops it being delivered again"""
+    print("=" * 80)
+    print("TEST: Late Result Cancels Retry")
+    print("=" * 80)
+    
+    async def scenario():
+        dispatcher = CommandDispatcher(_scratch_database())
+        dispatcher.scheduler.retry_backoff_seconds = 0
+        try:
+            delivered = await dispatcher.take_commands('agent-1')
+            assert [command['id'] for command in delivered] == ['cmd-1'], "command not delivered"
+            
+            # The agent does not answer in time: the command is requeued for a retry
+            await dispatcher._expire_commands(['cmd-1'])
+            assert dispatcher.pending_count('agent-1') == 1, "timed-out command not requeued"
+            print("[OK] Timed-out command requeued for retry")
+            
+            # ...then its result arrives after all
+            assert dispatcher.complete_command('cmd-1'), "late result not handled"
+            assert dispatcher.pending_count('agent-1') == 0, "retry still pending after the result"
+            assert ('retry', 'cmd-1') not in dispatcher.scheduler.timers, "retry wake-up still armed"
+            assert await dispatcher.take_commands('agent-1') == [], "command delivered a second time"
+            print("[OK] Late result dropped the retry; command not delivered again")
+        finally:
+            await dispatcher.stop()
+    
+    asyncio.run(scenario())
+
+def run_all_dispatcher_tests():
+    """Run all command dispatcher tests"""
+    tests = [
+        ("Late Result Cancels Retry", test_late_result_cancels_retry)
+    ]
+    
+    failed = 0
+    results = []
+    for test_name, test in tests:
+        try:
+            test()
+            results.append((test_name, True))
+        except AssertionError as e:
+            print(f"[ERROR] {e}")
+            results.append((test_name, False))
+            failed += 1
+    
+    print("\n" + "=" * 80)
+    print("COMMAND DISPATCHER SUMMARY")
+    print("=" * 80)
+    for test_name, result in results:
+        print(f"{'[PASS]' if result else '[FAIL]'} {test_name}")
+    
+    return failed == 0
+
+if __name__ == "__main__":
+    success = run_all_dispatcher_tests()
+    sys.exit(0 if success else 1)